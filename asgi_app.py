@@ -0,0 +1,468 @@
+"""
+ASGI App Module for Clinic Voice AI
+
+This module handles async serving of the conversation endpoints:
+1. The web demo API (start-call, process-speech, audio) on an ASGI server
+2. Awaiting ElevenLabs calls with a shared async HTTP client
+3. Running blocking SDK calls (OpenAI, Twilio, disk cache) in a bounded executor
+4. The Twilio webhooks, with the same TwiML as the Flask routes
+5. Twilio bidirectional media streams over a WebSocket (ASGI only)
+
+The JSON contracts are the same as voice_agent_continuous, which stays the
+WSGI entry point. Run with:
+    hypercorn asgi_app:app --bind 0.0.0.0:5000
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from quart import Quart, render_template, request, jsonify, Response, redirect, websocket
+
+import voice_agent_continuous as agent
+from audio_cache import tts_cache, make_cache_key
+from http_client import http_client as blocking_http_client, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+from conversation import get_llm_stats, process_conversation
+from twilio_integration import (
+    handle_voice_webhook, handle_gather_webhook, handle_gather_partial_webhook, create_call_speculation
+)
+from media_stream import MediaStreamCall, transcribe_utterance
+from metrics import metrics, PROMETHEUS_CONTENT_TYPE
+from providers import providers
+from transcoder import AUDIO_FORMATS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Threads available for blocking calls; requests beyond this queue instead of
+# starting more threads
+ASGI_BLOCKING_WORKERS = int(os.getenv('ASGI_BLOCKING_WORKERS', 16))
+
+# Outbound HTTP limits for the async ElevenLabs client
+ELEVENLABS_TIMEOUT = httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+ELEVENLABS_MAX_CONNECTIONS = int(os.getenv('ELEVENLABS_MAX_CONNECTIONS', 20))
+ELEVENLABS_TTS_URL = "https://api.elevenlabs.io/v1/text-to-speech"
+
+# Initialize Quart app
+app = Quart(__name__, template_folder='templates', static_folder='static')
+
+blocking_executor = ThreadPoolExecutor(max_workers=ASGI_BLOCKING_WORKERS, thread_name_prefix='asgi-blocking')
+http_client = None
+
+# Strong references to fire-and-forget tasks (the loop only keeps weak ones)
+_background_tasks = set()
+
+# Non-streaming syntheses in flight, so identical requests share one call
+_inflight_synthesis = {}
+
+# Gather turns prepared from Twilio's partial speech results
+call_speculation = create_call_speculation(process_conversation)
+
+# What a media stream turn runs: speech to text, the conversation, text to speech
+media_stream_backends = {
+    'transcribe': transcribe_utterance,
+    'respond': process_conversation,
+    'synthesize': agent.synthesize_telephony
+}
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking call in the bounded executor
+
+    Args:
+        func: Blocking callable
+        *args: Arguments for func
+        **kwargs: Keyword arguments for func
+
+    Returns:
+        The callable's return value
+    """
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context so latency spans in the worker keep their turn labels
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(blocking_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+def spawn(coroutine):
+    """Run a coroutine in the background, keeping it alive until it finishes"""
+    task = asyncio.get_running_loop().create_task(coroutine)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+@app.before_serving
+async def open_http_client():
+    """Create the shared async HTTP client"""
+    global http_client
+    http_client = httpx.AsyncClient(
+        timeout=ELEVENLABS_TIMEOUT,
+        limits=httpx.Limits(max_connections=ELEVENLABS_MAX_CONNECTIONS)
+    )
+
+
+@app.before_serving
+async def start_job_workers():
+    """Run queued booking side effects in this worker"""
+    agent.jobs.start()
+
+
+@app.before_serving
+async def warm_up_providers():
+    """Load provider SDKs in the background when PROVIDER_WARMUP asks for it"""
+    providers.warm_up_in_background()
+
+
+@app.after_serving
+async def close_http_client():
+    """Close the HTTP client and release executor threads"""
+    await http_client.aclose()
+    blocking_executor.shutdown(wait=False)
+
+
+async def generate_voice_async(text, emotion="neutral", session_id=None):
+    """
+    Async counterpart of voice_agent_continuous.generate_voice
+
+    Uses the same cache keys, stream registry and /api/audio URLs, so clips
+    are shared with the WSGI app.
+
+    Args:
+        text: Text to convert to speech
+        emotion: Emotional tone for the voice
+        session_id: Session the audio URL belongs to
+
+    Returns:
+        URL to the generated audio
+    """
+    try:
+        # Check if we have valid ElevenLabs credentials
+        if not agent.ELEVENLABS_API_KEY or not agent.ELEVENLABS_VOICE_ID:
+            logger.warning("Missing ElevenLabs credentials, using mock audio")
+            return "/static/mock_audio.mp3"
+
+        stability, similarity_boost = agent.get_voice_settings(emotion)
+        cache_key = make_cache_key(text, emotion, stability, similarity_boost,
+                                   agent.ELEVENLABS_VOICE_ID, agent.ELEVENLABS_MODEL_ID)
+
+        if await run_blocking(tts_cache.get, cache_key) is not None:
+            return await register_audio(session_id, cache_key=cache_key)
+
+        if agent.ELEVENLABS_STREAMING:
+            audio_stream, created = agent.audio_streams.open(stream_id=cache_key)
+            if created:
+                spawn(relay_voice_stream(audio_stream, text, emotion, cache_key))
+            return await register_audio(session_id, cache_key=cache_key, stream_id=audio_stream.stream_id)
+
+        audio = await synthesize_voice_async(text, emotion, cache_key)
+
+        if audio:
+            return await register_audio(session_id, cache_key=cache_key)
+        return "/static/mock_audio.mp3"
+
+    except Exception as e:
+        logger.error(f"Error generating voice: {str(e)}")
+        return "/static/mock_audio.mp3"
+
+
+async def register_audio(session_id, **artifact):
+    """Register an audio artifact for the session and return its URL"""
+    return agent.audio_url(await run_blocking(agent.audio_store.register, session_id, **artifact))
+
+
+async def synthesize_voice_async(text, emotion, cache_key):
+    """
+    Synthesize a complete clip and store it in the TTS cache
+
+    Args:
+        text: Text to convert to speech
+        emotion: Emotional tone for the voice
+        cache_key: TTS cache key for the clip
+
+    Returns:
+        MP3 audio bytes, or None on error
+    """
+    inflight = _inflight_synthesis.get(cache_key)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight_synthesis[cache_key] = future
+    audio = None
+
+    try:
+        headers, data = agent.build_voice_request(text, emotion)
+        with metrics.span('elevenlabs_tts'):
+            response = await http_client.post(f"{ELEVENLABS_TTS_URL}/{agent.ELEVENLABS_VOICE_ID}", json=data, headers=headers)
+
+        if response.status_code == 200:
+            audio = response.content
+            await run_blocking(tts_cache.put, cache_key, audio)
+        else:
+            logger.error(f"ElevenLabs API error: {response.status_code} - {response.text}")
+
+        return audio
+
+    finally:
+        del _inflight_synthesis[cache_key]
+        future.set_result(audio)
+
+
+async def relay_voice_stream(audio_stream, text, emotion, cache_key):
+    """
+    Relay the ElevenLabs streaming response into an AudioStream
+
+    Args:
+        audio_stream: Stream opened in the registry for this clip
+        text: Text to convert to speech
+        emotion: Emotional tone for the voice
+        cache_key: TTS cache key the finished clip is stored under
+    """
+    headers, data = agent.build_voice_request(text, emotion)
+    url = f"{ELEVENLABS_TTS_URL}/{agent.ELEVENLABS_VOICE_ID}/stream"
+
+    start = time.perf_counter()
+
+    try:
+        async with http_client.stream('POST', url, json=data, headers=headers) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise RuntimeError(f"ElevenLabs API error: {response.status_code} - {body.decode(errors='replace')}")
+
+            first_chunk = True
+            async for chunk in response.aiter_bytes(agent.STREAM_CHUNK_SIZE):
+                if first_chunk:
+                    metrics.observe('elevenlabs_first_chunk', time.perf_counter() - start)
+                    first_chunk = False
+                audio_stream.write(chunk)
+        audio_stream.finish()
+        metrics.observe('elevenlabs_stream', time.perf_counter() - start)
+    except Exception as e:
+        logger.error(f"Error streaming audio {audio_stream.stream_id}: {str(e)}")
+        audio_stream.finish(error=str(e))
+        return
+
+    await run_blocking(tts_cache.put, cache_key, audio_stream.getvalue())
+
+
+async def send_reply(reply, session_id=None):
+    """Async counterpart of voice_agent_continuous.send_reply"""
+    voice = reply.pop('voice', None)
+    session_id = session_id or reply.get('session_id')
+    if voice:
+        if voice['template']:
+            # Stitching itself runs on an audio stream thread; this only starts it
+            reply['audio_url'] = await run_blocking(agent.synthesize_reply_voice, voice, session_id)
+        else:
+            reply['audio_url'] = await generate_voice_async(voice['text'], voice['emotion'], session_id)
+    return jsonify(reply)
+
+
+@app.route('/')
+async def index():
+    """Render the web demo interface with continuous listening"""
+    return await render_template('voice_index_continuous.html')
+
+
+@app.route('/api/start-call', methods=['POST'])
+async def start_call():
+    """Initialize a new call session"""
+    with metrics.turn('start_call'):
+        return await send_reply(await run_blocking(agent.begin_call))
+
+
+@app.route('/api/process-speech', methods=['POST'])
+async def process_speech():
+    """Process transcribed speech with advanced conversation capabilities"""
+    data = await request.get_json()
+    with metrics.turn('process_speech'):
+        # Waits for a matching speculative turn still running
+        reply = await run_blocking(agent.take_speculative_reply, data)
+        if reply is not None:
+            return jsonify(reply)
+        # Session store reads and writes (SQLite) and booking jobs block, so they run off the event loop
+        return await send_reply(await run_blocking(agent.handle_speech, data), data.get('session_id'))
+
+
+@app.route('/api/process-partial', methods=['POST'])
+async def process_partial():
+    """Start preparing the reply to an interim transcript (the final one still goes to /api/process-speech)"""
+    data = await request.get_json()
+    speculating = agent.speech_speculation.partial(data.get('session_id'), data.get('transcript', ''))
+    return jsonify({'status': 'ok', 'speculating': speculating})
+
+
+@app.route('/api/get-conversation', methods=['GET'])
+async def get_conversation():
+    """Get conversation history for a session"""
+    session_id = request.args.get('session_id')
+
+    session = await run_blocking(agent.sessions.get, session_id) if session_id else None
+    if session is None:
+        return jsonify({'error': 'Invalid session ID'})
+
+    return jsonify(session['conversation'])
+
+
+@app.route('/api/get-appointments', methods=['GET'])
+async def get_appointments():
+    """Get all booked appointments"""
+    return jsonify(agent.appointments)
+
+
+@app.route('/api/audio/<audio_id>', methods=['GET'])
+async def stream_audio(audio_id):
+    """
+    Serve synthesized audio, relaying it as it streams if synthesis is still running
+
+    ?format=ulaw|opus|wav|mp3 serves the clip transcoded for another channel
+    (once synthesis has finished).
+    """
+    artifact = await run_blocking(agent.audio_store.lookup, audio_id)
+    if artifact is None:
+        return jsonify({'error': 'Audio not found'}), 404
+
+    audio_stream = agent.audio_streams.get(artifact['stream_id']) if artifact['stream_id'] else None
+
+    audio_format = request.args.get('format')
+    if audio_format:
+        if audio_format not in AUDIO_FORMATS:
+            return jsonify({'error': f"Unsupported format '{audio_format}'"}), 400
+        source = None
+        if audio_stream:
+            # Transcoding needs the whole clip
+            source = b"".join([chunk async for chunk in audio_stream.aiter_chunks()])
+            if not source or not audio_stream.done or audio_stream.error:
+                return jsonify({'error': 'Audio not available'}), 503
+        audio = await run_blocking(agent.read_audio_variant, artifact, audio_format, source)
+        if audio is None:
+            return jsonify({'error': 'Audio not found'}), 404
+        return Response(audio, mimetype=AUDIO_FORMATS[audio_format])
+
+    if not audio_stream:
+        # Not streaming (or streamed by another worker): serve the stored clip
+        audio = await run_blocking(agent.read_artifact_audio, artifact)
+        if audio is None:
+            return jsonify({'error': 'Audio not found'}), 404
+        return Response(audio, mimetype=artifact['mimetype'])
+
+    # If synthesis failed before producing anything, play the mock audio
+    if not await audio_stream.wait_for_data_async():
+        logger.error(f"Audio stream {audio_id} produced no audio: {audio_stream.error}")
+        return redirect("/static/mock_audio.mp3")
+
+    # Finished streams are served whole so the browser gets a Content-Length
+    if audio_stream.done:
+        return Response(agent.finished_stream_audio(audio_stream), mimetype=audio_stream.mimetype)
+
+    return Response(
+        audio_stream.aiter_chunks(),
+        mimetype=audio_stream.mimetype,
+        headers={'Cache-Control': 'no-cache'}
+    )
+
+
+@app.route('/api/tts-cache-stats', methods=['GET'])
+async def tts_cache_stats():
+    """Get TTS cache hit/miss/eviction counters"""
+    stats = tts_cache.stats()
+    stats['coalesced_streams'] = agent.audio_streams.coalesced
+    stats['phrase_bank'] = agent.phrase_bank.stats()
+    stats['audio_store'] = agent.audio_store.stats()
+    stats['variants'] = agent.audio_variants.stats()
+    return jsonify(stats)
+
+
+@app.route('/api/session-stats', methods=['GET'])
+async def session_stats():
+    """Get session store size, hit and eviction counters"""
+    return jsonify(await run_blocking(agent.sessions.stats))
+
+
+@app.route('/api/http-stats', methods=['GET'])
+async def http_stats():
+    """Get counters for the pooled client used by blocking provider calls"""
+    return jsonify(blocking_http_client.stats())
+
+
+@app.route('/api/llm-stats', methods=['GET'])
+async def llm_stats():
+    """Get LLM calls and latency per turn for each LLM_MODE used by the phone conversation handler"""
+    return jsonify(get_llm_stats())
+
+
+@app.route('/api/speculation-stats', methods=['GET'])
+async def speculation_stats():
+    """Get speculative turn counts, hit rate and latency saved per channel"""
+    return jsonify({'web': agent.speech_speculation.stats(), 'phone': call_speculation.stats()})
+
+
+@app.route('/api/job-stats', methods=['GET'])
+async def job_stats():
+    """Get side-effect job counts and the dead-letter list"""
+    stats = await run_blocking(agent.jobs.stats)
+    stats['dead_letters'] = await run_blocking(agent.jobs.dead_letters)
+    return jsonify(stats)
+
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    """Expose per-stage latency histograms in Prometheus text format"""
+    return Response(metrics.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route('/api/interrupt', methods=['POST'])
+async def handle_interruption():
+    """Handle user interruption during AI speech"""
+    data = await request.get_json()
+    session_id = data.get('session_id')
+
+    if not await run_blocking(agent.mark_interrupted, session_id):
+        return jsonify({'error': 'Invalid session ID'})
+
+    return jsonify({
+        'status': 'ok',
+        'message': 'Interruption registered'
+    })
+
+
+@app.route('/twilio/voice', methods=['POST'])
+async def twilio_voice():
+    """Handle incoming Twilio voice calls"""
+    values = await request.values
+    return Response(await run_blocking(handle_voice_webhook, values), mimetype='text/xml')
+
+
+@app.route('/twilio/gather', methods=['POST'])
+async def twilio_gather():
+    """Handle speech input from Twilio Gather (the conversation handler calls the LLM)"""
+    values = await request.values
+    twiml = await run_blocking(handle_gather_webhook, values, process_conversation, call_speculation)
+    return Response(twiml, mimetype='text/xml')
+
+
+@app.route('/twilio/gather-partial', methods=['POST'])
+async def twilio_gather_partial():
+    """Handle interim speech results from Twilio Gather (speculation runs in its own threads)"""
+    values = await request.values
+    handle_gather_partial_webhook(values, call_speculation)
+    return Response(status=204)
+
+
+@app.websocket('/twilio/media-stream')
+async def twilio_media_stream():
+    """Run a call over a Twilio bidirectional media stream (see media_stream)"""
+    call = MediaStreamCall(websocket.send, run_blocking, **media_stream_backends)
+    try:
+        while await call.handle(json.loads(await websocket.receive())):
+            pass
+    finally:
+        await call.close()
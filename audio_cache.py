@@ -0,0 +1,320 @@
+"""
+Audio Cache Module for Clinic Voice AI
+
+This module handles caching of synthesized speech:
+1. Content-addressed keys built from text and voice settings
+2. An in-memory LRU tier and a size-capped on-disk tier shared by workers
+3. Coalescing identical concurrent synthesis requests into one upstream call
+4. Hit, miss and eviction counters
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from metrics import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', os.path.join('.cache', 'tts'))
+TTS_CACHE_MEMORY_BYTES = int(os.getenv('TTS_CACHE_MEMORY_BYTES', 32 * 1024 * 1024))
+TTS_CACHE_DISK_BYTES = int(os.getenv('TTS_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+
+# When the disk tier is over its cap, evict down to this fraction of it
+DISK_EVICTION_TARGET = 0.9
+
+
+def normalize_text(text):
+    """Collapse whitespace so formatting differences map to the same clip"""
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+
+def make_cache_key(text, emotion, stability, similarity_boost, voice_id, model_id):
+    """
+    Build a content-addressed cache key for a synthesis request
+
+    Args:
+        text: Text to synthesize
+        emotion: Emotional tone requested
+        stability: ElevenLabs stability setting
+        similarity_boost: ElevenLabs similarity boost setting
+        voice_id: ElevenLabs voice ID
+        model_id: ElevenLabs model ID
+
+    Returns:
+        Hex SHA-256 digest identifying the clip
+    """
+    payload = json.dumps(
+        [normalize_text(text), emotion or '', stability, similarity_boost, voice_id or '', model_id or ''],
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _InflightSynthesis:
+    """A synthesis call that other requests for the same key can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.audio = None
+
+
+class TTSCache:
+    """Two-tier cache of synthesized audio keyed by make_cache_key"""
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, memory_bytes=TTS_CACHE_MEMORY_BYTES,
+                 disk_bytes=TTS_CACHE_DISK_BYTES, extension='mp3'):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Directory for the on-disk tier (shared by all workers)
+            memory_bytes: Byte cap for the in-memory LRU tier (0 disables it)
+            disk_bytes: Byte cap for the on-disk tier (0 disables it)
+            extension: File extension for cached clips
+        """
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.extension = extension
+
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0
+        }
+
+    def _path(self, key):
+        """Path of a clip in the on-disk tier, sharded by key prefix"""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{self.extension}")
+
+    def get(self, key, count_miss=True):
+        """
+        Look up a clip in memory, then on disk
+
+        Args:
+            key: Cache key
+            count_miss: Count a miss (False when the caller already counted one for this request)
+
+        Returns:
+            Audio bytes, or None on a miss
+        """
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return audio
+
+        audio = self._read_disk(key)
+
+        with self._lock:
+            if audio is None:
+                if count_miss:
+                    self.counters['misses'] += 1
+                return None
+            self.counters['disk_hits'] += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key, audio):
+        """
+        Store a clip in both tiers
+
+        Args:
+            key: Cache key
+            audio: Audio bytes
+        """
+        if not audio:
+            return
+
+        with self._lock:
+            self._remember(key, audio)
+            self.counters['stores'] += 1
+
+        self._write_disk(key, audio)
+
+    def get_or_synthesize(self, key, synthesize, count_miss=True):
+        """
+        Return a cached clip, or synthesize it once even under concurrent requests
+
+        Args:
+            key: Cache key
+            synthesize: Callable returning audio bytes (or None on failure)
+            count_miss: Count a miss (False when the caller already looked the key up)
+
+        Returns:
+            Audio bytes, or None if synthesis failed
+        """
+        audio = self.get(key, count_miss=count_miss)
+        if audio is not None:
+            return audio
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            leader = inflight is None
+            if leader:
+                inflight = _InflightSynthesis()
+                self._inflight[key] = inflight
+            else:
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            inflight.done.wait()
+            return inflight.audio
+
+        try:
+            audio = synthesize()
+            if audio:
+                self.put(key, audio)
+            inflight.audio = audio
+            return audio
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            inflight.done.set()
+
+    def stats(self):
+        """Get cache counters and current tier sizes"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_items'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_size
+            stats['disk_bytes'] = self._disk_size or 0
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key, audio):
+        """Insert into the memory tier and evict least recently used clips (lock held)"""
+        if not self.memory_bytes or len(audio) > self.memory_bytes:
+            return
+
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+
+        self._memory[key] = audio
+        self._memory_size += len(audio)
+
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+            self.counters['memory_evictions'] += 1
+
+    def _read_disk(self, key):
+        """Read a clip from the on-disk tier, refreshing its recency"""
+        if not self.disk_bytes:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                audio = f.read()
+            os.utime(path)
+            return audio
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.error(f"Error reading cached audio {key}: {str(e)}")
+            return None
+
+    @metrics.timed('tts_cache_write')
+    def _write_disk(self, key, audio):
+        """Atomically write a clip to the on-disk tier and enforce the size cap"""
+        if not self.disk_bytes:
+            return
+
+        path = self._path(key)
+        try:
+            # A rewrite replaces the old file, so only the difference is added
+            previous_size = os.path.getsize(path)
+        except OSError:
+            previous_size = 0
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(audio)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.error(f"Error writing cached audio {key}: {str(e)}")
+            return
+
+        with self._lock:
+            if self._disk_size is None:
+                self._disk_size = self._scan_disk_size()
+            else:
+                self._disk_size += len(audio) - previous_size
+            over_cap = self._disk_size > self.disk_bytes
+
+        if over_cap:
+            self._evict_disk()
+
+    def _scan_disk(self):
+        """List (mtime, size, path) for every clip in the on-disk tier"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(f".{self.extension}"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_disk_size(self):
+        """Total bytes in the on-disk tier"""
+        return sum(size for _, size, _ in self._scan_disk())
+
+    def _evict_disk(self):
+        """Delete least recently used clips until the disk tier is under its target size"""
+        # Rescan: other workers write to the same directory
+        entries = sorted(self._scan_disk())
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_bytes * DISK_EVICTION_TARGET
+        evicted = 0
+
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                evicted += 1
+            except FileNotFoundError:
+                total -= size
+
+        with self._lock:
+            self._disk_size = total
+            self.counters['disk_evictions'] += evicted
+
+        if evicted:
+            logger.info(f"Evicted {evicted} clips from the TTS disk cache")
+
+
+# Shared cache used by the TTS code paths
+tts_cache = TTSCache()
@@ -0,0 +1,357 @@
+"""
+Audio Store Module for Clinic Voice AI
+
+This module handles the audio clips served to callers:
+1. Collision-free artifact IDs behind every /api/audio URL
+2. Sharded on-disk storage (shared by workers) or memory-only short-lived clips
+3. Tying each artifact to the session that produced it, so its URL stops
+   working once the session is gone (checked only where that session is
+   visible: any worker with a shared session store, otherwise the worker
+   that registered the artifact)
+4. Background garbage collection by TTL and a total-bytes cap
+
+An artifact either owns its audio (stored with store()) or points at audio
+kept elsewhere: a TTS cache key or a live audio stream.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from metrics import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Store configuration
+AUDIO_STORE_DIR = os.getenv('AUDIO_STORE_DIR', os.path.join('.cache', 'audio'))
+AUDIO_TTL_SECONDS = int(os.getenv('AUDIO_TTL_SECONDS', 60 * 60))
+AUDIO_STORE_BYTES = int(os.getenv('AUDIO_STORE_BYTES', 256 * 1024 * 1024))
+AUDIO_GC_INTERVAL = int(os.getenv('AUDIO_GC_INTERVAL', 60))
+
+# Keep every artifact in process memory (single-worker deployments, no disk writes)
+AUDIO_MEMORY_ONLY = os.getenv('AUDIO_MEMORY_ONLY', 'false').lower() == 'true'
+
+# File extension for stored audio by MIME type
+AUDIO_EXTENSIONS = {
+    'audio/mpeg': 'mp3',
+    'audio/wav': 'wav',
+    'audio/basic': 'ulaw',
+    'audio/ogg': 'ogg'
+}
+
+
+class AudioStore:
+    """Session-scoped audio artifacts with TTL and size-capped storage"""
+
+    def __init__(self, root=AUDIO_STORE_DIR, ttl_seconds=AUDIO_TTL_SECONDS,
+                 max_bytes=AUDIO_STORE_BYTES, session_alive=None, shared_sessions=False):
+        """
+        Initialize the store
+
+        Args:
+            root: Directory for on-disk artifacts
+            ttl_seconds: Lifetime of an artifact after it is registered
+            max_bytes: Cap on audio bytes owned by the store (disk and memory)
+            session_alive: Optional callable (session_id) -> bool; artifacts of
+                sessions that no longer exist are treated as gone
+            shared_sessions: session_alive sees every worker's sessions. If not,
+                it only judges artifacts this process registered; the others
+                (from workers sharing the directory) expire by age alone
+        """
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.session_alive = session_alive
+        self.shared_sessions = shared_sessions
+
+        # artifact_id -> (metadata, audio bytes or None) for memory-only artifacts
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._gc_thread = None
+        self._stop_gc = threading.Event()
+
+        self.counters = {
+            'registered': 0,
+            'stored_bytes': 0,
+            'lookups': 0,
+            'not_found': 0,
+            'expired': 0,
+            'session_ended': 0,
+            'evicted': 0,
+            'gc_runs': 0
+        }
+
+    def _count(self, name, amount=1):
+        """Increment a counter"""
+        with self._lock:
+            self.counters[name] += amount
+
+    def _path(self, artifact_id, suffix):
+        """Path of an artifact file, sharded by ID prefix"""
+        return os.path.join(self.root, artifact_id[:2], f"{artifact_id}.{suffix}")
+
+    def _write_file(self, path, data):
+        """Write a file atomically so readers in other workers never see a partial one"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def register(self, session_id=None, mimetype='audio/mpeg', cache_key=None, stream_id=None, memory_only=AUDIO_MEMORY_ONLY):
+        """
+        Create an artifact and return its ID
+
+        Args:
+            session_id: Session the audio belongs to (None for session-less clips)
+            mimetype: MIME type of the audio
+            cache_key: TTS cache key holding the audio, if any
+            stream_id: Audio stream producing the audio, if any
+            memory_only: Keep the artifact in this process only (never written to disk)
+
+        Returns:
+            Artifact ID (random, so clips never collide)
+        """
+        artifact_id = uuid.uuid4().hex
+        metadata = {
+            'id': artifact_id,
+            'session_id': session_id,
+            'mimetype': mimetype,
+            'cache_key': cache_key,
+            'stream_id': stream_id,
+            'memory_only': memory_only,
+            # Read at registration: workers forked after import each have their own
+            'owner_pid': os.getpid(),
+            'created_at': time.time()
+        }
+
+        if memory_only:
+            with self._lock:
+                self._memory[artifact_id] = (metadata, None)
+        else:
+            try:
+                self._write_file(self._path(artifact_id, 'json'), json.dumps(metadata).encode('utf-8'))
+            except OSError as e:
+                logger.error(f"Error registering audio artifact, keeping it in memory: {str(e)}")
+                metadata['memory_only'] = True
+                with self._lock:
+                    self._memory[artifact_id] = (metadata, None)
+
+        self._count('registered')
+        return artifact_id
+
+    @metrics.timed('audio_store_write')
+    def store(self, artifact_id, audio):
+        """
+        Attach audio bytes to an artifact
+
+        Args:
+            artifact_id: ID from register
+            audio: Audio bytes
+        """
+        if not audio:
+            return
+
+        with self._lock:
+            entry = self._memory.get(artifact_id)
+            if entry is not None:
+                self._memory[artifact_id] = (entry[0], audio)
+                self.counters['stored_bytes'] += len(audio)
+                return
+
+        metadata = self._read_metadata(artifact_id)
+        if metadata is None:
+            return
+        extension = AUDIO_EXTENSIONS.get(metadata['mimetype'], 'bin')
+        try:
+            self._write_file(self._path(artifact_id, extension), audio)
+            self._count('stored_bytes', len(audio))
+        except OSError as e:
+            logger.error(f"Error storing audio artifact {artifact_id}: {str(e)}")
+
+    def lookup(self, artifact_id):
+        """
+        Get an artifact's metadata if it is still valid
+
+        Args:
+            artifact_id: Artifact ID from a URL
+
+        Returns:
+            Metadata dict, or None if unknown, expired or its session has ended
+        """
+        self._count('lookups')
+        with self._lock:
+            entry = self._memory.get(artifact_id)
+        metadata = entry[0] if entry is not None else self._read_metadata(artifact_id)
+
+        if metadata is None:
+            self._count('not_found')
+            return None
+
+        reason = self._invalid_reason(metadata, time.time())
+        if reason:
+            self._count(reason)
+            self.delete(artifact_id)
+            return None
+
+        return metadata
+
+    def read(self, artifact_id):
+        """Get the audio bytes an artifact owns, or None"""
+        with self._lock:
+            entry = self._memory.get(artifact_id)
+        if entry is not None:
+            return entry[1]
+
+        metadata = self._read_metadata(artifact_id)
+        if metadata is None:
+            return None
+        try:
+            with open(self._path(artifact_id, AUDIO_EXTENSIONS.get(metadata['mimetype'], 'bin')), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, artifact_id):
+        """Remove an artifact and any audio it owns"""
+        with self._lock:
+            entry = self._memory.pop(artifact_id, None)
+        if entry is not None:
+            return
+
+        shard = os.path.join(self.root, artifact_id[:2])
+        try:
+            for entry in os.scandir(shard):
+                if entry.name.startswith(f"{artifact_id}."):
+                    os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def _read_metadata(self, artifact_id):
+        """Load an on-disk artifact's metadata"""
+        if not artifact_id or not artifact_id.isalnum():
+            return None
+        try:
+            with open(self._path(artifact_id, 'json'), 'rb') as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _invalid_reason(self, metadata, now):
+        """Counter name explaining why an artifact is no longer servable, or None"""
+        if now - metadata['created_at'] > self.ttl_seconds:
+            return 'expired'
+        session_id = metadata.get('session_id')
+        if not session_id or not self.session_alive:
+            return None
+        if not self.shared_sessions and metadata.get('owner_pid') != os.getpid():
+            # Another worker's session, which this process cannot see
+            return None
+        if not self.session_alive(session_id):
+            return 'session_ended'
+        return None
+
+    def collect_garbage(self):
+        """
+        Delete expired and orphaned artifacts, then the oldest until under max_bytes
+
+        Returns:
+            Number of artifacts removed
+        """
+        now = time.time()
+        removed = {'expired': 0, 'session_ended': 0, 'evicted': 0}
+        # (created_at, size, artifact_id) for every artifact that owns audio
+        owned = []
+
+        with self._lock:
+            memory_items = list(self._memory.items())
+        for artifact_id, (metadata, audio) in memory_items:
+            reason = self._invalid_reason(metadata, now)
+            if reason:
+                self.delete(artifact_id)
+                removed[reason] += 1
+            elif audio:
+                owned.append((metadata['created_at'], len(audio), artifact_id))
+
+        for metadata, size in self._scan_disk():
+            reason = self._invalid_reason(metadata, now)
+            if reason:
+                self.delete(metadata['id'])
+                removed[reason] += 1
+            elif size:
+                owned.append((metadata['created_at'], size, metadata['id']))
+
+        total = sum(size for _, size, _ in owned)
+        for _, size, artifact_id in sorted(owned):
+            if total <= self.max_bytes:
+                break
+            self.delete(artifact_id)
+            total -= size
+            removed['evicted'] += 1
+
+        with self._lock:
+            self.counters['gc_runs'] += 1
+            for name, amount in removed.items():
+                self.counters[name] += amount
+
+        count = sum(removed.values())
+        if count:
+            logger.info(f"Audio store GC removed {count} artifacts: {removed}")
+        return count
+
+    def _scan_disk(self):
+        """Yield (metadata, audio size) for every on-disk artifact"""
+        if not os.path.isdir(self.root):
+            return
+
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            sizes = {}
+            metadata_ids = []
+            for entry in os.scandir(shard.path):
+                artifact_id, _, suffix = entry.name.partition('.')
+                if suffix == 'json':
+                    metadata_ids.append(artifact_id)
+                elif suffix != 'tmp':
+                    try:
+                        sizes[artifact_id] = entry.stat().st_size
+                    except FileNotFoundError:
+                        pass
+            for artifact_id in metadata_ids:
+                metadata = self._read_metadata(artifact_id)
+                if metadata is not None:
+                    yield metadata, sizes.get(artifact_id, 0)
+
+    def start_gc(self, interval=AUDIO_GC_INTERVAL):
+        """Run collect_garbage every interval seconds in a daemon thread"""
+        if self._gc_thread is not None:
+            return self._gc_thread
+
+        def run():
+            while not self._stop_gc.wait(interval):
+                try:
+                    self.collect_garbage()
+                except Exception as e:
+                    logger.error(f"Error collecting audio garbage: {str(e)}")
+
+        self._gc_thread = threading.Thread(target=run, name="audio-store-gc", daemon=True)
+        self._gc_thread.start()
+        return self._gc_thread
+
+    def stop_gc(self):
+        """Stop the background GC"""
+        self._stop_gc.set()
+
+    def stats(self):
+        """Get artifact counters"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_artifacts'] = len(self._memory)
+        stats['ttl_seconds'] = self.ttl_seconds
+        return stats
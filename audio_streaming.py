@@ -0,0 +1,278 @@
+"""
+Audio Streaming Module for Clinic Voice AI
+
+This module handles progressive delivery of synthesized speech:
+1. Buffering audio chunks as they arrive from a streaming TTS provider
+2. Serving those chunks to one or more HTTP readers while synthesis runs
+3. Expiring finished streams after a short retention period
+4. Awaitable readers for the async (ASGI) serving mode
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+import uuid
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How long a finished stream stays readable (browsers may re-request audio)
+STREAM_RETENTION_SECONDS = 300
+
+# How long a reader waits for the next chunk before giving up
+STREAM_READ_TIMEOUT = 30
+
+
+class AudioStream:
+    """Audio being produced by a TTS provider, readable while it is still growing"""
+
+    def __init__(self, stream_id, mimetype='audio/mpeg'):
+        """
+        Create an empty stream
+
+        Args:
+            stream_id: Unique stream identifier
+            mimetype: MIME type of the audio
+        """
+        self.stream_id = stream_id
+        self.mimetype = mimetype
+        self.created_at = time.time()
+        self.finished_at = None
+        self.error = None
+        self._chunks = []
+        self._condition = threading.Condition()
+        self._async_waiters = []
+
+    @property
+    def done(self):
+        """True once the provider has finished (successfully or not)"""
+        return self.finished_at is not None
+
+    @property
+    def size(self):
+        """Number of bytes received so far"""
+        with self._condition:
+            return sum(len(chunk) for chunk in self._chunks)
+
+    def write(self, chunk):
+        """Append a chunk of audio and wake up readers"""
+        with self._condition:
+            self._chunks.append(chunk)
+            self._notify()
+
+    def finish(self, error=None):
+        """Mark the stream complete, optionally recording a provider error"""
+        with self._condition:
+            self.error = error
+            self.finished_at = time.time()
+            self._notify()
+
+    def _notify(self):
+        """Wake up blocking and async readers (condition held)"""
+        self._condition.notify_all()
+        for loop, event in self._async_waiters:
+            loop.call_soon_threadsafe(event.set)
+        self._async_waiters = []
+
+    async def _wait_async(self, ready, timeout):
+        """
+        Wait on the event loop until ready() is true, without blocking a thread
+
+        Returns:
+            True if ready() became true, False on timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self._condition:
+                if ready():
+                    return True
+                event = asyncio.Event()
+                self._async_waiters.append((loop, event))
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+
+    def wait_for_data(self, timeout=STREAM_READ_TIMEOUT):
+        """
+        Block until the first chunk arrives or the stream finishes
+
+        Returns:
+            True if audio is available, False if the stream failed or timed out empty
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._chunks or self.done, timeout=timeout)
+            return bool(self._chunks)
+
+    async def wait_for_data_async(self, timeout=STREAM_READ_TIMEOUT):
+        """Awaitable version of wait_for_data"""
+        await self._wait_async(lambda: self._chunks or self.done, timeout)
+        with self._condition:
+            return bool(self._chunks)
+
+    def getvalue(self):
+        """Get all audio received so far as bytes"""
+        with self._condition:
+            return b"".join(self._chunks)
+
+    def iter_chunks(self, timeout=STREAM_READ_TIMEOUT):
+        """
+        Yield audio chunks from the start of the stream, waiting for new ones until it finishes
+
+        Args:
+            timeout: Seconds to wait for a new chunk before stopping
+
+        Yields:
+            Audio chunks as bytes
+        """
+        index = 0
+        while True:
+            with self._condition:
+                if not self._condition.wait_for(
+                    lambda: index < len(self._chunks) or self.done,
+                    timeout=timeout
+                ):
+                    logger.warning(f"Timed out waiting for audio stream {self.stream_id}")
+                    return
+                chunks = self._chunks[index:]
+                finished = self.done
+
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+
+            if finished and not chunks:
+                return
+
+    async def aiter_chunks(self, timeout=STREAM_READ_TIMEOUT):
+        """Async version of iter_chunks for ASGI responses"""
+        index = 0
+        while True:
+            if not await self._wait_async(lambda: index < len(self._chunks) or self.done, timeout):
+                logger.warning(f"Timed out waiting for audio stream {self.stream_id}")
+                return
+            with self._condition:
+                chunks = self._chunks[index:]
+                finished = self.done
+
+            for chunk in chunks:
+                yield chunk
+            index += len(chunks)
+
+            if finished and not chunks:
+                return
+
+
+class AudioStreamRegistry:
+    """Tracks in-flight and recently finished audio streams by ID"""
+
+    def __init__(self, retention_seconds=STREAM_RETENTION_SECONDS):
+        """
+        Initialize the registry
+
+        Args:
+            retention_seconds: How long finished streams remain readable
+        """
+        self.retention_seconds = retention_seconds
+        self.coalesced = 0
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def start(self, chunk_source, mimetype='audio/mpeg', stream_id=None, on_complete=None):
+        """
+        Start producing a stream in a background thread
+
+        If a stream with the same ID is already in flight (or finished without
+        error), it is returned instead, so identical requests share one
+        upstream call.
+
+        Args:
+            chunk_source: Callable returning an iterator of audio chunks (bytes)
+            mimetype: MIME type of the audio
+            stream_id: Optional stable ID (e.g. a cache key); random if omitted
+            on_complete: Optional callable invoked with the stream after a successful finish
+
+        Returns:
+            The AudioStream, which is readable immediately
+        """
+        audio_stream, created = self.open(mimetype, stream_id)
+        if not created:
+            return audio_stream
+
+        # Run in a copy of the caller's context so latency spans keep their turn labels
+        thread = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._produce, audio_stream, chunk_source, on_complete),
+            name=f"audio-stream-{audio_stream.stream_id[:8]}",
+            daemon=True
+        )
+        thread.start()
+        return audio_stream
+
+    def open(self, mimetype='audio/mpeg', stream_id=None):
+        """
+        Register a stream that the caller will write to and finish itself
+
+        Used by producers that are not a blocking iterator, such as an
+        asyncio task relaying an async HTTP response.
+
+        Args:
+            mimetype: MIME type of the audio
+            stream_id: Optional stable ID (e.g. a cache key); random if omitted
+
+        Returns:
+            Tuple of (AudioStream, created); created is False when an existing
+            in-flight or successful stream with the same ID was returned
+        """
+        self._purge_expired()
+
+        with self._lock:
+            existing = self._streams.get(stream_id) if stream_id else None
+            if existing is not None and existing.error is None:
+                self.coalesced += 1
+                return existing, False
+
+            audio_stream = AudioStream(stream_id or uuid.uuid4().hex, mimetype)
+            self._streams[audio_stream.stream_id] = audio_stream
+            return audio_stream, True
+
+    def get(self, stream_id):
+        """Get a stream by ID, or None if unknown or expired"""
+        with self._lock:
+            return self._streams.get(stream_id)
+
+    def _produce(self, audio_stream, chunk_source, on_complete=None):
+        """Pump chunks from the provider into the stream"""
+        try:
+            for chunk in chunk_source():
+                if chunk:
+                    audio_stream.write(chunk)
+            audio_stream.finish()
+        except Exception as e:
+            logger.error(f"Error streaming audio {audio_stream.stream_id}: {str(e)}")
+            audio_stream.finish(error=str(e))
+            return
+
+        if on_complete:
+            try:
+                on_complete(audio_stream)
+            except Exception as e:
+                logger.error(f"Error completing audio stream {audio_stream.stream_id}: {str(e)}")
+
+    def _purge_expired(self):
+        """Drop finished streams older than the retention period"""
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [
+                stream_id for stream_id, audio_stream in self._streams.items()
+                if audio_stream.done and audio_stream.finished_at < cutoff
+            ]
+            for stream_id in expired:
+                del self._streams[stream_id]
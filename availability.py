@@ -0,0 +1,360 @@
+"""
+Availability Module for Clinic Voice AI
+
+This module handles appointment availability for the clinic's doctors:
+1. Weekly working hours per doctor, parsed from the DOCTORS availability field
+   ("Monday", "Saturday morning", ...)
+2. Each doctor's booked intervals in a sorted interval index
+3. O(log n) "is this slot free?" checks and fast nearest-free-slot searches
+   for a doctor or a whole service
+4. Booking and cancelling slots, safe for concurrent requests
+
+Times are kept internally as integer minutes of local (clinic timezone) wall
+clock time since the epoch, so queries are integer bisections.
+"""
+
+import bisect
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from time_parser import CLINIC_TIMEZONE, SLOT_MINUTES, WEEKDAYS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Clinic opening hours (minutes past midnight) used for a doctor's working days
+CLINIC_OPEN_MINUTE = int(os.getenv('CLINIC_OPEN_HOUR', 8)) * 60
+CLINIC_CLOSE_MINUTE = int(os.getenv('CLINIC_CLOSE_HOUR', 18)) * 60
+
+# Parts of a day a doctor can be limited to ("Saturday morning")
+DAY_PARTS = {
+    'morning': (CLINIC_OPEN_MINUTE, 12 * 60),
+    'afternoon': (12 * 60, CLINIC_CLOSE_MINUTE)
+}
+
+# How far ahead slots are searched for
+AVAILABILITY_HORIZON_DAYS = int(os.getenv('AVAILABILITY_HORIZON_DAYS', 90))
+
+MINUTES_PER_DAY = 24 * 60
+
+# 1970-01-01 was a Thursday
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_WEEKDAY = 3
+
+
+def to_minutes(moment, tz=CLINIC_TIMEZONE):
+    """Aware datetime -> local wall-clock minutes since the epoch"""
+    local = moment.astimezone(tz).replace(tzinfo=None)
+    return (local - _EPOCH) // timedelta(minutes=1)
+
+
+def from_minutes(minutes, tz=CLINIC_TIMEZONE):
+    """Local wall-clock minutes since the epoch -> aware datetime"""
+    return (_EPOCH + timedelta(minutes=minutes)).replace(tzinfo=tz)
+
+
+def parse_working_hours(availability):
+    """
+    Parse a DOCTORS availability list into windows per weekday
+
+    Args:
+        availability: e.g. ["Monday", "Wednesday", "Saturday morning"]
+
+    Returns:
+        List of 7 lists (Monday first) of (start minute, end minute) windows
+    """
+    windows = [[] for _ in WEEKDAYS]
+    for entry in availability:
+        words = entry.lower().split()
+        if not words or words[0] not in WEEKDAYS:
+            logger.warning(f"Ignoring unrecognized availability entry: {entry}")
+            continue
+        part = DAY_PARTS.get(words[1]) if len(words) > 1 else None
+        windows[WEEKDAYS.index(words[0])].append(part or (CLINIC_OPEN_MINUTE, CLINIC_CLOSE_MINUTE))
+    return [sorted(day) for day in windows]
+
+
+class IntervalIndex:
+    """
+    Sorted, non-overlapping [start, end) integer intervals
+
+    Parallel start and end lists keep lookups to one bisection. The lists are
+    never changed in place: add and remove build new ones and swap in the
+    (starts, ends) pair with one assignment, so a reader that takes the pair
+    once always sees the two lists aligned. Writers must be serialized by
+    the caller.
+    """
+
+    def __init__(self):
+        self.spans = ([], [])
+
+    @property
+    def starts(self):
+        return self.spans[0]
+
+    @property
+    def ends(self):
+        return self.spans[1]
+
+    def __len__(self):
+        return len(self.spans[0])
+
+    def conflict_end(self, start, end):
+        """
+        End of the last interval overlapping [start, end), or None if it is free
+
+        O(log n) plus the number of overlapping intervals.
+        """
+        starts, ends = self.spans
+        index = bisect.bisect_left(ends, start + 1)
+        latest = None
+        while index < len(starts) and starts[index] < end:
+            latest = ends[index]
+            index += 1
+        return latest
+
+    def overlaps(self, start, end):
+        """Whether any interval overlaps [start, end)"""
+        starts, ends = self.spans
+        index = bisect.bisect_left(ends, start + 1)
+        return index < len(starts) and starts[index] < end
+
+    def add(self, start, end):
+        """
+        Insert an interval
+
+        Returns:
+            False (and nothing is inserted) if it overlaps an existing one
+        """
+        if self.overlaps(start, end):
+            return False
+        starts, ends = self.spans
+        index = bisect.bisect_left(starts, start)
+        self.spans = (starts[:index] + [start] + starts[index:], ends[:index] + [end] + ends[index:])
+        return True
+
+    def remove(self, start, end):
+        """Remove an interval; returns whether it was present"""
+        starts, ends = self.spans
+        index = bisect.bisect_left(starts, start)
+        if index < len(starts) and starts[index] == start and ends[index] == end:
+            self.spans = (starts[:index] + starts[index + 1:], ends[:index] + ends[index + 1:])
+            return True
+        return False
+
+
+class DoctorSchedule:
+    """One doctor's working hours and booked intervals"""
+
+    def __init__(self, name, service, availability, slot_minutes=SLOT_MINUTES):
+        self.name = name
+        self.service = service
+        self.slot_minutes = slot_minutes
+        self.windows = parse_working_hours(availability)
+        self.bookings = IntervalIndex()
+
+    def works(self, start, end):
+        """Whether [start, end) lies inside one working window"""
+        day, minute = divmod(start, MINUTES_PER_DAY)
+        end_minute = minute + (end - start)
+        return any(window_start <= minute and end_minute <= window_end
+                   for window_start, window_end in self.windows[(day + _EPOCH_WEEKDAY) % 7])
+
+    def next_working_slot(self, after, length, limit):
+        """
+        Earliest slot-aligned start >= after where [start, start + length) is inside working hours
+
+        Returns:
+            Start in minutes, or None if there is none before limit
+        """
+        day, minute = divmod(after, MINUTES_PER_DAY)
+        # Working hours repeat weekly, so a free window is at most 7 days away
+        for offset in range(8):
+            for window_start, window_end in self.windows[(day + offset + _EPOCH_WEEKDAY) % 7]:
+                start = window_start if offset else max(window_start, minute)
+                # Slots start on the slot grid counted from the window start
+                start = window_start + -(-(start - window_start) // self.slot_minutes) * self.slot_minutes
+                if start + length <= window_end:
+                    candidate = (day + offset) * MINUTES_PER_DAY + start
+                    return candidate if candidate < limit else None
+        return None
+
+    def is_free(self, start, end):
+        """Whether the doctor works during [start, end) and has nothing booked in it"""
+        return self.works(start, end) and not self.bookings.overlaps(start, end)
+
+    def next_free(self, after, limit, length=None):
+        """
+        Earliest free slot starting at or after a time
+
+        Args:
+            after: Minutes since the epoch
+            limit: Only slots starting before this are returned
+            length: Slot length in minutes (defaults to slot_minutes)
+
+        Returns:
+            Start in minutes, or None
+        """
+        length = length or self.slot_minutes
+        start = after
+        while True:
+            start = self.next_working_slot(start, length, limit)
+            if start is None:
+                return None
+            conflict = self.bookings.conflict_end(start, start + length)
+            if conflict is None:
+                return start
+            start = conflict
+
+
+class AvailabilityEngine:
+    """
+    Availability across all doctors, grouped by service
+
+    Reads are lock-free: book and cancel replace a doctor's booking lists
+    under the lock rather than changing them in place (see IntervalIndex),
+    and book re-checks the slot under the lock so two callers cannot take
+    the same slot.
+    """
+
+    def __init__(self, slot_minutes=SLOT_MINUTES, horizon_days=AVAILABILITY_HORIZON_DAYS, tz=CLINIC_TIMEZONE):
+        """
+        Initialize the engine
+
+        Args:
+            slot_minutes: Appointment length
+            horizon_days: How far ahead searches look
+            tz: Clinic timezone
+        """
+        self.slot_minutes = slot_minutes
+        self.horizon_days = horizon_days
+        self.tz = tz
+        self.doctors = {}
+        self.services = {}
+        # Working hours of any doctor per service: the earliest slot a service
+        # could offer, which lets searches stop at the first doctor free then
+        self.service_hours = {}
+        self._lock = threading.Lock()
+
+    def add_doctor(self, name, service, availability):
+        """
+        Register a doctor
+
+        Args:
+            name: Doctor name (unique)
+            service: Service category the doctor belongs to
+            availability: Working days, e.g. ["Monday", "Saturday morning"]
+        """
+        schedule = DoctorSchedule(name, service, availability, self.slot_minutes)
+        self.doctors[name] = schedule
+        self.services.setdefault(service, []).append(schedule)
+
+        hours = self.service_hours.setdefault(service, DoctorSchedule(service, service, [], self.slot_minutes))
+        hours.windows = [sorted(set(day) | set(windows)) for day, windows in zip(hours.windows, schedule.windows)]
+
+    def _span(self, start, end=None):
+        """Aware start/end datetimes -> minutes (end defaults to one slot)"""
+        start_minutes = to_minutes(start, self.tz)
+        end_minutes = to_minutes(end, self.tz) if end else start_minutes + self.slot_minutes
+        return start_minutes, end_minutes
+
+    def _limit(self, after):
+        return after + self.horizon_days * MINUTES_PER_DAY
+
+    def is_free(self, doctor, start, end=None):
+        """
+        Check one doctor's slot
+
+        Args:
+            doctor: Doctor name
+            start: Aware datetime
+            end: Aware datetime (defaults to one slot)
+
+        Returns:
+            True if the doctor works then and nothing is booked
+        """
+        schedule = self.doctors.get(doctor)
+        return schedule is not None and schedule.is_free(*self._span(start, end))
+
+    def next_free(self, service, after, doctor=None, before=None):
+        """
+        Nearest free slot at or after a time
+
+        Args:
+            service: Service category
+            after: Aware datetime
+            doctor: Preferred doctor; used when free at the earliest time any
+                doctor is free
+            before: Optional aware datetime the slot must start before
+
+        Returns:
+            Tuple of (start datetime, doctor name), or None
+        """
+        after_minutes = max(to_minutes(after, self.tz), to_minutes(datetime.now(self.tz), self.tz))
+        limit = to_minutes(before, self.tz) if before else self._limit(after_minutes)
+        hours = self.service_hours.get(service)
+        earliest = hours.next_working_slot(after_minutes, self.slot_minutes, limit) if hours else None
+        if earliest is None:
+            return None
+
+        best_start, best_doctor = None, None
+        preferred = self.doctors.get(doctor)
+        if preferred is not None and preferred.service == service:
+            best_start = preferred.next_free(earliest, limit)
+            best_doctor = preferred if best_start is not None else None
+
+        for schedule in self.services[service]:
+            # Nobody can be free before the earliest working slot of the service
+            if best_start == earliest:
+                break
+            # Only slots earlier than the best so far are of interest
+            start = schedule.next_free(earliest, best_start if best_start is not None else limit)
+            if start is not None:
+                best_start, best_doctor = start, schedule
+
+        if best_start is None:
+            return None
+        return from_minutes(best_start, self.tz), best_doctor.name
+
+    def find_slot(self, service, start, end, doctor=None):
+        """
+        First free slot starting inside [start, end)
+
+        Returns:
+            Tuple of (start datetime, doctor name), or None
+        """
+        return self.next_free(service, start, doctor=doctor, before=end)
+
+    def book(self, doctor, start, end=None):
+        """
+        Book a slot
+
+        Returns:
+            True if booked; False if the doctor is unknown, not working or already booked
+        """
+        schedule = self.doctors.get(doctor)
+        if schedule is None:
+            return False
+        start_minutes, end_minutes = self._span(start, end)
+        with self._lock:
+            if not schedule.works(start_minutes, end_minutes):
+                return False
+            return schedule.bookings.add(start_minutes, end_minutes)
+
+    def cancel(self, doctor, start, end=None):
+        """Cancel a booked slot; returns whether it was booked"""
+        schedule = self.doctors.get(doctor)
+        if schedule is None:
+            return False
+        with self._lock:
+            return schedule.bookings.remove(*self._span(start, end))
+
+    def stats(self):
+        """Doctor and booking counts per service"""
+        return {
+            service: {'doctors': len(schedules), 'bookings': sum(len(s.bookings) for s in schedules)}
+            for service, schedules in self.services.items()
+        }
@@ -0,0 +1,7 @@
+"""
+Benchmarks for Clinic Voice AI
+
+Run a benchmark from the repository root, e.g.:
+
+    python -m benchmarks.bench_intent_router
+"""
@@ -0,0 +1,122 @@
+"""
+Availability engine benchmark for Clinic Voice AI
+
+Builds an AvailabilityEngine with thousands of synthetic doctors and months
+of bookings, then times the queries a call makes: "is this doctor free?",
+"first free slot in this range" and "nearest free slot after t" for a
+service. The slot check is also timed against a linear scan of the same
+bookings for reference.
+
+Usage:
+    python -m benchmarks.bench_availability [--doctors 2000] [--days 90] [--occupancy 0.7]
+"""
+
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from availability import AvailabilityEngine, to_minutes, MINUTES_PER_DAY, CLINIC_OPEN_MINUTE, CLINIC_CLOSE_MINUTE
+from time_parser import CLINIC_TIMEZONE, SLOT_MINUTES, WEEKDAYS
+
+logger = logging.getLogger(__name__)
+
+SERVICES = ['dental', 'ent', 'dermatology', 'general']
+
+
+def build_engine(rng, doctors, days, occupancy, start):
+    """
+    Engine with synthetic doctors working 3-5 days a week, booked to the given occupancy
+
+    Returns:
+        Tuple of (engine, seconds per book() call, bookings made)
+    """
+    engine = AvailabilityEngine(horizon_days=days)
+    for index in range(doctors):
+        workdays = rng.sample(WEEKDAYS[:6], rng.randint(3, 5))
+        if 'saturday' in workdays:
+            workdays[workdays.index('saturday')] = 'saturday morning'
+        engine.add_doctor(f"Dr. Synthetic {index}", SERVICES[index % len(SERVICES)], [day.title() for day in workdays])
+
+    # Try every slot of clinic hours; book() itself rejects days off
+    slot = timedelta(minutes=SLOT_MINUTES)
+    slots = [start + timedelta(days=day, minutes=minute)
+             for day in range(days)
+             for minute in range(CLINIC_OPEN_MINUTE, CLINIC_CLOSE_MINUTE, SLOT_MINUTES)]
+    booked = attempts = 0
+    began = time.perf_counter()
+    for name in engine.doctors:
+        for moment in slots:
+            if rng.random() < occupancy:
+                attempts += 1
+                booked += engine.book(name, moment, moment + slot)
+    return engine, (time.perf_counter() - began) / max(attempts, 1), booked
+
+
+def time_queries(func, queries, rounds):
+    """Best-of-rounds seconds per call of func over the queries"""
+    best = None
+    for _ in range(rounds):
+        began = time.perf_counter()
+        for query in queries:
+            func(*query)
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(queries)
+
+
+def linear_is_free(engine, doctor, start):
+    """Reference slot check scanning every booking of the doctor"""
+    schedule = engine.doctors[doctor]
+    begin = to_minutes(start)
+    end = begin + SLOT_MINUTES
+    return schedule.works(begin, end) and not any(
+        booked_start < end and begin < booked_end
+        for booked_start, booked_end in zip(schedule.bookings.starts, schedule.bookings.ends))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark availability queries on a large synthetic schedule")
+    parser.add_argument("--doctors", type=int, default=2000, help="Synthetic doctors (spread over the services)")
+    parser.add_argument("--days", type=int, default=90, help="Days of bookings")
+    parser.add_argument("--occupancy", type=float, default=0.7, help="Fraction of working slots booked")
+    parser.add_argument("--queries", type=int, default=2000, help="Queries per kind")
+    parser.add_argument("--rounds", type=int, default=5, help="Timing rounds (best is kept)")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+
+    # Start from tomorrow 00:00 so every generated booking is in the future
+    start = datetime.combine(datetime.now(CLINIC_TIMEZONE).date() + timedelta(days=1),
+                             datetime.min.time(), tzinfo=CLINIC_TIMEZONE)
+    engine, book_seconds, booked = build_engine(rng, args.doctors, args.days, args.occupancy, start)
+
+    names = list(engine.doctors)
+    moments = [start + timedelta(minutes=rng.randrange(args.days * MINUTES_PER_DAY // SLOT_MINUTES) * SLOT_MINUTES)
+               for _ in range(args.queries)]
+    slot_queries = [(rng.choice(names), moment) for moment in moments]
+    range_queries = [(rng.choice(SERVICES), moment, moment + timedelta(hours=4)) for moment in moments]
+    nearest_queries = [(rng.choice(SERVICES), moment) for moment in moments]
+
+    results = [
+        ("is_free (bisect)", time_queries(engine.is_free, slot_queries, args.rounds)),
+        ("is_free (linear scan)", time_queries(lambda doctor, moment: linear_is_free(engine, doctor, moment),
+                                               slot_queries[:200], args.rounds)),
+        ("find_slot in 4h range", time_queries(engine.find_slot, range_queries, args.rounds)),
+        ("next_free for service", time_queries(engine.next_free, nearest_queries, args.rounds)),
+    ]
+
+    print(f"{args.doctors} doctors, {booked} bookings over {args.days} days "
+          f"({booked / max(args.doctors, 1):.0f} per doctor)")
+    print(f"booking: {book_seconds * 1e6:.2f} us per book()")
+    print(f"{'query':<24} {'us/call':>9} {'calls/s':>11}")
+    for label, seconds in results:
+        print(f"{label:<24} {seconds * 1e6:>9.2f} {1 / seconds:>11.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+"""
+Calendar query benchmark for Clinic Voice AI
+
+Compares GoogleIntegration.suggest_alternative_time, which makes one
+freebusy query for the whole search window, with the previous loop that
+made one events().list query per candidate slot, and with the synced local
+calendar mirror. All run against a simulated Calendar service that adds a
+fixed round-trip latency to every request. The benchmark reports API calls
+and wall time for a check_availability call followed by a suggestion (the
+"that time is taken" turn), and checks that every path suggests the same
+times.
+
+Usage:
+    python -m benchmarks.bench_calendar_queries [--latency-ms 150] [--occupancy 0.8]
+"""
+
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+import google_integration
+from calendar_mirror import CalendarMirror
+from google_integration import GoogleIntegration, SUGGESTION_DAYS, SUGGESTION_HOURS
+
+logger = logging.getLogger(__name__)
+
+
+class SimulatedRequest:
+    """A Calendar API request whose execute() waits one round trip"""
+
+    def __init__(self, calendar, response):
+        self.calendar = calendar
+        self.response = response
+
+    def execute(self):
+        self.calendar.requests += 1
+        time.sleep(self.calendar.latency)
+        return self.response()
+
+
+class SimulatedCalendar:
+    """
+    The parts of the Calendar v3 client GoogleIntegration uses, over a list of events
+
+    Events are (start, end) naive UTC datetimes, matching the 'Z' times the
+    queries are made with.
+    """
+
+    def __init__(self, events, latency):
+        self.events_list = sorted(events)
+        self.latency = latency
+        self.requests = 0
+
+    def _overlapping(self, time_min, time_max):
+        start = datetime.fromisoformat(time_min.rstrip('Z'))
+        end = datetime.fromisoformat(time_max.rstrip('Z'))
+        return [(event_start, event_end) for event_start, event_end in self.events_list
+                if event_start < end and event_end > start]
+
+    def events(self):
+        return self
+
+    def list(self, calendarId, timeMin=None, timeMax=None, syncToken=None, **params):
+        if syncToken:
+            # Nothing changes during a run
+            return SimulatedRequest(self, lambda: {'items': [], 'nextSyncToken': syncToken})
+        if timeMax is None:
+            # Full sync: every event from timeMin on, plus a token for incremental syncs
+            timeMin, timeMax = timeMin or '0001-01-01T00:00:00Z', '9999-12-31T00:00:00Z'
+        return SimulatedRequest(self, lambda: {'items': [
+            {'id': f"event{index}", 'start': {'dateTime': start.isoformat() + 'Z'}, 'end': {'dateTime': end.isoformat() + 'Z'}}
+            for index, (start, end) in enumerate(self._overlapping(timeMin, timeMax))
+        ], 'nextSyncToken': 'token'})
+
+    def freebusy(self):
+        return self
+
+    def query(self, body):
+        return SimulatedRequest(self, lambda: {'calendars': {body['items'][0]['id']: {'busy': [
+            {'start': start.isoformat() + 'Z', 'end': end.isoformat() + 'Z'}
+            for start, end in self._overlapping(body['timeMin'], body['timeMax'])
+        ]}}})
+
+
+# Reference copy of suggest_alternative_time before the freebusy window
+def legacy_suggest_alternative_time(integration, service, preferred_time):
+    start_time = datetime.now() + timedelta(days=1)
+    for days in range(1, 4):
+        for hour in [9, 10, 11, 13, 14, 15, 16]:
+            check_time = start_time + timedelta(days=days)
+            check_time = check_time.replace(hour=hour, minute=0, second=0, microsecond=0)
+            end_time = check_time + timedelta(hours=1)
+            events_result = integration.calendar_service.events().list(
+                calendarId=google_integration.CALENDAR_ID,
+                timeMin=check_time.isoformat() + 'Z',
+                timeMax=end_time.isoformat() + 'Z',
+                singleEvents=True,
+                orderBy='startTime'
+            ).execute()
+            if len(events_result.get('items', [])) == 0:
+                day_str = "today" if days == 0 else "tomorrow" if days == 1 else f"in {days} days"
+                hour_str = f"{hour}:00 AM" if hour < 12 else f"{hour-12}:00 PM"
+                return f"{day_str} at {hour_str}"
+    return "next Monday at 9:00 AM"
+
+
+# Reference copy of check_availability before the freebusy window
+def legacy_check_availability(integration, service, preferred_time):
+    start_time = datetime.now() + timedelta(days=1)
+    end_time = start_time + timedelta(hours=1)
+    events_result = integration.calendar_service.events().list(
+        calendarId=google_integration.CALENDAR_ID,
+        timeMin=start_time.isoformat() + 'Z',
+        timeMax=end_time.isoformat() + 'Z',
+        singleEvents=True,
+        orderBy='startTime'
+    ).execute()
+    return len(events_result.get('items', [])) == 0
+
+
+def build_events(rng, occupancy):
+    """One-hour events filling the candidate slots (and the hour after tomorrow's start) at the given occupancy"""
+    start_time = datetime.now() + timedelta(days=1)
+    events = [(start_time, start_time + timedelta(hours=1))]
+    for days in range(1, SUGGESTION_DAYS + 1):
+        for hour in SUGGESTION_HOURS:
+            if rng.random() < occupancy:
+                slot = (start_time + timedelta(days=days)).replace(hour=hour, minute=0, second=0, microsecond=0)
+                events.append((slot, slot + timedelta(hours=1)))
+    return events
+
+
+def run_turn(check, suggest, calendar, turns, before_turn=None):
+    """
+    Time "check, then suggest" turns
+
+    Returns:
+        Tuple of (seconds per check, seconds per suggestion, API calls per turn, suggestions)
+    """
+    check_seconds = suggest_seconds = 0
+    before = calendar.requests
+    suggestions = []
+    for _ in range(turns):
+        if before_turn:
+            before_turn()
+        began = time.perf_counter()
+        check('dental', 'tomorrow at 10 am')
+        checked = time.perf_counter()
+        suggestions.append(suggest('dental', 'tomorrow at 10 am'))
+        check_seconds += checked - began
+        suggest_seconds += time.perf_counter() - checked
+    return check_seconds / turns, suggest_seconds / turns, (calendar.requests - before) / turns, suggestions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark alternative-time suggestions: per-slot queries vs one freebusy window")
+    parser.add_argument("--latency-ms", type=float, default=150, help="Simulated Calendar API round trip")
+    parser.add_argument("--occupancy", type=float, default=0.8, help="Fraction of candidate slots already booked")
+    parser.add_argument("--turns", type=int, default=5, help="Check-then-suggest turns per path")
+    parser.add_argument("--seed", type=int, default=3, help="Random seed")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    events = build_events(random.Random(args.seed), args.occupancy)
+
+    legacy_calendar = SimulatedCalendar(events, args.latency_ms / 1000)
+    legacy = GoogleIntegration(calendar_service=legacy_calendar, mirror=False)
+    legacy_results = run_turn(lambda *a: legacy_check_availability(legacy, *a),
+                              lambda *a: legacy_suggest_alternative_time(legacy, *a),
+                              legacy_calendar, args.turns)
+
+    calendar = SimulatedCalendar(events, args.latency_ms / 1000)
+    integration = GoogleIntegration(calendar_service=calendar, mirror=False)
+
+    def expire_window():
+        # Every turn starts without a cached window, as after FREEBUSY_CACHE_SECONDS
+        integration._busy_window = None
+
+    cold_results = run_turn(integration.check_availability, integration.suggest_alternative_time,
+                            calendar, args.turns, before_turn=expire_window)
+    window_results = run_turn(integration.check_availability, integration.suggest_alternative_time,
+                              calendar, args.turns)
+
+    mirror_calendar = SimulatedCalendar(events, args.latency_ms / 1000)
+    mirrored = GoogleIntegration(calendar_service=mirror_calendar, mirror=False)
+    mirrored.calendar_mirror = CalendarMirror(mirror_calendar, google_integration.CALENDAR_ID)
+    # The background thread does this at startup
+    mirrored.calendar_mirror.sync()
+    mirror_results = run_turn(mirrored.check_availability, mirrored.suggest_alternative_time,
+                              mirror_calendar, args.turns)
+
+    print(f"{len(events)} busy events, {args.latency_ms:.0f} ms per API call, {args.turns} turns")
+    print(f"{'path':<32} {'check ms':>9} {'suggest ms':>11} {'calls/turn':>11}")
+    for label, (check, suggest, calls, _) in (("per-slot events().list", legacy_results),
+                                              ("freebusy window, fetched per turn", cold_results),
+                                              ("freebusy window, cached", window_results),
+                                              ("synced calendar mirror", mirror_results)):
+        print(f"{label:<32} {check * 1000:>9.1f} {suggest * 1000:>11.1f} {calls:>11.1f}")
+
+    mismatches = sum(before != after for before, after in zip(legacy_results[3] * 3, cold_results[3] + window_results[3] + mirror_results[3]))
+    print(f"suggestion: {window_results[3][0]!r}, mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,244 @@
+"""
+Intent router benchmark for Clinic Voice AI
+
+Compares the single-pass intent router used by process_speech against the
+previous cascade of per-helper keyword scans, on the benchmark transcript
+corpus. Both paths are also checked for identical routing decisions.
+
+Usage:
+    python -m benchmarks.bench_intent_router [--rounds N]
+"""
+
+import argparse
+import logging
+import os
+import random
+import time
+
+# Benchmarks never call the TTS provider
+os.environ['ELEVENLABS_API_KEY'] = ''
+
+import voice_agent_continuous as agent
+from benchmarks.corpus import load_transcripts
+
+logger = logging.getLogger(__name__)
+
+
+# Reference copy of the cascade process_speech ran before the intent router.
+# Each helper lowercases the transcript and runs its own substring loop.
+def legacy_detect_emotion(text):
+    text_lower = text.lower()
+    pain_words = ["pain", "hurt", "ache", "sore", "discomfort", "suffering", "agony", "ouch"]
+    if any(word in text_lower for word in pain_words):
+        return "pain"
+    anxiety_words = ["anxious", "nervous", "worried", "scared", "afraid", "fear", "stress", "concern", "panic"]
+    if any(word in text_lower for word in anxiety_words):
+        return "anxiety"
+    urgency_words = ["urgent", "emergency", "asap", "right away", "immediately", "soon", "hurry", "quick"]
+    if any(word in text_lower for word in urgency_words):
+        return "urgency"
+    confusion_words = ["confused", "don't understand", "what do you mean", "unclear", "lost", "not following"]
+    if any(word in text_lower for word in confusion_words):
+        return "confusion"
+    frustration_words = ["frustrated", "annoyed", "upset", "angry", "mad", "irritated", "fed up", "tired of"]
+    if any(word in text_lower for word in frustration_words):
+        return "frustration"
+    return "neutral"
+
+
+def legacy_check_for_humor(text):
+    text_lower = text.lower()
+    joke_indicators = [
+        "haha", "hehe", "lol", "lmao", "rofl", "joke", "funny", "kidding", "just kidding", "jk"
+    ]
+    if any(indicator in text_lower for indicator in joke_indicators):
+        return random.choice(agent.HUMOR_RESPONSES).format(filler=agent.add_filler())
+    if "knock knock" in text_lower:
+        return "Haha! Who's there? I love knock-knock jokes!"
+    if "why did the" in text_lower or "what do you call" in text_lower:
+        return "Haha! That's a good one! I love jokes like that. They make my day at the reception desk more fun."
+    return None
+
+
+def legacy_is_compliment(text):
+    text_lower = text.lower()
+    compliment_indicators = [
+        "nice voice", "sound nice", "sound good", "like your voice",
+        "helpful", "you're great", "you are great", "you're amazing", "you are amazing",
+        "thank you so much", "appreciate", "wonderful", "excellent", "fantastic",
+        "good job", "well done", "impressive"
+    ]
+    return any(indicator in text_lower for indicator in compliment_indicators)
+
+
+def legacy_check_for_doctor_questions(text, session):
+    text_lower = text.lower()
+    current_doctor = session.get('current_doctor_discussed')
+    for service, doctors_list in agent.DOCTORS.items():
+        for doctor in doctors_list:
+            doctor_last = doctor["name"].split()[1].lower()
+            doctor_first = doctor["name"].split()[0].lower().replace("dr.", "").strip()
+            if doctor_last in text_lower or (doctor_first in text_lower and "dr" in text_lower):
+                session['current_doctor_discussed'] = doctor["name"]
+                if "good" in text_lower or "recommend" in text_lower or "best" in text_lower or "trust" in text_lower:
+                    return f"quality:{doctor['name']}"
+                if "available" in text_lower or "schedule" in text_lower or "appointment" in text_lower or "book" in text_lower:
+                    return f"availability:{doctor['name']}"
+                if "specialty" in text_lower or "specialize" in text_lower or "expert" in text_lower:
+                    return f"specialty:{doctor['name']}"
+                if "experience" in text_lower or "how long" in text_lower or "background" in text_lower:
+                    return f"experience:{doctor['name']}"
+                if "language" in text_lower or "speak" in text_lower:
+                    return f"language:{doctor['name']}"
+                return f"general:{doctor['name']}"
+    if current_doctor and ("doctor" in text_lower or "about" in text_lower or "tell me" in text_lower or "good" in text_lower or "who" in text_lower):
+        for service, doctors_list in agent.DOCTORS.items():
+            for doctor in doctors_list:
+                if doctor["name"] == current_doctor:
+                    if "good" in text_lower or "recommend" in text_lower or "best" in text_lower or "trust" in text_lower:
+                        return f"quality:{doctor['name']}"
+                    return f"general:{doctor['name']}"
+    if "doctor" in text_lower or "specialist" in text_lower or "physician" in text_lower:
+        if "best" in text_lower or "recommend" in text_lower or "good" in text_lower:
+            return "all_doctors"
+        if "how many" in text_lower or "available" in text_lower:
+            return "doctor_count"
+    return None
+
+
+def legacy_check_for_clinic_questions(text):
+    text_lower = text.lower()
+    if "hours" in text_lower or "open" in text_lower or "close" in text_lower or "when" in text_lower:
+        return "hours"
+    if "location" in text_lower or "address" in text_lower or "where" in text_lower:
+        return "location"
+    if "parking" in text_lower:
+        return "parking"
+    if "insurance" in text_lower or "cover" in text_lower or "payment" in text_lower:
+        return "insurance"
+    if "covid" in text_lower or "mask" in text_lower or "vaccination" in text_lower:
+        return "covid"
+    if "services" in text_lower or "offer" in text_lower or "provide" in text_lower:
+        return "services"
+    return None
+
+
+def legacy_check_for_small_talk(text):
+    text_lower = text.lower()
+    if "your name" in text_lower or "who are you" in text_lower:
+        return "identity"
+    if "how are you" in text_lower or "how's your day" in text_lower or "how are things" in text_lower:
+        return random.choice(agent.SMALL_TALK["how_are_you"])
+    if "thank you" in text_lower or "thanks" in text_lower:
+        return random.choice(agent.SMALL_TALK["thanks"])
+    if "weather" in text_lower or "nice day" in text_lower or "raining" in text_lower or "sunny" in text_lower:
+        return random.choice(agent.SMALL_TALK["weather"])
+    if "weekend" in text_lower or "saturday" in text_lower or "sunday" in text_lower:
+        return random.choice(agent.SMALL_TALK["weekend"])
+    if "joke" in text_lower or "funny" in text_lower:
+        return random.choice(agent.SMALL_TALK["joke"])
+    if "how long" in text_lower and ("work" in text_lower or "been" in text_lower):
+        return "how_long"
+    if "like" in text_lower and "job" in text_lower:
+        return "job"
+    if "do you" in text_lower and ("live" in text_lower or "from" in text_lower):
+        return "residence"
+    if any(word in text_lower for word in ["hi", "hello", "hey", "greetings", "good morning", "good afternoon", "good evening"]):
+        if len(text_lower.split()) < 5:
+            return random.choice(agent.SMALL_TALK["greeting"])
+    return None
+
+
+def legacy_cascade(text, session):
+    """Run the pre-router cascade and return its routing decision"""
+    emotion = legacy_detect_emotion(text)
+    humor = legacy_check_for_humor(text)
+    compliment = legacy_is_compliment(text)
+    doctor = legacy_check_for_doctor_questions(text, session)
+    clinic = legacy_check_for_clinic_questions(text)
+    small_talk = legacy_check_for_small_talk(text)
+    listening = bool(agent.re.search(r'hear me out|listen|excuse me|wait|hold on', text.lower()))
+    booking = any(term in text.lower() for term in ["book", "schedule", "appointment", "reserve", "see a doctor", "visit", "come in"])
+    affirmative = any(word in text.lower() for word in agent.AFFIRMATIVE_KEYWORDS)
+    negative = any(word in text.lower() for word in agent.NEGATIVE_KEYWORDS)
+    return emotion, humor, compliment, doctor, clinic, small_talk, listening, booking, affirmative, negative
+
+
+def routed_cascade(text, session):
+    """Run the intent-router cascade and return its routing decision"""
+    intents = agent.intent_router.scan(text)
+    emotion = agent.detect_emotion(text, intents)
+    humor = agent.check_for_humor(text, intents)
+    compliment = agent.is_compliment(text, intents)
+    doctor = agent.check_for_doctor_questions(text, session, intents)
+    clinic = agent.check_for_clinic_questions(text, intents)
+    small_talk = agent.check_for_small_talk(text, intents)
+    listening = agent.wants_attention(text, intents)
+    booking = agent.is_booking_inquiry(text, intents)
+    affirmative = agent.is_affirmative(text, intents)
+    negative = agent.is_negative(text, intents)
+    return emotion, humor, compliment, doctor, clinic, small_talk, listening, booking, affirmative, negative
+
+
+def _normalize(decision):
+    """Reduce both cascades' outputs to comparable routing labels"""
+    emotion, humor, compliment, doctor, clinic, small_talk, listening, booking, affirmative, negative = decision
+    return (emotion, humor, compliment, doctor is not None, clinic is not None,
+            small_talk is not None, listening, booking, affirmative, negative)
+
+
+def check_equivalence(transcripts):
+    """Count transcripts where the two cascades disagree"""
+    mismatches = []
+    for i, text in enumerate(transcripts):
+        for current_doctor in [None, "Dr. Emily Johnson"]:
+            random.seed(i)
+            legacy_session = {'current_doctor_discussed': current_doctor}
+            legacy = _normalize(legacy_cascade(text, legacy_session))
+            random.seed(i)
+            routed_session = {'current_doctor_discussed': current_doctor}
+            routed = _normalize(routed_cascade(text, routed_session))
+            if legacy != routed or legacy_session != routed_session:
+                mismatches.append((text, legacy, routed))
+    return mismatches
+
+
+def time_cascade(cascade, transcripts, rounds):
+    """Time a cascade over the corpus and return seconds per turn"""
+    session = {'current_doctor_discussed': None}
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in transcripts:
+            session['current_doctor_discussed'] = None
+            cascade(text, session)
+    elapsed = time.perf_counter() - start
+    return elapsed / (rounds * len(transcripts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the intent router against the legacy cascade")
+    parser.add_argument("--rounds", type=int, default=200, help="Passes over the transcript corpus")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    transcripts = load_transcripts()
+
+    mismatches = check_equivalence(transcripts)
+    for text, legacy, routed in mismatches:
+        print(f"MISMATCH: {text!r}\n  legacy: {legacy}\n  routed: {routed}")
+
+    legacy_time = time_cascade(legacy_cascade, transcripts, args.rounds)
+    routed_time = time_cascade(routed_cascade, transcripts, args.rounds)
+
+    print(f"Corpus: {len(transcripts)} transcripts x {args.rounds} rounds")
+    print(f"Router: {agent.intent_router.pattern_count} keywords, {agent.intent_router.state_count} states")
+    print(f"{'cascade':<10} {'us/turn':>10} {'turns/sec':>12}")
+    print(f"{'legacy':<10} {legacy_time * 1e6:>10.2f} {1 / legacy_time:>12.0f}")
+    print(f"{'router':<10} {routed_time * 1e6:>10.2f} {1 / routed_time:>12.0f}")
+    print(f"Speedup: {legacy_time / routed_time:.2f}x, decision mismatches: {len(mismatches)}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+"""
+LLM mode benchmark for Clinic Voice AI
+
+Replays the TEST_SCENARIOS conversations through conversation.process_conversation
+in each LLM mode (sequential, concurrent, structured) and reports the LLM
+latency per turn.
+
+By default the OpenAI API is called (set OPENAI_API_KEY). With --simulate,
+the 'openai' provider is registered as a stand-in whose ChatCompletion calls
+follow a latency model (time to first token plus a per-token cost), which is
+enough to compare the number of serial round trips. The openai package is
+only imported on the real-API path (by conversation's provider loader).
+
+Usage:
+    python -m benchmarks.bench_llm_modes [--simulate] [--ttft-ms 600] [--token-ms 25]
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+from types import SimpleNamespace
+
+import conversation
+from providers import providers
+from test_scenarios import TEST_SCENARIOS
+
+logger = logging.getLogger(__name__)
+
+
+def simulated_completion(ttft_ms, token_ms):
+    """Build a ChatCompletion.create replacement that sleeps like the API would"""
+    def create(model, messages, temperature, max_tokens):
+        structured = 'Respond only with a JSON object' in messages[0]['content']
+        extraction = messages[0]['content'].startswith('You extract')
+
+        if structured:
+            content = json.dumps({"entities": dict(conversation.EMPTY_ENTITIES), "reply": "Thank you. Could you tell me a bit more?"})
+            tokens = 70
+        elif extraction:
+            content = json.dumps(conversation.EMPTY_ENTITIES)
+            tokens = 30
+        else:
+            content = "Thank you. Could you tell me a bit more?"
+            tokens = 45
+
+        time.sleep((ttft_ms + min(tokens, max_tokens) * token_ms) / 1000)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    return create
+
+
+def run_mode(mode):
+    """Replay every scenario in one LLM mode and return per-turn latencies in ms"""
+    conversation.LLM_MODE = mode
+    latencies = []
+
+    for scenario in TEST_SCENARIOS:
+        session = {
+            'id': str(uuid.uuid4()),
+            'state': 'collect_name',
+            'conversation': [],
+            'patient_info': {'name': None, 'service': None, 'preferred_time': None, 'phone_number': None}
+        }
+        for transcript in scenario['inputs']:
+            session['conversation'].append({'role': 'user', 'text': transcript})
+            start = time.perf_counter()
+            result = conversation.process_conversation(session['id'], transcript, session)
+            latencies.append((time.perf_counter() - start) * 1000)
+            session['conversation'].append({'role': 'system', 'text': result['text']})
+            session['state'] = result['next_state']
+
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-turn LLM latency across conversation LLM modes")
+    parser.add_argument("--simulate", action="store_true", help="Use a latency model instead of the OpenAI API")
+    parser.add_argument("--ttft-ms", type=float, default=600, help="Simulated time to first token")
+    parser.add_argument("--token-ms", type=float, default=25, help="Simulated time per output token")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    if args.simulate:
+        create = simulated_completion(args.ttft_ms, args.token_ms)
+        providers.register('openai', lambda: SimpleNamespace(ChatCompletion=SimpleNamespace(create=create)))
+    elif not os.getenv('OPENAI_API_KEY'):
+        parser.error("set OPENAI_API_KEY or pass --simulate")
+
+    results = {mode: run_mode(mode) for mode in ('sequential', 'concurrent', 'structured')}
+    baseline = sum(results['sequential']) / len(results['sequential'])
+
+    # API calls per turn as recorded by the conversation module itself
+    llm_stats = conversation.get_llm_stats()
+
+    print(f"{'mode':<12} {'turns':>6} {'calls/turn':>11} {'avg ms':>9} {'p50 ms':>9} {'max ms':>9} {'vs sequential':>14}")
+    for mode, latencies in results.items():
+        ordered = sorted(latencies)
+        average = sum(ordered) / len(ordered)
+        calls = llm_stats[mode]['calls'] / llm_stats[mode]['turns'] if llm_stats[mode]['turns'] else 0
+        print(f"{mode:<12} {len(ordered):>6} {calls:>11.1f} {average:>9.0f} {ordered[len(ordered) // 2]:>9.0f} "
+              f"{ordered[-1]:>9.0f} {baseline / average:>13.2f}x")
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,401 @@
+"""
+Load generator for Clinic Voice AI
+
+Replays test_scenarios.TEST_SCENARIOS, plus generated variants, as many
+concurrent virtual callers against the web demo API. Callers arrive at a
+configurable rate (Poisson arrivals) and pause between turns for a random
+think time. Reports throughput, turn latency percentiles, the error rate and
+memory growth over the run.
+
+By default the app runs in-process through the Flask test client, with TTS
+disabled so only the server's own work is measured. With --url the callers hit
+a running server instead, and --server-pid lets the report include that
+server's memory.
+
+Usage:
+    python -m benchmarks.bench_load [--callers 200] [--rate 20] [--concurrency 50]
+        [--think-ms 1000] [--variants 50] [--url http://localhost:5000] [--json report.json]
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.corpus import EXTRA_TRANSCRIPTS
+from test_scenarios import TEST_SCENARIOS
+
+logger = logging.getLogger(__name__)
+
+# Building blocks for generated scenario variants
+VARIANT_OPENERS = [
+    "Hi, I'd like to schedule an appointment",
+    "Hello, I need to book a visit",
+    "Good morning, can I make an appointment please",
+    "Hi there, I'm calling to see a doctor"
+]
+VARIANT_NAMES = ["John Smith", "Sarah Ahmed", "Maria Garcia", "Omar Khalid", "Emily Chen", "David Brown", "Fatima Ali"]
+VARIANT_SERVICES = [
+    "I need to see a dentist",
+    "I'd like a dental cleaning",
+    "I have an ear infection, I need an ENT doctor",
+    "I need a dermatologist for a skin rash",
+    "Just a general checkup please"
+]
+VARIANT_TIMES = [
+    "Next Tuesday at 2 PM would work for me",
+    "Tomorrow morning at 10",
+    "Friday afternoon around 3",
+    "Monday at 9 AM",
+    "Wednesday evening if possible"
+]
+VARIANT_PHONES = ["0501234567", "My number is 0559876543", "You can reach me at +971 50 123 4567", "052 111 2233"]
+VARIANT_CLOSERS = ["No, that's all I need. Thank you", "That's everything, thanks", "No thanks, bye"]
+VARIANT_FILLERS = ["Um, ", "So ", "Okay, ", "Well, "]
+
+# How often the memory sampler reads RSS
+MEMORY_SAMPLE_SECONDS = 0.5
+
+
+def generate_variant(rng, index):
+    """
+    Build a booking scenario with different wording, detours and fillers
+
+    Args:
+        rng: random.Random instance
+        index: Variant number (used in the name)
+
+    Returns:
+        Scenario dict like the entries of TEST_SCENARIOS
+    """
+    inputs = [
+        rng.choice(VARIANT_OPENERS),
+        f"My name is {rng.choice(VARIANT_NAMES)}",
+        rng.choice(VARIANT_SERVICES),
+        rng.choice(VARIANT_TIMES),
+        rng.choice(VARIANT_PHONES),
+        "Yes",
+        rng.choice(VARIANT_CLOSERS)
+    ]
+
+    # Some callers ask side questions or make small talk mid-booking
+    for _ in range(rng.choice([0, 0, 1, 2])):
+        inputs.insert(rng.randint(1, len(inputs) - 1), rng.choice(EXTRA_TRANSCRIPTS))
+
+    inputs = [rng.choice(VARIANT_FILLERS) + text[0].lower() + text[1:] if rng.random() < 0.25 else text for text in inputs]
+
+    return {"name": f"Generated variant {index}", "inputs": inputs}
+
+
+def read_rss_bytes(pid=None):
+    """Resident set size of a process (this one by default), or None if unavailable"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class MemorySampler:
+    """Samples a process's RSS in the background and keeps start, peak and last values"""
+
+    def __init__(self, pid=None):
+        self.pid = pid
+        self.start = read_rss_bytes(pid)
+        self.peak = self.start
+        self.last = self.start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(MEMORY_SAMPLE_SECONDS):
+            self.sample()
+
+    def sample(self):
+        rss = read_rss_bytes(self.pid)
+        if rss is not None:
+            self.last = rss
+            self.peak = max(self.peak or 0, rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+
+class InProcessTarget:
+    """Calls the Flask app directly through its test client"""
+
+    def __init__(self):
+        import voice_agent_continuous as agent
+        self.agent = agent
+        self.name = "in-process (Flask test client)"
+
+    def client(self):
+        test_client = self.agent.app.test_client()
+
+        def post(path, payload=None):
+            response = test_client.post(path, json=payload)
+            return response.status_code, response.get_json(silent=True)
+        return post
+
+    def session_count(self):
+        return len(self.agent.sessions)
+
+
+class URLTarget:
+    """Calls a running server over HTTP"""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.name = self.base_url
+
+    def client(self):
+        http = requests.Session()
+
+        def post(path, payload=None):
+            response = http.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+            try:
+                return response.status_code, response.json()
+            except ValueError:
+                return response.status_code, None
+        return post
+
+    def session_count(self):
+        return None
+
+
+class LoadResults:
+    """Thread-safe collector for request latencies and errors"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.turn_ms = []
+        self.start_call_ms = []
+        self.queue_ms = []
+        self.errors = {}
+        self.requests = 0
+        self.calls_completed = 0
+        self.calls_failed = 0
+
+    def record(self, kind, elapsed_ms, error=None):
+        with self.lock:
+            self.requests += 1
+            if error:
+                self.errors[error] = self.errors.get(error, 0) + 1
+            else:
+                (self.start_call_ms if kind == 'start_call' else self.turn_ms).append(elapsed_ms)
+
+    def finish_call(self, ok, queue_ms):
+        with self.lock:
+            self.queue_ms.append(queue_ms)
+            if ok:
+                self.calls_completed += 1
+            else:
+                self.calls_failed += 1
+
+
+def timed_post(post, results, kind, path, payload=None):
+    """Send one request and record its latency, returning the JSON body or None on error"""
+    start = time.perf_counter()
+    try:
+        status, body = post(path, payload)
+    except Exception as e:
+        results.record(kind, 0, f"{kind}: {type(e).__name__}")
+        return None
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if status != 200 or body is None:
+        results.record(kind, elapsed_ms, f"{kind}: HTTP {status}")
+        return None
+    if 'error' in body:
+        results.record(kind, elapsed_ms, f"{kind}: {body['error']}")
+        return None
+
+    results.record(kind, elapsed_ms)
+    return body
+
+
+def run_caller(target, scenario, think_ms, seed, results, submitted_at):
+    """Play one virtual caller through a scenario"""
+    queue_ms = (time.perf_counter() - submitted_at) * 1000
+    rng = random.Random(seed)
+    post = target.client()
+
+    start = timed_post(post, results, 'start_call', '/api/start-call')
+    if start is None:
+        results.finish_call(False, queue_ms)
+        return
+
+    for transcript in scenario['inputs']:
+        if think_ms:
+            time.sleep(rng.expovariate(1000 / think_ms))
+        reply = timed_post(post, results, 'turn', '/api/process-speech',
+                           {'session_id': start['session_id'], 'transcript': transcript})
+        if reply is None:
+            results.finish_call(False, queue_ms)
+            return
+        if reply.get('next_state') == 'end_call':
+            break
+
+    results.finish_call(True, queue_ms)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list (0 if empty)"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def latency_summary(values):
+    """p50/p95/p99/max in ms"""
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 0.5), 2),
+        'p95_ms': round(percentile(values, 0.95), 2),
+        'p99_ms': round(percentile(values, 0.99), 2),
+        'max_ms': round(max(values), 2) if values else 0
+    }
+
+
+def run_load(target, scenarios, callers, rate, concurrency, think_ms, seed, server_pid=None):
+    """
+    Start callers at the arrival rate and wait for all of them to finish
+
+    Returns:
+        Report dict
+    """
+    rng = random.Random(seed)
+    results = LoadResults()
+    sessions_before = target.session_count()
+
+    with MemorySampler(server_pid) as memory:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='caller') as executor:
+            next_arrival = started
+            for i in range(callers):
+                if rate:
+                    next_arrival += rng.expovariate(rate)
+                    delay = next_arrival - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                executor.submit(run_caller, target, rng.choice(scenarios), think_ms, rng.random(),
+                                results, time.perf_counter())
+        duration = time.perf_counter() - started
+
+    errors = sum(results.errors.values())
+    sessions_after = target.session_count()
+    report = {
+        'target': target.name,
+        'callers': callers,
+        'arrival_rate': rate,
+        'concurrency': concurrency,
+        'think_ms': think_ms,
+        'duration_s': round(duration, 2),
+        'calls_completed': results.calls_completed,
+        'calls_failed': results.calls_failed,
+        'requests': results.requests,
+        'requests_per_s': round(results.requests / duration, 2),
+        'turns_per_s': round(len(results.turn_ms) / duration, 2),
+        'error_rate': round(errors / results.requests, 4) if results.requests else 0,
+        'errors': results.errors,
+        'turn_latency': latency_summary(results.turn_ms),
+        'start_call_latency': latency_summary(results.start_call_ms),
+        'caller_queue_latency': latency_summary(results.queue_ms),
+        'memory': {
+            'rss_start_mb': _mb(memory.start),
+            'rss_end_mb': _mb(memory.last),
+            'rss_peak_mb': _mb(memory.peak),
+            'rss_growth_mb': _mb(memory.last - memory.start) if memory.start is not None else None
+        }
+    }
+    if sessions_before is not None:
+        report['sessions_created'] = sessions_after - sessions_before
+    return report
+
+
+def _mb(value):
+    return round(value / (1024 * 1024), 1) if value is not None else None
+
+
+def print_report(report):
+    """Print a load report as a table"""
+    print(f"target {report['target']}: {report['callers']} callers at {report['arrival_rate']}/s, "
+          f"concurrency {report['concurrency']}, think time {report['think_ms']:.0f} ms")
+    print(f"duration {report['duration_s']} s, calls completed {report['calls_completed']}, failed {report['calls_failed']}")
+    print(f"throughput {report['requests_per_s']} req/s, {report['turns_per_s']} turns/s, "
+          f"error rate {report['error_rate'] * 100:.2f}%")
+
+    print(f"\n{'latency':<14} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for label, key in (('turn', 'turn_latency'), ('start call', 'start_call_latency'), ('caller queue', 'caller_queue_latency')):
+        summary = report[key]
+        print(f"{label:<14} {summary['count']:>7} {summary['p50_ms']:>9.1f} {summary['p95_ms']:>9.1f} "
+              f"{summary['p99_ms']:>9.1f} {summary['max_ms']:>9.1f}")
+
+    memory = report['memory']
+    if memory['rss_start_mb'] is not None:
+        print(f"\nmemory RSS start {memory['rss_start_mb']} MB, peak {memory['rss_peak_mb']} MB, "
+              f"end {memory['rss_end_mb']} MB, growth {memory['rss_growth_mb']} MB")
+    if 'sessions_created' in report:
+        print(f"sessions held after run: +{report['sessions_created']}")
+
+    for error, count in sorted(report['errors'].items(), key=lambda item: -item[1])[:10]:
+        print(f"error x{count}: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay test scenarios as concurrent virtual callers")
+    parser.add_argument("--callers", type=int, default=200, help="Total virtual callers")
+    parser.add_argument("--rate", type=float, default=20, help="Caller arrivals per second (0: all at once)")
+    parser.add_argument("--concurrency", type=int, default=50, help="Maximum simultaneous callers")
+    parser.add_argument("--think-ms", type=float, default=1000, help="Mean pause between a caller's turns")
+    parser.add_argument("--variants", type=int, default=50, help="Generated scenario variants added to TEST_SCENARIOS")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed for variants, arrivals and think times")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process)")
+    parser.add_argument("--server-pid", type=int, help="PID of the server for memory sampling with --url")
+    parser.add_argument("--timeout", type=float, default=30, help="Request timeout with --url")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    if args.url:
+        target = URLTarget(args.url, args.timeout)
+    else:
+        # In-process runs never call the TTS provider
+        os.environ['ELEVENLABS_API_KEY'] = ''
+        target = InProcessTarget()
+
+    # Every in-process reply logs the mock-audio warning
+    logging.getLogger().setLevel(logging.ERROR)
+
+    rng = random.Random(args.seed)
+    scenarios = list(TEST_SCENARIOS) + [generate_variant(rng, i) for i in range(args.variants)]
+
+    report = run_load(target, scenarios, args.callers, args.rate, args.concurrency,
+                      args.think_ms, args.seed, args.server_pid)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 0 if report['calls_failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,396 @@
+"""
+Media stream replay client and turn latency benchmark for Clinic Voice AI
+
+Stands in for Twilio on the /twilio/media-stream WebSocket. It sends the
+connected and start messages, then streams caller audio in real time as
+20 ms mu-law media frames, and keeps streaming silence between turns as a
+live call does. It plays the server's reply frames on a simulated playback
+clock and echoes each mark when playback reaches it. A 'clear' drops the
+queued audio and echoes the pending marks at once, as Twilio does.
+
+Caller audio is either recorded call audio (--recording, one WAV or raw
+mu-law file per caller turn, or a whole call in one file) or synthetic
+speech-like turns. After each turn the client waits for the reply to finish
+playing before it speaks again (or, with --barge-in-ms, talks over it).
+
+For each reply it reports the time from the caller's last voiced frame to
+the first reply frame: the caller's silence, the server's end-of-turn
+detection, STT, the conversation and TTS together. The run fails (exit
+status 1) when the p95 is over --budget-ms.
+
+The server runs in-process (asgi_app through Quart's test client) unless
+--url points at a running one, e.g. ws://localhost:5000/twilio/media-stream.
+In-process, --simulate replaces STT, the LLM and TTS with stand-ins that
+take --stt-ms, --llm-ms and --tts-ms, so no API keys are needed.
+
+Usage:
+    python -m benchmarks.bench_media_stream --simulate [--turns 6] [--budget-ms 1000]
+    python -m benchmarks.bench_media_stream --recording call.wav --url ws://localhost:5000/twilio/media-stream
+"""
+
+import argparse
+import asyncio
+import base64
+import collections
+import json
+import logging
+import statistics
+import time
+import urllib.parse
+import uuid
+
+import numpy as np
+
+from benchmarks.bench_transcode import speech_like
+from transcoder import decode, resample, ulaw_encode, ulaw_decode, TELEPHONY_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+FRAME_SECONDS = 0.02
+FRAME_BYTES = int(TELEPHONY_SAMPLE_RATE * FRAME_SECONDS)
+SILENCE_FRAME = ulaw_encode(np.zeros(FRAME_BYTES, dtype=np.int16))
+
+# Caller level counted as speech when measuring where a turn ended (as media_stream.MEDIA_SPEECH_RMS)
+SPEECH_RMS = 500
+
+# What the simulated caller says in each conversation state
+CALLER_ANSWERS = {
+    'collect_name': "John Smith",
+    'collect_service': "A dental checkup please",
+    'collect_time': "Tomorrow at 10 am",
+    'confirm_alternative_time': "Yes, that works",
+    'collect_phone': "050 123 4567",
+    'closing': "No, that is all, thank you"
+}
+
+
+class WebSocketClient:
+    """Minimal ws:// (or wss://) client on wsproto, which hypercorn already depends on"""
+
+    def __init__(self, reader, writer, connection):
+        self.reader = reader
+        self.writer = writer
+        self.connection = connection
+        self._events = collections.deque()
+        self._text = []
+
+    @classmethod
+    async def connect(cls, url):
+        from wsproto import ConnectionType, WSConnection
+        from wsproto.events import AcceptConnection, RejectConnection, Request
+
+        parsed = urllib.parse.urlsplit(url)
+        secure = parsed.scheme == 'wss'
+        reader, writer = await asyncio.open_connection(
+            parsed.hostname, parsed.port or (443 if secure else 80), ssl=True if secure else None
+        )
+        client = cls(reader, writer, WSConnection(ConnectionType.CLIENT))
+        target = parsed.path + (f"?{parsed.query}" if parsed.query else '')
+        await client._write(Request(host=parsed.netloc, target=target or '/'))
+        event = await client._next_event()
+        if isinstance(event, RejectConnection) or not isinstance(event, AcceptConnection):
+            raise ConnectionError(f"WebSocket handshake with {url} was rejected")
+        return client
+
+    async def _write(self, event):
+        self.writer.write(self.connection.send(event))
+        await self.writer.drain()
+
+    async def _next_event(self):
+        while not self._events:
+            data = await self.reader.read(65536)
+            if not data:
+                raise ConnectionError("Connection closed")
+            self.connection.receive_data(data)
+            self._events.extend(self.connection.events())
+        return self._events.popleft()
+
+    async def send(self, text):
+        from wsproto.events import TextMessage
+        await self._write(TextMessage(data=text))
+
+    async def receive(self):
+        from wsproto.events import CloseConnection, Ping, TextMessage
+        while True:
+            event = await self._next_event()
+            if isinstance(event, TextMessage):
+                self._text.append(event.data)
+                if event.message_finished:
+                    text, self._text = ''.join(self._text), []
+                    return text
+            elif isinstance(event, Ping):
+                await self._write(event.response())
+            elif isinstance(event, CloseConnection):
+                await self._write(event.response())
+                raise ConnectionError("Server closed the stream")
+
+    async def close(self):
+        from wsproto.events import CloseConnection
+        try:
+            await self._write(CloseConnection(code=1000))
+        except Exception:
+            pass
+        self.writer.close()
+
+
+class ReplayState:
+    """What the simulated phone has heard so far"""
+
+    def __init__(self):
+        self.last_voiced = None
+        self.reply_started = None
+        self.playing_until = 0.0
+        self.pending_marks = {}
+        self.marks_echoed = 0
+        self.latencies = []
+        self.reply_seconds = []
+        self.greeting_latency = None
+        self.clears = 0
+        self.frames_received = 0
+        self.hung_up = False
+        self.closed = asyncio.Event()
+
+
+async def receive_replies(connection, state, started):
+    """Play reply frames on a simulated clock, echo marks, and time each reply"""
+    loop = asyncio.get_running_loop()
+
+    async def echo(name):
+        state.pending_marks.pop(name, None)
+        state.marks_echoed += 1
+        try:
+            await connection.send(json.dumps({'event': 'mark', 'streamSid': state.stream_sid, 'mark': {'name': name}}))
+        except Exception:
+            pass
+
+    try:
+        while True:
+            message = json.loads(await connection.receive())
+            now = time.perf_counter()
+            event = message.get('event')
+            if event == 'media':
+                audio = base64.b64decode(message['media']['payload'])
+                state.frames_received += 1
+                if state.reply_started is None:
+                    state.reply_started = now
+                    state.reply_seconds.append(0.0)
+                    if state.last_voiced is None:
+                        state.greeting_latency = now - started
+                    else:
+                        state.latencies.append(now - state.last_voiced)
+                seconds = len(audio) / TELEPHONY_SAMPLE_RATE
+                state.playing_until = max(state.playing_until, now) + seconds
+                state.reply_seconds[-1] += seconds
+            elif event == 'mark':
+                name = message['mark']['name']
+                state.reply_started = None
+                state.pending_marks[name] = loop.call_later(
+                    max(0.0, state.playing_until - now), lambda name=name: asyncio.ensure_future(echo(name))
+                )
+            elif event == 'clear':
+                state.clears += 1
+                state.playing_until = now
+                state.reply_started = None
+                for name, handle in list(state.pending_marks.items()):
+                    handle.cancel()
+                    await echo(name)
+    except Exception:
+        pass
+    finally:
+        state.closed.set()
+
+
+async def send_frame(connection, state, audio, sequence, voiced):
+    """Send one inbound media frame"""
+    await connection.send(json.dumps({
+        'event': 'media',
+        'sequenceNumber': str(sequence),
+        'streamSid': state.stream_sid,
+        'media': {'track': 'inbound', 'chunk': str(sequence), 'timestamp': str(int(sequence * FRAME_SECONDS * 1000)),
+                  'payload': base64.b64encode(audio).decode('ascii')}
+    }))
+    if voiced:
+        state.last_voiced = time.perf_counter()
+
+
+async def replay_call(connection, clips, args, call_sid):
+    """
+    Replay caller turns over one media stream
+
+    Args:
+        connection: Object with async send(text) and receive()
+        clips: Caller turns as mu-law bytes
+        args: Parsed command line
+        call_sid: Call SID sent in the start message
+
+    Returns:
+        ReplayState with the measurements
+    """
+    state = ReplayState()
+    state.stream_sid = f"MZ{uuid.uuid4().hex}"
+    started = time.perf_counter()
+    receiver = asyncio.create_task(receive_replies(connection, state, started))
+
+    await connection.send(json.dumps({'event': 'connected', 'protocol': 'Call', 'version': '1.0.0'}))
+    await connection.send(json.dumps({
+        'event': 'start',
+        'sequenceNumber': '1',
+        'streamSid': state.stream_sid,
+        'start': {'streamSid': state.stream_sid, 'callSid': call_sid, 'tracks': ['inbound'],
+                  'customParameters': {'from': '+971501234567'},
+                  'mediaFormat': {'encoding': 'audio/x-mulaw', 'sampleRate': TELEPHONY_SAMPLE_RATE, 'channels': 1}}
+    }))
+
+    sequence = 0
+    next_send = time.perf_counter()
+
+    async def stream(audio):
+        nonlocal sequence, next_send
+        for start in range(0, len(audio), FRAME_BYTES):
+            if state.closed.is_set():
+                return
+            frame = audio[start:start + FRAME_BYTES]
+            sequence += 1
+            rms = float(np.sqrt(np.mean(np.square(ulaw_decode(frame), dtype=np.float64))))
+            await send_frame(connection, state, frame, sequence, rms >= SPEECH_RMS)
+            next_send += FRAME_SECONDS
+            await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+
+    async def silence_until(done, timeout):
+        deadline = time.perf_counter() + timeout
+        while not done() and not state.closed.is_set() and time.perf_counter() < deadline:
+            await stream(SILENCE_FRAME)
+
+    # Listen to the greeting first
+    await silence_until(lambda: state.marks_echoed > 0, args.reply_timeout)
+    for clip in clips:
+        if state.closed.is_set():
+            break
+        echoed = state.marks_echoed
+        replies = len(state.reply_seconds)
+        await stream(clip)
+        if args.barge_in_ms is None:
+            await silence_until(lambda: state.marks_echoed > echoed, args.reply_timeout)
+            await silence_until(lambda: False, args.think_ms / 1000)
+        else:
+            # Talk over the reply once it has played for a while
+            await silence_until(lambda: len(state.reply_seconds) > replies, args.reply_timeout)
+            await silence_until(lambda: False, args.barge_in_ms / 1000)
+
+    state.hung_up = state.closed.is_set()
+    if not state.closed.is_set():
+        try:
+            await connection.send(json.dumps({'event': 'stop', 'streamSid': state.stream_sid, 'stop': {'callSid': call_sid}}))
+        except Exception:
+            pass
+        try:
+            await asyncio.wait_for(state.closed.wait(), timeout=2)
+        except asyncio.TimeoutError:
+            pass
+    receiver.cancel()
+    return state
+
+
+def load_recording(path):
+    """Read a caller recording as 8 kHz mu-law (WAV at any rate, or raw mu-law)"""
+    with open(path, 'rb') as recording:
+        audio = recording.read()
+    if audio[:4] != b'RIFF':
+        return audio
+    samples, sample_rate = decode(audio, 'wav')
+    return ulaw_encode(resample(samples, sample_rate, TELEPHONY_SAMPLE_RATE))
+
+
+def synthetic_turns(count):
+    """Speech-like caller turns of 1 to 2 seconds"""
+    return [ulaw_encode(speech_like(1.0 + (turn % 3) * 0.5, TELEPHONY_SAMPLE_RATE)) for turn in range(count)]
+
+
+def simulated_backends(args, call_sid):
+    """
+    Conversation and TTS stand-ins with fixed latencies; STT goes through the
+    real transcribe path with a StandInBackend in place of Whisper
+    """
+    from conversation import mock_process_conversation
+    from speech_recognition import StandInBackend, set_stt_backend
+    from twilio_integration import call_sessions
+
+    def caller_answer(audio_data, format):
+        session = call_sessions.get(call_sid)
+        return CALLER_ANSWERS.get(session['state'] if session else None, "Yes")
+
+    set_stt_backend(StandInBackend(caller_answer, latency=args.stt_ms / 1000))
+
+    def respond(session_id, transcript, session):
+        time.sleep(args.llm_ms / 1000)
+        return mock_process_conversation(session_id, transcript, session)
+
+    def synthesize(text):
+        time.sleep(args.tts_ms / 1000)
+        # About 2.5 words per second of speech
+        return ulaw_encode(speech_like(len(text.split()) / 2.5, TELEPHONY_SAMPLE_RATE))
+
+    return {'respond': respond, 'synthesize': synthesize}
+
+
+async def run(args, clips):
+    call_sid = f"CA{uuid.uuid4().hex}"
+    if args.url:
+        connection = await WebSocketClient.connect(args.url)
+        try:
+            return await replay_call(connection, clips, args, call_sid)
+        finally:
+            await connection.close()
+
+    import asgi_app
+    if args.simulate:
+        asgi_app.media_stream_backends.update(simulated_backends(args, call_sid))
+    async with asgi_app.app.test_app() as test_app:
+        async with test_app.test_client().websocket('/twilio/media-stream') as connection:
+            return await replay_call(connection, clips, args, call_sid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay caller audio over a Twilio media stream and time each reply")
+    parser.add_argument("--url", help="Media stream endpoint of a running server (default: asgi_app in-process)")
+    parser.add_argument("--recording", nargs='*', default=[], help="Caller audio files, one per turn (WAV or raw mu-law)")
+    parser.add_argument("--turns", type=int, default=6, help="Synthetic caller turns when no recording is given")
+    parser.add_argument("--simulate", action="store_true", help="Stand-in STT, LLM and TTS (in-process only)")
+    parser.add_argument("--stt-ms", type=float, default=150, help="Simulated transcription time")
+    parser.add_argument("--llm-ms", type=float, default=200, help="Simulated conversation turn time")
+    parser.add_argument("--tts-ms", type=float, default=150, help="Simulated synthesis time")
+    parser.add_argument("--think-ms", type=float, default=300, help="Caller pause after a reply finishes")
+    parser.add_argument("--barge-in-ms", type=float, help="Start the next turn this long into each reply instead of after it")
+    parser.add_argument("--reply-timeout", type=float, default=15, help="Longest wait for a reply to play")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="Budget for the p95 reply latency")
+    args = parser.parse_args()
+
+    if args.simulate and args.url:
+        parser.error("--simulate only applies to the in-process server")
+    logging.getLogger().setLevel(logging.ERROR)
+
+    clips = [load_recording(path) for path in args.recording] or synthetic_turns(args.turns)
+    state = asyncio.run(run(args, clips))
+
+    print(f"{len(clips)} caller turns, {len(state.latencies)} replies, {state.clears} cleared for barge-in, "
+          f"{state.frames_received} reply frames, {'server hung up' if state.hung_up else 'call still open'}")
+    if state.greeting_latency is not None:
+        print(f"greeting: first audio {state.greeting_latency * 1000:.0f} ms after start")
+    for turn, (latency, seconds) in enumerate(zip(state.latencies, state.reply_seconds[1:]), 1):
+        print(f"turn {turn}: first reply audio {latency * 1000:6.0f} ms after the caller stopped ({seconds:.1f} s reply)")
+    if not state.latencies:
+        print("no replies received")
+        return 1
+
+    latencies = sorted(state.latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000
+    print(f"reply latency p50 {p50:.0f} ms, p95 {p95:.0f} ms (budget {args.budget_ms:.0f})")
+    if p95 > args.budget_ms:
+        print(f"OVER BUDGET: p95 reply latency {p95:.0f} ms > {args.budget_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,294 @@
+"""
+NLP helper microbenchmarks for Clinic Voice AI
+
+Times the per-turn helpers in voice_agent_continuous (extract_name,
+extract_service, extract_time, extract_phone, detect_emotion,
+add_human_touches, add_ssml_tags, check_for_doctor_questions) on the
+categorized transcript corpus, and reports ops/sec and bytes allocated per
+call for each helper.
+
+Results are compared with a stored baseline. Speeds are normalized by a fixed
+calibration workload timed in alternating rounds with each helper, so a
+baseline recorded on one machine can be checked on another. The run fails
+(exit status 1) when a helper is slower, or allocates more, than the baseline
+by more than --threshold.
+
+Usage:
+    python -m benchmarks.bench_nlp_helpers [--threshold 0.3] [--by-category]
+    python -m benchmarks.bench_nlp_helpers --update-baseline
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import time
+import tracemalloc
+
+# Benchmarks never call the TTS provider
+os.environ['ELEVENLABS_API_KEY'] = ''
+
+import voice_agent_continuous as agent
+from benchmarks.corpus import load_nlp_corpus
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'nlp_helpers.json')
+
+# Allocation growth below this many bytes per call is noise, not a regression
+ALLOC_TOLERANCE_BYTES = 256
+
+# Doctor questions are checked against a fresh call's session
+BENCH_SESSION = {'current_doctor_discussed': None, 'context_memory': {}}
+
+
+def build_helpers():
+    """
+    Map helper name -> callable(transcript, intents), called the way handle_speech calls it
+
+    Helpers that handle_speech passes the turn's intent scan to get the
+    precomputed scan here too, so only the helper itself is timed.
+    """
+    return {
+        'extract_name': lambda text, intents: agent.extract_name(text),
+        'extract_service': lambda text, intents: agent.extract_service(text),
+        'extract_time': lambda text, intents: agent.extract_time(text),
+        'extract_phone': lambda text, intents: agent.extract_phone(text),
+        'detect_emotion': lambda text, intents: agent.detect_emotion(text, intents),
+        'add_human_touches': lambda text, intents: agent.add_human_touches(text),
+        'add_ssml_tags': lambda text, intents: agent.add_ssml_tags(text, 'friendly'),
+        'check_for_doctor_questions': lambda text, intents: agent.check_for_doctor_questions(text, dict(BENCH_SESSION), intents),
+    }
+
+
+def calibration_workload(iterations):
+    """
+    Run a fixed string and regex workload used to normalize helper speeds
+
+    Returns:
+        Seconds taken
+    """
+    pattern = re.compile(r"(\d{1,2})(?::(\d{2}))? ?(am|pm)")
+    text = "I would like to come in next tuesday at 2 pm if the doctor is available"
+    start = time.perf_counter()
+    for _ in range(iterations):
+        lowered = text.lower()
+        pattern.search(lowered)
+        ''.join(c for c in lowered[:20] if c.isalpha())
+    return time.perf_counter() - start
+
+
+def run_corpus(helper, corpus, passes):
+    """Call a helper on every transcript passes times and return the seconds taken"""
+    random.seed(0)
+    start = time.perf_counter()
+    for _ in range(passes):
+        for _, text, intents in corpus:
+            helper(text, intents)
+    return time.perf_counter() - start
+
+
+def calibrated_passes(run, min_time):
+    """Smallest power-of-two count for which run(count) takes at least min_time"""
+    count = 1
+    while run(count) < min_time:
+        count *= 2
+    return count
+
+
+def time_helper(helper, corpus, min_time, repeat):
+    """
+    Time a helper over the whole corpus, interleaved with the calibration workload
+
+    Each round times the calibration workload and then the helper, so both
+    see the same machine load; the median ratio of their speeds is the
+    normalized speed.
+
+    Args:
+        helper: Callable(transcript, intents)
+        corpus: List of (category, transcript, intents)
+        min_time: Minimum seconds per timing round
+        repeat: Rounds to run
+
+    Returns:
+        Tuple of (best seconds per call, normalized speed, mean calibration ops/sec)
+    """
+    passes = calibrated_passes(lambda count: run_corpus(helper, corpus, count), min_time)
+    iterations = calibrated_passes(lambda count: calibration_workload(count * 1000), min_time) * 1000
+
+    per_call = []
+    ratios = []
+    calibrations = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            calibration_speed = iterations / calibration_workload(iterations)
+            seconds = run_corpus(helper, corpus, passes) / (passes * len(corpus))
+            per_call.append(seconds)
+            calibrations.append(calibration_speed)
+            ratios.append((1 / seconds) / calibration_speed)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return min(per_call), statistics.median(ratios), sum(calibrations) / len(calibrations)
+
+
+def measure_allocations(helper, corpus):
+    """
+    Average peak bytes allocated by one call of a helper
+
+    Args:
+        helper: Callable(transcript, intents)
+        corpus: List of (category, transcript, intents)
+
+    Returns:
+        Mean peak allocation per call in bytes
+    """
+    # Warm caches (compiled regexes, interned strings) before tracing
+    for _, text, intents in corpus:
+        helper(text, intents)
+
+    total = 0
+    random.seed(0)
+    tracemalloc.start()
+    try:
+        for _, text, intents in corpus:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            helper(text, intents)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+    return total / len(corpus)
+
+
+def run_benchmarks(min_time, repeat, by_category=False):
+    """
+    Benchmark every helper
+
+    Returns:
+        Results dict: calibration speed plus per-helper ops_per_sec,
+        normalized speed, alloc_bytes and (optionally) per-category us/op
+    """
+    corpus = [(category, text, agent.intent_router.scan(text)) for category, text in load_nlp_corpus()]
+    calibrations = []
+    results = {'corpus_size': len(corpus), 'helpers': {}}
+
+    for name, helper in build_helpers().items():
+        seconds, normalized, calibration = time_helper(helper, corpus, min_time, repeat)
+        calibrations.append(calibration)
+        entry = {
+            'ops_per_sec': round(1 / seconds, 1),
+            'normalized': round(normalized, 4),
+            'alloc_bytes': round(measure_allocations(helper, corpus), 1)
+        }
+        if by_category:
+            entry['us_per_op_by_category'] = {
+                category: round(time_helper(helper, [item for item in corpus if item[0] == category], min_time / 4, repeat)[0] * 1e6, 2)
+                for category in sorted({item[0] for item in corpus})
+            }
+        results['helpers'][name] = entry
+
+    results['calibration_ops_per_sec'] = round(sum(calibrations) / len(calibrations), 1)
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold, raw=False):
+    """
+    Find helpers that regressed past the threshold
+
+    Args:
+        results: Output of run_benchmarks
+        baseline: Stored results
+        threshold: Allowed fractional slowdown or allocation growth
+        raw: Compare raw ops/sec instead of calibration-normalized speed
+
+    Returns:
+        Dict of helper name -> list of regression descriptions
+    """
+    speed_key = 'ops_per_sec' if raw else 'normalized'
+    regressions = {}
+
+    for name, current in results['helpers'].items():
+        base = baseline.get('helpers', {}).get(name)
+        if not base:
+            continue
+        problems = []
+        if current[speed_key] < base[speed_key] * (1 - threshold):
+            problems.append(f"speed {current[speed_key] / base[speed_key] - 1:+.0%}")
+        alloc_growth = current['alloc_bytes'] - base['alloc_bytes']
+        if alloc_growth > ALLOC_TOLERANCE_BYTES and current['alloc_bytes'] > base['alloc_bytes'] * (1 + threshold):
+            problems.append(f"allocations +{alloc_growth:.0f} B/call")
+        if problems:
+            regressions[name] = problems
+
+    return regressions
+
+
+def load_baseline(path):
+    """Load a stored baseline, or None if there is none"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-turn NLP helpers against a stored baseline")
+    parser.add_argument("--threshold", type=float, default=0.3, help="Allowed fractional slowdown or allocation growth")
+    parser.add_argument("--min-time", type=float, default=0.1, help="Minimum seconds per timing round")
+    parser.add_argument("--repeat", type=int, default=9, help="Interleaved timing rounds per helper")
+    parser.add_argument("--by-category", action="store_true", help="Also report us/op per transcript category")
+    parser.add_argument("--raw", action="store_true", help="Compare raw ops/sec instead of calibration-normalized speed")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    # Time the helpers themselves, not their latency spans
+    metrics.enabled = False
+
+    results = run_benchmarks(args.min_time, args.repeat, args.by_category)
+    baseline = load_baseline(args.baseline)
+    regressions = compare_to_baseline(results, baseline, args.threshold, args.raw) if baseline else {}
+
+    print(f"{results['corpus_size']} transcripts, calibration {results['calibration_ops_per_sec']:.0f} ops/s")
+    print(f"{'helper':<28} {'ops/s':>11} {'us/op':>8} {'alloc B':>9} {'vs baseline':>12}")
+    for name, entry in results['helpers'].items():
+        base = (baseline or {}).get('helpers', {}).get(name)
+        speed_key = 'ops_per_sec' if args.raw else 'normalized'
+        change = f"{entry[speed_key] / base[speed_key] - 1:+.0%}" if base else "-"
+        flag = "  REGRESSED" if name in regressions else ""
+        print(f"{name:<28} {entry['ops_per_sec']:>11.0f} {1e6 / entry['ops_per_sec']:>8.2f} "
+              f"{entry['alloc_bytes']:>9.0f} {change:>12}{flag}")
+        for category, us in entry.get('us_per_op_by_category', {}).items():
+            print(f"  {category:<26} {'':>11} {us:>8.2f}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to store one")
+        return 0
+
+    for name, problems in regressions.items():
+        print(f"REGRESSION {name}: {', '.join(problems)} (threshold {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,210 @@
+"""
+SMS dispatch benchmark for Clinic Voice AI
+
+Sends a day's worth of confirmations and reminders through a local stand-in
+for the Twilio Messages API that adds a fixed round trip to every request
+and rejects sends above the sender's rate with HTTP 429. It compares:
+- the sequential create() loop send_sms_confirmation amounts to,
+- a thread pool calling create() with no rate limit,
+- SMSDispatcher (token bucket plus sender threads).
+
+Delivery statuses are then checked the old way, one fetch() per message,
+and with a single reconcile() over the send window.
+
+Usage:
+    python -m benchmarks.bench_sms_dispatch [--messages 60] [--rate 10] [--latency-ms 150]
+"""
+
+import argparse
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from sms_dispatcher import SMSDispatcher, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+FROM_NUMBER = '+97140000000'
+
+
+class SimulatedTwilioError(Exception):
+    """REST error carrying an HTTP status, like TwilioRestException"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class SimulatedMessage:
+    """A sent message whose status moves from queued to delivered (or undelivered)"""
+
+    def __init__(self, sid, to, created, delivery_seconds, undelivered):
+        self.sid = sid
+        self.to = to
+        self.date_sent = datetime.now(timezone.utc)
+        self._created = created
+        self._delivery_seconds = delivery_seconds
+        self._undelivered = undelivered
+
+    @property
+    def status(self):
+        if time.monotonic() - self._created < self._delivery_seconds:
+            return 'sent'
+        return 'undelivered' if self._undelivered else 'delivered'
+
+    @property
+    def error_code(self):
+        return 30003 if self.status == 'undelivered' else None
+
+
+class SimulatedMessages:
+    """
+    The parts of client.messages the SMS code uses
+
+    create() past the sender's rate (a one-second burst allowed) raises a 429,
+    and every request waits one round trip.
+    """
+
+    def __init__(self, rate, latency, delivery_seconds, seed=7):
+        self.latency = latency
+        self.delivery_seconds = delivery_seconds
+        self.requests = 0
+        self.store = {}
+        self._limit = TokenBucket(rate, burst=max(1, int(rate)))
+        self._ids = itertools.count()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _request(self):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+
+    def create(self, body, from_, to):
+        self._request()
+        if not self._limit.acquire(timeout=0):
+            raise SimulatedTwilioError(429, "Too Many Requests")
+        with self._lock:
+            sid = f"SM{next(self._ids):032d}"
+            message = SimulatedMessage(sid, to, time.monotonic(), self.delivery_seconds, self._rng.random() < 0.05)
+            self.store[sid] = message
+        return message
+
+    def stream(self, from_=None, date_sent_after=None, date_sent_before=None, page_size=50):
+        matching = [m for m in self.store.values()
+                    if date_sent_after <= m.date_sent <= date_sent_before]
+        for page_start in range(0, len(matching), page_size):
+            self._request()
+            yield from matching[page_start:page_start + page_size]
+
+    def __call__(self, sid):
+        messages = self
+
+        class Context:
+            def fetch(self):
+                messages._request()
+                return messages.store[sid]
+
+        return Context()
+
+
+class SimulatedClient:
+    def __init__(self, messages):
+        self.messages = messages
+
+
+def send_sequential(client, recipients):
+    """The old path: one blocking create() per message, failures dropped"""
+    sids = []
+    for to_number in recipients:
+        try:
+            sids.append(client.messages.create(body="Reminder", from_=FROM_NUMBER, to=to_number).sid)
+        except Exception:
+            pass
+    return sids
+
+
+def send_unthrottled(client, recipients, workers):
+    """create() from a thread pool with no rate limit"""
+    def send(to_number):
+        try:
+            return client.messages.create(body="Reminder", from_=FROM_NUMBER, to=to_number).sid
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [sid for sid in pool.map(send, recipients) if sid]
+
+
+def send_dispatched(dispatcher, recipients):
+    futures = [dispatcher.submit(to_number, "Reminder") for to_number in recipients]
+    sids = []
+    for future in futures:
+        try:
+            sids.append(future.result())
+        except Exception:
+            pass
+    return sids
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SMS sending and status checks against a simulated Twilio API")
+    parser.add_argument("--messages", type=int, default=60, help="Messages to send per path")
+    parser.add_argument("--rate", type=float, default=10, help="Sender throughput in messages per second")
+    parser.add_argument("--latency-ms", type=float, default=150, help="Simulated API round trip")
+    parser.add_argument("--workers", type=int, default=4, help="Sender threads")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    latency = args.latency_ms / 1000
+    delivery_seconds = 0.5
+    recipients = [f"+9715{index:08d}" for index in range(args.messages)]
+
+    print(f"{args.messages} messages, sender limit {args.rate:g}/s, {args.latency_ms:.0f} ms per API call")
+    print(f"{'send path':<30} {'seconds':>8} {'sent':>5} {'rejected 429':>13} {'API calls':>10}")
+
+    rows = []
+    for label, run in (("sequential create()", lambda client: send_sequential(client, recipients)),
+                       (f"{args.workers * 2} threads, no limiter", lambda client: send_unthrottled(client, recipients, args.workers * 2))):
+        messages = SimulatedMessages(args.rate, latency, delivery_seconds)
+        # Let the sender's burst allowance fill up before each path
+        time.sleep(1)
+        sids, seconds = timed(run, SimulatedClient(messages))
+        rows.append((label, seconds, len(sids), args.messages - len(sids), messages.requests))
+
+    messages = SimulatedMessages(args.rate, latency, delivery_seconds)
+    time.sleep(1)
+    dispatcher = SMSDispatcher(SimulatedClient(messages), FROM_NUMBER, rate=args.rate, burst=1, workers=args.workers)
+    dispatcher.start()
+    sids, seconds = timed(send_dispatched, dispatcher, recipients)
+    rows.append(("SMSDispatcher", seconds, len(sids), dispatcher.counters['rate_limited'], messages.requests))
+    for label, seconds, sent, rejected, calls in rows:
+        print(f"{label:<30} {seconds:>8.2f} {sent:>5} {rejected:>13} {calls:>10}")
+
+    time.sleep(delivery_seconds)
+    print(f"\n{'status check':<30} {'seconds':>8} {'API calls':>10}")
+    before = messages.requests
+    fetched, seconds = timed(lambda: {sid: messages(sid).fetch().status for sid in sids})
+    print(f"{'fetch() per message':<30} {seconds:>8.2f} {messages.requests - before:>10}")
+    before = messages.requests
+    _, seconds = timed(dispatcher.reconcile)
+    print(f"{'reconcile() over the window':<30} {seconds:>8.2f} {messages.requests - before:>10}")
+    dispatcher.stop()
+
+    mismatches = sum(dispatcher.status(sid) != status for sid, status in fetched.items())
+    print(f"statuses: {dispatcher.stats()['statuses']}, mismatches: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
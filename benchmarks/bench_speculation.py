@@ -0,0 +1,175 @@
+"""
+Speculative turn benchmark for Clinic Voice AI
+
+Replays the TEST_SCENARIOS conversations on both channels, once with
+speculation off and once with it on, and reports the hit rate and the
+latency from the final transcript to the reply:
+- web: /api/process-partial and /api/process-speech on the Flask app, with
+  handle_speech running for real and reply audio start modeled as
+  --tts-ms (the wait for ElevenLabs' first chunk)
+- phone: Gather partial and final results through twilio_integration, with
+  the demo conversation handler plus --llm-ms of modeled LLM latency
+
+Each utterance is spoken word by word, one partial transcript per word
+every --word-ms, and the final transcript arrives --endpoint-ms after the
+last word (the recognizer's end-of-speech wait). In --revision-rate of the
+utterances the recognizer changes the last word in the final transcript,
+so the speculation on the last partial misses.
+
+Usage:
+    python -m benchmarks.bench_speculation [--word-ms 300] [--endpoint-ms 600]
+        [--llm-ms 700] [--tts-ms 300] [--revision-rate 0.2] [--scenarios 4]
+"""
+
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault('ELEVENLABS_API_KEY', '')
+os.environ.setdefault('JOBS_DB_PATH', os.path.join(tempfile.mkdtemp(), 'jobs.db'))
+
+import twilio_integration
+import voice_agent_continuous as agent
+from conversation import mock_process_conversation
+from test_scenarios import TEST_SCENARIOS
+
+logger = logging.getLogger(__name__)
+
+
+def utterance_events(text, rng, revision_rate):
+    """
+    Partial transcripts for an utterance and its final transcript
+
+    Returns:
+        Tuple of (list of partials, final transcript)
+    """
+    words = text.rstrip('.!?').split()
+    partials = [" ".join(words[:count]).lower() for count in range(1, len(words) + 1)]
+    if len(words) > 1 and rng.random() < revision_rate:
+        # The recognizer heard the last word differently until the end
+        partials[-1] = " ".join(words[:-1] + [words[-1][::-1]]).lower()
+    return partials, text
+
+
+def percentile(values, fraction):
+    """Value at a fraction of the way through the sorted values"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class WebChannel:
+    """The web client: interim results, then the final, on the Flask app"""
+
+    name = 'web'
+
+    def __init__(self, args):
+        self.client = agent.app.test_client()
+        self.speculation = agent.speech_speculation
+        synthesize = agent.synthesize_reply_voice
+
+        def synthesize_with_first_chunk(voice, session_id=None):
+            time.sleep(args.tts_ms / 1000)
+            return synthesize(voice, session_id)
+        agent.synthesize_reply_voice = synthesize_with_first_chunk
+
+    def start(self):
+        self.session_id = self.client.post('/api/start-call').get_json()['session_id']
+
+    def partial(self, transcript):
+        self.client.post('/api/process-partial', json={'session_id': self.session_id, 'transcript': transcript})
+
+    def final(self, transcript):
+        self.client.post('/api/process-speech', json={'session_id': self.session_id, 'transcript': transcript})
+
+
+class PhoneChannel:
+    """Twilio Gather: partial result callbacks, then the final speech result"""
+
+    name = 'phone'
+
+    def __init__(self, args):
+        def handler(session_id, transcript, session):
+            time.sleep(args.llm_ms / 1000)
+            return mock_process_conversation(session_id, transcript, session)
+        self.handler = handler
+        self.speculation = twilio_integration.create_call_speculation(handler)
+        self.calls = 0
+
+    def start(self):
+        self.calls += 1
+        self.call_sid = f"CA-bench-{self.calls}"
+        twilio_integration.start_call_session(self.call_sid, '+971500000000')
+        self.sequence = 0
+
+    def partial(self, transcript):
+        self.sequence += 1
+        twilio_integration.handle_gather_partial_webhook(
+            {'CallSid': self.call_sid, 'UnstableSpeechResult': transcript, 'SequenceNumber': str(self.sequence)},
+            self.speculation
+        )
+
+    def final(self, transcript):
+        result = twilio_integration.take_speculative_call_turn(self.call_sid, transcript, self.speculation)
+        if result is None:
+            twilio_integration.run_call_turn(self.call_sid, transcript, self.handler)
+
+
+def replay(channel, scenarios, args, speculate):
+    """Seconds from each final transcript to its reply"""
+    channel.speculation.enabled = speculate
+    rng = random.Random(7)
+    latencies = []
+    for scenario in scenarios:
+        channel.start()
+        for text in scenario['inputs']:
+            partials, final = utterance_events(text, rng, args.revision_rate)
+            if speculate:
+                for partial in partials:
+                    channel.partial(partial)
+                    time.sleep(args.word_ms / 1000)
+                time.sleep(max(0, args.endpoint_ms - args.word_ms) / 1000)
+            start = time.perf_counter()
+            channel.final(final)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark speculative turns on partial transcripts")
+    parser.add_argument("--word-ms", type=float, default=300, help="Time between partial transcripts (one per word)")
+    parser.add_argument("--endpoint-ms", type=float, default=600, help="Time from the last word to the final transcript")
+    parser.add_argument("--llm-ms", type=float, default=700, help="Modeled LLM latency per phone turn")
+    parser.add_argument("--tts-ms", type=float, default=300, help="Modeled wait for the first audio chunk per web turn")
+    parser.add_argument("--revision-rate", type=float, default=0.2, help="Share of utterances whose last word changes in the final")
+    parser.add_argument("--scenarios", type=int, default=4, help="TEST_SCENARIOS conversations replayed")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    scenarios = TEST_SCENARIOS[:args.scenarios]
+    turns = sum(len(scenario['inputs']) for scenario in scenarios)
+    print(f"{turns} turns per channel; partial every {args.word_ms:g} ms, final {args.endpoint_ms:g} ms after the "
+          f"last word, {args.revision_rate:.0%} revised; LLM {args.llm_ms:g} ms (phone), first audio {args.tts_ms:g} ms (web)")
+    print(f"{'channel':<8} {'off p50':>8} {'off p95':>8} {'on p50':>8} {'on p95':>8} {'hit rate':>9} "
+          f"{'saved/hit':>10} {'speculated':>11} {'unused':>7}")
+
+    misses = {}
+    for channel in (WebChannel(args), PhoneChannel(args)):
+        off = replay(channel, scenarios, args, speculate=False)
+        on = replay(channel, scenarios, args, speculate=True)
+        stats = channel.speculation.stats()
+        misses[channel.name] = {name[len('miss_'):]: count for name, count in stats.items() if name.startswith('miss_') and count}
+        print(f"{channel.name:<8} {statistics.median(off) * 1000:>8.0f} {percentile(off, 0.95) * 1000:>8.0f} "
+              f"{statistics.median(on) * 1000:>8.0f} {percentile(on, 0.95) * 1000:>8.0f} {stats['hit_rate']:>9.0%} "
+              f"{stats['saved_ms_per_hit']:>8.0f}ms {stats['started']:>11} {stats['started'] - stats['hits']:>7}")
+
+    for name, reasons in misses.items():
+        print(f"{name} misses: " + ", ".join(f"{reason} {count}" for reason, count in reasons.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,148 @@
+"""
+Worker startup benchmark for Clinic Voice AI
+
+Starts fresh interpreters that import an app module (voice_agent_continuous
+or asgi_app) and then serve their first call (start-call plus one speech
+turn) through the framework's test client. It reports cold import time,
+first-request latency, the app's slowest imports (from python -X importtime), and
+which provider SDKs were imported eagerly.
+
+The run fails (exit status 1) when the median import or first request is
+over its budget, or when an app imports a provider SDK (openai, twilio,
+googleapiclient) before the first request needs it.
+
+Usage:
+    python -m benchmarks.bench_startup [--runs 5] [--import-budget-ms 1500] [--first-request-budget-ms 500]
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+TARGETS = ('voice_agent_continuous', 'asgi_app')
+
+# SDKs the providers registry loads on first use
+PROVIDER_MODULES = ('openai', 'twilio', 'googleapiclient', 'google_auth_oauthlib')
+
+FIRST_CALL = ('My name is John Smith',)
+
+
+def child(module_name):
+    """Import the app and serve the first call; prints one JSON line of timings"""
+    import time
+    start = time.perf_counter()
+    app_module = __import__(module_name)
+    imported = time.perf_counter()
+    eager = sorted(name for name in PROVIDER_MODULES if name in sys.modules)
+
+    if module_name == 'asgi_app':
+        import asyncio
+
+        async def first_call():
+            async with app_module.app.test_app() as test_app:
+                client = test_app.test_client()
+                response = await client.post('/api/start-call')
+                session_id = (await response.get_json())['session_id']
+                for transcript in FIRST_CALL:
+                    await client.post('/api/process-speech', json={'session_id': session_id, 'transcript': transcript})
+
+        asyncio.run(first_call())
+    else:
+        client = app_module.app.test_client()
+        session_id = client.post('/api/start-call').get_json()['session_id']
+        for transcript in FIRST_CALL:
+            client.post('/api/process-speech', json={'session_id': session_id, 'transcript': transcript})
+    served = time.perf_counter()
+
+    print(json.dumps({'import': imported - start, 'first_request': served - imported, 'eager': eager}))
+
+
+def run_child(module_name, importtime=False):
+    """Run child() in a fresh interpreter with throwaway cache directories"""
+    scratch = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ,
+               ELEVENLABS_API_KEY='',
+               TTS_CACHE_DIR=os.path.join(scratch, 'tts'),
+               AUDIO_STORE_DIR=os.path.join(scratch, 'audio'),
+               JOBS_DB_PATH=os.path.join(scratch, 'jobs.db'),
+               PROVIDER_WARMUP='')
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + \
+        ['-m', 'benchmarks.bench_startup', '--child', module_name]
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{module_name} failed to start:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings, result.stderr
+
+
+def slowest_imports(importtime_log, module_name, count):
+    """The app's direct imports by cumulative time, from python -X importtime output"""
+    children = []
+    for line in importtime_log.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level and listed before their parent
+        level = (len(name) - len(name.lstrip()) + 1) // 2
+        if level == 2:
+            children.append((int(cumulative), name.strip()))
+        elif level == 1:
+            if name.strip() == module_name:
+                return sorted(children, reverse=True)[:count]
+            children = []
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import and first-request latency of the apps")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per app")
+    parser.add_argument("--import-budget-ms", type=float, default=1500, help="Budget for the median cold import")
+    parser.add_argument("--first-request-budget-ms", type=float, default=500, help="Budget for the median first call")
+    parser.add_argument("--top", type=int, default=8, help="Slowest imports to list per app")
+    args = parser.parse_args()
+
+    if args.child:
+        logging.disable(logging.CRITICAL)
+        child(args.child)
+        return 0
+
+    failures = []
+    for module_name in TARGETS:
+        try:
+            runs = [run_child(module_name)[0] for _ in range(args.runs)]
+            _, importtime_log = run_child(module_name, importtime=True)
+        except RuntimeError as e:
+            print(f"{module_name}: skipped ({str(e).splitlines()[-1]})")
+            continue
+
+        import_ms = statistics.median(run['import'] for run in runs) * 1000
+        first_ms = statistics.median(run['first_request'] for run in runs) * 1000
+        eager = sorted({name for run in runs for name in run['eager']})
+        print(f"{module_name}: import {import_ms:.0f} ms (budget {args.import_budget_ms:.0f}), "
+              f"first request {first_ms:.0f} ms (budget {args.first_request_budget_ms:.0f}), "
+              f"provider SDKs imported at startup: {', '.join(eager) or 'none'}")
+        for microseconds, name in slowest_imports(importtime_log, module_name, args.top):
+            print(f"    {microseconds / 1000:8.1f} ms  {name}")
+
+        if import_ms > args.import_budget_ms:
+            failures.append(f"{module_name} import {import_ms:.0f} ms > {args.import_budget_ms:.0f} ms")
+        if first_ms > args.first_request_budget_ms:
+            failures.append(f"{module_name} first request {first_ms:.0f} ms > {args.first_request_budget_ms:.0f} ms")
+        if eager:
+            failures.append(f"{module_name} imports {', '.join(eager)} at startup")
+
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
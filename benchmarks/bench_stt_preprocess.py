@@ -0,0 +1,173 @@
+"""
+STT preprocessing benchmark for Clinic Voice AI
+
+Sends caller turns through transcribe_audio with the preprocessing stage
+(speech_preprocessing.prepare_for_stt) off and on, against a local stand-in
+for the Whisper transcriptions endpoint, and reports bytes uploaded and STT
+latency per turn.
+
+The turns are speech-like audio with the silence real turns carry: a pause
+before the caller starts and the wait for the recording or Gather timeout
+after they stop. Two sources are mixed:
+- Twilio recordings: 8 kHz mono WAV
+- web client turns: 48 kHz stereo WAV (browsers record at 48 kHz)
+
+The stand-in runs in a separate process and models what the real upload
+and transcription cost: it holds each request for
+    --base-ms + --ms-per-audio-second x seconds of audio + bytes / --uplink-kbps
+so the latency figures include the client's own work (decoding, trimming,
+resampling, encoding) measured for real, plus modeled network and Whisper
+time. Set --uplink-kbps 0 and --ms-per-audio-second 0 to measure the client
+alone.
+
+Usage:
+    python -m benchmarks.bench_stt_preprocess [--turns 12] [--upload-format wav]
+        [--base-ms 250] [--ms-per-audio-second 40] [--uplink-kbps 2000]
+"""
+
+import argparse
+import io
+import logging
+import multiprocessing
+import statistics
+import time
+import wave
+
+import numpy as np
+
+from benchmarks.bench_stt_upload import TranscriptionsHandler, serve
+from benchmarks.bench_transcode import speech_like
+from http_client import HTTPClient
+from phrase_bank import encode_wav
+import speech_preprocessing
+from speech_preprocessing import preprocess_stats
+from speech_recognition import WhisperBackend, set_stt_backend, transcribe_audio
+from transcoder import decode, TELEPHONY_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+WEB_SAMPLE_RATE = 48000
+# Background noise on the line or in the room (int16 RMS)
+NOISE_RMS = 60
+
+
+class ModeledWhisperHandler(TranscriptionsHandler):
+    """Holds each upload for the modeled transfer and transcription time"""
+
+    base_ms = 250
+    ms_per_audio_second = 40
+    uplink_kbps = 2000
+
+    def do_POST(self):
+        file_part = self._read_file_part()
+        if not file_part:
+            return
+        head, audio = file_part
+        extension = head.split(b'filename="audio.', 1)[1].split(b'"', 1)[0].decode()
+        samples, sample_rate = decode(audio, extension)
+        seconds = len(samples) / sample_rate
+
+        delay_ms = self.base_ms + self.ms_per_audio_second * seconds
+        if self.uplink_kbps:
+            delay_ms += len(audio) * 8 / self.uplink_kbps
+        time.sleep(delay_ms / 1000)
+        self._reply(200, {'text': f"{len(audio)} {seconds:.2f}"})
+
+
+def caller_turn(index, rng):
+    """
+    One caller turn with leading and trailing silence
+
+    Returns:
+        Tuple of (label, WAV bytes, seconds of speech)
+    """
+    lead = 0.4 + (index % 4) * 0.4
+    speech = 1.5 + (index % 3) * 1.0
+    trail = 1.5 + (index % 2) * 1.5
+    web = index % 2 == 1
+    sample_rate = WEB_SAMPLE_RATE if web else TELEPHONY_SAMPLE_RATE
+
+    def noise(seconds):
+        return rng.normal(0, NOISE_RMS, int(seconds * sample_rate))
+
+    samples = np.concatenate([noise(lead), speech_like(speech, sample_rate) + noise(speech), noise(trail)])
+    samples = np.clip(samples, -32768, 32767).astype('<i2')
+    if web:
+        stereo = np.repeat(samples, 2)
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav_file:
+            wav_file.setnchannels(2)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(stereo.tobytes())
+        return "web 48 kHz stereo", buffer.getvalue(), speech
+    return "twilio 8 kHz", encode_wav(samples, sample_rate), speech
+
+
+def run_turn(audio, preprocess):
+    """Bytes uploaded, audio seconds uploaded and seconds taken for one turn"""
+    start = time.perf_counter()
+    text = transcribe_audio(audio, "wav", preprocess=preprocess)
+    seconds = time.perf_counter() - start
+    uploaded, audio_seconds = text.split() if text else (0, 0)
+    return int(uploaded), float(audio_seconds), seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark STT preprocessing (silence trimming, downsampling)")
+    parser.add_argument("--turns", type=int, default=12, help="Caller turns")
+    parser.add_argument("--upload-format", default="wav", help="Upload format with the stage on (wav, flac, opus, mp3)")
+    parser.add_argument("--base-ms", type=float, default=250, help="Modeled fixed time per transcription request")
+    parser.add_argument("--ms-per-audio-second", type=float, default=40, help="Modeled transcription time per second of audio")
+    parser.add_argument("--uplink-kbps", type=float, default=2000, help="Modeled upload bandwidth (0 = local speed)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    ModeledWhisperHandler.base_ms = args.base_ms
+    ModeledWhisperHandler.ms_per_audio_second = args.ms_per_audio_second
+    ModeledWhisperHandler.uplink_kbps = args.uplink_kbps
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(port_queue, ModeledWhisperHandler), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get(timeout=10)}/v1/audio/transcriptions"
+    set_stt_backend(WhisperBackend(api_key="test", url=url, client=HTTPClient(max_retries=0)))
+
+    speech_preprocessing.STT_UPLOAD_FORMAT = args.upload_format
+
+    rng = np.random.default_rng(7)
+    turns = [caller_turn(index, rng) for index in range(args.turns)]
+    print(f"Modeled endpoint: {args.base_ms:g} ms + {args.ms_per_audio_second:g} ms per audio second"
+          f" + upload at {args.uplink_kbps:g} kbit/s; upload format with the stage on: {args.upload_format}")
+    print(f"{'turn':>4} {'source':<18} {'audio s':>7} {'speech s':>8} {'off KiB':>8} {'on KiB':>7} "
+          f"{'sent s':>6} {'off ms':>7} {'on ms':>7}")
+
+    totals = {'off_bytes': 0, 'on_bytes': 0}
+    off_times, on_times, failures = [], [], 0
+    for index, (label, audio, speech) in enumerate(turns):
+        off_bytes, off_seconds_sent, off_time = run_turn(audio, False)
+        on_bytes, on_seconds_sent, on_time = run_turn(audio, True)
+        audio_seconds = off_seconds_sent
+        # The stage may only drop silence: everything spoken must still be sent
+        if not on_bytes or on_seconds_sent < speech:
+            failures += 1
+        totals['off_bytes'] += off_bytes
+        totals['on_bytes'] += on_bytes
+        off_times.append(off_time)
+        on_times.append(on_time)
+        print(f"{index + 1:>4} {label:<18} {audio_seconds:>7.2f} {speech:>8.2f} {off_bytes / 1024:>8.1f} "
+              f"{on_bytes / 1024:>7.1f} {on_seconds_sent:>6.2f} {off_time * 1000:>7.0f} {on_time * 1000:>7.0f}")
+
+    print(f"total uploaded: {totals['off_bytes'] / 1024:.0f} KiB off, {totals['on_bytes'] / 1024:.0f} KiB on "
+          f"({1 - totals['on_bytes'] / totals['off_bytes']:.0%} less)")
+    print(f"STT latency per turn: median {statistics.median(off_times) * 1000:.0f} ms off, "
+          f"{statistics.median(on_times) * 1000:.0f} ms on")
+    print(f"preprocess_stats: {preprocess_stats.stats()}")
+    if failures:
+        print(f"FAIL: {failures} turns lost speech with the stage on")
+
+    server.terminate()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
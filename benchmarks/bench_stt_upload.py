@@ -0,0 +1,177 @@
+"""
+STT upload benchmark for Clinic Voice AI
+
+Uploads caller audio to a local stand-in for the Whisper transcriptions
+endpoint. The stand-in parses the multipart body as the API would, so a
+request without a usable boundary is rejected. It compares:
+- the previous path (write a temp file, reopen it, set Content-Type by hand),
+- the same with the header left to requests (what the temp file alone costs),
+- WhisperBackend's in-memory upload,
+- WhisperBackend's chunked streaming upload.
+
+It reports the median time per upload of a short caller turn, and the time
+and the client's peak Python memory (tracemalloc) to upload a long recording.
+The stand-in runs in a separate process.
+
+Usage:
+    python -m benchmarks.bench_stt_upload [--turn-seconds 5] [--recording-minutes 10] [--repeat 30]
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_client import HTTPClient
+from speech_recognition import WhisperBackend
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+class TranscriptionsHandler(BaseHTTPRequestHandler):
+    """Accepts multipart uploads (plain or chunked) and answers with the file's size"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_file_part(self):
+        """Read the request and return (file head, file bytes), or reply with an error and return None"""
+        body = self._read_body()
+        content_type = self.headers.get('Content-Type', '')
+        if 'boundary=' not in content_type:
+            self._reply(400, {'error': 'Could not parse multipart form: missing boundary'})
+            return None
+
+        boundary = content_type.split('boundary=', 1)[1].strip('"').encode()
+        for part in body.split(b"--" + boundary):
+            head, _, data = part.partition(b"\r\n\r\n")
+            if b'name="file"' in head:
+                return head, data[:-2]
+        self._reply(400, {'error': 'No file part'})
+        return None
+
+    def do_POST(self):
+        file_part = self._read_file_part()
+        if file_part:
+            self._reply(200, {'text': str(len(file_part[1]))})
+
+
+def serve(port_queue, handler=TranscriptionsHandler):
+    """Run the stand-in endpoint (in its own process, so it is not in the client's memory figures)"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def upload_via_temp_file(client, url, audio, manual_header):
+    """The previous transcribe_audio upload"""
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
+        temp_file.write(audio)
+        temp_file_path = temp_file.name
+
+    headers = {"Authorization": "Bearer test"}
+    if manual_header:
+        headers["Content-Type"] = "multipart/form-data"
+    with open(temp_file_path, "rb") as audio_file:
+        files = {
+            "file": ("audio.wav", audio_file, "audio/wav"),
+            "model": (None, "whisper-1"),
+            "language": (None, "en")
+        }
+        response = client.post(url, headers=headers, files=files)
+    os.unlink(temp_file_path)
+    return response.json().get("text", "") if response.status_code == 200 else f"HTTP {response.status_code}"
+
+
+def measure(upload, repeat):
+    """Median seconds per upload and the last result"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = upload()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def measure_memory(upload):
+    """Seconds and peak traced bytes for one upload"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = upload()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark STT audio uploads against a local transcriptions endpoint")
+    parser.add_argument("--turn-seconds", type=float, default=5, help="Length of a caller turn (16 kHz WAV)")
+    parser.add_argument("--recording-minutes", type=float, default=10, help="Length of a long recording")
+    parser.add_argument("--repeat", type=int, default=30, help="Uploads per path for the turn")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(port_queue,), daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get(timeout=10)}/v1/audio/transcriptions"
+
+    client = HTTPClient(max_retries=0)
+    backend = WhisperBackend(api_key="test", url=url, client=client)
+    turn = os.urandom(int(args.turn_seconds * SAMPLE_RATE) * 2)
+    recording = os.urandom(int(args.recording_minutes * 60 * SAMPLE_RATE) * 2)
+
+    paths = [
+        ("temp file + manual header (old)", lambda audio: upload_via_temp_file(client, url, audio, True)),
+        ("temp file", lambda audio: upload_via_temp_file(client, url, audio, False)),
+        ("in memory", lambda audio: backend.transcribe(audio, "wav", chunked=False)),
+        ("chunked stream", lambda audio: backend.transcribe(audio, "wav", chunked=True)),
+    ]
+
+    failures = 0
+    print(f"{args.turn_seconds:g} s turn ({len(turn) / 1024:.0f} KiB), "
+          f"{args.recording_minutes:g} min recording ({len(recording) / 1024 / 1024:.1f} MiB)")
+    print(f"{'upload path':<33} {'turn ms':>8} {'recording ms':>13} {'peak MiB':>9}  result")
+    for label, upload in paths:
+        turn_seconds, turn_result = measure(lambda: upload(turn), args.repeat)
+        seconds, peak, result = measure_memory(lambda: upload(recording))
+        ok = turn_result == str(len(turn)) and result == str(len(recording))
+        failures += 0 if ok or label.endswith("(old)") else 1
+        print(f"{label:<33} {turn_seconds * 1000:>8.2f} {seconds * 1000:>13.0f} {peak / 1024 / 1024:>9.1f}  "
+              f"{'file received intact' if ok else turn_result}")
+
+    server.terminate()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
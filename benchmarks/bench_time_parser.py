@@ -0,0 +1,135 @@
+"""
+Temporal parser benchmark for Clinic Voice AI
+
+Compares the single-pass time parser behind extract_time with the previous
+loop of eight separate regex searches, on the benchmark corpus plus extra
+date and time phrases. Both paths are also checked for identical labels.
+Also times full resolution to datetime ranges (parse_time_range) and the
+availability queries.
+
+Usage:
+    python -m benchmarks.bench_time_parser [--rounds N]
+"""
+
+import argparse
+import logging
+import os
+import re
+import time
+
+# Benchmarks never call the TTS provider
+os.environ['ELEVENLABS_API_KEY'] = ''
+
+import voice_agent_continuous as agent
+from benchmarks.corpus import load_transcripts, SPOKEN_PHONE_NUMBERS, LONG_REQUESTS
+from time_parser import parse_time_range, scan_time_expressions, time_label
+
+logger = logging.getLogger(__name__)
+
+TIME_PHRASES = [
+    "Tuesday at 2 PM",
+    "tomorrow morning",
+    "Can I come in today at noon?",
+    "How about March 12 at 10:30 am",
+    "The 5th of January would be ideal",
+    "Next week sometime, maybe Wednesday afternoon",
+    "Friday at 4:30 pm please",
+    "around 3 o'clock if that works",
+    "any evening is fine",
+    "Saturday morning at 9am",
+    "Could I do march 3 pm?",
+    "march 3:30 pm would suit me",
+]
+
+
+# Reference copy of extract_time before the single-pass parser
+def legacy_extract_time(text):
+    text = text.lower()
+    day_patterns = [
+        r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday)",
+        r"(tomorrow|today|next week)",
+        r"(january|february|march|april|may|june|july|august|september|october|november|december) (\d{1,2})(?:st|nd|rd|th)?",
+        r"(\d{1,2})(?:st|nd|rd|th)? of (january|february|march|april|may|june|july|august|september|october|november|december)"
+    ]
+    time_patterns = [
+        r"(\d{1,2})(?::(\d{2}))? ?(am|pm)",
+        r"(\d{1,2}) o'?clock",
+        r"(morning|afternoon|evening)",
+        r"(noon|midnight)"
+    ]
+    day_match = None
+    for pattern in day_patterns:
+        match = re.search(pattern, text)
+        if match:
+            day_match = match.group(0)
+            break
+    time_match = None
+    for pattern in time_patterns:
+        match = re.search(pattern, text)
+        if match:
+            time_match = match.group(0)
+            break
+    if day_match and time_match:
+        return f"{day_match} at {time_match}"
+    elif day_match:
+        return f"{day_match} at 10:00 AM"
+    elif time_match:
+        return f"tomorrow at {time_match}"
+    return None
+
+
+def single_pass_extract_time(text):
+    return time_label(*scan_time_expressions(text))
+
+
+def time_per_call(func, transcripts, rounds):
+    """Best-of-rounds seconds per call of func over the transcripts"""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(20):
+            for text in transcripts:
+                func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / (20 * len(transcripts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the single-pass time parser against the regex loop")
+    parser.add_argument("--rounds", type=int, default=7, help="Timing rounds (best is kept)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    transcripts = load_transcripts() + SPOKEN_PHONE_NUMBERS + LONG_REQUESTS + TIME_PHRASES
+
+    mismatches = [(text, legacy_extract_time(text), single_pass_extract_time(text))
+                  for text in transcripts if legacy_extract_time(text) != single_pass_extract_time(text)]
+
+    legacy = time_per_call(legacy_extract_time, transcripts, args.rounds)
+    single = time_per_call(single_pass_extract_time, transcripts, args.rounds)
+    resolve = time_per_call(parse_time_range, transcripts, args.rounds)
+
+    ranges = [time_range for time_range in map(parse_time_range, transcripts) if time_range]
+    query = time_per_call(lambda time_range: agent.check_availability('dental', time_range), ranges, args.rounds)
+    nearest = time_per_call(lambda time_range: agent.suggest_alternative_time('dental', time_range.start), ranges, args.rounds)
+
+    print(f"{len(transcripts)} transcripts, {len(ranges)} with a time expression")
+    print(f"{'path':<34} {'us/call':>9} {'calls/s':>11}")
+    for label, seconds in (("regex loop (extract_time before)", legacy),
+                           ("single pass (extract_time now)", single),
+                           ("single pass + datetime range", resolve),
+                           ("free slot in range", query),
+                           ("nearest free slot after", nearest)):
+        print(f"{label:<34} {seconds * 1e6:>9.2f} {1 / seconds:>11.0f}")
+    print(f"label speedup: {legacy / single:.2f}x")
+
+    print(f"label mismatches: {len(mismatches)}")
+    for text, before, after in mismatches:
+        print(f"  {text!r}: {before!r} -> {after!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,113 @@
+"""
+Transcoding throughput benchmark for Clinic Voice AI
+
+Measures how fast synthesized speech is converted for each channel, on a
+synthetic speech-like clip (a few harmonics with a syllable-rate envelope):
+- mu-law encoding with the precomputed table vs the per-sample G.711 loop,
+- resampling 22.05 kHz and 16 kHz audio to the 8 kHz telephony rate,
+- WAV to 8 kHz mu-law end to end (what a phone leg costs per clip),
+- a VariantCache hit (what every later request for the clip costs),
+- Opus and MP3 encoding through pydub, when pydub and ffmpeg are installed.
+
+Throughput is reported as seconds of audio converted per second (x realtime).
+
+Usage:
+    python -m benchmarks.bench_transcode [--seconds 10] [--repeat 5]
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+
+import numpy as np
+
+import transcoder
+from phrase_bank import encode_wav, PHRASE_SAMPLE_RATE
+from transcoder import VariantCache, TELEPHONY_SAMPLE_RATE, ULAW_BIAS, ULAW_CLIP
+
+logger = logging.getLogger(__name__)
+
+
+def speech_like(seconds, sample_rate):
+    """Harmonics of a 140 Hz voice, amplitude-modulated at a syllable rate"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    voice = sum(np.sin(2 * np.pi * 140 * harmonic * t) / harmonic for harmonic in range(1, 12))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    return (voice * envelope * 6000).astype(np.int16)
+
+
+def ulaw_encode_loop(samples):
+    """Per-sample G.711 encoder (the reference g711.c algorithm) to compare against the table"""
+    encoded = bytearray(len(samples))
+    for index, sample in enumerate(samples.tolist()):
+        sample >>= 2
+        mask = 0x7F if sample < 0 else 0xFF
+        magnitude = min(abs(sample), ULAW_CLIP) + ULAW_BIAS
+        segment = 0
+        while segment < 8 and magnitude > (0x40 << segment) - 1:
+            segment += 1
+        code = 0x7F if segment > 7 else (segment << 4) | ((magnitude >> (segment + 1)) & 0x0F)
+        encoded[index] = code ^ mask
+    return bytes(encoded)
+
+
+def best_of(func, repeat):
+    """Fastest of repeat runs, in seconds, and the last result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark audio transcoding for telephony and browsers")
+    parser.add_argument("--seconds", type=float, default=10, help="Length of the test clip")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case (the fastest is reported)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    clip = speech_like(args.seconds, PHRASE_SAMPLE_RATE)
+    clip_16k = speech_like(args.seconds, 16000)
+    clip_8k = transcoder.resample(clip, PHRASE_SAMPLE_RATE, TELEPHONY_SAMPLE_RATE)
+    wav = encode_wav(clip, PHRASE_SAMPLE_RATE)
+
+    print(f"{args.seconds:g} s clip, best of {args.repeat}")
+    print(f"{'case':<40} {'ms':>9} {'x realtime':>11}")
+
+    def report(label, seconds):
+        print(f"{label:<40} {seconds * 1000:>9.2f} {args.seconds / seconds:>11.0f}")
+
+    loop_seconds, loop_encoded = best_of(lambda: ulaw_encode_loop(clip_8k), max(1, args.repeat // 2))
+    table_seconds, table_encoded = best_of(lambda: transcoder.ulaw_encode(clip_8k), args.repeat)
+    report("mu-law encode, per-sample loop", loop_seconds)
+    report("mu-law encode, lookup table", table_seconds)
+    report("mu-law decode, lookup table", best_of(lambda: transcoder.ulaw_decode(table_encoded), args.repeat)[0])
+    report("resample 22050 -> 8000", best_of(lambda: transcoder.resample(clip, PHRASE_SAMPLE_RATE, 8000), args.repeat)[0])
+    report("resample 16000 -> 8000", best_of(lambda: transcoder.resample(clip_16k, 16000, 8000), args.repeat)[0])
+    report("wav -> ulaw (decode, resample, encode)", best_of(lambda: transcoder.transcode(wav, 'wav', 'ulaw'), args.repeat)[0])
+
+    with tempfile.TemporaryDirectory(prefix='bench-transcode-') as cache_dir:
+        variants = VariantCache(cache_dir=cache_dir)
+        first, _ = best_of(lambda: variants.get_or_transcode('ab' + '0' * 30, 'ulaw', 'wav', lambda: wav), 1)
+        report("VariantCache miss (transcodes)", first)
+        report("VariantCache hit", best_of(lambda: variants.get_or_transcode('ab' + '0' * 30, 'ulaw', 'wav', lambda: wav), args.repeat)[0])
+
+    for audio_format in ('opus', 'mp3'):
+        try:
+            seconds, _ = best_of(lambda: transcoder.transcode(wav, 'wav', audio_format), max(1, args.repeat // 2))
+            report(f"wav -> {audio_format} (pydub)", seconds)
+        except Exception as e:
+            print(f"{'wav -> ' + audio_format + ' (pydub)':<40} skipped ({type(e).__name__}: {e})")
+
+    mismatches = sum(a != b for a, b in zip(loop_encoded, table_encoded))
+    print(f"\nlookup table vs per-sample loop: {mismatches} mismatched bytes, "
+          f"{loop_seconds / table_seconds:.0f}x faster")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
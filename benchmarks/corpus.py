@@ -0,0 +1,110 @@
+"""
+Transcript corpus for Clinic Voice AI benchmarks
+
+Combines the caller inputs from test_scenarios.TEST_SCENARIOS with extra
+transcripts covering small talk, clinic and doctor questions, and emotions.
+NLP_CORPUS groups transcripts by kind (short confirmations, long rambling
+requests, spoken phone numbers) for the per-helper benchmarks.
+"""
+
+from test_scenarios import TEST_SCENARIOS
+
+EXTRA_TRANSCRIPTS = [
+    "Hello",
+    "Hi there",
+    "Yes",
+    "No thanks",
+    "Yeah that works",
+    "Nope, that's wrong",
+    "How are you doing today?",
+    "Thank you so much, you've been really helpful",
+    "What's the weather like over there?",
+    "Are you open on the weekend?",
+    "Tell me a joke",
+    "Haha that's funny",
+    "Knock knock",
+    "What are your hours?",
+    "Where is the clinic located? Is there parking?",
+    "Do you take my insurance?",
+    "Do I need to wear a mask?",
+    "What services do you offer?",
+    "Is Dr. Chen any good?",
+    "Tell me about Dr. Sarah, what languages does she speak?",
+    "How much experience does Dr. Wilson have?",
+    "Which doctor would you recommend?",
+    "How many doctors are available?",
+    "I'm really nervous about going to the dentist",
+    "I have a terrible toothache and the pain is getting worse",
+    "This is urgent, I need to be seen as soon as possible",
+    "I'm confused, what do you mean?",
+    "I'm getting really frustrated with this",
+    "Wait, hold on, hear me out",
+    "Excuse me, can you listen for a second",
+    "I'd like to book a visit for my daughter, she's been complaining about her ears for a couple of days now and I think it might be an infection",
+    "Um so basically I was hoping to come in sometime next week, maybe Wednesday afternoon, because my skin has been breaking out and I'm not really sure what's going on",
+    "My number is oh five oh one two three four five six seven",
+    "It's 0501234567",
+    "You can reach me at +971 50 123 4567",
+    "How long have you been working there?",
+    "Do you like your job?",
+    "Where do you live?",
+    "Who are you?",
+]
+
+# Per-turn helper corpus, by the kinds of transcript callers produce
+SHORT_CONFIRMATIONS = [
+    "Yes",
+    "Yeah",
+    "No",
+    "Okay",
+    "Sure, that works",
+    "Yep that's right",
+    "Correct",
+    "Nope",
+    "Sounds good",
+    "That's fine",
+    "John Smith",
+    "Sarah",
+]
+
+LONG_REQUESTS = [
+    "Hi, um, so my name is Maria Garcia and I've been having this pain in my tooth for like three days now, it's really getting worse and I was hoping to see a dentist maybe tomorrow morning or whenever you have something",
+    "Okay so basically I was hoping to come in sometime next week, maybe Wednesday afternoon, because my skin has been breaking out and I'm not really sure what's going on and my friend said Dr. Wilson is good",
+    "Hello, this is David Brown speaking, I'm calling about my son, he's had a sore throat and an earache since the weekend and I'm a bit worried, is there an ENT doctor available on Friday at 3 pm",
+    "I'm really nervous about going to the dentist honestly, the last time was terrible, but my gums have been bleeding and I think I need a cleaning, could I come in on the 12th of March at 10 am",
+    "Sorry, I'm a bit confused, I called earlier and somebody said I could book a general checkup for my annual physical, is Dr. Chen there on Monday or maybe Tuesday afternoon",
+    "This is urgent, I need to be seen as soon as possible, I have a rash spreading on my arm and it's really itchy and painful, can a dermatologist see me today",
+]
+
+SPOKEN_PHONE_NUMBERS = [
+    "My number is oh five oh one two three four five six seven",
+    "It's 0501234567",
+    "You can reach me at +971 50 123 4567",
+    "zero five five, nine eight seven, six five four three",
+    "My phone number is 055-987-6543",
+    "050 123 4567, that's my mobile",
+    "Call me on 971 52 111 2233 please",
+    "It is five oh, one one one, two two three three",
+]
+
+NLP_CORPUS = {
+    'short': SHORT_CONFIRMATIONS,
+    'long': LONG_REQUESTS,
+    'phone': SPOKEN_PHONE_NUMBERS,
+}
+
+
+def load_transcripts():
+    """Get the benchmark transcript corpus"""
+    transcripts = []
+    for scenario in TEST_SCENARIOS:
+        transcripts.extend(scenario['inputs'])
+    transcripts.extend(EXTRA_TRANSCRIPTS)
+    return transcripts
+
+
+def load_nlp_corpus():
+    """Get (category, transcript) pairs for the NLP helper benchmarks"""
+    pairs = [(category, text) for category, texts in NLP_CORPUS.items() for text in texts]
+    pairs.extend(('scenario', text) for scenario in TEST_SCENARIOS for text in scenario['inputs'])
+    return pairs
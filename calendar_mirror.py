@@ -0,0 +1,278 @@
+"""
+Calendar Mirror Module for Clinic Voice AI
+
+This module handles a local copy of the clinic's Google Calendar:
+1. A full sync of events from a day ago onwards, then incremental syncs
+   with Calendar API sync tokens on a background thread
+2. Write-through of events the agent creates, so they count as busy at once
+3. Availability checks served from memory, with bounded staleness (a check
+   syncs first if the last sync is too old)
+4. A forced refresh for the final check before a booking is confirmed
+
+Times are naive UTC datetimes, the same convention GoogleIntegration uses
+for its queries.
+"""
+
+import bisect
+import logging
+import os
+import threading
+import time
+from datetime import datetime, date, timedelta, timezone
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Mirror configuration
+CALENDAR_SYNC_SECONDS = int(os.getenv('CALENDAR_SYNC_SECONDS', 30))
+CALENDAR_MAX_STALENESS_SECONDS = int(os.getenv('CALENDAR_MAX_STALENESS_SECONDS', 120))
+CALENDAR_PAGE_SIZE = 2500
+# Events that ended longer ago than this are neither fetched nor kept
+CALENDAR_PAST_DAYS = int(os.getenv('CALENDAR_PAST_DAYS', 1))
+
+
+def parse_calendar_time(value):
+    """RFC 3339 time from the Calendar API -> naive UTC datetime (as the queries use)"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def event_interval(event):
+    """
+    Busy interval of a Calendar event resource
+
+    Returns:
+        (start, end) naive UTC datetimes, or None if the event does not block time
+    """
+    if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent':
+        return None
+    start, end = event.get('start', {}), event.get('end', {})
+    if 'dateTime' in start and 'dateTime' in end:
+        return parse_calendar_time(start['dateTime']), parse_calendar_time(end['dateTime'])
+    if 'date' in start and 'date' in end:
+        # All-day events block their whole days
+        return (datetime.combine(date.fromisoformat(start['date']), datetime.min.time()),
+                datetime.combine(date.fromisoformat(end['date']), datetime.min.time()))
+    return None
+
+
+def merge_intervals(intervals):
+    """
+    Merge (start, end) intervals into sorted, non-overlapping lists
+
+    Returns:
+        Tuple of (starts, ends); both lists are sorted
+    """
+    starts, ends = [], []
+    for start, end in sorted(intervals):
+        if ends and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+def intervals_free(starts, ends, start, end):
+    """Whether no merged interval overlaps [start, end)"""
+    index = bisect.bisect_right(ends, start)
+    return index == len(starts) or starts[index] >= end
+
+
+def _http_status(error):
+    """HTTP status of a Google API client error, if it has one"""
+    return getattr(getattr(error, 'resp', None), 'status', None)
+
+
+class CalendarMirror:
+    """In-memory mirror of one calendar, kept current with sync tokens"""
+
+    def __init__(self, calendar_service, calendar_id='primary',
+                 max_staleness=CALENDAR_MAX_STALENESS_SECONDS):
+        """
+        Initialize the mirror (nothing is fetched until the first sync)
+
+        Args:
+            calendar_service: Calendar v3 client
+            calendar_id: Calendar to mirror
+            max_staleness: Seconds a check may rely on the last sync before syncing itself
+        """
+        self.calendar_service = calendar_service
+        self.calendar_id = calendar_id
+        self.max_staleness = max_staleness
+
+        # event id -> (start, end) for events that block time
+        self._events = {}
+        # Merged busy intervals, replaced as a whole after every change
+        self._busy = ([], [])
+        self._sync_token = None
+        self._synced_at = None
+        # Events written through while a full sync runs (None when none is running)
+        self._written_during_sync = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._sync_thread = None
+        self._stop_sync = threading.Event()
+
+        self.counters = {
+            'full_syncs': 0,
+            'incremental_syncs': 0,
+            'api_calls': 0,
+            'events_changed': 0,
+            'written_through': 0,
+            'sync_errors': 0,
+            'checks': 0,
+            'checks_synced': 0
+        }
+
+    def _window_start(self):
+        """Earliest end time of the events the mirror keeps (naive UTC)"""
+        return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=CALENDAR_PAST_DAYS)
+
+    def _list_events(self, **params):
+        """
+        All pages of an events().list query; returns (items, nextSyncToken)
+
+        Every request uses the same query. The API rejects timeMin alongside
+        a sync token, so only full syncs pass it; the token carries the window.
+        """
+        items = []
+        page_token = None
+        while True:
+            result = self.calendar_service.events().list(
+                calendarId=self.calendar_id,
+                singleEvents=True,
+                maxResults=CALENDAR_PAGE_SIZE,
+                pageToken=page_token,
+                **params
+            ).execute()
+            self.counters['api_calls'] += 1
+            items.extend(result.get('items', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return items, result.get('nextSyncToken')
+
+    def _apply(self, items, replace=False):
+        """
+        Apply changed (or, with replace, all) events and rebuild the busy index
+
+        A full sync (replace) also re-applies events written through while it
+        ran, which its listing may predate. Events that ended before the
+        mirrored window are dropped.
+        """
+        window_start = self._window_start()
+        with self._lock:
+            events = {} if replace else dict(self._events)
+            if replace and self._written_during_sync is not None:
+                items = list(items) + self._written_during_sync
+                self._written_during_sync = None
+            for item in items:
+                interval = event_interval(item)
+                if interval is None:
+                    events.pop(item.get('id'), None)
+                else:
+                    events[item.get('id')] = interval
+            events = {event_id: interval for event_id, interval in events.items() if interval[1] > window_start}
+            self._events = events
+            self._busy = merge_intervals(events.values())
+            self.counters['events_changed'] += len(items)
+
+    def sync(self):
+        """
+        Bring the mirror up to date
+
+        Uses the stored sync token when there is one. A full sync is done
+        first, and again when Google expires the token (HTTP 410).
+        """
+        with self._sync_lock:
+            if self._sync_token:
+                try:
+                    items, token = self._list_events(syncToken=self._sync_token)
+                    self._apply(items)
+                    self.counters['incremental_syncs'] += 1
+                    self._sync_token, self._synced_at = token, time.monotonic()
+                    return
+                except Exception as e:
+                    if _http_status(e) != 410:
+                        self.counters['sync_errors'] += 1
+                        raise
+                    logger.info("Calendar sync token expired; doing a full sync")
+
+            with self._lock:
+                self._written_during_sync = []
+            try:
+                items, token = self._list_events(timeMin=f"{self._window_start().isoformat()}Z")
+            except Exception:
+                with self._lock:
+                    self._written_during_sync = None
+                raise
+            self._apply(items, replace=True)
+            self.counters['full_syncs'] += 1
+            self._sync_token, self._synced_at = token, time.monotonic()
+            logger.info(f"Calendar mirror loaded {len(self._events)} events")
+
+    def staleness(self):
+        """Seconds since the last successful sync (None before the first one)"""
+        return None if self._synced_at is None else time.monotonic() - self._synced_at
+
+    def record_event(self, event):
+        """
+        Write-through for an event the agent created or changed
+
+        Args:
+            event: Calendar event resource returned by the API
+        """
+        with self._lock:
+            if self._written_during_sync is not None:
+                self._written_during_sync.append(event)
+        self._apply([event])
+        self.counters['written_through'] += 1
+
+    def is_free(self, start, end, force_refresh=False):
+        """
+        Check that no event overlaps [start, end)
+
+        Args:
+            start: Naive UTC datetime
+            end: Naive UTC datetime
+            force_refresh: Sync before checking (final booking confirmation)
+
+        Returns:
+            True if the time is free
+        """
+        self.counters['checks'] += 1
+        staleness = self.staleness()
+        if force_refresh or staleness is None or staleness > self.max_staleness:
+            self.counters['checks_synced'] += 1
+            self.sync()
+        starts, ends = self._busy
+        return intervals_free(starts, ends, start, end)
+
+    def start_sync(self, interval=CALENDAR_SYNC_SECONDS):
+        """Run sync every interval seconds in a daemon thread"""
+        if self._sync_thread is not None:
+            return self._sync_thread
+
+        def run():
+            while True:
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.error(f"Error syncing calendar mirror: {str(e)}")
+                if self._stop_sync.wait(interval):
+                    return
+
+        self._sync_thread = threading.Thread(target=run, name="calendar-mirror-sync", daemon=True)
+        self._sync_thread.start()
+        return self._sync_thread
+
+    def stop_sync(self):
+        """Stop the background sync"""
+        self._stop_sync.set()
+
+    def stats(self):
+        """Get sync counters"""
+        stats = dict(self.counters)
+        stats['events'] = len(self._events)
+        stats['staleness_seconds'] = self.staleness()
+        return stats
@@ -10,11 +10,15 @@ This module handles integration with Google services:
 import os
 import json
 import logging
+import threading
+import time
 from datetime import datetime, timedelta
 import pickle
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
+from types import SimpleNamespace
+from calendar_mirror import CalendarMirror, parse_calendar_time, merge_intervals, intervals_free
+from sheets_writer import SheetsWriter
+from metrics import metrics
+from providers import providers
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -32,18 +36,73 @@ GOOGLE_TOKEN_FILE = 'token.pickle'
 SPREADSHEET_ID = 'YOUR_SPREADSHEET_ID'
 CALENDAR_ID = 'primary'  # Use 'primary' for the user's primary calendar
 
+# Alternative times are searched for over this many days, at these hours
+SUGGESTION_DAYS = 3
+SUGGESTION_HOURS = [9, 10, 11, 13, 14, 15, 16]
+
+# A fetched busy window answers availability checks for this many seconds
+FREEBUSY_CACHE_SECONDS = int(os.getenv('FREEBUSY_CACHE_SECONDS', 60))
+
+# Answer availability from a synced local copy of the calendar
+CALENDAR_MIRROR_ENABLED = os.getenv('CALENDAR_MIRROR_ENABLED', 'true').lower() == 'true'
+
+# Journal appointment rows locally and append them to Sheets in batches
+SHEETS_WRITE_BEHIND = os.getenv('SHEETS_WRITE_BEHIND', 'true').lower() == 'true'
+
+def load_google_api():
+    """Google API client library: discovery build, the OAuth flow and its transport"""
+    from googleapiclient.discovery import build
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+    return SimpleNamespace(build=build, InstalledAppFlow=InstalledAppFlow, Request=Request)
+
+# The client library is imported when credentials are first needed (or by provider warm-up)
+providers.register('google_api', load_google_api)
+
 class GoogleIntegration:
     """Class to handle Google Sheets and Calendar integration"""
     
-    def __init__(self ):
-        """Initialize Google API clients"""
-        self.creds = self._get_credentials()
-        self.sheets_service = None
-        self.calendar_service = None
+    def __init__(self, calendar_service=None, sheets_service=None, mirror=CALENDAR_MIRROR_ENABLED,
+                 write_behind=SHEETS_WRITE_BEHIND):
+        """
+        Initialize Google API clients
+        
+        Args:
+            calendar_service: Prebuilt Calendar client (skips the OAuth flow)
+            sheets_service: Prebuilt Sheets client (skips the OAuth flow)
+            mirror: Keep a synced local copy of the calendar for availability checks
+            write_behind: Journal appointment rows and append them in batches
+                (one instance per process should do this)
+        """
+        self.creds = None
+        self.sheets_service = sheets_service
+        self.calendar_service = calendar_service
+        
+        if calendar_service is None and sheets_service is None:
+            self.creds = self._get_credentials()
+            if self.creds:
+                google_api = providers.get('google_api')
+                self.sheets_service = google_api.build('sheets', 'v4', credentials=self.creds)
+                self.calendar_service = google_api.build('calendar', 'v3', credentials=self.creds)
         
-        if self.creds:
-            self.sheets_service = build('sheets', 'v4', credentials=self.creds)
-            self.calendar_service = build('calendar', 'v3', credentials=self.creds)
+        # Busy intervals of the last freebusy query, shared by availability checks
+        self.calendar_api_calls = 0
+        self._busy_window = None
+        self._busy_lock = threading.Lock()
+        
+        # Local calendar copy, synced in the background
+        self.calendar_mirror = None
+        if self.calendar_service and mirror:
+            self.calendar_mirror = CalendarMirror(self.calendar_service, CALENDAR_ID)
+            self.calendar_mirror.start_sync()
+        
+        # Appointment rows are journaled and flushed in the background
+        self.sheets_writer = None
+        if self.sheets_service and write_behind:
+            self.sheets_writer = SheetsWriter(self._append_rows)
+            self.sheets_writer.start()
+            metrics.gauge('sheets_queue_depth', "Appointment rows waiting to be appended to Google Sheets",
+                          self.sheets_writer.depth)
     
     def _get_credentials(self):
         """Get Google API credentials"""
@@ -57,9 +116,9 @@ class GoogleIntegration:
         # If credentials don't exist or are invalid, get new ones
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
+                creds.refresh(providers.get('google_api').Request())
             else:
-                flow = InstalledAppFlow.from_client_secrets_file(
+                flow = providers.get('google_api').InstalledAppFlow.from_client_secrets_file(
                     GOOGLE_CREDENTIALS_FILE, SCOPES)
                 creds = flow.run_local_server(port=0)
             
@@ -73,11 +132,14 @@ class GoogleIntegration:
         """
         Log appointment details to Google Sheets
         
+        With write-behind on, the row is journaled and appended with the
+        next batch; the call does not wait for the Sheets API.
+        
         Args:
             appointment_data: Dictionary containing appointment details
             
         Returns:
-            True if successful, False otherwise
+            True if successful (or journaled), False otherwise
         """
         try:
             if not self.sheets_service:
@@ -93,22 +155,31 @@ class GoogleIntegration:
                 appointment_data.get('phone_number', '')
             ]
             
-            # Append row to sheet
-            result = self.sheets_service.spreadsheets().values().append(
-                spreadsheetId=SPREADSHEET_ID,
-                range='Appointments!A:E',
-                valueInputOption='RAW',
-                insertDataOption='INSERT_ROWS',
-                body={'values': [row_data]}
-            ).execute()
+            if self.sheets_writer:
+                self.sheets_writer.enqueue(row_data)
+                return True
             
-            logger.info(f"Appointment logged to Google Sheets: {result.get('updates').get('updatedRange')}")
+            # Append row to sheet
+            self._append_rows([row_data])
             return True
             
         except Exception as e:
             logger.error(f"Error logging appointment to Sheets: {str(e)}")
             return False
     
+    def _append_rows(self, rows):
+        """Append rows to the Appointments sheet in one API call"""
+        result = self.sheets_service.spreadsheets().values().append(
+            spreadsheetId=SPREADSHEET_ID,
+            range='Appointments!A:E',
+            valueInputOption='RAW',
+            insertDataOption='INSERT_ROWS',
+            body={'values': rows}
+        ).execute()
+        
+        logger.info(f"Appointments logged to Google Sheets: {result.get('updates').get('updatedRange')}")
+        return result
+    
     def create_calendar_event(self, appointment_data):
         """
         Create a calendar event for the appointment
@@ -161,6 +232,12 @@ class GoogleIntegration:
                 body=event
             ).execute()
             
+            # Write through to the mirror; the cached busy window is now incomplete
+            if self.calendar_mirror:
+                self.calendar_mirror.record_event(event)
+            with self._busy_lock:
+                self._busy_window = None
+            
             logger.info(f"Calendar event created: {event.get('htmlLink')}")
             return event.get('id')
             
@@ -168,13 +245,15 @@ class GoogleIntegration:
             logger.error(f"Error creating calendar event: {str(e)}")
             return None
     
-    def check_availability(self, service, preferred_time):
+    def check_availability(self, service, preferred_time, force_refresh=False):
         """
         Check if a time slot is available in the calendar
         
         Args:
             service: Type of service requested
             preferred_time: Preferred appointment time
+            force_refresh: Sync with the calendar first (use for the final
+                check before a booking is confirmed)
             
         Returns:
             True if available, False otherwise
@@ -193,19 +272,15 @@ class GoogleIntegration:
             start_time = datetime.now() + timedelta(days=1)
             end_time = start_time + timedelta(hours=1)
             
-            # Check for conflicting events
-            events_result = self.calendar_service.events().list(
-                calendarId=CALENDAR_ID,
-                timeMin=start_time.isoformat() + 'Z',
-                timeMax=end_time.isoformat() + 'Z',
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-            
-            events = events_result.get('items', [])
+            if self.calendar_mirror:
+                return self.calendar_mirror.is_free(start_time, end_time, force_refresh=force_refresh)
             
-            # If no events, time slot is available
-            return len(events) == 0
+            # Check for conflicting events in the (possibly cached) busy window
+            if force_refresh:
+                with self._busy_lock:
+                    self._busy_window = None
+            window = self._get_busy_window(start_time, end_time)
+            return self._is_free(window, start_time, end_time)
             
         except Exception as e:
             logger.error(f"Error checking availability: {str(e)}")
@@ -235,27 +310,24 @@ class GoogleIntegration:
             # In production, use a proper datetime parser
             start_time = datetime.now() + timedelta(days=1)
             
+            if self.calendar_mirror:
+                slot_free = self.calendar_mirror.is_free
+            else:
+                # One query covers every candidate slot; the slots are checked locally
+                last_day = start_time + timedelta(days=SUGGESTION_DAYS)
+                window = self._get_busy_window(start_time, last_day.replace(hour=max(SUGGESTION_HOURS) + 1, minute=0, second=0, microsecond=0))
+                slot_free = lambda slot_start, slot_end: self._is_free(window, slot_start, slot_end)
+            
             # Look for available slots in the next 3 days
-            for days in range(1, 4):
-                for hour in [9, 10, 11, 13, 14, 15, 16]:
+            for days in range(1, SUGGESTION_DAYS + 1):
+                for hour in SUGGESTION_HOURS:
                     check_time = start_time + timedelta(days=days)
                     check_time = check_time.replace(hour=hour, minute=0, second=0, microsecond=0)
                     
                     end_time = check_time + timedelta(hours=1)
                     
-                    # Check for conflicting events
-                    events_result = self.calendar_service.events().list(
-                        calendarId=CALENDAR_ID,
-                        timeMin=check_time.isoformat() + 'Z',
-                        timeMax=end_time.isoformat() + 'Z',
-                        singleEvents=True,
-                        orderBy='startTime'
-                    ).execute()
-                    
-                    events = events_result.get('items', [])
-                    
                     # If no events, time slot is available
-                    if len(events) == 0:
+                    if slot_free(check_time, end_time):
                         # Format time for response
                         day_str = "today" if days == 0 else "tomorrow" if days == 1 else f"in {days} days"
                         hour_str = f"{hour}:00 AM" if hour < 12 else f"{hour-12}:00 PM"
@@ -267,6 +339,54 @@ class GoogleIntegration:
         except Exception as e:
             logger.error(f"Error suggesting alternative time: {str(e)}")
             return "tomorrow at 10:00 AM"  # Default fallback
+    
+    def _get_busy_window(self, start_time, end_time):
+        """
+        Busy intervals covering a time range, from one freebusy query
+        
+        A window fetched within FREEBUSY_CACHE_SECONDS is reused if it covers
+        the range. A new window runs from start_time to midnight after the
+        last day alternatives are searched on, so the availability check and
+        the suggestion that follows it share one query.
+        
+        Args:
+            start_time: Range start (naive UTC)
+            end_time: Range end (naive UTC)
+            
+        Returns:
+            Window dict with merged, sorted busy 'starts' and 'ends'
+        """
+        with self._busy_lock:
+            window = self._busy_window
+            if (window is None
+                    or time.monotonic() - window['fetched_at'] > FREEBUSY_CACHE_SECONDS
+                    or start_time < window['start'] or end_time > window['end']):
+                window_end = (start_time + timedelta(days=SUGGESTION_DAYS + 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+                window = self._busy_window = self._query_freebusy(start_time, max(window_end, end_time))
+            return window
+    
+    def _query_freebusy(self, start_time, end_time):
+        """Run one freebusy query and merge the busy intervals"""
+        result = self.calendar_service.freebusy().query(body={
+            'timeMin': start_time.isoformat() + 'Z',
+            'timeMax': end_time.isoformat() + 'Z',
+            'items': [{'id': CALENDAR_ID}]
+        }).execute()
+        self.calendar_api_calls += 1
+        
+        # Merge overlapping events so the end times are sorted too
+        starts, ends = merge_intervals(
+            (parse_calendar_time(period['start']), parse_calendar_time(period['end']))
+            for period in result.get('calendars', {}).get(CALENDAR_ID, {}).get('busy', [])
+        )
+        
+        logger.info(f"Fetched {len(starts)} busy periods from {start_time.isoformat()} to {end_time.isoformat()}")
+        return {'start': start_time, 'end': end_time, 'starts': starts, 'ends': ends, 'fetched_at': time.monotonic()}
+    
+    @staticmethod
+    def _is_free(window, start_time, end_time):
+        """Whether no busy interval of the window overlaps [start_time, end_time)"""
+        return intervals_free(window['starts'], window['ends'], start_time, end_time)
 
 # For demo/testing purposes
 def mock_google_integration():
@@ -285,7 +405,7 @@ def mock_google_integration():
             logger.info(f"Mock: Creating calendar event: {json.dumps(appointment_data)}")
             return "mock_event_id_12345"
             
-        def check_availability(self, service, preferred_time):
+        def check_availability(self, service, preferred_time, force_refresh=False):
             import random
             available = random.random() > 0.3
             logger.info(f"Mock: Checking availability for {service} at {preferred_time}: {available}")
@@ -308,8 +428,10 @@ def setup_google_sheets():
     
     Creates the appointment tracking spreadsheet if it doesn't exist
     """
+    global SPREADSHEET_ID
+    
     try:
-        google = GoogleIntegration()
+        google = GoogleIntegration(mirror=False, write_behind=False)
         
         if not google.sheets_service:
             logger.error("Sheets service not initialized")
@@ -369,7 +491,6 @@ def setup_google_sheets():
             ).execute()
             
             # Update the spreadsheet ID
-            global SPREADSHEET_ID
             SPREADSHEET_ID = spreadsheet.get('spreadsheetId')
             
             logger.info(f"Created new spreadsheet: {SPREADSHEET_ID}")
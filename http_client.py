@@ -0,0 +1,211 @@
+"""
+HTTP Client Module for Clinic Voice AI
+
+This module handles outbound HTTP calls to providers (ElevenLabs, OpenAI, Twilio):
+1. A shared session with per-host keep-alive connection pools
+2. Connect and read timeouts on every request
+3. Retrying transient failures with jittered exponential backoff
+4. Request, retry and connection reuse statistics
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Timeouts in seconds (read timeout is the longest gap between bytes, not the total)
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+
+# Connection pools: number of hosts kept and connections kept per host
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', 10))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 20))
+
+# Retries after the first attempt, and the backoff base/cap in seconds
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 2))
+HTTP_BACKOFF_BASE = 0.25
+HTTP_BACKOFF_MAX = 4.0
+
+# Responses worth retrying: rate limits and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def backoff_delay(attempt, base=HTTP_BACKOFF_BASE, cap=HTTP_BACKOFF_MAX):
+    """
+    Delay before a retry, using exponential backoff with full jitter
+
+    Args:
+        attempt: Retry number, starting at 1
+
+    Returns:
+        Seconds to sleep
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _retry_after(response):
+    """Seconds requested by a Retry-After header, if it is a number"""
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def host_key(url):
+    """Identify a host as host:port, the way connection pools are keyed"""
+    parts = urlsplit(url)
+    return f"{parts.hostname}:{parts.port or (443 if parts.scheme == 'https' else 80)}"
+
+
+def _rewind_files(files):
+    """Seek file uploads back to the start so a retry re-sends the whole body"""
+    for value in (files or {}).values():
+        file_obj = value[1] if isinstance(value, tuple) else value
+        if hasattr(file_obj, 'seek'):
+            file_obj.seek(0)
+
+
+class HTTPClient:
+    """Pooled, retrying HTTP client shared by all provider integrations"""
+
+    def __init__(self, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 max_retries=HTTP_MAX_RETRIES, pool_hosts=HTTP_POOL_HOSTS, pool_size=HTTP_POOL_SIZE):
+        """
+        Initialize the client
+
+        Args:
+            connect_timeout: Seconds to wait for a TCP/TLS connection
+            read_timeout: Seconds to wait between bytes of the response
+            max_retries: Retries after the first attempt for transient failures
+            pool_hosts: Number of per-host pools to keep
+            pool_size: Keep-alive connections kept per host
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+
+        self.adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+
+        self._lock = threading.Lock()
+        self.counters = defaultdict(lambda: {'requests': 0, 'retries': 0, 'errors': 0, 'seconds': 0.0})
+
+    def request(self, method, url, retries=None, **kwargs):
+        """
+        Send a request, retrying connection errors, timeouts and retryable statuses
+
+        Streaming responses (stream=True) are only retried before their body
+        is read, so callers never see a partially replayed body.
+
+        Args:
+            method: HTTP method
+            url: Request URL
+            retries: Override the client's retry count (0 disables retries)
+            **kwargs: Passed to requests (json, data, files, headers, stream, timeout, ...)
+
+        Returns:
+            requests.Response (the last one, if every attempt got a retryable status)
+
+        Raises:
+            requests.RequestException: If the last attempt failed to connect or timed out
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        retries = self.max_retries if retries is None else retries
+        host = host_key(url)
+        stats = self.counters[host]
+
+        attempt = 0
+        while True:
+            _rewind_files(kwargs.get('files'))
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response = None
+                error = e
+            finally:
+                with self._lock:
+                    stats['requests'] += 1
+                    stats['seconds'] += time.perf_counter() - start
+
+            retryable = error is not None or response.status_code in RETRY_STATUS_CODES
+            if not retryable or attempt >= retries:
+                if error is not None:
+                    with self._lock:
+                        stats['errors'] += 1
+                    raise error
+                return response
+
+            attempt += 1
+            delay = backoff_delay(attempt)
+            if response is not None:
+                delay = max(delay, min(_retry_after(response) or 0, HTTP_BACKOFF_MAX))
+                response.close()
+
+            with self._lock:
+                stats['retries'] += 1
+            logger.warning(f"Retrying {method} {host} in {delay:.2f}s (attempt {attempt}/{retries}): "
+                           f"{error or response.status_code}")
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        """Send a GET request (see request)"""
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """Send a POST request (see request)"""
+        return self.request('POST', url, **kwargs)
+
+    def pool_stats(self):
+        """Per-host connection counts from the underlying urllib3 pools"""
+        pools = {}
+        manager = self.adapter.poolmanager
+        for key in manager.pools.keys():
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            pools[f"{key.key_host}:{key.key_port}"] = {
+                'connections_opened': pool.num_connections,
+                'requests_sent': pool.num_requests,
+                'idle_connections': sum(1 for conn in pool.pool.queue if conn is not None) if pool.pool else 0
+            }
+        return pools
+
+    def stats(self):
+        """Get request counters and connection reuse per host"""
+        with self._lock:
+            hosts = {host: dict(counters) for host, counters in self.counters.items()}
+
+        for host, pool in self.pool_stats().items():
+            entry = hosts.setdefault(host, {})
+            entry.update(pool)
+            entry['connection_reuse_rate'] = (
+                1 - pool['connections_opened'] / pool['requests_sent'] if pool['requests_sent'] else 0.0
+            )
+
+        for entry in hosts.values():
+            seconds = entry.pop('seconds', 0.0)
+            if entry.get('requests'):
+                entry['avg_ms'] = round(1000 * seconds / entry['requests'], 1)
+
+        return {
+            'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]},
+            'max_retries': self.max_retries,
+            'hosts': hosts
+        }
+
+
+# Shared client used by every outbound provider call
+http_client = HTTPClient()
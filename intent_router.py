@@ -0,0 +1,189 @@
+"""
+Intent Router Module for Clinic Voice AI
+
+This module handles single-pass keyword routing of caller transcripts:
+1. Compiling every keyword table into one Aho-Corasick automaton at startup
+2. Scanning a transcript once and reporting all matched categories
+3. Recording match positions and word-boundary information for each hit
+"""
+
+import logging
+from collections import deque, namedtuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A single keyword hit. start/end index into the lowercased transcript.
+KeywordMatch = namedtuple('KeywordMatch', ['category', 'keyword', 'start', 'end', 'word_boundary'])
+
+
+def is_word_boundary(text, start, end):
+    """
+    Check whether text[start:end] is delimited by non-alphanumeric characters
+
+    Args:
+        text: Text the span was found in
+        start: Start index of the span
+        end: End index of the span (exclusive)
+
+    Returns:
+        True if the span is a whole word or phrase, False otherwise
+    """
+    if start > 0 and text[start - 1].isalnum():
+        return False
+    if end < len(text) and text[end].isalnum():
+        return False
+    return True
+
+
+class IntentMatches:
+    """Every keyword hit found in one transcript, indexed by category"""
+
+    def __init__(self, text, hits):
+        """
+        Index the hits of a scan
+
+        Args:
+            text: Lowercased transcript the hits refer to
+            hits: List of KeywordMatch tuples in scan order
+        """
+        self.text = text
+        self.hits = hits
+        self._by_category = {}
+        self._keywords = set()
+
+        for hit in hits:
+            self._by_category.setdefault(hit.category, []).append(hit)
+            self._keywords.add(hit.keyword)
+
+    @property
+    def categories(self):
+        """Categories with at least one hit, in order of first occurrence"""
+        return list(self._by_category)
+
+    def has(self, category, whole_word=False):
+        """
+        Check whether a category matched
+
+        Args:
+            category: Category name
+            whole_word: Only count hits on word boundaries
+
+        Returns:
+            True if the category matched, False otherwise
+        """
+        hits = self._by_category.get(category)
+        if not hits:
+            return False
+        if whole_word:
+            return any(hit.word_boundary for hit in hits)
+        return True
+
+    def has_keyword(self, keyword):
+        """Check whether a specific keyword matched in any category"""
+        return keyword.lower() in self._keywords
+
+    def get(self, category):
+        """Get the hits for a category (empty list if none)"""
+        return self._by_category.get(category, [])
+
+
+class IntentRouter:
+    """Aho-Corasick automaton over a set of categorized keyword tables"""
+
+    def __init__(self, keyword_tables):
+        """
+        Compile the keyword tables into an automaton
+
+        Args:
+            keyword_tables: Dictionary mapping category name to a list of keywords
+        """
+        goto = [{}]
+        outputs = [[]]
+
+        for category, keywords in keyword_tables.items():
+            for keyword in keywords:
+                keyword = keyword.lower()
+                if not keyword:
+                    continue
+
+                state = 0
+                for char in keyword:
+                    next_state = goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(goto)
+                        goto[state][char] = next_state
+                        goto.append({})
+                        outputs.append([])
+                    state = next_state
+
+                if (category, keyword) not in outputs[state]:
+                    outputs[state].append((category, keyword))
+
+        self._delta, self._outputs = self._compile(goto, outputs)
+        self.pattern_count = sum(len(keywords) for keywords in keyword_tables.values())
+        self.state_count = len(goto)
+
+        logger.info(f"Intent router compiled: {self.pattern_count} keywords, {self.state_count} states")
+
+    @staticmethod
+    def _compile(goto, outputs):
+        """Add failure links and flatten the trie into a deterministic transition table"""
+        fail = [0] * len(goto)
+        delta = [dict(transitions) for transitions in goto]
+        order = deque()
+
+        order.extend(goto[0].values())
+
+        while order:
+            state = order.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+
+            # Missing transitions fall back to the failure state's transitions
+            for char, target in delta[fail[state]].items():
+                if char not in delta[state]:
+                    delta[state][char] = target
+
+            for char, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(char, 0)
+                order.append(child)
+
+        # Precompute keyword lengths so a scan only does arithmetic per hit
+        outputs = [
+            tuple((category, keyword, len(keyword)) for category, keyword in state_outputs)
+            for state_outputs in outputs
+        ]
+        return delta, outputs
+
+    def scan(self, text):
+        """
+        Scan a transcript once for every keyword category
+
+        Args:
+            text: Caller transcript
+
+        Returns:
+            IntentMatches with every hit, including overlapping ones
+        """
+        text_lower = (text or "").lower()
+        delta = self._delta
+        outputs = self._outputs
+        hits = []
+        state = 0
+
+        for index, char in enumerate(text_lower):
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                end = index + 1
+                for category, keyword, length in outputs[state]:
+                    start = end - length
+                    hits.append(KeywordMatch(
+                        category,
+                        keyword,
+                        start,
+                        end,
+                        is_word_boundary(text_lower, start, end)
+                    ))
+
+        return IntentMatches(text_lower, hits)
@@ -0,0 +1,330 @@
+"""
+Job Queue Module for Clinic Voice AI
+
+This module handles side effects that run after a reply has been returned
+(calendar events, Sheets rows, SMS confirmations):
+1. A durable job table in SQLite, shared by every worker process on the host
+2. A pool of worker threads running registered handlers
+3. Retries with exponential backoff, then a dead-letter list
+4. Idempotency keys, so enqueueing the same side effect twice runs it once
+5. Queue depth and per-kind duration metrics
+
+A running job holds a lease. If its process dies, the job becomes claimable
+again when the lease expires, so handlers must tolerate running twice for
+the same key (the key is passed to them for that purpose). A worker that
+overruns its lease no longer owns the job: its outcome is dropped rather
+than written over that of the worker that took the job over.
+"""
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from metrics import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Queue configuration
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', os.path.join('.cache', 'jobs.db'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 6))
+JOB_BACKOFF_SECONDS = float(os.getenv('JOB_BACKOFF_SECONDS', 2))
+JOB_BACKOFF_MAX_SECONDS = 300
+
+# A running job is handed to another worker if it has not finished by then
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 120))
+
+# Idle workers look for due retries (and jobs from other processes) this often
+JOB_POLL_SECONDS = 1.0
+
+# Completed jobs are deleted after this long
+JOB_RETENTION_SECONDS = 7 * 24 * 60 * 60
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+DEAD = 'dead'
+
+
+def backoff_delay(attempts, base=JOB_BACKOFF_SECONDS, limit=JOB_BACKOFF_MAX_SECONDS):
+    """Seconds before retry number attempts (doubling, with jitter so retries spread out)"""
+    delay = min(limit, base * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class JobQueue:
+    """SQLite-backed job queue with a worker thread pool"""
+
+    def __init__(self, path=JOBS_DB_PATH, max_attempts=JOB_MAX_ATTEMPTS, lease_seconds=JOB_LEASE_SECONDS):
+        """
+        Initialize the queue
+
+        Args:
+            path: SQLite database file
+            max_attempts: Attempts before a job is dead-lettered
+            lease_seconds: Seconds a worker may hold a job before it can be claimed again
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.handlers = {}
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop_workers = threading.Event()
+        self._workers = []
+        self._start_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._pruned_at = 0
+
+        self.counters = {
+            'enqueued': 0,
+            'duplicates': 0,
+            'succeeded': 0,
+            'retried': 0,
+            'dead_lettered': 0,
+            'lease_lost': 0
+        }
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, run_at REAL NOT NULL, "
+            "last_error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at)")
+
+    def _connect(self):
+        """Per-thread connection in autocommit mode (transactions are explicit)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._counter_lock:
+            self.counters[name] += amount
+
+    def register(self, kind, handler):
+        """
+        Register the handler for a kind of job
+
+        Args:
+            kind: Job kind name
+            handler: Callable(payload, key); raising marks the attempt as failed
+        """
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, payload, key):
+        """
+        Queue a job unless one with the same key already exists
+
+        Args:
+            kind: Job kind name
+            payload: JSON-serializable job data
+            key: Idempotency key, e.g. "<appointment id>:sms"
+
+        Returns:
+            True if the job was queued, False if the key was already taken
+        """
+        now = time.time()
+        queued = self._connect().execute(
+            "INSERT OR IGNORE INTO jobs (key, kind, payload, status, run_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, kind, json.dumps(payload), PENDING, now, now, now)
+        ).rowcount == 1
+        if queued:
+            self._count('enqueued')
+            self._wake.set()
+        else:
+            self._count('duplicates')
+            logger.info(f"Job {key} is already queued; not adding it again")
+        return queued
+
+    def _claim(self):
+        """Lease the next due job, or return None"""
+        conn = self._connect()
+        now = time.time()
+        lease = now + self.lease_seconds
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, key, kind, payload, attempts FROM jobs "
+                "WHERE status IN (?, ?) AND run_at <= ? ORDER BY run_at LIMIT 1",
+                (PENDING, RUNNING, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, run_at = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, lease, now, row[0])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job_id, key, kind, payload, attempts = row
+        return {'id': job_id, 'key': key, 'kind': kind, 'payload': json.loads(payload), 'attempts': attempts + 1,
+                'lease': lease}
+
+    def _finish(self, job, error=None):
+        """
+        Record the outcome of an attempt
+
+        Each update only applies while this worker still holds the job's lease
+        (the job is running with the run_at set when it was claimed).
+        """
+        now = time.time()
+        conn = self._connect()
+        held = "WHERE id = ? AND status = ? AND run_at = ?"
+        lease = (job['id'], RUNNING, job['lease'])
+        if error is None:
+            outcome = 'succeeded'
+            updated = conn.execute(f"UPDATE jobs SET status = ?, last_error = NULL, updated_at = ? {held}",
+                                   (DONE, now) + lease).rowcount
+        elif job['attempts'] >= self.max_attempts:
+            outcome = 'dead_lettered'
+            updated = conn.execute(f"UPDATE jobs SET status = ?, last_error = ?, updated_at = ? {held}",
+                                   (DEAD, error, now) + lease).rowcount
+        else:
+            outcome = 'retried'
+            delay = backoff_delay(job['attempts'])
+            updated = conn.execute(f"UPDATE jobs SET status = ?, last_error = ?, run_at = ?, updated_at = ? {held}",
+                                   (PENDING, error, now + delay, now) + lease).rowcount
+
+        if not updated:
+            self._count('lease_lost')
+            logger.warning(f"Job {job['key']} overran its lease and was taken over; dropping this attempt's outcome")
+            return
+
+        self._count(outcome)
+        if outcome == 'dead_lettered':
+            logger.error(f"Job {job['key']} failed {job['attempts']} times; moved to dead letters: {error}")
+        elif outcome == 'retried':
+            logger.warning(f"Job {job['key']} failed (attempt {job['attempts']}), retrying in {delay:.1f}s: {error}")
+
+    def run_one(self):
+        """
+        Run the next due job in this thread
+
+        Returns:
+            True if a job was run, False if none was due
+        """
+        job = self._claim()
+        if job is None:
+            return False
+
+        handler = self.handlers.get(job['kind'])
+        start = time.perf_counter()
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{job['kind']}'")
+            handler(job['payload'], job['key'])
+        except Exception as e:
+            self._finish(job, str(e) or type(e).__name__)
+        else:
+            self._finish(job)
+        metrics.observe(f"job_{job['kind']}", time.perf_counter() - start)
+        return True
+
+    def prune(self, older_than=JOB_RETENTION_SECONDS):
+        """Delete completed jobs finished more than older_than seconds ago"""
+        return self._connect().execute(
+            "DELETE FROM jobs WHERE status = ? AND updated_at < ?",
+            (DONE, time.time() - older_than)
+        ).rowcount
+
+    def start(self, workers=JOB_WORKERS):
+        """Run jobs in a pool of daemon threads (once; later calls return the running pool)"""
+        with self._start_lock:
+            if self._workers:
+                return self._workers
+
+            def run():
+                while not self._stop_workers.is_set():
+                    try:
+                        if self.run_one():
+                            continue
+                        if time.time() - self._pruned_at > 3600:
+                            self._pruned_at = time.time()
+                            self.prune()
+                    except Exception as e:
+                        logger.error(f"Error in job worker: {str(e)}")
+                    self._wake.wait(JOB_POLL_SECONDS)
+                    self._wake.clear()
+
+            for index in range(workers):
+                worker = threading.Thread(target=run, name=f"job-worker-{index}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            return self._workers
+
+    def stop(self):
+        """Stop the workers after the jobs they are running"""
+        self._stop_workers.set()
+        self._wake.set()
+        for worker in self._workers:
+            worker.join(timeout=self.lease_seconds)
+
+    def depth(self):
+        """Jobs waiting to run or running"""
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (PENDING, RUNNING)
+        ).fetchone()[0]
+
+    def dead_letters(self, limit=100):
+        """
+        Jobs that used up their attempts, newest first
+
+        Returns:
+            List of dicts with id, key, kind, payload, attempts, last_error and updated_at
+        """
+        rows = self._connect().execute(
+            "SELECT id, key, kind, payload, attempts, last_error, updated_at FROM jobs "
+            "WHERE status = ? ORDER BY updated_at DESC LIMIT ?",
+            (DEAD, limit)
+        ).fetchall()
+        return [
+            {'id': job_id, 'key': key, 'kind': kind, 'payload': json.loads(payload),
+             'attempts': attempts, 'last_error': last_error, 'updated_at': updated_at}
+            for job_id, key, kind, payload, attempts, last_error, updated_at in rows
+        ]
+
+    def retry_dead(self, job_id):
+        """
+        Give a dead-lettered job a fresh set of attempts
+
+        Returns:
+            True if the job was requeued
+        """
+        now = time.time()
+        requeued = self._connect().execute(
+            "UPDATE jobs SET status = ?, attempts = 0, run_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (PENDING, now, now, job_id, DEAD)
+        ).rowcount == 1
+        if requeued:
+            self._wake.set()
+        return requeued
+
+    def stats(self):
+        """Get job counts by status and queue counters"""
+        with self._counter_lock:
+            stats = dict(self.counters)
+        stats['jobs'] = dict(self._connect().execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ).fetchall())
+        stats['workers'] = len(self._workers)
+        return stats
@@ -0,0 +1,337 @@
+"""
+Media Stream Module for Clinic Voice AI
+
+This module handles phone calls over Twilio bidirectional media streams:
+1. Receiving the caller's 8 kHz mu-law audio frames over a WebSocket
+2. Detecting the end of each caller turn from trailing silence (energy-based)
+3. Transcribing the turn, running the conversation, and synthesizing the reply
+4. Sending the reply back as mu-law frames on the same connection, with a
+   mark so playback completion is known
+5. Barge-in: when the caller talks over a reply, Twilio is told to clear
+   the audio it has not played yet
+
+Compared with Gather webhooks, a turn costs no TwiML round trip, no audio
+fetch by Twilio, and no speech_timeout wait beyond MEDIA_ENDPOINT_SILENCE_MS.
+
+The protocol handling is framework-neutral: MediaStreamCall takes the
+messages received and an async send callable (asgi_app serves it at
+/twilio/media-stream). See benchmarks/bench_media_stream.py for a client
+that replays recorded call audio against it.
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+from metrics import metrics
+from phrase_bank import encode_wav
+from speech_recognition import transcribe_audio
+from transcoder import ulaw_decode, TELEPHONY_SAMPLE_RATE
+from twilio_integration import call_sessions, run_call_turn, start_call_session, GREETING
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Turn detection on caller audio
+MEDIA_SPEECH_RMS = int(os.getenv('MEDIA_SPEECH_RMS', 500))
+MEDIA_ENDPOINT_SILENCE_MS = int(os.getenv('MEDIA_ENDPOINT_SILENCE_MS', 400))
+MEDIA_MIN_SPEECH_MS = int(os.getenv('MEDIA_MIN_SPEECH_MS', 120))
+MEDIA_MAX_UTTERANCE_SECONDS = 15
+# Audio kept from before speech was detected, so the first syllable is not clipped
+MEDIA_PREROLL_MS = 200
+MEDIA_BARGE_IN = os.getenv('MEDIA_BARGE_IN', 'true').lower() == 'true'
+
+# Outbound audio is sent in frames of this length (Twilio's own frame size)
+MEDIA_FRAME_MS = 20
+MEDIA_FRAME_BYTES = TELEPHONY_SAMPLE_RATE * MEDIA_FRAME_MS // 1000
+
+# Calls with an open media stream in this process
+active_calls = set()
+metrics.gauge('media_streams_active', "Open Twilio media streams", lambda: len(active_calls))
+
+
+def frame_rms(samples):
+    """Root-mean-square level of int16 samples"""
+    if not len(samples):
+        return 0.0
+    return float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+
+
+class Endpointer:
+    """Splits a caller's audio into utterances at trailing silence"""
+
+    def __init__(self, speech_rms=MEDIA_SPEECH_RMS, silence_ms=MEDIA_ENDPOINT_SILENCE_MS,
+                 min_speech_ms=MEDIA_MIN_SPEECH_MS, max_seconds=MEDIA_MAX_UTTERANCE_SECONDS,
+                 preroll_ms=MEDIA_PREROLL_MS, sample_rate=TELEPHONY_SAMPLE_RATE):
+        """
+        Initialize the endpointer
+
+        Args:
+            speech_rms: Frame level (int16 RMS) counted as speech
+            silence_ms: Silence that ends an utterance
+            min_speech_ms: Continuous speech needed to start one (ignores clicks)
+            max_seconds: Longest utterance before it is cut
+            preroll_ms: Audio kept from before speech started
+            sample_rate: Sample rate of the frames fed in
+        """
+        self.speech_rms = speech_rms
+        self.silence_ms = silence_ms
+        self.min_speech_ms = min_speech_ms
+        self.max_ms = max_seconds * 1000
+        self.preroll_ms = preroll_ms
+        self.sample_rate = sample_rate
+
+        self.in_speech = False
+        self._frames = []
+        self._preroll = deque()
+        self._preroll_total = 0
+        self._voiced_ms = 0
+        self._silent_ms = 0
+        self._utterance_ms = 0
+
+    def feed(self, samples):
+        """
+        Add a frame of caller audio
+
+        Args:
+            samples: int16 samples
+
+        Returns:
+            Tuple of (event, utterance): event is 'speech_start', 'speech_end'
+            or None, and utterance holds the int16 samples on 'speech_end'
+        """
+        frame_ms = len(samples) * 1000 / self.sample_rate
+        voiced = frame_rms(samples) >= self.speech_rms
+
+        if not self.in_speech:
+            self._preroll.append((samples, frame_ms))
+            self._preroll_total += frame_ms
+            self._voiced_ms = self._voiced_ms + frame_ms if voiced else 0
+            if self._voiced_ms < self.min_speech_ms:
+                while len(self._preroll) > 1 and self._preroll_total - self._preroll[0][1] >= self.preroll_ms + self._voiced_ms:
+                    self._preroll_total -= self._preroll.popleft()[1]
+                return None, None
+
+            self.in_speech = True
+            self._frames = [frame for frame, _ in self._preroll]
+            self._utterance_ms = self._preroll_total
+            self._silent_ms = 0
+            self._preroll.clear()
+            self._preroll_total = 0
+            return 'speech_start', None
+
+        self._frames.append(samples)
+        self._utterance_ms += frame_ms
+        self._silent_ms = 0 if voiced else self._silent_ms + frame_ms
+        if self._silent_ms < self.silence_ms and self._utterance_ms < self.max_ms:
+            return None, None
+
+        utterance = np.concatenate(self._frames)
+        self.in_speech = False
+        self._frames = []
+        self._voiced_ms = 0
+        return 'speech_end', utterance
+
+
+def transcribe_utterance(samples, sample_rate=TELEPHONY_SAMPLE_RATE):
+    """
+    Transcribe a caller utterance with Whisper
+
+    Args:
+        samples: int16 samples
+        sample_rate: Their sample rate
+
+    Returns:
+        Transcribed text ("" on error)
+    """
+    return transcribe_audio(encode_wav(samples, sample_rate), "wav")
+
+
+class MediaStreamCall:
+    """One call's media stream: turn detection, conversation turns and reply playback"""
+
+    def __init__(self, send, run_blocking, respond, synthesize, transcribe=transcribe_utterance,
+                 barge_in=MEDIA_BARGE_IN, endpointer=None):
+        """
+        Initialize the call (nothing is sent before Twilio's start message)
+
+        Args:
+            send: Async callable sending one text message on the WebSocket
+            run_blocking: Async callable running a blocking function off the event loop
+            respond: Conversation handler (session_id, transcript, session) -> dict with text and next_state
+            synthesize: Callable text -> 8 kHz mu-law bytes (None if synthesis failed)
+            transcribe: Callable (int16 samples, sample rate) -> text
+            barge_in: Clear unplayed reply audio when the caller starts talking
+            endpointer: Endpointer for the caller's audio
+        """
+        self.send = send
+        self.run_blocking = run_blocking
+        self.respond = respond
+        self.synthesize = synthesize
+        self.transcribe = transcribe
+        self.barge_in = barge_in
+        self.endpointer = endpointer or Endpointer()
+
+        self.stream_sid = None
+        self.call_sid = None
+        self.finished = False
+        self._marks = set()
+        self._mark_count = 0
+        self._hangup_mark = None
+        self._turn_lock = asyncio.Lock()
+        self._tasks = set()
+
+        self.counters = {
+            'turns': 0,
+            'empty_transcripts': 0,
+            'barge_ins': 0,
+            'frames_received': 0,
+            'frames_sent': 0
+        }
+
+    async def handle(self, message):
+        """
+        Handle one message from Twilio
+
+        Args:
+            message: Decoded JSON message (connected, start, media, mark, stop)
+
+        Returns:
+            False once the call is over and the connection should be closed
+        """
+        event = message.get('event')
+
+        if event == 'start':
+            start = message['start']
+            self.stream_sid = message.get('streamSid') or start.get('streamSid')
+            self.call_sid = start.get('callSid')
+            logger.info(f"Media stream {self.stream_sid} started for call {self.call_sid}")
+            active_calls.add(self)
+            self._spawn(self.greet(start.get('customParameters') or {}))
+
+        elif event == 'media':
+            if message['media'].get('track', 'inbound') == 'inbound':
+                self.counters['frames_received'] += 1
+                samples = ulaw_decode(base64.b64decode(message['media']['payload']))
+                await self.on_caller_audio(samples)
+
+        elif event == 'mark':
+            name = message['mark']['name']
+            self._marks.discard(name)
+            if name == self._hangup_mark:
+                self.finished = True
+
+        elif event == 'stop':
+            logger.info(f"Media stream {self.stream_sid} stopped")
+            self.finished = True
+
+        return not self.finished
+
+    async def on_caller_audio(self, samples):
+        """Feed caller audio to the endpointer, handling barge-in and finished turns"""
+        event, utterance = self.endpointer.feed(samples)
+        if event == 'speech_start' and self.barge_in and self._marks:
+            await self.clear()
+        elif event == 'speech_end':
+            self._spawn(self.run_turn(utterance, time.perf_counter()))
+
+    async def greet(self, parameters):
+        """Play the greeting, creating the call session if /twilio/voice did not"""
+        try:
+            session = await self.run_blocking(call_sessions.get, self.call_sid)
+            if session is None:
+                session = await self.run_blocking(start_call_session, self.call_sid, parameters.get('from'))
+            greeting = next((turn['text'] for turn in reversed(session['conversation']) if turn['role'] == 'system'), GREETING)
+            await self.play(await self.run_blocking(self.synthesize, greeting))
+        except Exception as e:
+            logger.error(f"Error greeting call {self.call_sid}: {str(e)}")
+
+    async def run_turn(self, utterance, ended_at):
+        """
+        Transcribe an utterance, run the conversation turn and play the reply
+
+        Args:
+            utterance: Caller's int16 samples
+            ended_at: perf_counter time the end of the utterance was detected
+        """
+        async with self._turn_lock:
+            with metrics.turn('media_stream_turn'):
+                try:
+                    with metrics.span('media_stream_stt'):
+                        transcript = (await self.run_blocking(self.transcribe, utterance, TELEPHONY_SAMPLE_RATE) or '').strip()
+                    if not transcript:
+                        self.counters['empty_transcripts'] += 1
+                        return
+
+                    result = await self.run_blocking(run_call_turn, self.call_sid, transcript, self.respond)
+                    if result is None:
+                        self.finished = True
+                        return
+                    self.counters['turns'] += 1
+
+                    with metrics.span('media_stream_tts'):
+                        audio = await self.run_blocking(self.synthesize, result['text'])
+                    mark = await self.play(audio)
+                    metrics.observe('media_stream_first_audio', time.perf_counter() - ended_at)
+
+                    if result['next_state'] == 'end_call':
+                        # Hang up once Twilio reports the goodbye has played
+                        if mark:
+                            self._hangup_mark = mark
+                        else:
+                            self.finished = True
+                except Exception as e:
+                    logger.error(f"Error in media stream turn for call {self.call_sid}: {str(e)}")
+
+    async def play(self, audio):
+        """
+        Send mu-law audio to the caller, followed by a mark
+
+        Args:
+            audio: 8 kHz mu-law bytes (None or empty sends nothing)
+
+        Returns:
+            Name of the mark Twilio echoes when playback reaches the end, or None
+        """
+        if not audio:
+            logger.warning(f"No reply audio for call {self.call_sid}")
+            return None
+
+        for start in range(0, len(audio), MEDIA_FRAME_BYTES):
+            payload = base64.b64encode(audio[start:start + MEDIA_FRAME_BYTES]).decode('ascii')
+            await self.send(json.dumps({'event': 'media', 'streamSid': self.stream_sid, 'media': {'payload': payload}}))
+            self.counters['frames_sent'] += 1
+
+        self._mark_count += 1
+        mark = f"reply-{self._mark_count}"
+        self._marks.add(mark)
+        await self.send(json.dumps({'event': 'mark', 'streamSid': self.stream_sid, 'mark': {'name': mark}}))
+        return mark
+
+    async def clear(self):
+        """Drop reply audio Twilio has buffered but not played (the caller barged in)"""
+        self.counters['barge_ins'] += 1
+        self._marks.clear()
+        await self.send(json.dumps({'event': 'clear', 'streamSid': self.stream_sid}))
+
+    def _spawn(self, coroutine):
+        """Run a coroutine for this call, keeping a reference until it finishes"""
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def close(self):
+        """Cancel turns still running (the connection closed)"""
+        active_calls.discard(self)
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,411 @@
+"""
+Phrase Bank Module for Clinic Voice AI
+
+This module handles stitched synthesis of templated responses:
+1. Pre-rendering the static parts of response templates (and fillers) to PCM
+2. Synthesizing only the variable slots of a response at runtime, all at
+   once, with adjacent slots merged into one request
+3. Joining the pieces with short crossfades and streaming them as WAV as
+   soon as the first segment is ready
+"""
+
+import io
+import logging
+import os
+import re
+import string
+import struct
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# PCM format requested from the TTS provider (16-bit mono)
+PHRASE_SAMPLE_RATE = 22050
+
+# Length of the crossfade between stitched segments
+CROSSFADE_MS = 12
+
+# Samples quieter than this (out of 32768) count as silence at clip edges
+SILENCE_THRESHOLD = 300
+
+# Silence kept at the edges of each clip when trimming
+EDGE_PADDING_MS = 40
+
+# Segments synthesized at once per process (slots and phrase bank misses)
+PHRASE_BANK_WORKERS = int(os.getenv('PHRASE_BANK_WORKERS', 8))
+
+# Data size written in the header of a WAV streamed before its length is known
+STREAMING_WAV_DATA_SIZE = 0x7FFFFFFF
+
+
+def split_template(template, slots, static_slot_prefix='filler'):
+    """
+    Split a response template into static and variable segments
+
+    Literal text is static. Slots whose name starts with static_slot_prefix
+    (fillers) are static too, since every filler is pre-rendered. Other slots
+    are variable. Punctuation at the start of a segment is moved to the end of
+    the preceding one so it is spoken with the right intonation.
+
+    Args:
+        template: str.format template, e.g. "Thanks, {name}! ..."
+        slots: Values for the template fields
+        static_slot_prefix: Prefix of slot names whose values are pre-rendered
+
+    Returns:
+        List of (text, is_static) tuples
+    """
+    segments = []
+
+    for literal, field_name, _, _ in string.Formatter().parse(template):
+        for text, is_static in [(literal, True), (str(slots.get(field_name, '')) if field_name else '', None)]:
+            text = text.strip()
+            if not text:
+                continue
+            if is_static is None:
+                is_static = field_name.startswith(static_slot_prefix)
+            # Leading punctuation belongs to the end of the previous segment
+            punctuation = re.match(r'[.,!?;:]*', text).group(0)
+            if segments and punctuation:
+                previous_text, previous_static = segments[-1]
+                segments[-1] = (f"{previous_text}{punctuation}", previous_static)
+                text = text[len(punctuation):].strip()
+                if not text:
+                    continue
+            segments.append((text, is_static))
+
+    return segments
+
+
+def template_static_phrases(template, static_slot_prefix='filler'):
+    """Get the static literal segments of a template (for pre-rendering)"""
+    placeholder_slots = {}
+    for _, field_name, _, _ in string.Formatter().parse(template):
+        if field_name and not field_name.startswith(static_slot_prefix):
+            placeholder_slots[field_name] = f"{{{field_name}}}"
+
+    return [
+        text for text, is_static in split_template(template, placeholder_slots, static_slot_prefix)
+        if is_static
+    ]
+
+
+def merge_variable_segments(segments):
+    """Join adjacent variable segments so they are synthesized in one request"""
+    merged = []
+    for text, is_static in segments:
+        if merged and not is_static and not merged[-1][1]:
+            merged[-1] = (f"{merged[-1][0]} {text}", False)
+        else:
+            merged.append((text, is_static))
+    return merged
+
+
+def pcm_to_array(pcm_bytes):
+    """Convert 16-bit little-endian PCM bytes to a float32 array"""
+    return np.frombuffer(pcm_bytes, dtype='<i2').astype(np.float32)
+
+
+def trim_silence(samples, sample_rate, threshold=SILENCE_THRESHOLD, padding_ms=EDGE_PADDING_MS):
+    """Trim leading and trailing silence from a clip, keeping a little padding"""
+    loud = np.flatnonzero(np.abs(samples) > threshold)
+    if loud.size == 0:
+        return samples[:0]
+
+    padding = int(sample_rate * padding_ms / 1000)
+    start = max(loud[0] - padding, 0)
+    end = min(loud[-1] + 1 + padding, samples.size)
+    return samples[start:end]
+
+
+def iter_crossfade(clips, fade_samples):
+    """
+    Join clips as they arrive, overlapping each boundary with a linear crossfade
+
+    The end of each clip is held back until the next one arrives, since the
+    crossfade mixes it with the next clip's start.
+
+    Args:
+        clips: Iterable of float32 sample arrays
+        fade_samples: Crossfade length in samples
+
+    Yields:
+        float32 arrays of the joined audio, in order
+    """
+    held = None
+    for clip in clips:
+        if not clip.size:
+            continue
+        if held is None:
+            joined = clip
+        else:
+            # Overlap at each boundary is limited by the shorter neighbouring clip
+            overlap = min(fade_samples, held.size, clip.size)
+            ramp = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+            mixed = held[held.size - overlap:] * (1.0 - ramp) + clip[:overlap] * ramp
+            joined = np.concatenate([held[:held.size - overlap], mixed, clip[overlap:]])
+
+        keep = min(fade_samples, clip.size)
+        if joined.size > keep:
+            yield joined[:joined.size - keep]
+        held = joined[joined.size - keep:]
+
+    if held is not None and held.size:
+        yield held
+
+
+def crossfade_concat(clips, fade_samples):
+    """
+    Concatenate clips, overlapping each boundary with a linear crossfade
+
+    Args:
+        clips: List of float32 sample arrays
+        fade_samples: Crossfade length in samples
+
+    Returns:
+        float32 array of the joined audio
+    """
+    parts = list(iter_crossfade(clips, fade_samples))
+    if not parts:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(parts).astype(np.float32, copy=False)
+
+
+def to_pcm16(samples):
+    """Convert float32 samples to 16-bit little-endian PCM bytes"""
+    return np.clip(np.rint(samples), -32768, 32767).astype('<i2').tobytes()
+
+
+def encode_wav(samples, sample_rate):
+    """Encode float32 samples as 16-bit mono WAV bytes"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(to_pcm16(samples))
+    return buffer.getvalue()
+
+
+def wav_header(sample_rate, data_size=STREAMING_WAV_DATA_SIZE):
+    """
+    Header of a 16-bit mono WAV file
+
+    Args:
+        sample_rate: Sample rate of the audio
+        data_size: Bytes of PCM that follow (a placeholder while streaming)
+
+    Returns:
+        44 header bytes
+    """
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', min(36 + data_size, 0xFFFFFFFF), b'WAVE',
+        b'fmt ', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b'data', data_size
+    )
+
+
+def finalize_wav(audio):
+    """Write the real sizes into the header of a WAV streamed by PhraseBank.stream"""
+    sample_rate = struct.unpack_from('<I', audio, 24)[0]
+    return wav_header(sample_rate, len(audio) - 44) + bytes(audio[44:])
+
+
+class PhraseBank:
+    """Pre-rendered PCM phrases plus runtime stitching of templated responses"""
+
+    def __init__(self, synthesize_pcm, sample_rate=PHRASE_SAMPLE_RATE, crossfade_ms=CROSSFADE_MS,
+                 workers=PHRASE_BANK_WORKERS):
+        """
+        Initialize the phrase bank
+
+        Args:
+            synthesize_pcm: Callable (text, emotion) -> 16-bit PCM bytes or None
+            sample_rate: Sample rate of the PCM returned by synthesize_pcm
+            crossfade_ms: Crossfade length between segments
+            workers: Segments synthesized at once
+        """
+        self.synthesize_pcm = synthesize_pcm
+        self.sample_rate = sample_rate
+        self.fade_samples = int(sample_rate * crossfade_ms / 1000)
+        self.workers = workers
+
+        self._phrases = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+        self.counters = {
+            'prerendered': 0,
+            'renders': 0,
+            'bank_hits': 0,
+            'bank_misses': 0,
+            'total_chars': 0,
+            'synthesized_chars': 0
+        }
+
+    def _synthesize(self, text, emotion):
+        """Synthesize one segment to trimmed float32 samples"""
+        pcm = self.synthesize_pcm(text, emotion)
+        if not pcm:
+            raise RuntimeError(f"No audio synthesized for segment: {text!r}")
+        return trim_silence(pcm_to_array(pcm), self.sample_rate)
+
+    def prerender(self, phrases, emotion):
+        """
+        Render phrases into the bank
+
+        Args:
+            phrases: Iterable of phrase texts
+            emotion: Emotional tone to render them with
+
+        Returns:
+            Number of phrases rendered
+        """
+        rendered = 0
+        for text in dict.fromkeys(phrase.strip() for phrase in phrases):
+            if not text or (text, emotion) in self._phrases:
+                continue
+            try:
+                samples = self._synthesize(text, emotion)
+            except Exception as e:
+                logger.error(f"Error pre-rendering phrase {text!r}: {str(e)}")
+                continue
+            with self._lock:
+                self._phrases[(text, emotion)] = samples
+                self.counters['prerendered'] += 1
+            rendered += 1
+
+        logger.info(f"Phrase bank pre-rendered {rendered} phrases for emotion '{emotion}'")
+        return rendered
+
+    def warm_up(self, phrases_by_emotion):
+        """
+        Pre-render phrases in a background thread
+
+        Args:
+            phrases_by_emotion: Dictionary mapping emotion to the phrases spoken
+                with it, rendered in that order
+        """
+        plan = [(list(phrases), emotion) for emotion, phrases in phrases_by_emotion.items()]
+
+        def prerender_all():
+            for phrases, emotion in plan:
+                self.prerender(phrases, emotion)
+
+        thread = threading.Thread(target=prerender_all, name="phrase-bank-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def get_phrase(self, text, emotion):
+        """Get a static phrase from the bank, rendering and storing it on a miss"""
+        key = (text, emotion)
+        with self._lock:
+            samples = self._phrases.get(key)
+            if samples is not None:
+                self.counters['bank_hits'] += 1
+                return samples
+            self.counters['bank_misses'] += 1
+
+        samples = self._synthesize(text, emotion)
+        with self._lock:
+            self._phrases[key] = samples
+            self.counters['synthesized_chars'] += len(text)
+        return samples
+
+    def _synthesize_slot(self, text, emotion):
+        """Synthesize a variable segment (never stored in the bank)"""
+        samples = self._synthesize(text, emotion)
+        with self._lock:
+            self.counters['synthesized_chars'] += len(text)
+        return samples
+
+    def _segment_clips(self, segments, emotion):
+        """
+        Yield each segment's samples in order
+
+        Every segment that needs the TTS provider is submitted at once, so a
+        response costs one round trip rather than one per slot. Bank hits are
+        yielded without waiting for the slots after them.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='phrase-bank')
+            executor = self._executor
+
+        pending = []
+        for text, is_static in merge_variable_segments(segments):
+            if is_static:
+                with self._lock:
+                    samples = self._phrases.get((text, emotion))
+                if samples is not None:
+                    pending.append(samples)
+                    continue
+                pending.append(executor.submit(self.get_phrase, text, emotion))
+            else:
+                pending.append(executor.submit(self._synthesize_slot, text, emotion))
+
+        try:
+            for item in pending:
+                if isinstance(item, np.ndarray):
+                    with self._lock:
+                        self.counters['bank_hits'] += 1
+                    yield item
+                else:
+                    yield item.result()
+        finally:
+            for item in pending:
+                if not isinstance(item, np.ndarray):
+                    item.cancel()
+
+        with self._lock:
+            self.counters['renders'] += 1
+            self.counters['total_chars'] += sum(len(text) for text, _ in segments)
+
+    def stream(self, segments, emotion):
+        """
+        Stitch a response from its segments, yielding WAV bytes as they are ready
+
+        The header goes out first with a placeholder length (see finalize_wav),
+        then the audio of each segment as soon as it and those before it have
+        been synthesized.
+
+        Args:
+            segments: List of (text, is_static) tuples from split_template
+            emotion: Emotional tone for the voice
+
+        Yields:
+            WAV bytes
+        """
+        yield wav_header(self.sample_rate)
+        for samples in iter_crossfade(self._segment_clips(segments, emotion), self.fade_samples):
+            yield to_pcm16(samples)
+
+    def render(self, segments, emotion):
+        """
+        Stitch a response from its segments
+
+        Args:
+            segments: List of (text, is_static) tuples from split_template
+            emotion: Emotional tone for the voice
+
+        Returns:
+            WAV bytes of the full response
+        """
+        return finalize_wav(b''.join(self.stream(segments, emotion)))
+
+    def stats(self):
+        """Get phrase bank counters, including the share of characters synthesized at runtime"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['phrases'] = len(self._phrases)
+        stats['synthesized_ratio'] = (
+            stats['synthesized_chars'] / stats['total_chars'] if stats['total_chars'] else 0.0
+        )
+        return stats
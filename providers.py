@@ -0,0 +1,129 @@
+"""
+Providers Module for Clinic Voice AI
+
+This module handles lazy loading of provider SDKs and clients (OpenAI,
+Twilio, Google APIs):
+1. A registry of named factories, each run once on first use
+2. Thread-safe loading, so concurrent first requests build a client once
+3. An optional warm-up that loads providers ahead of the first request
+   (PROVIDER_WARMUP=all, or a comma-separated list of names)
+4. Load timings, recorded as provider_load metrics
+
+Importing a service module therefore costs no SDK import or client
+construction; a worker boots fast and pays for each provider on first use
+(or during warm-up, off the request path).
+"""
+
+import logging
+import os
+import threading
+import time
+from metrics import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Providers to load ahead of the first request: "", "all" or "openai,twilio"
+PROVIDER_WARMUP = os.getenv('PROVIDER_WARMUP', '')
+
+
+class ProviderRegistry:
+    """Named factories whose results are built on first use and kept"""
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._load_seconds = {}
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    def register(self, name, factory):
+        """
+        Register how to build a provider (nothing is built yet)
+
+        Args:
+            name: Provider name
+            factory: Callable with no arguments returning the client or module
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """
+        Get a provider, building it on first use
+
+        Raises:
+            KeyError: No factory is registered under name
+            Exception: Whatever the factory raised (the next call tries again)
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                start = time.perf_counter()
+                instance = self._factories[name]()
+                seconds = time.perf_counter() - start
+                self._load_seconds[name] = seconds
+                metrics.observe('provider_load', seconds, state=name)
+                logger.info(f"Loaded provider '{name}' in {seconds * 1000:.0f} ms")
+                self._instances[name] = instance
+        return instance
+
+    def loaded(self, name):
+        """Whether a provider has been built"""
+        return name in self._instances
+
+    def warm_up(self, names=None):
+        """
+        Build providers now instead of on first use
+
+        Args:
+            names: Provider names (defaults to every registered provider)
+
+        Returns:
+            Dict of name -> True if loaded, False if its factory failed
+        """
+        results = {}
+        for name in names if names is not None else list(self._factories):
+            try:
+                self.get(name)
+                results[name] = True
+            except Exception as e:
+                logger.error(f"Error warming up provider '{name}': {str(e)}")
+                results[name] = False
+        return results
+
+    def warm_up_in_background(self, setting=PROVIDER_WARMUP):
+        """
+        Start warm_up in a daemon thread, as PROVIDER_WARMUP asks
+
+        Call it once the app's modules have registered their providers (e.g.
+        in a gunicorn post_fork hook or a before_serving handler).
+
+        Returns:
+            The thread, or None if warm-up is off
+        """
+        setting = setting.strip()
+        if not setting:
+            return None
+        names = None if setting == 'all' else [name.strip() for name in setting.split(',') if name.strip()]
+        thread = threading.Thread(target=self.warm_up, args=(names,), name="provider-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        """Get registered providers and load times of the built ones"""
+        return {
+            name: {'loaded': name in self._instances,
+                   'load_ms': round(self._load_seconds[name] * 1000, 1) if name in self._load_seconds else None}
+            for name in self._factories
+        }
+
+
+# Shared registry for the whole process
+providers = ProviderRegistry()
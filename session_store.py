@@ -0,0 +1,391 @@
+"""
+Session Store Module for Clinic Voice AI
+
+This module handles storage of call and web sessions:
+1. A dict-like session store interface shared by the web app and Twilio routes
+2. An in-memory LRU + TTL backend for single-process deployments
+3. A SQLite backend so gunicorn workers on one host share sessions
+4. JSON serialization that keeps sets (mentioned_topics) and datetimes
+5. A background sweeper that expires idle sessions, with eviction metrics
+
+Sessions are plain dicts. Changes to a session are only persisted when it is
+stored again (store[session_id] = session), so handlers load a session,
+update it and write it back.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Store configuration
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory')
+SESSION_TTL_SECONDS = int(os.getenv('SESSION_TTL_SECONDS', 2 * 60 * 60))
+SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', 10000))
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', os.path.join('.cache', 'sessions.db'))
+SESSION_SWEEP_INTERVAL = int(os.getenv('SESSION_SWEEP_INTERVAL', 60))
+
+
+def _encode_value(value):
+    """JSON default hook for the non-JSON types sessions contain"""
+    if isinstance(value, (set, frozenset)):
+        return {'__set__': sorted(value, key=str)}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    raise TypeError(f"Cannot serialize {type(value).__name__} in a session")
+
+
+def _decode_value(obj):
+    """JSON object hook reversing _encode_value"""
+    if len(obj) == 1:
+        if '__set__' in obj:
+            return set(obj['__set__'])
+        if '__datetime__' in obj:
+            return datetime.fromisoformat(obj['__datetime__'])
+        if '__date__' in obj:
+            return date.fromisoformat(obj['__date__'])
+    return obj
+
+
+def serialize_session(session):
+    """Serialize a session dict to a JSON string"""
+    return json.dumps(session, default=_encode_value, separators=(',', ':'))
+
+
+def deserialize_session(data):
+    """Deserialize a session stored by serialize_session"""
+    return json.loads(data, object_hook=_decode_value)
+
+
+class SessionStore:
+    """
+    Base class for session stores
+
+    Subclasses implement get, exists, set, delete, sweep and __len__. The
+    dict-style methods let the store replace the module-level sessions dicts.
+    """
+
+    # Whether every worker process sees the same sessions
+    shared = False
+
+    def __init__(self, ttl_seconds=SESSION_TTL_SECONDS, max_sessions=SESSION_MAX_SESSIONS):
+        """
+        Initialize the store
+
+        Args:
+            ttl_seconds: Idle time after which a session expires
+            max_sessions: Cap on stored sessions; least recently used are evicted first
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sweeper = None
+        self._stop_sweeper = threading.Event()
+        self._counter_lock = threading.Lock()
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'deletes': 0,
+            'expired': 0,
+            'evicted': 0,
+            'sweeps': 0
+        }
+
+    def _count(self, name, amount=1):
+        """Increment a counter"""
+        with self._counter_lock:
+            self.counters[name] += amount
+
+    def get(self, session_id, default=None):
+        """Get a session, or default if it is unknown or expired"""
+        raise NotImplementedError
+
+    def exists(self, session_id):
+        """Check that a session is stored and unexpired, without counting a lookup or resetting its idle timer"""
+        raise NotImplementedError
+
+    def set(self, session_id, session):
+        """Store a session and reset its idle timer"""
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """Remove a session if present"""
+        raise NotImplementedError
+
+    def sweep(self):
+        """
+        Remove expired sessions and enforce max_sessions
+
+        Returns:
+            Number of sessions removed
+        """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __getitem__(self, session_id):
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def __setitem__(self, session_id, session):
+        self.set(session_id, session)
+
+    def __delitem__(self, session_id):
+        self.delete(session_id)
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def start_sweeper(self, interval=SESSION_SWEEP_INTERVAL):
+        """Sweep expired sessions every interval seconds in a daemon thread"""
+        if self._sweeper is not None:
+            return self._sweeper
+
+        def run():
+            while not self._stop_sweeper.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"Error sweeping sessions: {str(e)}")
+
+        self._sweeper = threading.Thread(target=run, name=f"session-sweeper-{type(self).__name__}", daemon=True)
+        self._sweeper.start()
+        return self._sweeper
+
+    def stop_sweeper(self):
+        """Stop the background sweeper"""
+        self._stop_sweeper.set()
+
+    def stats(self):
+        """Get session counts and hit/eviction counters"""
+        with self._counter_lock:
+            stats = dict(self.counters)
+        stats['sessions'] = len(self)
+        stats['backend'] = type(self).__name__
+        stats['ttl_seconds'] = self.ttl_seconds
+        return stats
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store with LRU eviction and idle TTL"""
+
+    def __init__(self, ttl_seconds=SESSION_TTL_SECONDS, max_sessions=SESSION_MAX_SESSIONS):
+        super().__init__(ttl_seconds, max_sessions)
+        # session_id -> (session, last_used), least recently used first
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and now - entry[1] > self.ttl_seconds:
+                del self._sessions[session_id]
+                self._count('expired')
+                entry = None
+            if entry is None:
+                self._count('misses')
+                return default
+            self._sessions[session_id] = (entry[0], now)
+            self._sessions.move_to_end(session_id)
+        self._count('hits')
+        return entry[0]
+
+    def exists(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        return entry is not None and time.time() - entry[1] <= self.ttl_seconds
+
+    def set(self, session_id, session):
+        with self._lock:
+            self._sessions[session_id] = (session, time.time())
+            self._sessions.move_to_end(session_id)
+            evicted = 0
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                evicted += 1
+        self._count('writes')
+        if evicted:
+            self._count('evicted', evicted)
+
+    def delete(self, session_id):
+        with self._lock:
+            if self._sessions.pop(session_id, None) is not None:
+                self._count('deletes')
+
+    def sweep(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            # Entries are in last-used order, so expired ones are at the front
+            expired = 0
+            while self._sessions:
+                session_id, (_, last_used) = next(iter(self._sessions.items()))
+                if last_used >= cutoff:
+                    break
+                del self._sessions[session_id]
+                expired += 1
+        self._count('sweeps')
+        if expired:
+            self._count('expired', expired)
+            logger.info(f"Expired {expired} idle sessions")
+        return expired
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Store backed by a SQLite file, shared by every worker process on the host
+
+    Sessions from different apps (web demo, Twilio calls) share one database
+    and are kept apart by namespace.
+    """
+
+    shared = True
+
+    def __init__(self, path=SESSION_DB_PATH, namespace='default',
+                 ttl_seconds=SESSION_TTL_SECONDS, max_sessions=SESSION_MAX_SESSIONS):
+        """
+        Initialize the store
+
+        Args:
+            path: SQLite database file
+            namespace: Name separating this store's sessions from others in the file
+            ttl_seconds: Idle time after which a session expires
+            max_sessions: Cap on stored sessions in this namespace
+        """
+        super().__init__(ttl_seconds, max_sessions)
+        self.path = path
+        self.namespace = namespace
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "namespace TEXT NOT NULL, session_id TEXT NOT NULL, data TEXT NOT NULL, "
+                "updated_at REAL NOT NULL, PRIMARY KEY (namespace, session_id))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (namespace, updated_at)")
+
+    def _connect(self):
+        """Per-thread connection (sqlite3 connections are not shared across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            # WAL lets readers in other workers proceed while one worker writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id, default=None):
+        cutoff = time.time() - self.ttl_seconds
+        row = self._connect().execute(
+            "SELECT data FROM sessions WHERE namespace = ? AND session_id = ? AND updated_at >= ?",
+            (self.namespace, session_id, cutoff)
+        ).fetchone()
+        if row is None:
+            self._count('misses')
+            return default
+        self._count('hits')
+        return deserialize_session(row[0])
+
+    def exists(self, session_id):
+        cutoff = time.time() - self.ttl_seconds
+        return self._connect().execute(
+            "SELECT 1 FROM sessions WHERE namespace = ? AND session_id = ? AND updated_at >= ?",
+            (self.namespace, session_id, cutoff)
+        ).fetchone() is not None
+
+    def set(self, session_id, session):
+        data = serialize_session(session)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (namespace, session_id, data, updated_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, session_id, data, time.time())
+            )
+        self._count('writes')
+
+    def delete(self, session_id):
+        with self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM sessions WHERE namespace = ? AND session_id = ?",
+                (self.namespace, session_id)
+            ).rowcount
+        if deleted:
+            self._count('deletes')
+
+    def sweep(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._connect() as conn:
+            expired = conn.execute(
+                "DELETE FROM sessions WHERE namespace = ? AND updated_at < ?",
+                (self.namespace, cutoff)
+            ).rowcount
+            evicted = conn.execute(
+                "DELETE FROM sessions WHERE namespace = ? AND session_id IN ("
+                "SELECT session_id FROM sessions WHERE namespace = ? "
+                "ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.namespace, self.namespace, self.max_sessions)
+            ).rowcount
+        self._count('sweeps')
+        if expired:
+            self._count('expired', expired)
+        if evicted:
+            self._count('evicted', evicted)
+        if expired or evicted:
+            logger.info(f"Removed {expired} expired and {evicted} excess sessions from '{self.namespace}'")
+        return expired + evicted
+
+    def __len__(self):
+        cutoff = time.time() - self.ttl_seconds
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM sessions WHERE namespace = ? AND updated_at >= ?",
+            (self.namespace, cutoff)
+        ).fetchone()[0]
+
+
+def create_session_store(namespace, backend=None, sweep=True):
+    """
+    Create the session store configured by SESSION_STORE
+
+    Args:
+        namespace: Name of the app using the store (keeps SQLite sessions apart)
+        backend: 'memory' or 'sqlite' (defaults to SESSION_STORE)
+        sweep: Start the background sweeper
+
+    Returns:
+        SessionStore instance
+    """
+    backend = (backend or SESSION_STORE).lower()
+    if backend == 'sqlite':
+        store = SQLiteSessionStore(namespace=namespace)
+    elif backend == 'memory':
+        store = MemorySessionStore()
+    else:
+        raise ValueError(f"Unknown session store backend: {backend}")
+
+    if sweep:
+        store.start_sweeper()
+
+    logger.info(f"Using {type(store).__name__} for '{namespace}' sessions")
+    return store
@@ -0,0 +1,344 @@
+"""
+Sheets Writer Module for Clinic Voice AI
+
+This module handles write-behind logging of appointment rows to Google Sheets:
+1. Journaling each row to a local append-only file before the call moves on
+2. Flushing rows to Sheets in batched appends when enough are waiting or
+   after a time limit, on a background thread
+3. Replaying unflushed rows from the journal on restart, so no booking row
+   is lost
+4. Moving a batch Sheets keeps rejecting to a dead-letter file, so it does
+   not hold up the rows behind it
+5. Queue depth and flush latency metrics
+
+Delivery is at least once: a crash between a successful append and the
+journal recording it means those rows are appended again after a restart.
+Each process locks its own journal file (the first free of journal,
+journal.1, journal.2, ...), so workers sharing a directory never replay each
+other's rows. A process also takes over the rows of journals no process
+holds any more (left behind when fewer workers come back after a restart).
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from metrics import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Writer configuration
+SHEETS_JOURNAL_PATH = os.getenv('SHEETS_JOURNAL_PATH', os.path.join('.cache', 'sheets-journal.jsonl'))
+SHEETS_BATCH_SIZE = int(os.getenv('SHEETS_BATCH_SIZE', 50))
+SHEETS_FLUSH_SECONDS = float(os.getenv('SHEETS_FLUSH_SECONDS', 5))
+
+# fsync every journaled row (a row survives power loss, not just a crash)
+SHEETS_JOURNAL_FSYNC = os.getenv('SHEETS_JOURNAL_FSYNC', 'true').lower() == 'true'
+
+# Rewrite the journal with only pending rows once it has this many lines
+SHEETS_JOURNAL_COMPACT_LINES = 1000
+
+# Journal files worker processes can claim
+SHEETS_JOURNAL_SLOTS = 32
+
+# A batch Sheets rejects this many times in a row (a 4xx other than 408/429)
+# is moved to the dead-letter file
+SHEETS_MAX_ATTEMPTS = int(os.getenv('SHEETS_MAX_ATTEMPTS', 5))
+SHEETS_DEAD_LETTER_PATH = os.getenv('SHEETS_DEAD_LETTER_PATH', os.path.join('.cache', 'sheets-dead-letter.jsonl'))
+
+
+def claim_journal(path, slots=SHEETS_JOURNAL_SLOTS):
+    """
+    Lock the first journal file no other process holds
+
+    Args:
+        path: Base journal path
+        slots: Journal files to try
+
+    Returns:
+        Tuple of (journal path, open lock file; keep it open to hold the lock)
+    """
+    for slot in range(slots):
+        candidate = path if slot == 0 else f"{path}.{slot}"
+        lock = open(f"{candidate}.lock", 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return candidate, lock
+        except OSError:
+            lock.close()
+    raise RuntimeError(f"All {slots} Sheets journals under {path} are in use")
+
+
+def read_journal(path):
+    """
+    Rows a journal has no flush (or dead-letter) record for
+
+    Args:
+        path: Journal file
+
+    Returns:
+        Tuple of (dict of row id to row, in journal order; number of lines)
+    """
+    rows = {}
+    lines = 0
+    if not os.path.exists(path):
+        return rows, lines
+
+    with open(path, encoding='utf-8') as journal:
+        for line in journal:
+            lines += 1
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A torn last line from a crash mid-write
+                logger.warning(f"Skipping unreadable line in {path}")
+                continue
+            if 'row' in entry:
+                rows[entry['id']] = entry['row']
+            for row_id in entry.get('flushed', []) + entry.get('dead', []):
+                rows.pop(row_id, None)
+    return rows, lines
+
+
+def is_rejected(error):
+    """Whether an append error is Sheets rejecting the request (retrying will not help)"""
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+class SheetsWriter:
+    """Journaled, batched writer of spreadsheet rows"""
+
+    def __init__(self, append_rows, journal_path=SHEETS_JOURNAL_PATH, batch_size=SHEETS_BATCH_SIZE,
+                 flush_interval=SHEETS_FLUSH_SECONDS, fsync=SHEETS_JOURNAL_FSYNC,
+                 max_attempts=SHEETS_MAX_ATTEMPTS, dead_letter_path=SHEETS_DEAD_LETTER_PATH):
+        """
+        Initialize the writer and replay rows left in the journal
+
+        Args:
+            append_rows: Callable(list of rows) appending them in one API call;
+                raises on failure
+            journal_path: Append-only journal file
+            batch_size: Rows per append; reaching it triggers a flush
+            flush_interval: Seconds a row may wait before it is flushed
+            fsync: fsync the journal after every row
+            max_attempts: Rejections in a row before a batch is dead-lettered
+            dead_letter_path: File dead-lettered rows are appended to
+        """
+        self.append_rows = append_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+
+        # (row id, row) in journal order
+        self._pending = []
+        self._journal_lines = 0
+        # Rejections in a row of the batch at the head of the queue
+        self._rejections = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_flush = threading.Event()
+        self._flush_thread = None
+
+        self.counters = {
+            'enqueued': 0,
+            'replayed': 0,
+            'adopted': 0,
+            'flushed_rows': 0,
+            'batches': 0,
+            'flush_errors': 0,
+            'dead_lettered': 0
+        }
+
+        os.makedirs(os.path.dirname(journal_path) or '.', exist_ok=True)
+        os.makedirs(os.path.dirname(dead_letter_path) or '.', exist_ok=True)
+        self.journal_path, self._journal_lock = claim_journal(journal_path)
+        self._replay()
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._adopt_orphans(journal_path)
+
+    def _replay(self):
+        """Load rows the journal has but no flush record for"""
+        rows, self._journal_lines = read_journal(self.journal_path)
+        self._pending = list(rows.items())
+        self.counters['replayed'] = len(self._pending)
+        if self._pending:
+            logger.info(f"Replaying {len(self._pending)} unflushed Sheets rows from {self.journal_path}")
+
+    def _adopt_orphans(self, path):
+        """
+        Take over the unflushed rows of journals no process holds
+
+        Each orphan's rows are copied to this journal (and synced) before the
+        orphan is emptied, so a crash in between only replays them twice.
+
+        Args:
+            path: Base journal path
+        """
+        for slot in range(SHEETS_JOURNAL_SLOTS):
+            candidate = path if slot == 0 else f"{path}.{slot}"
+            if candidate == self.journal_path or not os.path.exists(candidate) or os.path.getsize(candidate) == 0:
+                continue
+            lock = open(f"{candidate}.lock", 'a')
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Another process holds it and flushes its rows
+                lock.close()
+                continue
+            try:
+                rows, _ = read_journal(candidate)
+                if rows:
+                    with self._lock:
+                        for row_id, row in rows.items():
+                            self._write_journal({'id': row_id, 'row': row})
+                            self._pending.append((row_id, row))
+                        os.fsync(self._journal.fileno())
+                    self.counters['adopted'] += len(rows)
+                    logger.info(f"Took over {len(rows)} unflushed Sheets rows from {candidate}")
+                open(candidate, 'w').close()
+            except Exception as e:
+                logger.error(f"Error taking over Sheets journal {candidate}: {str(e)}")
+            finally:
+                lock.close()
+
+    def _write_journal(self, entry):
+        """Append one entry to the journal (caller holds the lock)"""
+        self._journal.write(json.dumps(entry) + "\n")
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._journal_lines += 1
+
+    def enqueue(self, row):
+        """
+        Journal a row and queue it for the next batch
+
+        Args:
+            row: List of cell values
+        """
+        with self._lock:
+            row_id = uuid.uuid4().hex
+            self._write_journal({'id': row_id, 'row': row})
+            self._pending.append((row_id, row))
+            self.counters['enqueued'] += 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Append every pending row to Sheets, batch_size rows per API call
+
+        Returns:
+            Number of rows flushed; rows of a failed batch stay queued, unless
+            Sheets rejected it max_attempts times in a row
+        """
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._pending[:self.batch_size]
+                if not batch:
+                    break
+
+                start = time.perf_counter()
+                try:
+                    self.append_rows([row for _, row in batch])
+                except Exception as e:
+                    self.counters['flush_errors'] += 1
+                    logger.error(f"Error flushing {len(batch)} rows to Sheets: {str(e)}")
+                    self._rejections = self._rejections + 1 if is_rejected(e) else 0
+                    if self._rejections < self.max_attempts:
+                        break
+                    self._dead_letter(batch, e)
+                    continue
+                metrics.observe('sheets_flush', time.perf_counter() - start)
+                self._rejections = 0
+
+                with self._lock:
+                    self._write_journal({'flushed': [row_id for row_id, _ in batch]})
+                    del self._pending[:len(batch)]
+                    self.counters['batches'] += 1
+                    self.counters['flushed_rows'] += len(batch)
+                flushed += len(batch)
+
+            self._compact()
+        return flushed
+
+    def _dead_letter(self, batch, error):
+        """Move a rejected batch to the dead-letter file (caller holds the flush lock)"""
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as dead_letter:
+            for row_id, row in batch:
+                dead_letter.write(json.dumps({'id': row_id, 'row': row, 'error': str(error)}) + "\n")
+            dead_letter.flush()
+            os.fsync(dead_letter.fileno())
+        with self._lock:
+            self._write_journal({'dead': [row_id for row_id, _ in batch]})
+            del self._pending[:len(batch)]
+            self.counters['dead_lettered'] += len(batch)
+        self._rejections = 0
+        logger.error(f"Moved {len(batch)} rejected Sheets rows to {self.dead_letter_path}")
+
+    def _compact(self):
+        """Rewrite a long journal with only the pending rows (caller holds the flush lock)"""
+        with self._lock:
+            if self._journal_lines < SHEETS_JOURNAL_COMPACT_LINES:
+                return
+            temp_path = f"{self.journal_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as temp:
+                for row_id, row in self._pending:
+                    temp.write(json.dumps({'id': row_id, 'row': row}) + "\n")
+                temp.flush()
+                os.fsync(temp.fileno())
+            self._journal.close()
+            os.replace(temp_path, self.journal_path)
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal_lines = len(self._pending)
+
+    def depth(self):
+        """Rows waiting to be flushed"""
+        return len(self._pending)
+
+    def start(self):
+        """Flush in a daemon thread when a batch fills up or flush_interval passes"""
+        if self._flush_thread is not None:
+            return self._flush_thread
+
+        def run():
+            while not self._stop_flush.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Error in Sheets flush loop: {str(e)}")
+
+        self._flush_thread = threading.Thread(target=run, name="sheets-writer", daemon=True)
+        self._flush_thread.start()
+        return self._flush_thread
+
+    def close(self):
+        """Stop the flush thread, flush what is left and close the journal"""
+        self._stop_flush.set()
+        self._wake.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        with self._lock:
+            self._journal.close()
+        self._journal_lock.close()
+
+    def stats(self):
+        """Get writer counters"""
+        stats = dict(self.counters)
+        stats['depth'] = self.depth()
+        return stats
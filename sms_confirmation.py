@@ -4,14 +4,17 @@ SMS Confirmation Module for Clinic Voice AI
 This module handles SMS confirmation using Twilio:
 1. Generating confirmation messages
 2. Sending SMS notifications
-3. Handling delivery status
+3. Queueing SMS through the rate-limited dispatcher (sms_dispatcher.py)
+4. Handling delivery status
 """
 
 import os
 import logging
-from twilio.rest import Client
 import json
 from datetime import datetime
+from sms_dispatcher import SMSDispatcher
+from metrics import metrics
+from providers import providers
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,12 +25,35 @@ TWILIO_ACCOUNT_SID = "YOUR_TWILIO_ACCOUNT_SID"
 TWILIO_AUTH_TOKEN = "YOUR_TWILIO_AUTH_TOKEN"
 TWILIO_PHONE_NUMBER = "YOUR_TWILIO_PHONE_NUMBER"
 
-# Initialize Twilio client
-try:
-    client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-except Exception as e:
-    logger.error(f"Error initializing Twilio client: {str(e)}")
-    client = None
+def load_twilio_client():
+    """Twilio REST client for SMS"""
+    from twilio.rest import Client
+    return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+def load_dispatcher():
+    """Rate-limited sender for confirmations and reminders sent in volume"""
+    dispatcher = SMSDispatcher(providers.get('twilio_sms'), TWILIO_PHONE_NUMBER)
+    dispatcher.start()
+    dispatcher.start_reconciler()
+    metrics.gauge('sms_queue_depth', "SMS waiting to be sent", dispatcher.depth)
+    return dispatcher
+
+# The client and dispatcher are created on first use (or by provider warm-up)
+providers.register('twilio_sms', load_twilio_client)
+providers.register('sms_dispatcher', load_dispatcher)
+
+def get_provider(name):
+    """
+    Get the Twilio client or the dispatcher, creating it on first use
+    
+    Returns:
+        The provider, or None if it could not be created
+    """
+    try:
+        return providers.get(name)
+    except Exception as e:
+        logger.error(f"Error initializing {name}: {str(e)}")
+        return None
 
 def generate_confirmation_message(appointment_data):
     """
@@ -69,6 +95,7 @@ def send_sms_confirmation(to_number, message=None, appointment_data=None):
         Tuple of (success, message_id or error)
     """
     try:
+        client = get_provider('twilio_sms')
         if not client:
             logger.error("Twilio client not initialized")
             return False, "Twilio client not initialized"
@@ -98,10 +125,43 @@ def send_sms_confirmation(to_number, message=None, appointment_data=None):
         logger.error(f"Error sending SMS: {str(e)}")
         return False, str(e)
 
+def queue_sms_confirmation(to_number, message=None, appointment_data=None):
+    """
+    Queue an SMS confirmation on the rate-limited dispatcher
+    
+    Args:
+        to_number: Recipient phone number
+        message: Optional pre-formatted message
+        appointment_data: Optional appointment data to generate message
+        
+    Returns:
+        Future resolving to the message SID, or None if it could not be queued
+    """
+    try:
+        dispatcher = get_provider('sms_dispatcher')
+        if not dispatcher:
+            logger.error("Twilio client not initialized")
+            return None
+        
+        if not message and appointment_data:
+            message = generate_confirmation_message(appointment_data)
+        elif not message:
+            logger.error("No message or appointment data provided")
+            return None
+        
+        return dispatcher.submit(to_number, message)
+        
+    except Exception as e:
+        logger.error(f"Error queueing SMS: {str(e)}")
+        return None
+
 def check_sms_status(message_sid):
     """
     Check the delivery status of an SMS
     
+    Messages sent through the dispatcher are answered from its reconciled
+    statuses; others are fetched one at a time.
+    
     Args:
         message_sid: Twilio message SID
         
@@ -109,10 +169,15 @@ def check_sms_status(message_sid):
         Message status
     """
     try:
+        client = get_provider('twilio_sms')
         if not client:
             logger.error("Twilio client not initialized")
             return "unknown"
         
+        # Don't start the dispatcher just to look up a status
+        if providers.loaded('sms_dispatcher') and providers.get('sms_dispatcher').status(message_sid):
+            return providers.get('sms_dispatcher').status(message_sid)
+        
         message = client.messages(message_sid).fetch()
         return message.status
         
@@ -0,0 +1,316 @@
+"""
+SMS Dispatcher Module for Clinic Voice AI
+
+This module handles sending SMS in volume (confirmations and reminders):
+1. A token bucket holding sends to the sender's throughput (messages per second)
+2. A bounded queue drained by a small pool of sender threads
+3. Retrying sends Twilio rejects with HTTP 429, after pausing the bucket
+4. Reconciling delivery statuses in bulk with paged list queries over the
+   send window, instead of one fetch per message
+5. Send latency and queue depth metrics
+
+The dispatcher only needs an object shaped like twilio.rest.Client
+(messages.create and messages.stream), so it runs against a local stand-in
+as well (see benchmarks/bench_sms_dispatch.py).
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone
+from metrics import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Dispatcher configuration (a long-code sender does 1 message per second,
+# toll-free and short codes more)
+SMS_RATE_PER_SECOND = float(os.getenv('SMS_RATE_PER_SECOND', 1))
+SMS_BURST = int(os.getenv('SMS_BURST', 1))
+SMS_WORKERS = int(os.getenv('SMS_WORKERS', 4))
+SMS_QUEUE_SIZE = int(os.getenv('SMS_QUEUE_SIZE', 1000))
+SMS_MAX_RETRIES = 3
+SMS_RETRY_PAUSE_SECONDS = 1.0
+
+# Status reconciliation
+SMS_RECONCILE_SECONDS = int(os.getenv('SMS_RECONCILE_SECONDS', 60))
+SMS_RECONCILE_PAGE_SIZE = 1000
+# Widen the list query window by this much on both sides (clock skew, send time vs date_sent)
+SMS_RECONCILE_SLACK = timedelta(minutes=5)
+# Messages in a final status are forgotten after this long
+SMS_TRACK_SECONDS = 24 * 60 * 60
+
+# Statuses that will not change again
+FINAL_STATUSES = {'delivered', 'undelivered', 'failed', 'canceled', 'read'}
+
+
+def _http_status(error):
+    """HTTP status of a Twilio REST error, if it has one"""
+    return getattr(error, 'status', None)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, holding at most burst"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        """Add the tokens accrued since the last update (caller holds the lock)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout=None):
+        """
+        Take one token, waiting for it if needed
+
+        Args:
+            timeout: Longest wait in seconds (None waits as long as it takes)
+
+        Returns:
+            True if a token was taken, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for seconds (after the provider pushed back)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class SMSDispatcher:
+    """Rate-limited SMS sender with bulk delivery-status reconciliation"""
+
+    def __init__(self, client, from_number, rate=SMS_RATE_PER_SECOND, burst=SMS_BURST,
+                 workers=SMS_WORKERS, queue_size=SMS_QUEUE_SIZE, max_retries=SMS_MAX_RETRIES):
+        """
+        Initialize the dispatcher (call start to begin sending)
+
+        Args:
+            client: Twilio REST client (or a stand-in with the same messages API)
+            from_number: Sender number
+            rate: Messages per second the sender may send
+            burst: Messages that may go out back to back after an idle period
+            workers: Sender threads (enough to keep rate busy at the API's latency)
+            queue_size: Messages that may wait; submit blocks briefly, then fails, beyond it
+            max_retries: Retries for a send rejected with HTTP 429
+        """
+        self.client = client
+        self.from_number = from_number
+        self.bucket = TokenBucket(rate, burst)
+        self.workers = workers
+        self.max_retries = max_retries
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        # sid -> {'to', 'status', 'sent_at', 'error_code'}
+        self.messages = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop = threading.Event()
+        self._reconciler = None
+
+        self.counters = {
+            'submitted': 0,
+            'sent': 0,
+            'send_errors': 0,
+            'rate_limited': 0,
+            'rejected_full': 0,
+            'reconciles': 0,
+            'status_changes': 0
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def submit(self, to_number, body, timeout=5):
+        """
+        Queue a message
+
+        Args:
+            to_number: Recipient number (a missing '+' is added)
+            body: Message text
+            timeout: Seconds to wait for room in a full queue
+
+        Returns:
+            Future resolving to the message SID (or raising the send error)
+        """
+        if not to_number.startswith('+'):
+            to_number = '+' + to_number
+        future = Future()
+        try:
+            self._queue.put((to_number, body, future), timeout=timeout)
+            self._count('submitted')
+        except queue.Full:
+            self._count('rejected_full')
+            future.set_exception(RuntimeError(f"SMS queue is full ({self._queue.maxsize} messages waiting)"))
+        return future
+
+    def _send(self, to_number, body):
+        """Send one message under the rate limit, retrying 429s; returns the SID"""
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                message = self.client.messages.create(body=body, from_=self.from_number, to=to_number)
+            except Exception as e:
+                if _http_status(e) != 429 or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._count('rate_limited')
+                self.bucket.pause(SMS_RETRY_PAUSE_SECONDS * attempt)
+                logger.warning(f"SMS to {to_number} rate limited; retry {attempt} of {self.max_retries}")
+                continue
+            metrics.observe('sms_send', time.perf_counter() - start)
+
+            with self._lock:
+                self.messages[message.sid] = {
+                    'to': to_number,
+                    'status': message.status,
+                    'sent_at': datetime.now(timezone.utc),
+                    'error_code': None
+                }
+                self.counters['sent'] += 1
+            return message.sid
+
+    def start(self):
+        """Start the sender threads"""
+        if self._threads:
+            return self._threads
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    to_number, body, future = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                try:
+                    future.set_result(self._send(to_number, body))
+                except Exception as e:
+                    self._count('send_errors')
+                    logger.error(f"Error sending SMS to {to_number}: {str(e)}")
+                    future.set_exception(e)
+                finally:
+                    self._queue.task_done()
+
+        for index in range(self.workers):
+            thread = threading.Thread(target=run, name=f"sms-sender-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self._threads
+
+    def drain(self):
+        """Block until every queued message has been sent or has failed"""
+        self._queue.join()
+
+    def stop(self):
+        """Stop the sender threads and the reconciler"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def reconcile(self, since=None, until=None):
+        """
+        Update tracked messages' statuses from paged list queries
+
+        Args:
+            since: Start of the send window (defaults to the oldest message
+                not yet in a final status)
+            until: End of the send window (defaults to now)
+
+        Returns:
+            Number of tracked messages whose status changed
+        """
+        with self._lock:
+            open_sent = [m['sent_at'] for m in self.messages.values() if m['status'] not in FINAL_STATUSES]
+        if since is None:
+            if not open_sent:
+                return 0
+            since = min(open_sent)
+        until = until or datetime.now(timezone.utc)
+
+        changed = 0
+        pages = self.client.messages.stream(
+            from_=self.from_number,
+            date_sent_after=since - SMS_RECONCILE_SLACK,
+            date_sent_before=until + SMS_RECONCILE_SLACK,
+            page_size=SMS_RECONCILE_PAGE_SIZE
+        )
+        for message in pages:
+            with self._lock:
+                tracked = self.messages.get(message.sid)
+                if tracked is not None and tracked['status'] != message.status:
+                    tracked['status'] = message.status
+                    tracked['error_code'] = message.error_code
+                    changed += 1
+
+        self._count('reconciles')
+        self._count('status_changes', changed)
+        self._forget_final()
+        return changed
+
+    def _forget_final(self):
+        """Drop messages that reached a final status long ago"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=SMS_TRACK_SECONDS)
+        with self._lock:
+            for sid in [sid for sid, m in self.messages.items()
+                        if m['status'] in FINAL_STATUSES and m['sent_at'] < cutoff]:
+                del self.messages[sid]
+
+    def status(self, sid):
+        """Last known status of a sent message (None if it is not tracked)"""
+        message = self.messages.get(sid)
+        return message['status'] if message else None
+
+    def start_reconciler(self, interval=SMS_RECONCILE_SECONDS):
+        """Run reconcile every interval seconds in a daemon thread"""
+        if self._reconciler is not None:
+            return self._reconciler
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    logger.error(f"Error reconciling SMS statuses: {str(e)}")
+
+        self._reconciler = threading.Thread(target=run, name="sms-reconciler", daemon=True)
+        self._reconciler.start()
+        return self._reconciler
+
+    def depth(self):
+        """Messages waiting to be sent"""
+        return self._queue.qsize()
+
+    def stats(self):
+        """Get dispatcher counters and tracked messages by status"""
+        with self._lock:
+            stats = dict(self.counters)
+            statuses = {}
+            for message in self.messages.values():
+                statuses[message['status']] = statuses.get(message['status'], 0) + 1
+        stats['statuses'] = statuses
+        stats['depth'] = self.depth()
+        return stats
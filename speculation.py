@@ -0,0 +1,300 @@
+"""
+Speculation Module for Clinic Voice AI
+
+This module handles preparing replies from partial (interim) transcripts:
+1. Running a conversation turn on a private copy of the session as soon as
+   a partial transcript arrives, while the caller is still talking
+2. Starting the reply's audio along with it (web channel)
+3. Handing the prepared reply to the final transcript when it matches, so
+   the turn only waits for whatever speculative work is still running
+4. Counting hits, misses and the latency saved
+
+A speculative turn never touches the real session: it runs on a deep copy
+that is only saved when the final transcript matches and the session has
+not moved on since. States whose turn has side effects outside the session
+(booking a slot) are not speculated. At most SPECULATION_MAX_INFLIGHT
+speculative turns run per session; further partials are coalesced into the
+newest one.
+
+Speculations live in the process that received the partials, so with
+several workers a final landing on another worker is a miss, not an error.
+"""
+
+import copy
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SPECULATION_ENABLED = os.getenv('SPECULATION_ENABLED', 'true').lower() == 'true'
+# Partials shorter than this are too unstable to be worth a turn
+SPECULATION_MIN_WORDS = int(os.getenv('SPECULATION_MIN_WORDS', 2))
+SPECULATION_WORKERS = int(os.getenv('SPECULATION_WORKERS', 4))
+# Speculative turns running at once per session; a newer partial starts right
+# away up to this, later ones wait and only the newest of them runs
+SPECULATION_MAX_INFLIGHT = int(os.getenv('SPECULATION_MAX_INFLIGHT', 2))
+# Start synthesizing the speculative reply too (a miss wastes the synthesis)
+SPECULATION_PRESTART_TTS = os.getenv('SPECULATION_PRESTART_TTS', 'true').lower() == 'true'
+# Sessions tracked at once (the oldest are dropped; callers that hang up never send a final)
+SPECULATION_MAX_SESSIONS = 1000
+# Longest a final transcript waits for a matching speculative turn still running
+SPECULATION_WAIT_SECONDS = 10
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def speculation_executor():
+    """Threads shared by all speculative turns (created on first use)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SPECULATION_WORKERS, thread_name_prefix='speculation')
+        return _executor
+
+
+def normalize_transcript(text):
+    """Lowercase words without punctuation, so a partial matches its final form"""
+    return " ".join(re.sub(r"[^\w\s']", " ", (text or "").lower()).split())
+
+
+def session_version(session):
+    """What a speculative turn depends on: a turn or interruption since changes it"""
+    return (session.get('state'), len(session.get('conversation', [])), session.get('interruption_count', 0))
+
+
+class Speculation:
+    """One speculative turn for a partial transcript"""
+
+    def __init__(self, transcript):
+        self.transcript = transcript
+        self.normalized = normalize_transcript(transcript)
+        self.version = None
+        # Index the turn's user entry gets in the session's conversation
+        self.user_turn = None
+        self.future = None
+        self.seconds = None
+
+
+class SpeculativeTurns:
+    """Replies prepared from partial transcripts, for one channel"""
+
+    def __init__(self, name, load, run, skip_states=(), min_words=SPECULATION_MIN_WORDS,
+                 max_inflight=SPECULATION_MAX_INFLIGHT, enabled=SPECULATION_ENABLED, executor=None):
+        """
+        Initialize speculation for a channel
+
+        Args:
+            name: Channel name used in metrics ('web', 'phone')
+            load: Callable key -> session (None if unknown)
+            run: Callable (key, transcript, session) -> reply; runs a whole turn
+                (audio included, if any) on the session copy it is given
+            skip_states: Conversation states that are never speculated
+            min_words: Fewest words in a partial worth speculating on
+            max_inflight: Speculative turns running at once per session
+            enabled: Turn speculation on or off
+            executor: Executor for the turns (default: speculation_executor())
+        """
+        self.name = name
+        self.load = load
+        self.run = run
+        self.skip_states = set(skip_states)
+        self.min_words = min_words
+        self.max_inflight = max_inflight
+        self.enabled = enabled
+        self.executor = executor
+        # Reentrant: a turn that finishes at once runs _finished inside _start
+        self._lock = threading.RLock()
+        # key -> {'current': newest Speculation, 'running': set of Speculations,
+        #         'pending': transcript or None, 'sequence': int or None}
+        self._entries = {}
+        self.counters = {
+            'partials': 0,
+            'started': 0,
+            'coalesced': 0,
+            'finals': 0,
+            'hits': 0,
+            'misses': 0,
+            # Why finals missed
+            'miss_no_partial': 0,
+            'miss_text_changed': 0,
+            'miss_queued': 0,
+            'miss_not_speculated': 0,
+            'miss_session_changed': 0,
+            'miss_interrupted': 0,
+            'saved_seconds': 0.0
+        }
+        metrics.gauge(f"speculation_{name}_hit_rate", f"Share of {name} final transcripts answered by a speculative turn",
+                      lambda: self.stats()['hit_rate'])
+
+    def partial(self, key, transcript, sequence=None):
+        """
+        Speculate on a partial transcript
+
+        Args:
+            key: Session ID or call SID
+            transcript: Interim transcript of the utterance so far
+            sequence: Callback sequence number, if the source has one (older ones are ignored)
+
+        Returns:
+            True if a speculative turn covers this transcript (running, queued or done)
+        """
+        normalized = normalize_transcript(transcript)
+        if not self.enabled or not key or len(normalized.split()) < self.min_words:
+            return False
+
+        with self._lock:
+            self.counters['partials'] += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                while len(self._entries) >= SPECULATION_MAX_SESSIONS:
+                    del self._entries[next(iter(self._entries))]
+                entry = self._entries[key] = {'current': None, 'running': set(), 'pending': None, 'sequence': None}
+
+            if sequence is not None:
+                if entry['sequence'] is not None and sequence <= entry['sequence']:
+                    return False
+                entry['sequence'] = sequence
+
+            current = entry['current']
+            if current is not None and current.normalized == normalized:
+                entry['pending'] = None
+                return True
+            if len(entry['running']) >= self.max_inflight:
+                entry['pending'] = transcript
+                self.counters['coalesced'] += 1
+                return True
+            self._start(key, entry, transcript)
+        return True
+
+    def _start(self, key, entry, transcript):
+        """Submit a speculative turn (called with the lock held)"""
+        speculation = Speculation(transcript)
+        entry['current'] = speculation
+        entry['pending'] = None
+        entry['running'].add(speculation)
+        self.counters['started'] += 1
+        executor = self.executor or speculation_executor()
+        speculation.future = executor.submit(self._run, key, speculation)
+        speculation.future.add_done_callback(lambda _: self._finished(key, speculation))
+
+    def _run(self, key, speculation):
+        """Run the turn on a copy of the session; returns (reply, session) or None"""
+        start = time.perf_counter()
+        session = self.load(key)
+        if session is None or session.get('state') in self.skip_states:
+            return None
+        session = copy.deepcopy(session)
+        speculation.version = session_version(session)
+        speculation.user_turn = len(session.get('conversation', []))
+
+        try:
+            with metrics.turn(f"speculate_{self.name}"):
+                reply = self.run(key, speculation.transcript, session)
+        except Exception as e:
+            logger.error(f"Error in speculative turn for {key}: {str(e)}")
+            return None
+        speculation.seconds = time.perf_counter() - start
+        return reply, session
+
+    def _finished(self, key, speculation):
+        """Start the newest partial that was waiting for a free slot"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or speculation not in entry['running']:
+                return
+            entry['running'].discard(speculation)
+            if entry['pending'] and normalize_transcript(entry['pending']) != entry['current'].normalized:
+                self._start(key, entry, entry['pending'])
+            entry['pending'] = None
+
+    def take(self, key, transcript):
+        """
+        Get the prepared reply for a final transcript
+
+        Waits for the matching speculative turn if it is still running.
+
+        Args:
+            key: Session ID or call SID
+            transcript: Final transcript
+
+        Returns:
+            Tuple of (reply, session) on a hit; the caller saves the session.
+            None on a miss (the caller runs the turn as usual).
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if not self.enabled:
+            return None
+
+        normalized = normalize_transcript(transcript)
+        speculation = entry['current'] if entry else None
+        result = None
+        waited = 0.0
+        if speculation is None:
+            miss = 'miss_no_partial'
+        elif entry['pending'] and normalize_transcript(entry['pending']) == normalized:
+            # The matching partial was still waiting for a free slot (see max_inflight)
+            miss = 'miss_queued'
+        elif speculation.normalized != normalized:
+            miss = 'miss_text_changed'
+        else:
+            wait_start = time.perf_counter()
+            try:
+                result = speculation.future.result(timeout=SPECULATION_WAIT_SECONDS)
+            except Exception as e:
+                logger.error(f"Error waiting for speculative turn for {key}: {str(e)}")
+            waited = time.perf_counter() - wait_start
+            miss = 'miss_not_speculated' if result is None else None
+
+        if result is not None:
+            current = self.load(key)
+            if current is None or session_version(current) != speculation.version:
+                result = None
+                miss = 'miss_session_changed'
+
+        with self._lock:
+            self.counters['finals'] += 1
+            if result is None:
+                self.counters['misses'] += 1
+                self.counters[miss] += 1
+                return None
+            saved = max(0.0, speculation.seconds - waited)
+            self.counters['hits'] += 1
+            self.counters['saved_seconds'] += saved
+
+        metrics.observe(f"speculation_saved_{self.name}", saved)
+        reply, session = result
+        # The turn recorded the partial's wording; keep the final's
+        conversation = session.get('conversation', [])
+        if len(conversation) > speculation.user_turn and conversation[speculation.user_turn].get('role') == 'user':
+            conversation[speculation.user_turn]['text'] = transcript
+        logger.info(f"Speculative {self.name} turn hit for {key}: saved {saved * 1000:.0f} ms")
+        return reply, session
+
+    def discard(self, key):
+        """Drop any speculation for an interrupted final, which cannot use it (counted as a miss)"""
+        with self._lock:
+            self._entries.pop(key, None)
+            if self.enabled:
+                self.counters['finals'] += 1
+                self.counters['misses'] += 1
+                self.counters['miss_interrupted'] += 1
+
+    def stats(self):
+        """Get the counters plus hit rate and saved latency per hit"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['tracked_sessions'] = len(self._entries)
+        stats['hit_rate'] = round(stats['hits'] / stats['finals'], 3) if stats['finals'] else 0.0
+        stats['saved_ms_per_hit'] = round(stats['saved_seconds'] * 1000 / stats['hits'], 1) if stats['hits'] else 0.0
+        stats['saved_seconds'] = round(stats['saved_seconds'], 3)
+        return stats
@@ -0,0 +1,184 @@
+"""
+Speech Preprocessing Module for Clinic Voice AI
+
+This module handles preparing caller audio before it is uploaded for STT:
+1. Decoding to mono 16-bit PCM (WAV, mu-law and raw PCM with NumPy; webm,
+   MP3 and the like through pydub)
+2. Downsampling to 16 kHz, the rate Whisper works at (8 kHz telephony audio
+   is left as is; upsampling would add bytes and no information)
+3. Trimming leading and trailing silence with an energy-based voice
+   activity check, vectorized over 20 ms frames
+4. Optional compression to a compact codec (FLAC, Opus or MP3 via pydub)
+5. Counting bytes and audio seconds before and after, per turn
+
+Audio that cannot be decoded is uploaded unchanged; audio with no speech
+at all is not uploaded.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from metrics import metrics
+from transcoder import decode, encode, resample
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Run the stage in transcribe_audio
+STT_PREPROCESS = os.getenv('STT_PREPROCESS', 'true').lower() == 'true'
+
+STT_SAMPLE_RATE = 16000
+# Upload format: 'wav' (16-bit PCM), or 'flac', 'opus' or 'mp3' (need pydub and ffmpeg)
+STT_UPLOAD_FORMAT = os.getenv('STT_UPLOAD_FORMAT', 'wav')
+
+# Voice activity: frames at or above this RMS (or STT_VAD_NOISE_RATIO x the
+# noise floor, if higher) count as speech
+STT_VAD_FRAME_MS = 20
+STT_VAD_RMS = int(os.getenv('STT_VAD_RMS', 300))
+STT_VAD_NOISE_RATIO = 3.0
+# Audio kept around the first and last speech frames
+STT_TRIM_PADDING_MS = int(os.getenv('STT_TRIM_PADDING_MS', 200))
+
+# File extension Whisper expects for each upload format
+UPLOAD_EXTENSIONS = {'wav': 'wav', 'flac': 'flac', 'opus': 'ogg', 'mp3': 'mp3'}
+
+
+def frame_levels(samples, frame_length):
+    """
+    RMS level of each whole frame
+
+    Args:
+        samples: int16 samples
+        frame_length: Samples per frame
+
+    Returns:
+        float32 array with one level per frame
+    """
+    count = len(samples) // frame_length
+    if not count:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.asarray(samples[:count * frame_length], dtype=np.float32).reshape(count, frame_length)
+    return np.sqrt(np.mean(frames * frames, axis=1))
+
+
+def speech_bounds(samples, sample_rate, speech_rms=STT_VAD_RMS, padding_ms=STT_TRIM_PADDING_MS,
+                  frame_ms=STT_VAD_FRAME_MS):
+    """
+    Find the span of samples that holds speech
+
+    Args:
+        samples: int16 samples
+        sample_rate: Their sample rate
+        speech_rms: Lowest frame level counted as speech
+        padding_ms: Audio kept before the first and after the last speech frame
+        frame_ms: Frame length for the level check
+
+    Returns:
+        Tuple of (start, end) sample indices, or None if no frame is speech
+    """
+    frame_length = max(1, sample_rate * frame_ms // 1000)
+    levels = frame_levels(samples, frame_length)
+    if not len(levels):
+        return None
+
+    # Noisy lines raise the bar, but never above a quarter of the loudest frame
+    noise_floor = float(np.percentile(levels, 10))
+    threshold = max(speech_rms, min(noise_floor * STT_VAD_NOISE_RATIO, float(levels.max()) / 4))
+    voiced = np.flatnonzero(levels >= threshold)
+    if not len(voiced):
+        return None
+
+    padding = sample_rate * padding_ms // 1000
+    start = max(0, voiced[0] * frame_length - padding)
+    end = min(len(samples), (voiced[-1] + 1) * frame_length + padding)
+    return int(start), int(end)
+
+
+class PreprocessStats:
+    """Bytes and audio seconds before and after preprocessing"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'turns': 0,
+            'skipped_silent': 0,
+            'passed_through': 0,
+            'bytes_in': 0,
+            'bytes_out': 0,
+            'seconds_in': 0.0,
+            'seconds_out': 0.0
+        }
+
+    def record(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counters[name] += amount
+
+    def stats(self):
+        """Get the counters plus the share of bytes and audio removed"""
+        with self._lock:
+            stats = dict(self.counters)
+        stats['bytes_saved_ratio'] = round(1 - stats['bytes_out'] / stats['bytes_in'], 3) if stats['bytes_in'] else 0.0
+        stats['seconds_trimmed'] = round(stats['seconds_in'] - stats['seconds_out'], 2)
+        return stats
+
+
+# Counters for every turn this process preprocessed
+preprocess_stats = PreprocessStats()
+
+
+def prepare_for_stt(audio_data, format="wav", upload_format=None):
+    """
+    Trim, downmix and downsample a turn for upload
+
+    Args:
+        audio_data: Encoded audio bytes
+        format: Their format ('wav', 'webm', 'mp3', 'ulaw', 'pcm_<rate>', ...)
+        upload_format: Key of UPLOAD_EXTENSIONS (default: STT_UPLOAD_FORMAT)
+
+    Returns:
+        Tuple of (audio bytes, format) to upload: the original audio if it could
+        not be decoded, or (None, None) if it holds no speech
+    """
+    start_time = time.perf_counter()
+    upload_format = upload_format or STT_UPLOAD_FORMAT
+    try:
+        samples, sample_rate = decode(bytes(audio_data), format)
+    except Exception as e:
+        logger.warning(f"Uploading {format} audio unprocessed (could not decode it: {str(e)})")
+        preprocess_stats.record(turns=1, passed_through=1, bytes_in=len(audio_data), bytes_out=len(audio_data))
+        return audio_data, format
+
+    seconds_in = len(samples) / sample_rate
+    bounds = speech_bounds(samples, sample_rate)
+    if bounds is None:
+        metrics.observe('stt_preprocess', time.perf_counter() - start_time)
+        preprocess_stats.record(turns=1, skipped_silent=1, bytes_in=len(audio_data), seconds_in=seconds_in)
+        logger.info(f"No speech in {seconds_in:.1f} s of {format} audio; not uploaded")
+        return None, None
+
+    # Trim first so only the kept audio is resampled
+    samples = samples[bounds[0]:bounds[1]]
+    if sample_rate > STT_SAMPLE_RATE:
+        samples = resample(samples, sample_rate, STT_SAMPLE_RATE)
+        sample_rate = STT_SAMPLE_RATE
+
+    try:
+        prepared = encode(samples, sample_rate, upload_format)
+        prepared_format = UPLOAD_EXTENSIONS[upload_format]
+    except Exception as e:
+        logger.error(f"Error encoding {upload_format} for STT, using WAV: {str(e)}")
+        prepared, prepared_format = encode(samples, sample_rate, 'wav'), 'wav'
+
+    seconds_out = len(samples) / sample_rate
+    metrics.observe('stt_preprocess', time.perf_counter() - start_time)
+    preprocess_stats.record(turns=1, bytes_in=len(audio_data), bytes_out=len(prepared),
+                            seconds_in=seconds_in, seconds_out=seconds_out)
+    logger.info(f"STT upload {len(audio_data) / 1024:.0f} KiB -> {len(prepared) / 1024:.0f} KiB "
+                f"({seconds_out:.1f} s of {seconds_in:.1f} s kept, {sample_rate} Hz {prepared_format})")
+    return prepared, prepared_format
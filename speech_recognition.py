@@ -5,15 +5,25 @@ This module handles speech recognition using OpenAI's Whisper API:
 1. Transcribing audio from callers
 2. Processing and cleaning transcriptions
 3. Handling different languages and accents
+4. Uploading audio straight from memory, with a chunked streaming upload
+   for long recordings
+5. Pluggable STT backends (STT_BACKEND), so a local stand-in can replace
+   Whisper in tests and benchmarks
+6. Trimming silence and downsampling turns before upload (STT_PREPROCESS,
+   see speech_preprocessing.py)
 """
 
 import os
-import tempfile
+import io
+import itertools
 import logging
-import requests
+import time
+import uuid
+from http_client import http_client
+from metrics import metrics
+from speech_preprocessing import prepare_for_stt, STT_PREPROCESS
 import json
 import base64
-from pydub import AudioSegment
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,53 +32,235 @@ logger = logging.getLogger(__name__)
 # In a production environment, this would be an environment variable
 OPENAI_API_KEY = "YOUR_OPENAI_API_KEY"
 
-def transcribe_audio(audio_data, format="wav"):
+WHISPER_URL = "https://api.openai.com/v1/audio/transcriptions"
+WHISPER_MODEL = "whisper-1"
+
+# Which backend transcribe_audio uses: 'whisper' or 'stand-in' (no network)
+STT_BACKEND = os.getenv('STT_BACKEND', 'whisper')
+
+# Audio larger than this is uploaded as a chunked stream instead of one in-memory body
+STT_CHUNKED_UPLOAD_BYTES = int(os.getenv('STT_CHUNKED_UPLOAD_BYTES', 4 * 1024 * 1024))
+STT_UPLOAD_CHUNK_BYTES = 64 * 1024
+
+# Sample responses for the stand-in backend and mock_transcribe
+MOCK_TRANSCRIPTS = [
+    "I'd like to schedule an appointment for a dental checkup.",
+    "My name is Sarah Johnson.",
+    "I'm looking for a dermatologist appointment.",
+    "Next Tuesday at 2 PM would work for me.",
+    "Yes, that time works for me.",
+    "My phone number is 555-123-4567.",
+    "No, that's all I needed today. Thank you."
+]
+
+class MultipartStream:
     """
-    Transcribe audio using OpenAI's Whisper API
+    A multipart/form-data body produced chunk by chunk
     
-    Args:
-        audio_data: Binary audio data
-        format: Audio format (default: wav)
-        
-    Returns:
-        Transcribed text
+    Iterating it yields the encoded form without ever holding a second copy
+    of the audio; each iteration starts over, so a retried request re-sends
+    the whole body. requests sends an iterable body with chunked transfer
+    encoding.
     """
-    try:
-        # Save audio data to a temporary file
-        with tempfile.NamedTemporaryFile(suffix=f".{format}", delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_file_path = temp_file.name
+    
+    def __init__(self, fields, file_field, filename, content_type, audio, chunk_bytes=STT_UPLOAD_CHUNK_BYTES):
+        """
+        Initialize the body
+        
+        Args:
+            fields: Dict of plain form fields
+            file_field: Form field name of the file
+            filename: File name sent for the file
+            content_type: MIME type of the file
+            audio: Audio as bytes-like or a seekable binary file object
+            chunk_bytes: Size of the audio chunks yielded
+        """
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.fields = fields
+        self.file_field = file_field
+        self.filename = filename
+        self.file_content_type = content_type
+        self.audio = audio
+        self.chunk_bytes = chunk_bytes
+    
+    def _audio_chunks(self):
+        if hasattr(self.audio, 'read'):
+            self.audio.seek(0)
+            return iter(lambda: self.audio.read(self.chunk_bytes), b"")
+        view = memoryview(self.audio)
+        return (view[start:start + self.chunk_bytes] for start in range(0, len(view), self.chunk_bytes))
+    
+    def __iter__(self):
+        for name, value in self.fields.items():
+            yield (f"--{self.boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+                   f"{value}\r\n").encode()
+        yield (f"--{self.boundary}\r\nContent-Disposition: form-data; name=\"{self.file_field}\"; "
+               f"filename=\"{self.filename}\"\r\nContent-Type: {self.file_content_type}\r\n\r\n").encode()
+        for chunk in self._audio_chunks():
+            yield bytes(chunk)
+        yield f"\r\n--{self.boundary}--\r\n".encode()
+
+def audio_size(audio_data):
+    """Size in bytes of bytes-like audio or a seekable file object"""
+    if hasattr(audio_data, 'read'):
+        position = audio_data.tell()
+        size = audio_data.seek(0, io.SEEK_END)
+        audio_data.seek(position)
+        return size
+    return memoryview(audio_data).nbytes
+
+class WhisperBackend:
+    """Transcription with OpenAI's Whisper API"""
+    
+    def __init__(self, api_key=OPENAI_API_KEY, url=WHISPER_URL, model=WHISPER_MODEL, language="en",
+                 chunked_bytes=STT_CHUNKED_UPLOAD_BYTES, client=http_client):
+        """
+        Initialize the backend
         
-        # In a production environment, this would use the official OpenAI API
-        headers = {
-            "Authorization": f"Bearer {OPENAI_API_KEY}",
-            "Content-Type": "multipart/form-data"
-        }
+        Args:
+            api_key: OpenAI API key
+            url: Transcriptions endpoint
+            model: Whisper model name
+            language: Spoken language hint
+            chunked_bytes: Audio larger than this is sent as a chunked stream
+            client: HTTPClient used for the upload
+        """
+        self.api_key = api_key
+        self.url = url
+        self.model = model
+        self.language = language
+        self.chunked_bytes = chunked_bytes
+        self.client = client
+    
+    def transcribe(self, audio_data, format="wav", chunked=None):
+        """
+        Transcribe audio
         
-        with open(temp_file_path, "rb") as audio_file:
-            files = {
-                "file": (f"audio.{format}", audio_file, f"audio/{format}"),
-                "model": (None, "whisper-1"),
-                "language": (None, "en")
-            }
-            
-            response = requests.post(
-                "https://api.openai.com/v1/audio/transcriptions",
-                headers=headers,
-                files=files
-            )
+        Args:
+            audio_data: Audio as bytes-like or a seekable binary file object
+            format: Audio format (file extension)
+            chunked: Force (True) or disable (False) the chunked upload; by default
+                audio larger than chunked_bytes is chunked
+        
+        Returns:
+            Transcribed text ("" on an API error)
+        """
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        fields = {"model": self.model, "language": self.language}
+        filename = f"audio.{format}"
+        content_type = f"audio/{format}"
+        
+        if chunked is None:
+            chunked = audio_size(audio_data) > self.chunked_bytes
         
-        # Clean up temporary file
-        os.unlink(temp_file_path)
+        if chunked:
+            body = MultipartStream(fields, "file", filename, content_type, audio_data)
+            headers["Content-Type"] = body.content_type
+            response = self.client.post(self.url, headers=headers, data=body)
+        else:
+            # requests writes the multipart body (and its boundary header) from memory
+            if hasattr(audio_data, 'read'):
+                audio_data.seek(0)
+            files = {"file": (filename, audio_data, content_type)}
+            files.update({name: (None, value) for name, value in fields.items()})
+            response = self.client.post(self.url, headers=headers, files=files)
         
-        # Parse response
         if response.status_code == 200:
-            result = response.json()
-            return result.get("text", "")
+            return response.json().get("text", "")
+        logger.error(f"Whisper API error: {response.status_code} - {response.text}")
+        return ""
+
+class StandInBackend:
+    """Local stand-in for Whisper (tests and benchmarks): no network, fixed latency"""
+    
+    def __init__(self, transcripts=None, latency=0.0):
+        """
+        Initialize the stand-in
+        
+        Args:
+            transcripts: List of transcripts returned in turn (cycled), or a
+                callable (audio_data, format) -> text; defaults to MOCK_TRANSCRIPTS
+            latency: Seconds each transcription takes
+        """
+        transcripts = MOCK_TRANSCRIPTS if transcripts is None else transcripts
+        if callable(transcripts):
+            self._next = transcripts
         else:
-            logger.error(f"Whisper API error: {response.status_code} - {response.text}")
-            return ""
-            
+            cycle = itertools.cycle(transcripts)
+            self._next = lambda audio_data, format: next(cycle)
+        self.latency = latency
+        self.calls = 0
+    
+    def transcribe(self, audio_data, format="wav", chunked=None):
+        """Return the next transcript after the configured latency"""
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self._next(audio_data, format)
+
+STT_BACKENDS = {
+    'whisper': WhisperBackend,
+    'stand-in': StandInBackend
+}
+
+def create_stt_backend(name=None):
+    """
+    Create the STT backend configured by STT_BACKEND
+    
+    Args:
+        name: Key of STT_BACKENDS (defaults to STT_BACKEND)
+    
+    Returns:
+        Backend instance
+    """
+    name = (name or STT_BACKEND).lower()
+    if name not in STT_BACKENDS:
+        raise ValueError(f"Unknown STT backend: {name}")
+    logger.info(f"Using {STT_BACKENDS[name].__name__} for speech recognition")
+    return STT_BACKENDS[name]()
+
+# Backend used by transcribe_audio
+stt_backend = create_stt_backend()
+
+def set_stt_backend(backend):
+    """
+    Replace the backend transcribe_audio uses (e.g. with a StandInBackend)
+    
+    Args:
+        backend: Object with transcribe(audio_data, format, chunked=None) -> text
+    
+    Returns:
+        The previous backend
+    """
+    global stt_backend
+    previous, stt_backend = stt_backend, backend
+    return previous
+
+@metrics.timed('stt')
+def transcribe_audio(audio_data, format="wav", chunked=None, preprocess=None):
+    """
+    Transcribe audio with the configured STT backend (Whisper by default)
+    
+    Args:
+        audio_data: Binary audio data (bytes-like or a seekable file object)
+        format: Audio format (default: wav)
+        chunked: Force or disable the chunked streaming upload (default: by size)
+        preprocess: Trim silence and downsample bytes-like audio before upload
+            (default: STT_PREPROCESS); file objects are always sent as they are
+    
+    Returns:
+        Transcribed text ("" without an upload if the audio holds no speech)
+    """
+    try:
+        if preprocess is None:
+            preprocess = STT_PREPROCESS
+        if preprocess and not hasattr(audio_data, 'read'):
+            audio_data, format = prepare_for_stt(audio_data, format)
+            if audio_data is None:
+                return ""
+        
+        return stt_backend.transcribe(audio_data, format, chunked=chunked)
     except Exception as e:
         logger.error(f"Error transcribing audio: {str(e)}")
         return ""
@@ -85,7 +277,7 @@ def process_twilio_recording(recording_url):
     """
     try:
         # Download the recording
-        response = requests.get(recording_url)
+        response = http_client.get(recording_url)
         
         if response.status_code == 200:
             # Transcribe the audio
@@ -129,15 +321,4 @@ def mock_transcribe(audio_data=None):
     """
     import random
     
-    # Sample responses for testing
-    responses = [
-        "I'd like to schedule an appointment for a dental checkup.",
-        "My name is Sarah Johnson.",
-        "I'm looking for a dermatologist appointment.",
-        "Next Tuesday at 2 PM would work for me.",
-        "Yes, that time works for me.",
-        "My phone number is 555-123-4567.",
-        "No, that's all I needed today. Thank you."
-    ]
-    
-    return random.choice(responses)
+    return random.choice(MOCK_TRANSCRIPTS)
@@ -4,6 +4,7 @@ import json
 import uuid
 import logging
 from datetime import datetime
+from session_store import create_session_store
 
 # Initialize Flask app
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
@@ -12,9 +13,10 @@ app = Flask(__name__, template_folder='../templates', static_folder='../static')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sessions expire when idle; set SESSION_STORE=sqlite to share them between workers
+sessions = create_session_store('app')
 # In-memory storage for demo purposes
 # In production, this would be a database
-sessions = {}
 appointments = []
 
 @app.route('/')
@@ -26,7 +28,7 @@ def index():
 def start_call():
     """Initialize a new call session"""
     session_id = str(uuid.uuid4())
-    sessions[session_id] = {
+    session = {
         'id': session_id,
         'start_time': datetime.now().isoformat(),
         'conversation': [],
@@ -45,13 +47,14 @@ def start_call():
         'next_state': 'collect_name'
     }
     
-    sessions[session_id]['conversation'].append({
+    session['conversation'].append({
         'role': 'system',
         'text': initial_response['text'],
         'timestamp': datetime.now().isoformat()
     })
     
-    sessions[session_id]['state'] = initial_response['next_state']
+    session['state'] = initial_response['next_state']
+    sessions[session_id] = session
     
     return jsonify({
         'session_id': session_id,
@@ -65,28 +68,30 @@ def process_speech():
     session_id = data.get('session_id')
     transcript = data.get('transcript')
     
-    if not session_id or not transcript or session_id not in sessions:
+    session = sessions.get(session_id) if session_id else None
+    if not transcript or session is None:
         return jsonify({'error': 'Invalid session or missing transcript'}), 400
     
     # Log user input
-    sessions[session_id]['conversation'].append({
+    session['conversation'].append({
         'role': 'user',
         'text': transcript,
         'timestamp': datetime.now().isoformat()
     })
     
     # Process the input based on current state
-    response = process_conversation(session_id, transcript)
+    response = process_conversation(session_id, transcript, session)
     
     # Log system response
-    sessions[session_id]['conversation'].append({
+    session['conversation'].append({
         'role': 'system',
         'text': response['text'],
         'timestamp': datetime.now().isoformat()
     })
     
     # Update session state
-    sessions[session_id]['state'] = response['next_state']
+    session['state'] = response['next_state']
+    sessions[session_id] = session
     
     return jsonify({
         'message': response['text'],
@@ -94,9 +99,10 @@ def process_speech():
         'session_id': session_id
     })
 
-def process_conversation(session_id, transcript):
-    """Process user input based on conversation state"""
-    session = sessions[session_id]
+def process_conversation(session_id, transcript, session=None):
+    """Process user input based on conversation state (updates session in place)"""
+    if session is None:
+        session = sessions[session_id]
     current_state = session['state']
     patient_info = session['patient_info']
     
@@ -233,13 +239,14 @@ def get_conversation():
     """Get the full conversation history for a session"""
     session_id = request.args.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    session = sessions.get(session_id) if session_id else None
+    if session is None:
         return jsonify({'error': 'Invalid session ID'}), 400
         
     return jsonify({
-        'conversation': sessions[session_id]['conversation'],
-        'patient_info': sessions[session_id]['patient_info'],
-        'state': sessions[session_id]['state']
+        'conversation': session['conversation'],
+        'patient_info': session['patient_info'],
+        'state': session['state']
     })
 
 @app.route('/api/get-appointments', methods=['GET'])
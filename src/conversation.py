@@ -12,8 +12,13 @@ import os
 import logging
 import json
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-import openai
+from http_client import http_client
+from providers import providers
+from metrics import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,8 +27,29 @@ logger = logging.getLogger(__name__)
 # In a production environment, this would be an environment variable
 OPENAI_API_KEY = "YOUR_OPENAI_API_KEY"
 
-# Initialize OpenAI client
-openai.api_key = OPENAI_API_KEY
+def load_openai():
+    """Import and configure the OpenAI SDK (reusing the shared connection pool)"""
+    import openai
+    openai.api_key = OPENAI_API_KEY
+    openai.requestssession = http_client.session
+    return openai
+
+# The SDK is imported on the first LLM call (or by provider warm-up)
+providers.register('openai', load_openai)
+
+# How each turn uses the LLM:
+# - structured: one call returns both the extracted entities and the reply
+# - concurrent: entity extraction and reply generation run in parallel
+# - sequential: extraction, then reply generation (two round trips)
+LLM_MODE = os.getenv('LLM_MODE', 'structured')
+LLM_MODES = ('structured', 'concurrent', 'sequential')
+
+# Threads for the concurrent mode (two per turn in flight)
+llm_executor = ThreadPoolExecutor(max_workers=int(os.getenv('LLM_WORKERS', 8)), thread_name_prefix='llm')
+
+# Per-mode turn latency, for comparing the modes
+llm_stats = {mode: {'turns': 0, 'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0} for mode in LLM_MODES}
+llm_stats_lock = threading.Lock()
 
 # System prompt for GPT-4
 SYSTEM_PROMPT = """
@@ -41,6 +67,57 @@ Once all information is collected, confirm the appointment details.
 Keep your responses concise, warm, and professional. Speak naturally as a helpful receptionist would.
 """
 
+# Output format for the structured mode (appended to SYSTEM_PROMPT)
+STRUCTURED_OUTPUT_PROMPT = """
+For every patient message, first extract any of the following from the patient's latest message:
+- name: Patient name
+- service: Medical service requested
+- datetime: Preferred appointment date and time
+- phone: Phone number
+
+Then write your reply, taking the newly extracted information into account.
+
+Respond only with a JSON object, nothing else:
+{"entities": {"name": null, "service": null, "datetime": null, "phone": null}, "reply": "your reply to the patient"}
+Set an entity to null if it is not present in the latest message.
+"""
+
+EMPTY_ENTITIES = {
+    "name": None,
+    "service": None,
+    "datetime": None,
+    "phone": None
+}
+
+def parse_json_object(content):
+    """Parse the JSON object in an LLM response, ignoring any text around it"""
+    json_match = re.search(r'({.*})', content, re.DOTALL)
+    if json_match:
+        content = json_match.group(1)
+    return json.loads(content)
+
+def build_context_message(current_state, patient_info):
+    """Describe the conversation state and collected information for the LLM"""
+    return f"""
+        Current conversation state: {current_state}
+        
+        Patient information collected so far:
+        - Name: {patient_info.get('name') or 'Not provided'}
+        - Service requested: {patient_info.get('service') or 'Not provided'}
+        - Preferred time: {patient_info.get('preferred_time') or 'Not provided'}
+        - Phone number: {patient_info.get('phone_number') or 'Not provided'}
+        
+        Based on the conversation state and collected information, respond appropriately to collect missing information or confirm the appointment.
+        """
+
+def history_messages(conversation_history):
+    """Format the last few conversation turns as chat messages"""
+    messages = []
+    for message in conversation_history[-5:]:  # Only use the last 5 messages for context
+        role = "assistant" if message["role"] == "system" else "user"
+        messages.append({"role": role, "content": message["text"]})
+    return messages
+
 def extract_entities(text):
     """
     Extract relevant entities from user input using GPT-4
@@ -66,7 +143,7 @@ def extract_entities(text):
         Only respond with the JSON object, nothing else.
         """
         
-        response = openai.ChatCompletion.create(
+        response = providers.get('openai').ChatCompletion.create(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "You extract structured information from text."},
@@ -76,25 +153,12 @@ def extract_entities(text):
             max_tokens=150
         )
         
-        # Parse the response
-        content = response.choices[0].message.content.strip()
-        
-        # Extract JSON from the response (in case there's any extra text)
-        json_match = re.search(r'({.*})', content, re.DOTALL)
-        if json_match:
-            content = json_match.group(1)
-            
-        entities = json.loads(content)
-        return entities
+        # Parse the response (ignoring any extra text around the JSON)
+        return parse_json_object(response.choices[0].message.content.strip())
         
     except Exception as e:
         logger.error(f"Error extracting entities: {str(e)}")
-        return {
-            "name": None,
-            "service": None,
-            "datetime": None,
-            "phone": None
-        }
+        return dict(EMPTY_ENTITIES)
 
 def generate_response(conversation_history, current_state, patient_info):
     """
@@ -115,27 +179,13 @@ def generate_response(conversation_history, current_state, patient_info):
         ]
         
         # Add conversation context
-        context = f"""
-        Current conversation state: {current_state}
-        
-        Patient information collected so far:
-        - Name: {patient_info.get('name') or 'Not provided'}
-        - Service requested: {patient_info.get('service') or 'Not provided'}
-        - Preferred time: {patient_info.get('preferred_time') or 'Not provided'}
-        - Phone number: {patient_info.get('phone_number') or 'Not provided'}
-        
-        Based on the conversation state and collected information, respond appropriately to collect missing information or confirm the appointment.
-        """
-        
-        messages.append({"role": "user", "content": context})
+        messages.append({"role": "user", "content": build_context_message(current_state, patient_info)})
         
         # Add conversation history
-        for message in conversation_history[-5:]:  # Only use the last 5 messages for context
-            role = "assistant" if message["role"] == "system" else "user"
-            messages.append({"role": role, "content": message["text"]})
+        messages.extend(history_messages(conversation_history))
         
         # Generate response
-        response = openai.ChatCompletion.create(
+        response = providers.get('openai').ChatCompletion.create(
             model="gpt-4",
             messages=messages,
             temperature=0.7,
@@ -242,10 +292,42 @@ def process_conversation(session_id, transcript, session=None):
         patient_info = sessions[session_id]['patient_info']
         conversation = sessions[session_id]['conversation']
     
-    # Extract entities from transcript
-    entities = extract_entities(transcript)
+    mode = LLM_MODE if LLM_MODE in LLM_MODES else 'structured'
+    start = time.perf_counter()
     
-    # Update patient info with any extracted entities
+    if mode == 'structured':
+        # One round trip: entities and reply come back together
+        entities, generated_text = generate_structured_turn(conversation, current_state, patient_info)
+        apply_entities(patient_info, entities)
+        result = {
+            "text": generated_text,
+            "next_state": determine_next_state(current_state, generated_text, patient_info)
+        }
+        calls = 1
+        
+    elif mode == 'concurrent':
+        # Both calls in flight at once; the reply is written from the info
+        # known before this turn, so the next state is re-decided afterwards
+        entities_future = llm_executor.submit(extract_entities, transcript)
+        response_future = llm_executor.submit(generate_response, conversation, current_state, dict(patient_info))
+        apply_entities(patient_info, entities_future.result())
+        result = response_future.result()
+        result['next_state'] = determine_next_state(current_state, result['text'], patient_info)
+        calls = 2
+        
+    else:
+        # Extract entities from transcript
+        apply_entities(patient_info, extract_entities(transcript))
+        
+        # Generate response using GPT-4
+        result = generate_response(conversation, current_state, patient_info)
+        calls = 2
+    
+    record_llm_turn(mode, calls, (time.perf_counter() - start) * 1000)
+    return result
+
+def apply_entities(patient_info, entities):
+    """Update patient info with any extracted entities"""
     if entities.get('name'):
         patient_info['name'] = entities.get('name')
     
@@ -257,9 +339,80 @@ def process_conversation(session_id, transcript, session=None):
     
     if entities.get('phone'):
         patient_info['phone_number'] = entities.get('phone')
+
+def generate_structured_turn(conversation_history, current_state, patient_info):
+    """
+    Extract entities and generate the reply with a single GPT-4 call
+    
+    Args:
+        conversation_history: List of conversation messages (ending with the patient's latest)
+        current_state: Current conversation state
+        patient_info: Dictionary of patient information collected before this turn
+        
+    Returns:
+        Tuple of (entities dict, reply text)
+    """
+    try:
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT + STRUCTURED_OUTPUT_PROMPT},
+            {"role": "user", "content": build_context_message(current_state, patient_info)}
+        ]
+        messages.extend(history_messages(conversation_history))
+        
+        response = providers.get('openai').ChatCompletion.create(
+            model="gpt-4",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=250  # reply (150) plus the entities object
+        )
+        
+        content = response.choices[0].message.content.strip()
+        
+        try:
+            parsed = parse_json_object(content)
+            entities = dict(EMPTY_ENTITIES, **(parsed.get('entities') or {}))
+            reply = (parsed.get('reply') or '').strip()
+        except (ValueError, AttributeError):
+            # The model answered in plain text: use it as the reply
+            logger.warning("Structured LLM response was not JSON, using it as the reply")
+            entities, reply = dict(EMPTY_ENTITIES), content
+        
+        if not reply:
+            raise ValueError("Structured LLM response had no reply")
+        
+        return entities, reply
+        
+    except Exception as e:
+        logger.error(f"Error generating structured turn: {str(e)}")
+        return dict(EMPTY_ENTITIES), "I'm sorry, I'm having trouble processing your request. Could you please repeat that?"
+
+def record_llm_turn(mode, calls, elapsed_ms):
+    """Record the LLM latency of one turn"""
+    with llm_stats_lock:
+        stats = llm_stats[mode]
+        stats['turns'] += 1
+        stats['calls'] += calls
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+    metrics.observe('llm', elapsed_ms / 1000)
+    
+    logger.info(f"LLM turn ({mode}): {calls} call(s), {elapsed_ms:.0f} ms")
+
+def get_llm_stats():
+    """
+    Get per-mode LLM latency per turn
+    
+    Returns:
+        Dictionary of mode -> turns, calls, avg_ms and max_ms
+    """
+    with llm_stats_lock:
+        snapshot = {mode: dict(stats) for mode, stats in llm_stats.items()}
     
-    # Generate response using GPT-4
-    return generate_response(conversation, current_state, patient_info)
+    for stats in snapshot.values():
+        total_ms = stats.pop('total_ms')
+        stats['avg_ms'] = round(total_ms / stats['turns'], 1) if stats['turns'] else 0.0
+        stats['max_ms'] = round(stats['max_ms'], 1)
+    return snapshot
 
 # For demo/testing purposes
 def mock_process_conversation(session_id, transcript, session=None):
@@ -0,0 +1,241 @@
+"""
+Metrics Module for Clinic Voice AI
+
+This module handles latency instrumentation of the turn pipeline:
+1. Lightweight timing spans around pipeline stages (context manager and decorator)
+2. Labelling spans with the conversation state of the turn they belong to
+3. Histograms with p50/p95/p99 per stage and state
+4. Gauges read when metrics are scraped (queue depths and the like)
+5. Prometheus text exposition for the /metrics endpoint
+
+Recording a span costs a couple of microseconds (two perf_counter calls, a
+bisect and a deque append under a lock), so it is meant to stay on in
+production. Set METRICS_ENABLED=false to turn it off.
+"""
+
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+# Histogram bucket upper bounds in seconds (from fast in-process stages to provider calls)
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+# Recent samples kept per series for quantiles
+QUANTILE_WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Label used when a span runs outside a turn or before its state is known
+NO_STATE = 'none'
+
+# The turn being processed in this request (copied into tasks and producer threads)
+_current_turn = contextvars.ContextVar('current_turn', default=None)
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts plus a window of recent samples for quantiles"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=QUANTILE_WINDOW):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        """Record one duration (caller holds the registry lock)"""
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def quantiles(self, quantiles=QUANTILES):
+        """Quantiles of the recent samples, as {quantile: seconds}"""
+        samples = sorted(self.recent)
+        if not samples:
+            return {}
+        return {q: samples[min(int(q * len(samples)), len(samples) - 1)] for q in quantiles}
+
+
+class MetricsRegistry:
+    """Latency histograms keyed by (stage, conversation state)"""
+
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds, state=None):
+        """
+        Record a stage duration
+
+        Args:
+            stage: Pipeline stage name
+            seconds: Duration in seconds
+            state: Conversation state (defaults to the current turn's state)
+        """
+        if not self.enabled:
+            return
+        if state is None:
+            turn = _current_turn.get()
+            state = turn['state'] if turn is not None and turn['state'] else NO_STATE
+
+        key = (stage, state)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage):
+        """Time the enclosed block as a stage of the current turn"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """Decorator timing every call of a function as a stage"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(stage, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def turn(self, stage):
+        """
+        Time a whole request (start_call, process_speech, twilio_gather)
+
+        Spans recorded inside it, including in tasks and threads started from
+        it, are labelled with the state passed to set_turn_state.
+
+        Yields:
+            The turn dict; its 'state' may also be set directly
+        """
+        turn = {'state': None}
+        token = _current_turn.set(turn)
+        start = time.perf_counter()
+        try:
+            yield turn
+        finally:
+            self.observe(stage, time.perf_counter() - start, turn['state'] or NO_STATE)
+            _current_turn.reset(token)
+
+    def gauge(self, name, description, read):
+        """
+        Register a gauge that is read when metrics are rendered
+
+        Args:
+            name: Metric name (without the prefix)
+            description: HELP text
+            read: Callable returning the current value
+        """
+        with self._lock:
+            self._gauges[name] = (description, read)
+
+    def snapshot(self):
+        """Copy of every series as {(stage, state): (counts, total, count, quantiles)}"""
+        with self._lock:
+            return {
+                key: (list(h.counts), h.total, h.count, h.quantiles())
+                for key, h in self._histograms.items()
+            }
+
+    def render_prometheus(self, prefix='voice_agent'):
+        """
+        Render all series in the Prometheus text exposition format
+
+        Returns:
+            Text for a /metrics response
+        """
+        name = f"{prefix}_stage_duration_seconds"
+        quantile_name = f"{prefix}_stage_duration_quantile_seconds"
+        lines = [
+            f"# HELP {name} Duration of turn pipeline stages",
+            f"# TYPE {name} histogram"
+        ]
+        quantile_lines = [
+            f"# HELP {quantile_name} Recent duration quantiles of turn pipeline stages (last {QUANTILE_WINDOW} samples)",
+            f"# TYPE {quantile_name} gauge"
+        ]
+
+        for (stage, state), (counts, total, count, quantiles) in sorted(self.snapshot().items()):
+            labels = f'stage="{_escape(stage)}",state="{_escape(state)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+            for q, seconds in quantiles.items():
+                quantile_lines.append(f'{quantile_name}{{{labels},quantile="{q}"}} {seconds:.6f}')
+
+        with self._lock:
+            gauges = sorted(self._gauges.items())
+        gauge_lines = []
+        for gauge_name, (description, read) in gauges:
+            try:
+                value = float(read())
+            except Exception as e:
+                logger.error(f"Error reading gauge {gauge_name}: {str(e)}")
+                continue
+            gauge_lines.extend([
+                f"# HELP {prefix}_{gauge_name} {description}",
+                f"# TYPE {prefix}_{gauge_name} gauge",
+                f"{prefix}_{gauge_name} {value:g}"
+            ])
+
+        return "\n".join(lines + quantile_lines + gauge_lines) + "\n"
+
+    def reset(self):
+        """Drop all recorded series"""
+        with self._lock:
+            self._histograms.clear()
+
+
+def _escape(value):
+    """Escape a Prometheus label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Shared registry for the whole process
+metrics = MetricsRegistry()
+
+
+def set_turn_state(state):
+    """Label the current turn (and its spans) with a conversation state"""
+    turn = _current_turn.get()
+    if turn is not None:
+        turn['state'] = state
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
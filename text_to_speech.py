@@ -8,11 +8,12 @@ This module handles voice synthesis using ElevenLabs API:
 """
 
 import os
-import requests
+from http_client import http_client
 import json
 import base64
 import logging
 import tempfile
+from audio_cache import tts_cache, make_cache_key
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,11 +22,18 @@ logger = logging.getLogger(__name__)
 # In a production environment, this would be an environment variable
 ELEVENLABS_API_KEY = "YOUR_ELEVENLABS_API_KEY"
 ELEVENLABS_VOICE_ID = "YOUR_RACHEL_VOICE_ID"  # Rachel voice ID
+ELEVENLABS_MODEL_ID = "eleven_monolingual_v1"
+
+# (stability, similarity_boost) used for every clip
+VOICE_SETTINGS = (0.5, 0.75)
 
 def synthesize_speech(text):
     """
     Convert text to speech using ElevenLabs API
     
+    Results are served from the shared TTS cache when the same text has
+    been synthesized before with the same voice settings.
+    
     Args:
         text: Text to convert to speech
         
@@ -33,35 +41,43 @@ def synthesize_speech(text):
         Audio data in bytes
     """
     try:
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
-        
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": ELEVENLABS_API_KEY
-        }
+        stability, similarity_boost = VOICE_SETTINGS
+        cache_key = make_cache_key(text, None, stability, similarity_boost, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL_ID)
         
-        data = {
-            "text": text,
-            "model_id": "eleven_monolingual_v1",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.75
-            }
-        }
-        
-        response = requests.post(url, json=data, headers=headers)
-        
-        if response.status_code == 200:
-            return response.content
-        else:
-            logger.error(f"ElevenLabs API error: {response.status_code} - {response.text}")
-            return None
+        return tts_cache.get_or_synthesize(cache_key, lambda: _request_speech(text))
             
     except Exception as e:
         logger.error(f"Error synthesizing speech: {str(e)}")
         return None
 
+def _request_speech(text):
+    """Call the ElevenLabs API for a clip that is not cached"""
+    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+    
+    headers = {
+        "Accept": "audio/mpeg",
+        "Content-Type": "application/json",
+        "xi-api-key": ELEVENLABS_API_KEY
+    }
+    
+    stability, similarity_boost = VOICE_SETTINGS
+    data = {
+        "text": text,
+        "model_id": ELEVENLABS_MODEL_ID,
+        "voice_settings": {
+            "stability": stability,
+            "similarity_boost": similarity_boost
+        }
+    }
+    
+    response = http_client.post(url, json=data, headers=headers)
+    
+    if response.status_code == 200:
+        return response.content
+    
+    logger.error(f"ElevenLabs API error: {response.status_code} - {response.text}")
+    return None
+
 def get_base64_audio(text):
     """
     Get base64-encoded audio for web playback
@@ -0,0 +1,230 @@
+"""
+Time Parser Module for Clinic Voice AI
+
+This module handles turning spoken appointment times into datetimes:
+1. One compiled pattern that finds day and time expressions in a single pass
+2. The same "tuesday at 2 pm" labels extract_time has always returned
+3. Resolving those expressions to timezone-aware datetime ranges relative to
+   the call time (day names, today/tomorrow/next week, month-day forms,
+   clock times and time-of-day words)
+4. Spoken labels for resolved slots
+"""
+
+import logging
+import os
+import re
+from collections import namedtuple
+from datetime import datetime, date, time, timedelta
+from zoneinfo import ZoneInfo
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Times are resolved in the clinic's timezone
+CLINIC_TIMEZONE = ZoneInfo(os.getenv('CLINIC_TIMEZONE', 'Asia/Dubai'))
+
+# Length of one appointment slot
+SLOT_MINUTES = int(os.getenv('SLOT_MINUTES', 30))
+
+# Time used when the caller only gives a day (matches the "at 10:00 AM" label)
+DEFAULT_TIME = time(10, 0)
+DEFAULT_TIME_LABEL = "10:00 AM"
+
+# Hours covered by time-of-day words
+PARTS_OF_DAY = {
+    'morning': (8, 12),
+    'afternoon': (12, 17),
+    'evening': (17, 21)
+}
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+          'august', 'september', 'october', 'november', 'december']
+
+_WEEKDAY = '|'.join(WEEKDAYS)
+_MONTH = '|'.join(MONTHS)
+
+# Every day and time expression as one alternation; the group name is the
+# expression kind. Kinds are listed in the priority extract_time used. Only
+# the kinds are captured, which keeps match objects small; the parts of the
+# winning matches are read with CLOCK_PARTS and NUMBER afterwards. The one
+# exception: in "march 3 pm" the 3 is both the day and the hour, so the day
+# number is only looked ahead at (as month_day_number) and left to the clock.
+TIME_EXPRESSION = re.compile(
+    # Only try at word starts; most positions fail this check immediately
+    rf"\b(?:(?P<weekday>{_WEEKDAY})"
+    rf"|(?P<relative>tomorrow|today|next week)"
+    rf"|(?P<month_day>(?:{_MONTH}) (?:\d{{1,2}}(?!\d|(?::\d{{2}})? ?(?:am|pm))(?:st|nd|rd|th)?"
+    rf"|(?=(?P<month_day_number>\d{{1,2}})(?::\d{{2}})? ?(?:am|pm))))"
+    rf"|(?P<day_of_month>\d{{1,2}}(?:st|nd|rd|th)? of (?:{_MONTH}))"
+    rf"|(?P<clock>\d{{1,2}}(?::\d{{2}})? ?(?:am|pm))"
+    rf"|(?P<oclock>\d{{1,2}} o'?clock)"
+    rf"|(?P<part_of_day>morning|afternoon|evening)"
+    rf"|(?P<noon>noon|midnight))"
+)
+CLOCK_PARTS = re.compile(r"(\d{1,2})(?::(\d{2}))? ?(am|pm)")
+NUMBER = re.compile(r"\d{1,2}")
+
+DAY_KINDS = ('weekday', 'relative', 'month_day', 'day_of_month')
+TIME_KINDS = ('clock', 'oclock', 'part_of_day', 'noon')
+DAY_RANK = {kind: rank for rank, kind in enumerate(DAY_KINDS)}
+TIME_RANK = {kind: rank for rank, kind in enumerate(TIME_KINDS)}
+
+
+TimeRange = namedtuple('TimeRange', ['start', 'end', 'label'])
+TimeRange.__doc__ = "Requested appointment window: [start, end) in the clinic timezone, plus the spoken label"
+
+
+def scan_time_expressions(text):
+    """
+    Find the day and time expressions in a transcript in one pass
+
+    Args:
+        text: Transcript (any case)
+
+    Returns:
+        Tuple of (day match, time match); either may be None
+    """
+    day_match = time_match = None
+    day_rank = time_rank = len(DAY_KINDS)
+
+    # Keep the first match of the highest-priority kind on each side
+    for match in TIME_EXPRESSION.finditer(text.lower()):
+        kind = match.lastgroup
+        if kind in DAY_RANK:
+            if DAY_RANK[kind] < day_rank:
+                day_match, day_rank = match, DAY_RANK[kind]
+        elif TIME_RANK[kind] < time_rank:
+            time_match, time_rank = match, TIME_RANK[kind]
+        if day_rank == 0 and time_rank == 0:
+            break
+
+    return day_match, time_match
+
+
+def _day_words(day_match):
+    """Words of a day match, including a month day number shared with the clock time"""
+    if day_match.lastgroup == 'month_day' and day_match.group('month_day_number'):
+        return day_match.group(0) + day_match.group('month_day_number')
+    return day_match.group(0)
+
+
+def time_label(day_match, time_match):
+    """
+    Build the label extract_time returns for a scan
+
+    Returns:
+        e.g. "tuesday at 2 pm", "tomorrow at 10 o'clock", or None
+    """
+    if day_match and time_match:
+        return f"{_day_words(day_match)} at {time_match.group(0)}"
+    elif day_match:
+        # Default to morning if only day is specified
+        return f"{_day_words(day_match)} at {DEFAULT_TIME_LABEL}"
+    elif time_match:
+        # Default to tomorrow if only time is specified
+        return f"tomorrow at {time_match.group(0)}"
+    return None
+
+
+def _resolve_date(day_match, today):
+    """Date a day expression refers to (the next one on or after today)"""
+    if day_match is None:
+        return today + timedelta(days=1)
+
+    kind = day_match.lastgroup
+    words = _day_words(day_match)
+    if kind == 'weekday':
+        return today + timedelta(days=(WEEKDAYS.index(words) - today.weekday()) % 7)
+    if kind == 'relative':
+        if words == 'today':
+            return today
+        if words == 'tomorrow':
+            return today + timedelta(days=1)
+        # next week: the Monday after this one
+        return today + timedelta(days=7 - today.weekday())
+
+    day = NUMBER.search(words).group(0)
+    month = next(index for index, name in enumerate(MONTHS, 1) if name in words)
+    for year in (today.year, today.year + 1):
+        try:
+            resolved = date(year, month, int(day))
+        except ValueError:
+            return None
+        if resolved >= today:
+            return resolved
+    return None
+
+
+def _resolve_hours(time_match):
+    """(start time, end time) of a time expression; end None means one slot"""
+    if time_match is None:
+        return DEFAULT_TIME, None
+
+    kind = time_match.lastgroup
+    if kind == 'clock':
+        hour, minute, meridiem = CLOCK_PARTS.match(time_match.group(0)).groups()
+        hour = int(hour) % 12
+        if meridiem == 'pm':
+            hour += 12
+        return time(hour, min(int(minute or 0), 59)), None
+    if kind == 'oclock':
+        hour = int(NUMBER.match(time_match.group(0)).group(0)) % 12
+        # Clinic hours: "2 o'clock" means 2 PM, "9 o'clock" means 9 AM
+        if hour < 7:
+            hour += 12
+        return time(hour), None
+    if kind == 'part_of_day':
+        start_hour, end_hour = PARTS_OF_DAY[time_match.group(0)]
+        return time(start_hour), time(end_hour)
+    return (time(12) if time_match.group(0) == 'noon' else time(0)), None
+
+
+def parse_time_range(text, now=None, tz=CLINIC_TIMEZONE):
+    """
+    Resolve the appointment time in a transcript to a datetime range
+
+    Args:
+        text: Transcript
+        now: Call time (aware datetime; defaults to the current time)
+        tz: Timezone the clinic works in
+
+    Returns:
+        TimeRange, or None if the transcript has no (valid) time expression
+    """
+    day_match, time_match = scan_time_expressions(text)
+    label = time_label(day_match, time_match)
+    if label is None:
+        return None
+
+    now = now.astimezone(tz) if now else datetime.now(tz)
+    day = _resolve_date(day_match, now.date())
+    if day is None:
+        return None
+
+    start_time, end_time = _resolve_hours(time_match)
+    start = datetime.combine(day, start_time, tzinfo=tz)
+    end = datetime.combine(day, end_time, tzinfo=tz) if end_time else start + timedelta(minutes=SLOT_MINUTES)
+
+    # A weekday whose time has already passed today means next week
+    if day_match is not None and day_match.lastgroup == 'weekday' and end <= now:
+        start += timedelta(days=7)
+        end += timedelta(days=7)
+
+    return TimeRange(start, end, label)
+
+
+def format_slot(start, now=None):
+    """
+    Spoken label for a slot, e.g. "Tuesday at 2:30 PM"
+
+    Slots more than a week away also get their date.
+    """
+    now = now.astimezone(start.tzinfo) if now else datetime.now(start.tzinfo)
+    hour = start.strftime('%I').lstrip('0')
+    label = f"{start.strftime('%A')} at {hour}:{start.strftime('%M %p')}"
+    if (start.date() - now.date()).days >= 7:
+        label = f"{start.strftime('%A, %B')} {start.day} at {hour}:{start.strftime('%M %p')}"
+    return label
+
@@ -0,0 +1,289 @@
+"""
+Transcoder Module for Clinic Voice AI
+
+This module handles converting synthesized speech to the format each
+channel plays:
+1. 8 kHz mu-law for telephony, encoded with precomputed lookup tables
+2. Opus (in Ogg) for browsers, and MP3/WAV, through pydub (ffmpeg)
+3. Resampling 16-bit mono PCM with a windowed-sinc low-pass filter
+4. A per-format cache of variants stored next to the source clip in the TTS
+   cache, so a clip is transcoded at most once per format
+
+WAV, raw PCM and mu-law are handled with NumPy alone. Decoding MP3 and
+encoding Opus or MP3 need pydub, which is loaded on first use.
+"""
+
+import functools
+import io
+import logging
+import os
+import threading
+import wave
+
+import numpy as np
+
+from audio_cache import TTSCache, TTS_CACHE_DIR
+from metrics import metrics
+from phrase_bank import encode_wav
+from providers import providers
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Output formats by name, with the Content-Type they are served as
+AUDIO_FORMATS = {
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'opus': 'audio/ogg; codecs=opus',
+    'ulaw': 'audio/basic'
+}
+
+# Source formats of stored clips, by MIME type
+MIMETYPE_FORMATS = {
+    'audio/mpeg': 'mp3',
+    'audio/wav': 'wav',
+    'audio/ogg; codecs=opus': 'opus',
+    'audio/basic': 'ulaw'
+}
+
+TELEPHONY_SAMPLE_RATE = 8000
+OPUS_BITRATE = os.getenv('OPUS_BITRATE', '24k')
+
+# Variant cache caps, per format
+TTS_VARIANT_MEMORY_BYTES = int(os.getenv('TTS_VARIANT_MEMORY_BYTES', 8 * 1024 * 1024))
+TTS_VARIANT_DISK_BYTES = int(os.getenv('TTS_VARIANT_DISK_BYTES', 128 * 1024 * 1024))
+
+# Low-pass filter length for resampling (odd, so the filter is centred)
+RESAMPLE_TAPS = 63
+
+# G.711 mu-law constants (on 14-bit magnitudes, as in the reference g711.c)
+ULAW_BIAS = 0x21
+ULAW_CLIP = 8159
+ULAW_SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+
+
+def _build_ulaw_tables():
+    """
+    G.711 mu-law tables
+
+    Returns:
+        Tuple of (encode table indexed by a 16-bit sample viewed as uint16,
+        decode table indexed by the mu-law byte)
+    """
+    samples = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2
+    mask = np.where(samples < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(samples), ULAW_CLIP) + ULAW_BIAS
+    segment = np.searchsorted(ULAW_SEGMENT_ENDS, magnitude)
+    mantissa = (magnitude >> (segment + 1)) & 0x0F
+    # Magnitudes past the last segment get the largest code
+    encode = (np.where(segment > 7, 0x7F, (segment << 4) | mantissa) ^ mask).astype(np.uint8)
+
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    magnitude = ((((codes & 0x0F) << 3) + 0x84) << ((codes & 0x70) >> 4)) - 0x84
+    decode = np.where(codes & 0x80, -magnitude, magnitude).astype(np.int16)
+    return encode, decode
+
+
+ULAW_ENCODE_TABLE, ULAW_DECODE_TABLE = _build_ulaw_tables()
+
+
+def ulaw_encode(samples):
+    """Encode int16 samples as mu-law bytes (one table lookup per sample)"""
+    return ULAW_ENCODE_TABLE[np.ascontiguousarray(samples, dtype=np.int16).view(np.uint16)].tobytes()
+
+
+def ulaw_decode(data):
+    """Decode mu-law bytes to int16 samples"""
+    return ULAW_DECODE_TABLE[np.frombuffer(data, dtype=np.uint8)]
+
+
+@functools.lru_cache(maxsize=16)
+def _lowpass_filter(from_rate, to_rate, taps=RESAMPLE_TAPS):
+    """Windowed-sinc low-pass filter at 95% of the lower Nyquist frequency"""
+    cutoff = 0.95 * min(from_rate, to_rate) / 2 / from_rate
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def resample(samples, from_rate, to_rate):
+    """
+    Resample mono audio
+
+    Args:
+        samples: int16 samples
+        from_rate: Sample rate of samples
+        to_rate: Wanted sample rate
+
+    Returns:
+        int16 samples at to_rate
+    """
+    if from_rate == to_rate or not len(samples):
+        return np.asarray(samples, dtype=np.int16)
+
+    signal = np.asarray(samples, dtype=np.float32)
+    if to_rate < from_rate:
+        # Remove what the lower rate cannot represent before dropping samples
+        signal = np.convolve(signal, _lowpass_filter(from_rate, to_rate), mode='same')
+
+    if from_rate % to_rate == 0:
+        resampled = signal[::from_rate // to_rate]
+    else:
+        length = int(len(signal) * to_rate / from_rate)
+        positions = np.arange(length, dtype=np.float64) * (from_rate / to_rate)
+        resampled = np.interp(positions, np.arange(len(signal)), signal)
+    return np.clip(np.rint(resampled), -32768, 32767).astype(np.int16)
+
+
+def load_pydub():
+    """pydub's AudioSegment (ffmpeg-backed decoding and encoding)"""
+    from pydub import AudioSegment
+    return AudioSegment
+
+
+# Imported when a clip first needs ffmpeg (or by provider warm-up)
+providers.register('pydub', load_pydub)
+
+
+def decode(audio, source_format):
+    """
+    Decode a clip to 16-bit mono samples
+
+    Args:
+        audio: Encoded audio bytes
+        source_format: 'wav', 'ulaw', 'pcm_<rate>', or a format ffmpeg reads ('mp3', 'opus')
+
+    Returns:
+        Tuple of (int16 samples, sample rate)
+    """
+    if source_format == 'wav':
+        with wave.open(io.BytesIO(audio)) as wav_file:
+            if wav_file.getsampwidth() == 2:
+                samples = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype='<i2')
+                channels = wav_file.getnchannels()
+                if channels > 1:
+                    samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+                return samples, wav_file.getframerate()
+    elif source_format == 'ulaw':
+        return ulaw_decode(audio), TELEPHONY_SAMPLE_RATE
+    elif source_format.startswith('pcm_'):
+        return np.frombuffer(audio, dtype='<i2'), int(source_format[len('pcm_'):])
+
+    container = 'ogg' if source_format == 'opus' else source_format
+    segment = providers.get('pydub').from_file(io.BytesIO(audio), format=container)
+    segment = segment.set_channels(1).set_sample_width(2)
+    return np.frombuffer(segment.raw_data, dtype='<i2'), segment.frame_rate
+
+
+def encode(samples, sample_rate, target_format):
+    """
+    Encode 16-bit mono samples
+
+    Args:
+        samples: int16 samples
+        sample_rate: Their sample rate
+        target_format: Key of AUDIO_FORMATS
+
+    Returns:
+        Encoded audio bytes
+    """
+    if target_format == 'ulaw':
+        return ulaw_encode(resample(samples, sample_rate, TELEPHONY_SAMPLE_RATE))
+    if target_format == 'wav':
+        return encode_wav(samples, sample_rate)
+
+    segment = providers.get('pydub')(
+        data=np.asarray(samples, dtype='<i2').tobytes(), sample_width=2, frame_rate=sample_rate, channels=1
+    )
+    buffer = io.BytesIO()
+    if target_format == 'opus':
+        segment.export(buffer, format='ogg', codec='libopus', bitrate=OPUS_BITRATE)
+    else:
+        segment.export(buffer, format=target_format)
+    return buffer.getvalue()
+
+
+def transcode(audio, source_format, target_format):
+    """
+    Convert a clip between formats
+
+    Args:
+        audio: Encoded audio bytes
+        source_format: Format of audio (see decode)
+        target_format: Key of AUDIO_FORMATS
+
+    Returns:
+        Encoded audio bytes (audio itself when the formats match)
+    """
+    if source_format == target_format:
+        return audio
+    with metrics.span(f"transcode_{target_format}"):
+        samples, sample_rate = decode(audio, source_format)
+        return encode(samples, sample_rate, target_format)
+
+
+class VariantCache:
+    """Transcoded variants of TTS cache clips, one TTSCache per format in the same directory"""
+
+    def __init__(self, cache_dir=TTS_CACHE_DIR, memory_bytes=TTS_VARIANT_MEMORY_BYTES,
+                 disk_bytes=TTS_VARIANT_DISK_BYTES):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: TTS cache directory (variants sit next to their source clip)
+            memory_bytes: Byte cap for the in-memory tier of each format
+            disk_bytes: Byte cap for the on-disk tier of each format
+        """
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        # Created per format on first use
+        self.caches = {}
+        self._lock = threading.Lock()
+
+    def _cache(self, audio_format):
+        """The variant cache for one format"""
+        with self._lock:
+            cache = self.caches.get(audio_format)
+            if cache is None:
+                cache = self.caches[audio_format] = TTSCache(
+                    cache_dir=self.cache_dir, memory_bytes=self.memory_bytes,
+                    disk_bytes=self.disk_bytes, extension=audio_format
+                )
+            return cache
+
+    def get_or_transcode(self, key, target_format, source_format, read_source):
+        """
+        Get a clip in a format, transcoding it once (even under concurrent requests)
+
+        Args:
+            key: TTS cache key of the source clip
+            target_format: Key of AUDIO_FORMATS
+            source_format: Format of the source clip
+            read_source: Callable returning the source clip bytes (or None)
+
+        Returns:
+            Audio bytes, or None if the source clip is gone or cannot be transcoded
+        """
+        if target_format == source_format:
+            return read_source()
+
+        def transcode_source():
+            audio = read_source()
+            if audio is None:
+                return None
+            try:
+                return transcode(audio, source_format, target_format)
+            except Exception as e:
+                logger.error(f"Error transcoding {key} from {source_format} to {target_format}: {str(e)}")
+                return None
+
+        return self._cache(target_format).get_or_synthesize(key, transcode_source)
+
+    def stats(self):
+        """Get cache counters per format"""
+        with self._lock:
+            caches = dict(self.caches)
+        return {audio_format: cache.stats() for audio_format, cache in caches.items()}
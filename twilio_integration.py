@@ -6,16 +6,21 @@ This module handles the integration with Twilio for:
 2. Processing audio streams for speech recognition
 3. Generating TwiML responses
 4. Sending SMS confirmations
+5. Connecting calls to the media stream endpoint (see media_stream)
+6. Preparing replies from Gather's partial speech results (see speculation)
 """
 
 from flask import request, Response
 import os
-from twilio.twiml.voice_response import VoiceResponse, Gather
-from twilio.rest import Client
 import logging
 import json
 import uuid
+from types import SimpleNamespace
 from datetime import datetime
+from session_store import create_session_store
+from metrics import metrics, set_turn_state
+from providers import providers
+from speculation import SpeculativeTurns, SPECULATION_ENABLED
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,131 +31,292 @@ TWILIO_ACCOUNT_SID = "YOUR_TWILIO_ACCOUNT_SID"
 TWILIO_AUTH_TOKEN = "YOUR_TWILIO_AUTH_TOKEN"
 TWILIO_PHONE_NUMBER = "YOUR_TWILIO_PHONE_NUMBER"
 
-# Initialize Twilio client
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+# wss:// URL of the media stream endpoint (asgi_app); when set, calls are
+# answered with a bidirectional media stream instead of Say/Gather round trips
+MEDIA_STREAM_URL = os.getenv('MEDIA_STREAM_URL', '')
 
-# In-memory session storage (would be a database in production)
-call_sessions = {}
+GREETING = "Thank you for calling Noor Medical Clinic. This is Rachel speaking. How may I help you today?"
+
+def load_twilio_client():
+    """Twilio REST client for calls and SMS"""
+    from twilio.rest import Client
+    return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+def load_twiml():
+    """TwiML builders for webhook responses"""
+    from twilio.twiml.voice_response import VoiceResponse, Gather, Connect
+    return SimpleNamespace(VoiceResponse=VoiceResponse, Gather=Gather, Connect=Connect)
+
+# The SDK is imported on first use (or by provider warm-up)
+providers.register('twilio', load_twilio_client)
+providers.register('twiml', load_twiml)
+
+# Call sessions, shared between workers when SESSION_STORE=sqlite so a
+# callback landing on another worker still finds its call
+call_sessions = create_session_store('twilio')
 
 def register_twilio_routes(app, conversation_handler):
-    """Register Twilio webhook routes with the Flask app"""
+    """Register Twilio webhook routes with the Flask app (returns the call SpeculativeTurns)"""
     
     @app.route('/twilio/voice', methods=['POST'])
     def twilio_voice():
         """Handle incoming Twilio voice calls"""
-        # Get call SID from Twilio request
-        call_sid = request.values.get('CallSid')
-        
-        # Create a new session for this call
-        session_id = str(uuid.uuid4())
-        call_sessions[call_sid] = {
-            'id': session_id,
-            'call_sid': call_sid,
-            'start_time': datetime.now().isoformat(),
-            'conversation': [],
-            'patient_info': {
-                'name': None,
-                'service': None,
-                'preferred_time': None,
-                'phone_number': request.values.get('From')
-            },
-            'state': 'greeting'
-        }
-        
-        # Log the new call
-        logger.info(f"New call received: {call_sid}, session: {session_id}")
-        
-        # Create TwiML response
-        response = VoiceResponse()
-        
-        # Add initial greeting message
-        response.say(
-            "Thank you for calling Noor Medical Clinic. This is Rachel speaking. How may I help you today?",
-            voice="alice"  # In production, this would use ElevenLabs
-        )
-        
-        # Start gathering speech input
-        gather = Gather(
-            input='speech',
-            action='/twilio/gather',
-            method='POST',
-            speech_timeout='auto',
-            language='en-US'
-        )
-        response.append(gather)
-        
-        # Update session state
-        call_sessions[call_sid]['state'] = 'collect_name'
-        call_sessions[call_sid]['conversation'].append({
-            'role': 'system',
-            'text': "Thank you for calling Noor Medical Clinic. This is Rachel speaking. How may I help you today?",
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        return Response(str(response), mimetype='text/xml')
+        return Response(handle_voice_webhook(request.values), mimetype='text/xml')
+    
+    speculation = create_call_speculation(conversation_handler)
     
     @app.route('/twilio/gather', methods=['POST'])
     def twilio_gather():
         """Handle speech input from Twilio Gather"""
-        # Get call SID and speech result from Twilio request
-        call_sid = request.values.get('CallSid')
-        speech_result = request.values.get('SpeechResult')
-        
-        # Check if we have a valid session
-        if call_sid not in call_sessions:
-            logger.error(f"No session found for call: {call_sid}")
-            response = VoiceResponse()
-            response.say("I'm sorry, there was an error with your call. Please try again later.")
-            response.hangup()
-            return Response(str(response), mimetype='text/xml')
-        
-        # Get the current session
-        session = call_sessions[call_sid]
-        
-        # Log user input
-        logger.info(f"Speech input for call {call_sid}: {speech_result}")
-        session['conversation'].append({
-            'role': 'user',
-            'text': speech_result,
-            'timestamp': datetime.now().isoformat()
-        })
+        return Response(handle_gather_webhook(request.values, conversation_handler, speculation), mimetype='text/xml')
+    
+    @app.route('/twilio/gather-partial', methods=['POST'])
+    def twilio_gather_partial():
+        """Handle interim speech results from Twilio Gather"""
+        handle_gather_partial_webhook(request.values, speculation)
+        return Response(status=204)
+    
+    return speculation
+
+def start_call_session(call_sid, from_number):
+    """
+    Create and store the session for a new call, greeting included
+    
+    Args:
+        call_sid: Twilio call SID
+        from_number: Caller's number
         
-        # Process the conversation using the handler
-        # In production, this would use Whisper for better transcription and GPT-4 for conversation
-        result = conversation_handler(session['id'], speech_result, session)
+    Returns:
+        Session dict
+    """
+    session_id = str(uuid.uuid4())
+    session = {
+        'id': session_id,
+        'call_sid': call_sid,
+        'start_time': datetime.now().isoformat(),
+        'conversation': [],
+        'patient_info': {
+            'name': None,
+            'service': None,
+            'preferred_time': None,
+            'phone_number': from_number
+        },
+        'state': 'collect_name'
+    }
+    session['conversation'].append({
+        'role': 'system',
+        'text': GREETING,
+        'timestamp': datetime.now().isoformat()
+    })
+    call_sessions[call_sid] = session
+    
+    # Log the new call
+    logger.info(f"New call received: {call_sid}, session: {session_id}")
+    return session
+
+def handle_voice_webhook(values):
+    """
+    Start a session for an incoming Twilio call
+    
+    With MEDIA_STREAM_URL set, the call is connected to the media stream
+    endpoint (which greets the caller itself); otherwise it is answered with
+    Say and Gather.
+    
+    Args:
+        values: Twilio webhook form values
         
-        # Create TwiML response
-        response = VoiceResponse()
+    Returns:
+        TwiML response as a string
+    """
+    # Get call SID from Twilio request
+    call_sid = values.get('CallSid')
+    start_call_session(call_sid, values.get('From'))
+    
+    # Create TwiML response
+    twiml = providers.get('twiml')
+    response = twiml.VoiceResponse()
+    
+    if MEDIA_STREAM_URL:
+        connect = twiml.Connect()
+        connect.stream(url=MEDIA_STREAM_URL)
+        response.append(connect)
+        return str(response)
+    
+    # Add initial greeting message
+    response.say(
+        GREETING,
+        voice="alice"  # In production, this would use ElevenLabs
+    )
+    
+    # Start gathering speech input
+    response.append(gather_speech(twiml))
+    
+    return str(response)
+
+def gather_speech(twiml):
+    """
+    Gather verb for the caller's next utterance
+    
+    With speculation on, Twilio also posts partial results to
+    /twilio/gather-partial while the caller speaks.
+    """
+    options = {}
+    if SPECULATION_ENABLED:
+        options = {'partial_result_callback': '/twilio/gather-partial', 'partial_result_callback_method': 'POST'}
+    return twiml.Gather(
+        input='speech',
+        action='/twilio/gather',
+        method='POST',
+        speech_timeout='auto',
+        language='en-US',
+        **options
+    )
+
+def run_call_turn(call_sid, speech_result, conversation_handler, store=None):
+    """
+    Run a conversation turn for a call and save its session
+    
+    Shared by the Gather webhook and the media stream endpoint.
+    
+    Args:
+        call_sid: Twilio call SID
+        speech_result: Transcribed caller speech
+        conversation_handler: Callable (session_id, transcript, session) -> dict with text and next_state
+        store: Session store holding the call (default: call_sessions); speculative
+            turns pass a private copy
         
-        # Add the response message
-        response.say(result['text'], voice="alice")  # In production, this would use ElevenLabs
+    Returns:
+        The handler's result, or None if the call has no session
+    """
+    store = call_sessions if store is None else store
+    session = store.get(call_sid)
+    if session is None:
+        logger.error(f"No session found for call: {call_sid}")
+        return None
+    set_turn_state(session.get('state'))
+    
+    # Log user input
+    logger.info(f"Speech input for call {call_sid}: {speech_result}")
+    session['conversation'].append({
+        'role': 'user',
+        'text': speech_result,
+        'timestamp': datetime.now().isoformat()
+    })
+    
+    # Process the conversation using the handler
+    # In production, this would use Whisper for better transcription and GPT-4 for conversation
+    result = conversation_handler(session['id'], speech_result, session)
+    
+    # Log system response
+    session['conversation'].append({
+        'role': 'system',
+        'text': result['text'],
+        'timestamp': datetime.now().isoformat()
+    })
+    
+    # Update session state
+    session['state'] = result['next_state']
+    store[call_sid] = session
+    return result
+
+def create_call_speculation(conversation_handler):
+    """
+    Speculative call turns for Gather's partial results
+    
+    The demo handlers book the appointment on the phone number turn, so
+    collect_phone is never speculated.
+    
+    Args:
+        conversation_handler: Callable (session_id, transcript, session) -> dict with text and next_state
         
-        # Log system response
-        session['conversation'].append({
-            'role': 'system',
-            'text': result['text'],
-            'timestamp': datetime.now().isoformat()
-        })
+    Returns:
+        SpeculativeTurns keyed by call SID
+    """
+    def speculate(call_sid, speech_result, session):
+        return run_call_turn(call_sid, speech_result, conversation_handler, store={call_sid: session})
+    
+    return SpeculativeTurns('phone', call_sessions.get, speculate, skip_states=('collect_phone',))
+
+def handle_gather_partial_webhook(values, speculation):
+    """
+    Speculate on a partial speech result from Gather's partialResultCallback
+    
+    Args:
+        values: Twilio webhook form values (UnstableSpeechResult, StableSpeechResult, SequenceNumber)
+        speculation: SpeculativeTurns from create_call_speculation
         
-        # Update session state
-        session['state'] = result['next_state']
+    Returns:
+        True if a speculative turn covers the partial result
+    """
+    # Twilio splits the hypothesis into a settled start and a still-changing end
+    speech = " ".join(part.strip() for part in (values.get('StableSpeechResult'), values.get('UnstableSpeechResult')) if part)
+    sequence = values.get('SequenceNumber')
+    return speculation.partial(values.get('CallSid'), speech, int(sequence) if sequence else None)
+
+def take_speculative_call_turn(call_sid, speech_result, speculation):
+    """
+    Get the turn prepared from partial results for a final speech result
+    
+    Args:
+        call_sid: Twilio call SID
+        speech_result: Final transcribed caller speech
+        speculation: SpeculativeTurns from create_call_speculation
         
-        # If we're not ending the call, gather more speech
-        if result['next_state'] != 'end_call':
-            gather = Gather(
-                input='speech',
-                action='/twilio/gather',
-                method='POST',
-                speech_timeout='auto',
-                language='en-US'
-            )
-            response.append(gather)
-        else:
-            # End the call after a delay
-            response.pause(length=1)
-            response.hangup()
+    Returns:
+        The handler's result (the call session saved), or None if nothing matches
+    """
+    prepared = speculation.take(call_sid, speech_result or '')
+    if prepared is None:
+        return None
+    result, session = prepared
+    call_sessions[call_sid] = session
+    return result
+
+@metrics.turn('twilio_gather')
+def handle_gather_webhook(values, conversation_handler, speculation=None):
+    """
+    Run a conversation turn for speech gathered by Twilio
+    
+    Framework-neutral so both the Flask routes and the ASGI app can use it;
+    conversation_handler may block (it calls the LLM), so async callers run
+    this in their executor.
+    
+    Args:
+        values: Twilio webhook form values
+        conversation_handler: Callable (session_id, transcript, session) -> dict with text and next_state
+        speculation: SpeculativeTurns whose prepared turn is used when it matches
         
-        return Response(str(response), mimetype='text/xml')
+    Returns:
+        TwiML response as a string
+    """
+    # Get call SID and speech result from Twilio request
+    call_sid = values.get('CallSid')
+    speech_result = values.get('SpeechResult')
+    
+    result = take_speculative_call_turn(call_sid, speech_result, speculation) if speculation else None
+    if result is None:
+        result = run_call_turn(call_sid, speech_result, conversation_handler)
+    if result is None:
+        response = providers.get('twiml').VoiceResponse()
+        response.say("I'm sorry, there was an error with your call. Please try again later.")
+        response.hangup()
+        return str(response)
+    
+    # Create TwiML response
+    response = providers.get('twiml').VoiceResponse()
+    
+    # Add the response message
+    response.say(result['text'], voice="alice")  # In production, this would use ElevenLabs
+    
+    # If we're not ending the call, gather more speech
+    if result['next_state'] != 'end_call':
+        response.append(gather_speech(providers.get('twiml')))
+    else:
+        # End the call after a delay
+        response.pause(length=1)
+        response.hangup()
+    
+    return str(response)
 
 def send_sms_confirmation(to_number, message):
     """Send SMS confirmation using Twilio"""
@@ -160,7 +326,7 @@ def send_sms_confirmation(to_number, message):
             to_number = '+' + to_number
             
         # Send the message
-        message = client.messages.create(
+        message = providers.get('twilio').messages.create(
             body=message,
             from_=TWILIO_PHONE_NUMBER,
             to=to_number
@@ -11,18 +11,32 @@ This version includes:
 - Natural speech patterns with pauses and fillers
 - ElevenLabs voice synthesis with improved expressiveness
 - Modern UI/UX design
+- Replies prepared from interim transcripts while the caller is still talking
 """
 
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response, redirect, stream_with_context
 import os
 import json
 import logging
 import random
-import requests
 import re
 import time
+import uuid
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from intent_router import IntentRouter
+from audio_streaming import AudioStreamRegistry
+from audio_cache import tts_cache, make_cache_key, TTSCache, TTS_CACHE_DIR
+from phrase_bank import PhraseBank, split_template, template_static_phrases, finalize_wav, PHRASE_SAMPLE_RATE
+from http_client import http_client
+from session_store import create_session_store
+from audio_store import AudioStore
+from metrics import metrics, set_turn_state, PROMETHEUS_CONTENT_TYPE
+from time_parser import scan_time_expressions, time_label, parse_time_range, format_slot, SLOT_MINUTES
+from availability import AvailabilityEngine
+from job_queue import JobQueue
+from transcoder import VariantCache, transcode, AUDIO_FORMATS, MIMETYPE_FORMATS
+from speculation import SpeculativeTurns, SPECULATION_PRESTART_TTS
 
 # Load environment variables
 load_dotenv()
@@ -38,21 +52,33 @@ app.secret_key = os.urandom(24)  # For session management
 # API Keys from environment variables
 ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY')
 ELEVENLABS_VOICE_ID = os.getenv('ELEVENLABS_VOICE_ID')
+ELEVENLABS_MODEL_ID = "eleven_monolingual_v1"
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
 
+# Stream TTS audio to the browser while it is synthesized (set to "false" to
+# synthesize the whole clip before returning its URL)
+ELEVENLABS_STREAMING = os.getenv('ELEVENLABS_STREAMING', 'true').lower() == 'true'
+STREAM_CHUNK_SIZE = 4096
+
+# Stitch templated responses from pre-rendered phrases instead of synthesizing them whole
+PHRASE_BANK_ENABLED = os.getenv('PHRASE_BANK_ENABLED', 'true').lower() == 'true'
+
+# Sessions expire when idle; set SESSION_STORE=sqlite to share them between workers
+sessions = create_session_store('web')
+# Audio URLs stop working once their session has expired (with in-memory
+# sessions, only in the worker that owns the session)
+audio_store = AudioStore(session_alive=sessions.exists, shared_sessions=sessions.shared)
+audio_store.start_gc()
 # In-memory storage for demo purposes
-sessions = {}
 appointments = []
-
-# Sample available time slots for different services
-AVAILABLE_SLOTS = {
-    "dental": ["Monday at 10:00 AM", "Tuesday at 2:30 PM", "Wednesday at 9:15 AM"],
-    "ent": ["Monday at 11:30 AM", "Wednesday at 3:00 PM", "Friday at 10:45 AM"],
-    "dermatology": ["Tuesday at 9:00 AM", "Thursday at 1:15 PM", "Friday at 4:30 PM"],
-    "general": ["Monday at 8:30 AM", "Tuesday at 4:00 PM", "Thursday at 11:00 AM"]
-}
+# Booking side effects (calendar event, Sheets row, SMS) run after the reply is returned
+jobs = JobQueue()
+audio_streams = AudioStreamRegistry()
+pcm_cache = TTSCache(cache_dir=f"{TTS_CACHE_DIR}-pcm", extension='pcm')
+# Clips transcoded for other channels (telephony mu-law, Opus), next to the source clip
+audio_variants = VariantCache()
 
 # Doctor information with detailed personality traits and specialties
 DOCTORS = {
@@ -146,6 +172,12 @@ DOCTORS = {
     ]
 }
 
+# Working hours and booked slots of every doctor, indexed for slot queries
+availability = AvailabilityEngine()
+for service_category, service_doctors in DOCTORS.items():
+    for service_doctor in service_doctors:
+        availability.add_doctor(service_doctor["name"], service_category, service_doctor["availability"])
+
 # Rachel's personality traits and background information
 RACHEL_INFO = {
     "name": "Rachel",
@@ -344,6 +376,120 @@ INTERRUPTION_RESPONSES = {
     ]
 }
 
+# Responses with fixed wording around a few variable slots. Their static text
+# (and every entry in FILLERS) is pre-rendered by the phrase bank, so only the
+# slots are synthesized per call. Slots named filler* take an add_filler() value.
+RESPONSE_TEMPLATES = {
+    "confirm_name": "Thanks, {name}! {filler1} Did I get your name right? {filler2} What type of appointment would you like to schedule? We offer dental care, ENT services, dermatology, and general checkups. Or if you have questions about any of our doctors or services, I'm happy to help with that too.",
+    "booking_confirmed": "Perfect! {filler1} I've booked your {service} appointment with {doctor} for {time}. You'll receive a text confirmation at {phone} shortly, and a reminder the day before your appointment. Is there anything else I can help you with today? Any questions about preparing for your visit?"
+}
+
+# Voice emotion for a response, by the caller's detected emotional state ("friendly" otherwise)
+RESPONSE_EMOTIONS = {
+    "anxiety": "reassuring",
+    "urgency": "efficient",
+    "frustration": "apologetic"
+}
+
+# Keyword tables for the conversation helpers. All of them are compiled into a
+# single intent router so each transcript is scanned once per turn.
+EMOTION_KEYWORDS = {
+    "pain": ["pain", "hurt", "ache", "sore", "discomfort", "suffering", "agony", "ouch"],
+    "anxiety": ["anxious", "nervous", "worried", "scared", "afraid", "fear", "stress", "concern", "panic"],
+    "urgency": ["urgent", "emergency", "asap", "right away", "immediately", "soon", "hurry", "quick"],
+    "confusion": ["confused", "don't understand", "what do you mean", "unclear", "lost", "not following"],
+    "frustration": ["frustrated", "annoyed", "upset", "angry", "mad", "irritated", "fed up", "tired of"]
+}
+
+HUMOR_KEYWORDS = {
+    "indicator": ["haha", "hehe", "lol", "lmao", "rofl", "joke", "funny", "kidding", "just kidding", "jk"],
+    "knock_knock": ["knock knock"],
+    "setup": ["why did the", "what do you call"]
+}
+
+COMPLIMENT_KEYWORDS = [
+    "nice voice", "sound nice", "sound good", "like your voice",
+    "helpful", "you're great", "you are great", "you're amazing", "you are amazing",
+    "thank you so much", "appreciate", "wonderful", "excellent", "fantastic",
+    "good job", "well done", "impressive"
+]
+
+SMALL_TALK_KEYWORDS = {
+    "identity": ["your name", "who are you"],
+    "how_are_you": ["how are you", "how's your day", "how are things"],
+    "thanks": ["thank you", "thanks"],
+    "weather": ["weather", "nice day", "raining", "sunny"],
+    "weekend": ["weekend", "saturday", "sunday"],
+    "joke": ["joke", "funny"],
+    "how_long": ["how long"],
+    "work": ["work", "been"],
+    "like": ["like"],
+    "job": ["job"],
+    "do_you": ["do you"],
+    "residence": ["live", "from"],
+    "greeting": ["hi", "hello", "hey", "greetings", "good morning", "good afternoon", "good evening"]
+}
+
+CLINIC_KEYWORDS = {
+    "hours": ["hours", "open", "close", "when"],
+    "location": ["location", "address", "where"],
+    "parking": ["parking"],
+    "insurance": ["insurance", "cover", "payment"],
+    "covid": ["covid", "mask", "vaccination"],
+    "services": ["services", "offer", "provide"]
+}
+
+DOCTOR_KEYWORDS = {
+    "title": ["dr"],
+    "quality": ["good", "recommend", "best", "trust"],
+    "availability": ["available", "schedule", "appointment", "book"],
+    "specialty": ["specialty", "specialize", "expert"],
+    "experience": ["experience", "how long", "background"],
+    "language": ["language", "speak"],
+    "follow_up": ["doctor", "about", "tell me", "good", "who"],
+    "general": ["doctor", "specialist", "physician"],
+    "count": ["how many", "available"]
+}
+
+BOOKING_KEYWORDS = ["book", "schedule", "appointment", "reserve", "see a doctor", "visit", "come in"]
+
+LISTENING_KEYWORDS = ["hear me out", "listen", "excuse me", "wait", "hold on"]
+
+AFFIRMATIVE_KEYWORDS = ["yes", "yeah", "yep", "sure", "okay", "ok", "fine", "good", "alright", "correct", "right", "yup", "absolutely", "definitely", "certainly", "indeed", "true", "affirmative", "agreed", "works", "that works"]
+
+NEGATIVE_KEYWORDS = ["no", "nope", "nah", "not", "don't", "cannot", "can't", "won't", "wouldn't", "shouldn't", "never", "negative", "disagree", "incorrect", "wrong", "false", "impossible", "unavailable"]
+
+def doctor_name_keywords(doctor):
+    """Get the (first, last) name keywords used to spot a doctor in a transcript"""
+    name_parts = doctor["name"].split()
+    doctor_first = name_parts[0].lower().replace("dr.", "").strip()
+    doctor_last = name_parts[1].lower()
+    return doctor_first, doctor_last
+
+def build_intent_keywords():
+    """Flatten every keyword table into the category -> keywords mapping of the intent router"""
+    tables = {}
+
+    for prefix, group in [("emotion", EMOTION_KEYWORDS), ("humor", HUMOR_KEYWORDS),
+                          ("small_talk", SMALL_TALK_KEYWORDS), ("clinic", CLINIC_KEYWORDS),
+                          ("doctor", DOCTOR_KEYWORDS)]:
+        for name, keywords in group.items():
+            tables[f"{prefix}.{name}"] = keywords
+
+    tables["doctor.name"] = [keyword for doctors_list in DOCTORS.values()
+                             for doctor in doctors_list
+                             for keyword in doctor_name_keywords(doctor) if keyword]
+    tables["compliment"] = COMPLIMENT_KEYWORDS
+    tables["booking"] = BOOKING_KEYWORDS
+    tables["listening"] = LISTENING_KEYWORDS
+    tables["affirmative"] = AFFIRMATIVE_KEYWORDS
+    tables["negative"] = NEGATIVE_KEYWORDS
+
+    return tables
+
+# Compiled once at startup
+intent_router = IntentRouter(build_intent_keywords())
+
 @app.route('/')
 def index():
     """Render the web demo interface with continuous listening"""
@@ -352,8 +498,85 @@ def index():
 @app.route('/api/start-call', methods=['POST'])
 def start_call():
     """Initialize a new call session"""
+    with metrics.turn('start_call'):
+        return send_reply(begin_call())
+
+@app.route('/api/process-speech', methods=['POST'])
+def process_speech():
+    """Process transcribed speech with advanced conversation capabilities"""
+    data = request.json
+    with metrics.turn('process_speech'):
+        reply = take_speculative_reply(data)
+        if reply is not None:
+            return jsonify(reply)
+        return send_reply(handle_speech(data), data.get('session_id'))
+
+@app.route('/api/process-partial', methods=['POST'])
+def process_partial():
+    """Start preparing the reply to an interim transcript (the final one still goes to /api/process-speech)"""
+    data = request.json
+    speculating = speech_speculation.partial(data.get('session_id'), data.get('transcript', ''))
+    return jsonify({'status': 'ok', 'speculating': speculating})
+
+def speculate_speech(session_id, transcript, session):
+    """
+    Run a turn for an interim transcript on a copy of the session
+    
+    Args:
+        session_id: Web session ID
+        transcript: Interim transcript
+        session: Private copy of the session (updated in place)
+        
+    Returns:
+        Reply dict as sent to the client, with its audio already started
+    """
+    reply = handle_speech({'session_id': session_id, 'transcript': transcript}, store={session_id: session})
+    voice = reply.pop('voice', None)
+    if voice and SPECULATION_PRESTART_TTS:
+        reply['audio_url'] = synthesize_reply_voice(voice, session_id)
+    elif voice:
+        reply['voice'] = voice
+    return reply
+
+def take_speculative_reply(data):
+    """
+    Get the reply prepared from interim transcripts for a final one
+    
+    Args:
+        data: /api/process-speech request body
+        
+    Returns:
+        Reply dict (audio started), or None if no speculative turn matches
+    """
+    session_id = data.get('session_id')
+    if data.get('interrupted'):
+        # Interrupted turns are answered differently than the speculation assumed
+        speech_speculation.discard(session_id)
+        return None
+    
+    prepared = speech_speculation.take(session_id, data.get('transcript', ''))
+    if prepared is None:
+        return None
+    reply, session = prepared
+    sessions[session_id] = session
+    
+    voice = reply.pop('voice', None)
+    if voice:
+        reply['audio_url'] = synthesize_reply_voice(voice, session_id)
+    return reply
+
+# Web turns prepared from interim transcripts; confirm_phone books the slot, so it is never speculated
+speech_speculation = SpeculativeTurns('web', sessions.get, speculate_speech, skip_states=('confirm_phone',))
+
+def begin_call():
+    """
+    Create a call session and build its greeting
+    
+    Returns:
+        Reply dict (see voice_reply) including the new session_id
+    """
     session_id = str(random.randint(10000, 99999))
-    sessions[session_id] = {
+    session = {
         'state': 'greeting',
         'patient_info': {},
         'conversation': [],
@@ -368,40 +591,47 @@ def start_call():
         'was_interrupted': False,
         'last_response_time': datetime.now().isoformat()
     }
+    set_turn_state('greeting')
     
     # Add a natural filler word occasionally
     greeting = add_human_touches("Hello, thank you for calling Noor Medical Clinic. This is Rachel speaking. How can I help you today?")
     
     # Add to conversation history
-    sessions[session_id]['conversation'].append({
+    session['conversation'].append({
         'role': 'system',
         'text': greeting,
         'timestamp': datetime.now().isoformat()
     })
+    sessions[session_id] = session
     
-    # Generate voice audio with appropriate pauses and intonation
-    audio_url = generate_voice(greeting, emotion="friendly")
-    
-    return jsonify({
-        'session_id': session_id,
-        'text': greeting,
-        'audio_url': audio_url,
-        'next_state': 'greeting'
-    })
+    return voice_reply(greeting, 'greeting', emotion="friendly", session_id=session_id)
 
-@app.route('/api/process-speech', methods=['POST'])
-def process_speech():
-    """Process transcribed speech with advanced conversation capabilities"""
-    data = request.json
+def handle_speech(data, store=None):
+    """
+    Run one conversation turn for a transcript
+    
+    Only updates the session and decides what to say; the reply's audio is
+    synthesized by the serving layer (send_reply here, or the ASGI app).
+    
+    Args:
+        data: Request body with session_id, transcript and interrupted
+        store: Session store to read and save the session in (default: sessions);
+            speculative turns pass a private copy
+        
+    Returns:
+        Reply dict (see voice_reply), or {'error': ...} for an unknown session
+    """
     session_id = data.get('session_id')
     transcript = data.get('transcript', '').strip()
     was_interrupted = data.get('interrupted', False)
+    store = sessions if store is None else store
     
-    if not session_id or session_id not in sessions:
-        return jsonify({'error': 'Invalid session ID'})
+    session = store.get(session_id) if session_id else None
+    if session is None:
+        return {'error': 'Invalid session ID'}
     
-    session = sessions[session_id]
     current_state = session.get('state', 'greeting')
+    set_turn_state(current_state)
     patient_info = session.get('patient_info', {})
     small_talk_count = session.get('small_talk_count', 0)
     last_topic = session.get('last_topic', None)
@@ -424,15 +654,19 @@ def process_speech():
         'interrupted': was_interrupted
     })
     
+    # Scan the transcript once; every check below is a lookup on this result
+    with metrics.span('intent_scan'):
+        intents = intent_router.scan(transcript)
+    
     # Detect emotional state from text
-    new_emotional_state = detect_emotion(transcript)
+    new_emotional_state = detect_emotion(transcript, intents)
     if new_emotional_state != 'neutral':
         emotional_state = new_emotional_state
         session['emotional_state'] = emotional_state
         logger.info(f"Detected emotional state: {emotional_state}")
     
     # Check for humor or jokes
-    humor_response = check_for_humor(transcript)
+    humor_response = check_for_humor(transcript, intents)
     if humor_response:
         # Add human touches like fillers and pauses
         humor_response = add_human_touches(humor_response)
@@ -444,20 +678,13 @@ def process_speech():
             'timestamp': datetime.now().isoformat()
         })
         
-        # Generate voice audio with appropriate emotion
-        audio_url = generate_voice(humor_response, emotion="amused")
-        
         # Update session
-        sessions[session_id] = session
+        store[session_id] = session
         
-        return jsonify({
-            'text': humor_response,
-            'audio_url': audio_url,
-            'next_state': current_state
-        })
+        return voice_reply(humor_response, current_state, emotion="amused")
     
     # Check for compliments
-    if is_compliment(transcript):
+    if is_compliment(transcript, intents):
         compliment_response = random.choice(SMALL_TALK["compliment"])
         compliment_response = add_human_touches(compliment_response)
         
@@ -468,20 +695,13 @@ def process_speech():
             'timestamp': datetime.now().isoformat()
         })
         
-        # Generate voice audio with appropriate emotion
-        audio_url = generate_voice(compliment_response, emotion="happy")
-        
         # Update session
-        sessions[session_id] = session
+        store[session_id] = session
         
-        return jsonify({
-            'text': compliment_response,
-            'audio_url': audio_url,
-            'next_state': current_state
-        })
+        return voice_reply(compliment_response, current_state, emotion="happy")
     
     # Check for doctor-specific questions or comments
-    doctor_response = check_for_doctor_questions(transcript, session)
+    doctor_response = check_for_doctor_questions(transcript, session, intents)
     if doctor_response:
         # Remember we discussed this doctor
         if "Dr." in doctor_response:
@@ -507,20 +727,13 @@ def process_speech():
             'timestamp': datetime.now().isoformat()
         })
         
-        # Generate voice audio with appropriate emotion
-        audio_url = generate_voice(doctor_response, emotion="reassuring")
-        
         # Update session
-        sessions[session_id] = session
+        store[session_id] = session
         
-        return jsonify({
-            'text': doctor_response,
-            'audio_url': audio_url,
-            'next_state': current_state
-        })
+        return voice_reply(doctor_response, current_state, emotion="reassuring")
     
     # Check for clinic-specific questions
-    clinic_response = check_for_clinic_questions(transcript)
+    clinic_response = check_for_clinic_questions(transcript, intents)
     if clinic_response:
         session['last_topic'] = 'clinic_info'
         mentioned_topics.add('clinic_info')
@@ -535,20 +748,13 @@ def process_speech():
             'timestamp': datetime.now().isoformat()
         })
         
-        # Generate voice audio
-        audio_url = generate_voice(clinic_response, emotion="informative")
-        
         # Update session
-        sessions[session_id] = session
-        
-        return jsonify({
-            'text': clinic_response,
-            'audio_url': audio_url,
-            'next_state': current_state
-        })
+        store[session_id] = session
+
+        return voice_reply(clinic_response, current_state, emotion="informative")
     
     # Check for small talk or personal questions
-    small_talk_response = check_for_small_talk(transcript)
+    small_talk_response = check_for_small_talk(transcript, intents)
     if small_talk_response:
         session['small_talk_count'] = small_talk_count + 1
         session['last_topic'] = 'small_talk'
@@ -575,21 +781,14 @@ def process_speech():
             'timestamp': datetime.now().isoformat()
         })
         
-        # Generate voice audio with friendly tone
-        audio_url = generate_voice(small_talk_response, emotion="friendly")
-        
         # Update session
         session['state'] = next_state
-        sessions[session_id] = session
+        store[session_id] = session
         
-        return jsonify({
-            'text': small_talk_response,
-            'audio_url': audio_url,
-            'next_state': next_state
-        })
+        return voice_reply(small_talk_response, next_state, emotion="friendly")
     
     # Check for "hear me out" or similar phrases indicating user wants attention
-    if re.search(r'hear me out|listen|excuse me|wait|hold on', transcript.lower()):
+    if wants_attention(transcript, intents):
         listening_response = random.choice(BRIDGES['listening'])
         session['last_topic'] = 'listening'
         
@@ -603,17 +802,10 @@ def process_speech():
             'timestamp': datetime.now().isoformat()
         })
         
-        # Generate voice audio with attentive tone
-        audio_url = generate_voice(listening_response, emotion="attentive")
-        
         # Update session
-        sessions[session_id] = session
+        store[session_id] = session
         
-        return jsonify({
-            'text': listening_response,
-            'audio_url': audio_url,
-            'next_state': current_state
-        })
+        return voice_reply(listening_response, current_state, emotion="attentive")
     
     # Handle if user was interrupted
     if session.get('was_interrupted', False):
@@ -631,17 +823,14 @@ def process_speech():
             'timestamp': datetime.now().isoformat()
         })
         
-        # Generate voice audio with apologetic tone
-        audio_url = generate_voice(interruption_response, emotion="apologetic")
-        
         # Update session
-        sessions[session_id] = session
+        store[session_id] = session
         
-        return jsonify({
-            'text': interruption_response,
-            'audio_url': audio_url,
-            'next_state': current_state
-        })
+        return voice_reply(interruption_response, current_state, emotion="apologetic")
+    
+    # Set when the response comes from RESPONSE_TEMPLATES so its audio can be stitched
+    response_template = None
+    state_machine_start = time.perf_counter()
     
     # Process based on current state with improved NLP and context awareness
     if current_state == 'greeting':
@@ -657,7 +846,7 @@ def process_speech():
             next_state = 'collect_service'
         else:
             # Check if they're asking about booking
-            if is_booking_inquiry(transcript):
+            if is_booking_inquiry(transcript, intents):
                 response_text = f"{add_filler()} I'd be happy to help you book an appointment! Could I get your name first, please?"
                 next_state = 'collect_name'
             else:
@@ -673,7 +862,8 @@ def process_speech():
             context_memory['patient_name'] = name
             
             # Confirm the name to ensure accuracy
-            response_text = f"Thanks, {name}! {add_filler()} Did I get your name right? {add_filler()} What type of appointment would you like to schedule? We offer dental care, ENT services, dermatology, and general checkups. Or if you have questions about any of our doctors or services, I'm happy to help with that too."
+            response_template = ("confirm_name", {"name": name, "filler1": add_filler(), "filler2": add_filler()})
+            response_text = render_response_template(*response_template)
             next_state = 'collect_service'
         else:
             # If we still can't extract a name, ask for clarification
@@ -725,39 +915,46 @@ def process_speech():
             next_state = 'collect_service'
         
     elif current_state == 'collect_time':
-        # Extract preferred time with improved NLP
-        preferred_time = extract_time(transcript)
+        # Resolve the preferred time to a datetime range relative to now
+        time_range = parse_time_range(transcript)
         
-        if preferred_time:
+        if time_range:
+            preferred_time = time_range.label
             patient_info['preferred_time'] = preferred_time
+            patient_info['preferred_start'] = time_range.start
             context_memory['appointment_time'] = preferred_time
             
-            # Check availability with more realistic logic
+            # Check the doctors' schedules, preferring the doctor already discussed
             service_type = get_service_category(patient_info.get('service', ''))
-            is_available = check_availability(service_type, preferred_time)
-            
-            if is_available:
+            slot = check_availability(service_type, time_range, session.get('current_doctor_discussed'))
+
+            if slot:
+                patient_info['preferred_start'], patient_info['doctor'] = slot
+                # A part of the day ("tuesday afternoon") or an off-grid time narrows to a slot
+                if slot[0] != time_range.start or time_range.end - time_range.start > timedelta(minutes=SLOT_MINUTES):
+                    preferred_time = format_slot(slot[0])
+                    patient_info['preferred_time'] = preferred_time
+                    context_memory['appointment_time'] = preferred_time
+
                 response_text = f"Perfect! {add_filler()} {preferred_time} works great for your {patient_info['service']} appointment. Could I get your phone number for the confirmation? We'll send you a reminder text the day before."
                 next_state = 'collect_phone'
             else:
-                # Suggest alternative based on service type
-                alternative_time = suggest_alternative_time(service_type, preferred_time)
-                patient_info['alternative_time'] = alternative_time
-                context_memory['alternative_time'] = alternative_time
-                
-                # Get doctor information for personalization
-                doctors_list = DOCTORS.get(service_type, [])
-                if doctors_list and session.get('current_doctor_discussed'):
-                    # Try to use the previously discussed doctor
-                    doctor_name = session.get('current_doctor_discussed')
-                    doctor = next((d for d in doctors_list if d["name"] == doctor_name), random.choice(doctors_list))
+                # Suggest the nearest free slot and the doctor who has it
+                suggestion = suggest_alternative_time(service_type, time_range.start, doctor=session.get('current_doctor_discussed'))
+
+                if suggestion:
+                    alternative_start, doctor_name = suggestion
+                    alternative_time = format_slot(alternative_start)
+                    patient_info['alternative_time'] = alternative_time
+                    patient_info['alternative_start'] = alternative_start
+                    patient_info['alternative_doctor'] = doctor_name
+                    context_memory['alternative_time'] = alternative_time
+
+                    response_text = f"{add_filler()} I just checked the schedule, and unfortunately {preferred_time} is already booked for {patient_info['service']}. {doctor_name} does have availability on {alternative_time} though. Would that work for you instead?"
+                    next_state = 'confirm_alternative_time'
                 else:
-                    doctor = random.choice(doctors_list) if doctors_list else {"name": "our specialist"}
-                
-                doctor_name = doctor["name"] if isinstance(doctor, dict) else doctor
-                
-                response_text = f"{add_filler()} I just checked the schedule, and unfortunately {preferred_time} is already booked for {patient_info['service']}. {doctor_name} does have availability on {alternative_time} though. Would that work for you instead?"
-                next_state = 'confirm_alternative_time'
+                    response_text = f"{add_filler()} I'm sorry, our {patient_info['service']} schedule is fully booked for the coming weeks. Is there another day you'd like me to check, or would you prefer a different service?"
+                    next_state = 'collect_time'
         else:
             # Check if they're asking about doctor availability
             if "available" in transcript.lower() or "schedule" in transcript.lower() or "free" in transcript.lower():
@@ -786,22 +983,38 @@ def process_speech():
             
     elif current_state == 'confirm_alternative_time':
         # Check if user accepts alternative time with improved NLP
-        if is_affirmative(transcript):
+        if is_affirmative(transcript, intents):
             # Update preferred time with the alternative
             patient_info['preferred_time'] = patient_info['alternative_time']
+            patient_info['preferred_start'] = patient_info.get('alternative_start')
+            patient_info['doctor'] = patient_info.get('alternative_doctor')
             context_memory['appointment_time'] = patient_info['alternative_time']
-            
-            response_text = f"Wonderful! {add_filler()} I've got you down for {patient_info['preferred_time']}. Could I get your phone number to send you a confirmation? We'll also send a reminder the day before your appointment."
-            next_state = 'collect_phone'
-        elif is_negative(transcript):
+
+            if patient_info.get('phone'):
+                # The slot was offered after the first one was taken at confirmation
+                response_text = f"Wonderful! {add_filler()} I've got you down for {patient_info['preferred_time']}. Shall I send the confirmation to {format_uae_phone(patient_info['phone'])} again?"
+                next_state = 'confirm_phone'
+            else:
+                response_text = f"Wonderful! {add_filler()} I've got you down for {patient_info['preferred_time']}. Could I get your phone number to send you a confirmation? We'll also send a reminder the day before your appointment."
+                next_state = 'collect_phone'
+        elif is_negative(transcript, intents):
             # Suggest another time
             service_type = get_service_category(patient_info.get('service', ''))
-            new_alternative = suggest_alternative_time(service_type, patient_info['alternative_time'], exclude_previous=True)
-            patient_info['alternative_time'] = new_alternative
-            context_memory['alternative_time'] = new_alternative
-            
-            response_text = f"No problem at all! {add_filler()} Let me check what else we have... How about {new_alternative}? That just opened up in our schedule. Would that work better for you?"
-            next_state = 'confirm_alternative_time'
+            suggestion = suggest_alternative_time(service_type, patient_info['alternative_start'], exclude_previous=True)
+
+            if suggestion:
+                new_start, doctor_name = suggestion
+                new_alternative = format_slot(new_start)
+                patient_info['alternative_time'] = new_alternative
+                patient_info['alternative_start'] = new_start
+                patient_info['alternative_doctor'] = doctor_name
+                context_memory['alternative_time'] = new_alternative
+
+                response_text = f"No problem at all! {add_filler()} Let me check what else we have... How about {new_alternative} with {doctor_name}? Would that work better for you?"
+                next_state = 'confirm_alternative_time'
+            else:
+                response_text = f"{add_filler()} I'm sorry, that was the last opening we have in the coming weeks. Is there a specific day you'd like me to check?"
+                next_state = 'collect_time'
         else:
             # Check if they're asking about the doctor
             if "doctor" in transcript.lower() or "who" in transcript.lower() or "good" in transcript.lower():
@@ -828,17 +1041,10 @@ def process_speech():
                     'timestamp': datetime.now().isoformat()
                 })
                 
-                # Generate voice audio with confident tone
-                audio_url = generate_voice(trust_response, emotion="confident")
-                
                 # Update session
-                sessions[session_id] = session
+                store[session_id] = session
                 
-                return jsonify({
-                    'text': trust_response,
-                    'audio_url': audio_url,
-                    'next_state': current_state
-                })
+                return voice_reply(trust_response, current_state, emotion="confident")
             
             response_text = f"{add_filler()} I'm not quite sure if that works for you. Just to confirm, would {patient_info['alternative_time']} work for your {patient_info['service']} appointment? We want to make sure we find a time that's convenient for you."
             next_state = 'confirm_alternative_time'
@@ -866,30 +1072,51 @@ def process_speech():
     
     elif current_state == 'confirm_phone':
         # Check if user confirms phone number
-        if is_affirmative(transcript):
+        confirmed = is_affirmative(transcript, intents)
+        if confirmed and patient_info.get('doctor') and not availability.book(patient_info['doctor'], patient_info['preferred_start']):
+            # Another caller took the slot while this one was giving their number
+            service_type = get_service_category(patient_info.get('service', ''))
+            suggestion = suggest_alternative_time(service_type, patient_info['preferred_start'], exclude_previous=True)
+
+            if suggestion:
+                alternative_start, doctor_name = suggestion
+                alternative_time = format_slot(alternative_start)
+                patient_info['alternative_time'] = alternative_time
+                patient_info['alternative_start'] = alternative_start
+                patient_info['alternative_doctor'] = doctor_name
+                context_memory['alternative_time'] = alternative_time
+
+                response_text = f"I'm so sorry, {add_filler()} {patient_info['preferred_time']} was just booked by another patient. {doctor_name} has {alternative_time} open though. Would that work for you?"
+                next_state = 'confirm_alternative_time'
+            else:
+                response_text = f"I'm so sorry, {add_filler()} {patient_info['preferred_time']} was just booked by another patient. Is there another day you'd like me to check?"
+                next_state = 'collect_time'
+        elif confirmed:
             # Save appointment
             appointment = {
+                'id': appointment_id(session_id, patient_info),
                 'patient_name': patient_info['name'],
                 'service': patient_info['service'],
+                'doctor': patient_info.get('doctor'),
                 'scheduled_time': patient_info['preferred_time'],
+                'scheduled_start': patient_info['preferred_start'].isoformat() if patient_info.get('preferred_start') else None,
                 'phone_number': patient_info['phone'],
                 'timestamp': datetime.now().isoformat()
             }
             
             appointments.append(appointment)
             
-            # Mock logging to Google Sheets and Calendar
-            logger.info(f"Mock: Appointment logged to Google Sheets: {json.dumps(appointment)}")
-            logger.info(f"Mock: Calendar event created: {json.dumps(appointment)}")
-            
-            # Mock SMS confirmation
-            logger.info(f"Mock: SMS confirmation sent to {patient_info['phone']}")
+            # The slot is reserved; calendar, Sheets and SMS follow in the background
+            enqueue_booking_jobs(appointment)
             
             # Personalize confirmation
             service_type = get_service_category(patient_info.get('service', ''))
             doctors_list = DOCTORS.get(service_type, [])
-            
-            if doctors_list and session.get('current_doctor_discussed'):
+
+            if patient_info.get('doctor'):
+                # The doctor whose slot was booked
+                doctor_name = patient_info['doctor']
+            elif doctors_list and session.get('current_doctor_discussed'):
                 # Try to use the previously discussed doctor
                 doctor_name = session.get('current_doctor_discussed')
                 doctor = next((d for d in doctors_list if d["name"] == doctor_name), random.choice(doctors_list))
@@ -897,10 +1124,17 @@ def process_speech():
             else:
                 doctor = random.choice(doctors_list) if doctors_list else {"name": "our specialist"}
                 doctor_name = doctor["name"] if isinstance(doctor, dict) else doctor
-            
-            response_text = f"Perfect! {add_filler()} I've booked your {patient_info['service']} appointment with {doctor_name} for {patient_info['preferred_time']}. You'll receive a text confirmation at {format_uae_phone(patient_info['phone'])} shortly, and a reminder the day before your appointment. Is there anything else I can help you with today? Any questions about preparing for your visit?"
+
+            response_template = ("booking_confirmed", {
+                "filler1": add_filler(),
+                "service": patient_info['service'],
+                "doctor": doctor_name,
+                "time": patient_info['preferred_time'],
+                "phone": format_uae_phone(patient_info['phone'])
+            })
+            response_text = render_response_template(*response_template)
             next_state = 'confirm_complete'
-        elif is_negative(transcript):
+        elif is_negative(transcript, intents):
             response_text = f"I apologize for getting that wrong. {add_filler()} Could you please provide your phone number again? We want to make sure we have the correct number for your appointment confirmation."
             next_state = 'collect_phone'
         else:
@@ -908,7 +1142,7 @@ def process_speech():
             next_state = 'confirm_phone'
         
     elif current_state == 'confirm_complete':
-        if is_affirmative(transcript) or "question" in transcript.lower():
+        if is_affirmative(transcript, intents) or "question" in transcript.lower():
             service_type = get_service_category(patient_info.get('service', ''))
             
             if service_type == "dental":
@@ -953,14 +1187,18 @@ def process_speech():
             response_text = f"I'm sorry, {add_filler()} I didn't quite catch that. Could you please repeat what you said? I want to make sure I'm helping you correctly."
             next_state = current_state
     
+    metrics.observe('state_machine', time.perf_counter() - state_machine_start)
+    
     # Add empathy based on detected emotion
+    empathy_prefix = ""
     if emotional_state != 'neutral' and random.random() < 0.7:  # 70% chance to add empathy
         empathy_prefix = add_empathetic_response(emotional_state)
         if empathy_prefix:
             response_text = f"{empathy_prefix} {response_text}"
     
-    # Add human touches like fillers and pauses
-    response_text = add_human_touches(response_text)
+    # Add human touches like fillers and pauses (templates already place their fillers)
+    if not response_template:
+        response_text = add_human_touches(response_text)
     
     # Add system response to conversation history
     session['conversation'].append({
@@ -969,16 +1207,8 @@ def process_speech():
         'timestamp': datetime.now().isoformat()
     })
     
-    # Generate voice audio with appropriate emotion
-    emotion = "friendly"
-    if emotional_state == "anxiety":
-        emotion = "reassuring"
-    elif emotional_state == "urgency":
-        emotion = "efficient"
-    elif emotional_state == "frustration":
-        emotion = "apologetic"
-    
-    audio_url = generate_voice(response_text, emotion=emotion)
+    # Pick the voice emotion for the response
+    emotion = RESPONSE_EMOTIONS.get(emotional_state, "friendly")
     
     # Update session
     session['state'] = next_state
@@ -986,158 +1216,292 @@ def process_speech():
     session['last_topic'] = 'appointment'
     session['context_memory'] = context_memory
     session['last_response_time'] = datetime.now().isoformat()
-    sessions[session_id] = session
+    store[session_id] = session
     
-    return jsonify({
-        'text': response_text,
-        'audio_url': audio_url,
-        'next_state': next_state
-    })
+    return voice_reply(response_text, next_state, emotion=emotion, template=response_template, prefix=empathy_prefix)
 
 @app.route('/api/get-conversation', methods=['GET'])
 def get_conversation():
     """Get conversation history for a session"""
     session_id = request.args.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    session = sessions.get(session_id) if session_id else None
+    if session is None:
         return jsonify({'error': 'Invalid session ID'})
     
-    return jsonify(sessions[session_id]['conversation'])
+    return jsonify(session['conversation'])
 
 @app.route('/api/get-appointments', methods=['GET'])
 def get_appointments():
     """Get all booked appointments"""
     return jsonify(appointments)
 
+@app.route('/api/audio/<audio_id>', methods=['GET'])
+def stream_audio(audio_id):
+    """
+    Serve synthesized audio, relaying it as it streams if synthesis is still running
+    
+    ?format=ulaw|opus|wav|mp3 serves the clip transcoded for another channel
+    (once synthesis has finished).
+    """
+    artifact = audio_store.lookup(audio_id)
+    if artifact is None:
+        return jsonify({'error': 'Audio not found'}), 404
+    
+    audio_stream = audio_streams.get(artifact['stream_id']) if artifact['stream_id'] else None
+    
+    audio_format = request.args.get('format')
+    if audio_format:
+        if audio_format not in AUDIO_FORMATS:
+            return jsonify({'error': f"Unsupported format '{audio_format}'"}), 400
+        source = None
+        if audio_stream:
+            # Transcoding needs the whole clip
+            source = b"".join(audio_stream.iter_chunks())
+            if not source or not audio_stream.done or audio_stream.error:
+                return jsonify({'error': 'Audio not available'}), 503
+        audio = read_audio_variant(artifact, audio_format, source)
+        if audio is None:
+            return jsonify({'error': 'Audio not found'}), 404
+        return Response(audio, mimetype=AUDIO_FORMATS[audio_format])
+    
+    if not audio_stream:
+        # Not streaming (or streamed by another worker): serve the stored clip
+        audio = read_artifact_audio(artifact)
+        if audio is None:
+            return jsonify({'error': 'Audio not found'}), 404
+        return Response(audio, mimetype=artifact['mimetype'])
+    
+    # If synthesis failed before producing anything, play the mock audio like the file path does
+    if not audio_stream.wait_for_data():
+        logger.error(f"Audio stream {audio_id} produced no audio: {audio_stream.error}")
+        return redirect("/static/mock_audio.mp3")
+    
+    # Finished streams are served whole so the browser gets a Content-Length
+    if audio_stream.done:
+        return Response(finished_stream_audio(audio_stream), mimetype=audio_stream.mimetype)
+    
+    return Response(
+        stream_with_context(audio_stream.iter_chunks()),
+        mimetype=audio_stream.mimetype,
+        headers={'Cache-Control': 'no-cache'}
+    )
+
+def read_artifact_audio(artifact):
+    """Get a finished artifact's audio from the audio store or the TTS cache"""
+    audio = audio_store.read(artifact['id'])
+    if audio is None and artifact['cache_key']:
+        audio = tts_cache.get(artifact['cache_key'])
+    return audio
+
+def read_audio_variant(artifact, audio_format, source=None):
+    """
+    Get a finished artifact's audio in another format
+    
+    Variants of TTS cache clips are cached, so a phrase is transcoded at most
+    once per format; stitched clips (unique to a call) are transcoded per request.
+    
+    Args:
+        artifact: Artifact from audio_store.lookup
+        audio_format: Key of AUDIO_FORMATS
+        source: The artifact's audio, if the caller already has it
+        
+    Returns:
+        Audio bytes, or None if the clip is gone or cannot be transcoded
+    """
+    source_format = MIMETYPE_FORMATS.get(artifact['mimetype'], 'mp3')
+    read_source = (lambda: source) if source is not None else (lambda: read_artifact_audio(artifact))
+    
+    if artifact['cache_key']:
+        return audio_variants.get_or_transcode(artifact['cache_key'], audio_format, source_format, read_source)
+    
+    audio = read_source()
+    if audio is None:
+        return None
+    try:
+        return transcode(audio, source_format, audio_format)
+    except Exception as e:
+        logger.error(f"Error transcoding audio {artifact['id']} to {audio_format}: {str(e)}")
+        return None
+
+@app.route('/api/tts-cache-stats', methods=['GET'])
+def tts_cache_stats():
+    """Get TTS cache hit/miss/eviction counters"""
+    stats = tts_cache.stats()
+    stats['coalesced_streams'] = audio_streams.coalesced
+    stats['phrase_bank'] = phrase_bank.stats()
+    stats['audio_store'] = audio_store.stats()
+    stats['variants'] = audio_variants.stats()
+    return jsonify(stats)
+
+@app.route('/api/session-stats', methods=['GET'])
+def session_stats():
+    """Get session store size, hit and eviction counters"""
+    return jsonify(sessions.stats())
+
+@app.route('/api/http-stats', methods=['GET'])
+def http_stats():
+    """Get outbound HTTP request, retry and connection pool counters"""
+    return jsonify(http_client.stats())
+
+@app.route('/api/speculation-stats', methods=['GET'])
+def speculation_stats():
+    """Get speculative turn counts, hit rate and latency saved"""
+    return jsonify({'web': speech_speculation.stats()})
+
+@app.route('/api/job-stats', methods=['GET'])
+def job_stats():
+    """Get side-effect job counts and the dead-letter list"""
+    stats = jobs.stats()
+    stats['dead_letters'] = jobs.dead_letters()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose per-stage latency histograms in Prometheus text format"""
+    return Response(metrics.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/api/interrupt', methods=['POST'])
 def handle_interruption():
     """Handle user interruption during AI speech"""
     data = request.json
     session_id = data.get('session_id')
     
-    if not session_id or session_id not in sessions:
+    if not mark_interrupted(session_id):
         return jsonify({'error': 'Invalid session ID'})
     
-    # Mark the session as interrupted
-    sessions[session_id]['was_interrupted'] = True
-    sessions[session_id]['interruption_count'] = sessions[session_id].get('interruption_count', 0) + 1
-    
-    # Log the interruption
-    logger.info(f"User interrupted AI speech for session {session_id}")
-    
     # Return acknowledgment
     return jsonify({
         'status': 'ok',
         'message': 'Interruption registered'
     })
 
+def mark_interrupted(session_id):
+    """
+    Record that the user interrupted the AI's speech
+    
+    Args:
+        session_id: Web session ID
+        
+    Returns:
+        True if the session exists
+    """
+    session = sessions.get(session_id) if session_id else None
+    if session is None:
+        return False
+    
+    # Mark the session as interrupted
+    session['was_interrupted'] = True
+    session['interruption_count'] = session.get('interruption_count', 0) + 1
+    sessions[session_id] = session
+    
+    # Log the interruption
+    logger.info(f"User interrupted AI speech for session {session_id}")
+    return True
+
 # Conversation Helper Functions
-def check_for_small_talk(text):
+@metrics.timed('small_talk')
+def check_for_small_talk(text, intents=None):
     """Check if the user is making small talk and generate appropriate response"""
-    text_lower = text.lower()
+    if intents is None:
+        intents = intent_router.scan(text)
     
     # Check for questions about Rachel
-    if "your name" in text_lower or "who are you" in text_lower:
+    if intents.has("small_talk.identity"):
         return f"My name is {RACHEL_INFO['name']}! I'm the receptionist here at Noor Medical Clinic. I've been working here for {RACHEL_INFO['experience']} and I really enjoy {RACHEL_INFO['favorite_part']}."
     
-    if "how are you" in text_lower or "how's your day" in text_lower or "how are things" in text_lower:
+    if intents.has("small_talk.how_are_you"):
         return random.choice(SMALL_TALK["how_are_you"])
     
-    if "thank you" in text_lower or "thanks" in text_lower:
+    if intents.has("small_talk.thanks"):
         return random.choice(SMALL_TALK["thanks"])
     
-    if "weather" in text_lower or "nice day" in text_lower or "raining" in text_lower or "sunny" in text_lower:
+    if intents.has("small_talk.weather"):
         return random.choice(SMALL_TALK["weather"])
     
-    if "weekend" in text_lower or "saturday" in text_lower or "sunday" in text_lower:
+    if intents.has("small_talk.weekend"):
         return random.choice(SMALL_TALK["weekend"])
     
-    if "joke" in text_lower or "funny" in text_lower:
+    if intents.has("small_talk.joke"):
         return random.choice(SMALL_TALK["joke"])
     
     # Check for personal questions about Rachel
-    if "how long" in text_lower and ("work" in text_lower or "been" in text_lower):
+    if intents.has("small_talk.how_long") and intents.has("small_talk.work"):
         return f"I've been working at Noor Medical Clinic for {RACHEL_INFO['experience']}. Before that, I was a {RACHEL_INFO['background']}. I really love working here because {RACHEL_INFO['favorite_part']}."
     
-    if "like" in text_lower and "job" in text_lower:
+    if intents.has("small_talk.like") and intents.has("small_talk.job"):
         return f"I really enjoy my job! My favorite part is {RACHEL_INFO['favorite_part']}. {RACHEL_INFO['personal_touch']}"
     
-    if "do you" in text_lower and ("live" in text_lower or "from" in text_lower):
+    if intents.has("small_talk.do_you") and intents.has("small_talk.residence"):
         return f"I live pretty close to the clinic actually. Makes for an easy commute! In my free time, I enjoy {RACHEL_INFO['hobbies']}."
     
     # Check for general greetings if no other small talk detected
-    if any(word in text_lower for word in ["hi", "hello", "hey", "greetings", "good morning", "good afternoon", "good evening"]):
-        if len(text_lower.split()) < 5:  # Only respond to short greetings
+    if intents.has("small_talk.greeting"):
+        if len(intents.text.split()) < 5:  # Only respond to short greetings
             return random.choice(SMALL_TALK["greeting"])
     
     return None
 
-def check_for_humor(text):
+@metrics.timed('humor')
+def check_for_humor(text, intents=None):
     """Check if the user is making a joke or being humorous"""
-    text_lower = text.lower()
+    if intents is None:
+        intents = intent_router.scan(text)
     
     # Check for common joke indicators
-    joke_indicators = [
-        "haha", "hehe", "lol", "lmao", "rofl", "joke", "funny", "kidding", "just kidding", "jk"
-    ]
-    
-    if any(indicator in text_lower for indicator in joke_indicators):
+    if intents.has("humor.indicator"):
         response = random.choice(HUMOR_RESPONSES).format(filler=add_filler())
         return response
     
     # Check for specific joke patterns
-    if "knock knock" in text_lower:
+    if intents.has("humor.knock_knock"):
         return "Haha! Who's there? I love knock-knock jokes!"
     
-    if "why did the" in text_lower or "what do you call" in text_lower:
+    if intents.has("humor.setup"):
         return "Haha! That's a good one! I love jokes like that. They make my day at the reception desk more fun."
     
     return None
 
-def is_compliment(text):
+@metrics.timed('compliment')
+def is_compliment(text, intents=None):
     """Check if the user is giving a compliment"""
-    text_lower = text.lower()
-    
-    compliment_indicators = [
-        "nice voice", "sound nice", "sound good", "like your voice", 
-        "helpful", "you're great", "you are great", "you're amazing", "you are amazing",
-        "thank you so much", "appreciate", "wonderful", "excellent", "fantastic",
-        "good job", "well done", "impressive"
-    ]
+    if intents is None:
+        intents = intent_router.scan(text)
     
-    return any(indicator in text_lower for indicator in compliment_indicators)
+    return intents.has("compliment")
 
-def check_for_doctor_questions(text, session):
+@metrics.timed('doctor_questions')
+def check_for_doctor_questions(text, session, intents=None):
     """Check if the user is asking about doctors with context awareness"""
-    text_lower = text.lower()
-    context_memory = session.get('context_memory', {})
+    if intents is None:
+        intents = intent_router.scan(text)
     current_doctor = session.get('current_doctor_discussed')
     
     # Check for questions about specific doctors
     for service, doctors_list in DOCTORS.items():
         for doctor in doctors_list:
-            doctor_last = doctor["name"].split()[1].lower()
-            doctor_first = doctor["name"].split()[0].lower().replace("dr.", "").strip()
+            doctor_first, doctor_last = doctor_name_keywords(doctor)
+            first_mentioned = not doctor_first or intents.has_keyword(doctor_first)
             
-            if doctor_last in text_lower or (doctor_first in text_lower and "dr" in text_lower):
+            if intents.has_keyword(doctor_last) or (first_mentioned and intents.has("doctor.title")):
                 # Remember this doctor was discussed
                 session['current_doctor_discussed'] = doctor["name"]
                 
                 # Check for specific questions about the doctor
-                if "good" in text_lower or "recommend" in text_lower or "best" in text_lower or "trust" in text_lower:
+                if intents.has("doctor.quality"):
                     return f"Yes, {doctor['name']} is excellent! Patients consistently say that {doctor['patients_say']}. They have {doctor['experience']} experience and are known for being {doctor['personality']}. Would you like to schedule with them?"
                 
-                if "available" in text_lower or "schedule" in text_lower or "appointment" in text_lower or "book" in text_lower:
+                if intents.has("doctor.availability"):
                     avail_str = f"{doctor['availability'][0]} and {doctor['availability'][1]}" if len(doctor['availability']) > 1 else doctor['availability'][0]
                     return f"{doctor['name']} is typically available on {avail_str}. Would any of those days work for you?"
                 
-                if "specialty" in text_lower or "specialize" in text_lower or "expert" in text_lower:
+                if intents.has("doctor.specialty"):
                     return f"{doctor['name']} specializes in {doctor['specialty']}. They're particularly known for their {doctor['personality']} approach with patients."
                 
-                if "experience" in text_lower or "how long" in text_lower or "background" in text_lower:
+                if intents.has("doctor.experience"):
                     return f"{doctor['name']} has {doctor['experience']} of experience and trained at {doctor['education']}. They're one of our most experienced specialists in {service}."
                 
-                if "language" in text_lower or "speak" in text_lower:
+                if intents.has("doctor.language"):
                     langs = ", ".join(doctor['languages'])
                     return f"{doctor['name']} speaks {langs}. Would you prefer your appointment in a specific language?"
                 
@@ -1145,86 +1509,77 @@ def check_for_doctor_questions(text, session):
                 return f"{doctor['name']} is one of our top {service} specialists with {doctor['experience']} experience. They're known for being {doctor['personality']} and specializing in {doctor['specialty']}. Patients particularly appreciate how {doctor['patients_say']}. Would you like to schedule an appointment with them?"
     
     # Check if they're asking about the previously mentioned doctor
-    if current_doctor and ("doctor" in text_lower or "about" in text_lower or "tell me" in text_lower or "good" in text_lower or "who" in text_lower):
+    if current_doctor and intents.has("doctor.follow_up"):
         # Find the doctor in our database
         for service, doctors_list in DOCTORS.items():
             for doctor in doctors_list:
                 if doctor["name"] == current_doctor:
-                    if "good" in text_lower or "recommend" in text_lower or "best" in text_lower or "trust" in text_lower:
+                    if intents.has("doctor.quality"):
                         return f"Yes, {doctor['name']} is excellent! Patients consistently say that {doctor['patients_say']}. They have {doctor['experience']} experience and are known for being {doctor['personality']}. Would you like to schedule with them?"
                     
                     # General information if no specific question detected
                     return f"{doctor['name']} is one of our top {service} specialists with {doctor['experience']} experience. They're known for being {doctor['personality']} and specializing in {doctor['specialty']}. Patients particularly appreciate how {doctor['patients_say']}. Would you like to schedule an appointment with them?"
     
     # Check for general questions about doctors
-    if "doctor" in text_lower or "specialist" in text_lower or "physician" in text_lower:
-        if "best" in text_lower or "recommend" in text_lower or "good" in text_lower:
+    if intents.has("doctor.general"):
+        if intents.has("doctor.quality"):
             return "All of our doctors are excellent and board-certified in their specialties. If you let me know what type of service you're looking for, I can tell you more about the specific doctors in that department."
         
-        if "how many" in text_lower or "available" in text_lower:
+        if intents.has("doctor.count"):
             return "We have multiple specialists in each department. Our dental, ENT, dermatology, and general practice departments each have at least two dedicated doctors, plus supporting staff. Would you like to know about a specific department?"
     
     return None
 
-def check_for_clinic_questions(text):
+@metrics.timed('clinic_questions')
+def check_for_clinic_questions(text, intents=None):
     """Check if the user is asking about the clinic"""
-    text_lower = text.lower()
+    if intents is None:
+        intents = intent_router.scan(text)
     
-    if "hours" in text_lower or "open" in text_lower or "close" in text_lower or "when" in text_lower:
+    if intents.has("clinic.hours"):
         return f"Noor Medical Clinic is open {RACHEL_INFO['clinic_hours']}"
     
-    if "location" in text_lower or "address" in text_lower or "where" in text_lower:
+    if intents.has("clinic.location"):
         return f"We're located at {RACHEL_INFO['clinic_location']}"
     
-    if "parking" in text_lower:
+    if intents.has("clinic.parking"):
         return f"We have {RACHEL_INFO['clinic_parking']}"
     
-    if "insurance" in text_lower or "cover" in text_lower or "payment" in text_lower:
+    if intents.has("clinic.insurance"):
         return f"{RACHEL_INFO['insurance']} We also offer payment plans for those without insurance. Would you like me to check if we accept your specific insurance?"
     
-    if "covid" in text_lower or "mask" in text_lower or "vaccination" in text_lower:
+    if intents.has("clinic.covid"):
         return "We follow all current health guidelines. Masks are optional but available if you'd like one. If you're experiencing any COVID symptoms, we ask that you reschedule or consider a telehealth appointment instead."
     
-    if "services" in text_lower or "offer" in text_lower or "provide" in text_lower:
+    if intents.has("clinic.services"):
         return f"{RACHEL_INFO['clinic_info']} Each department has highly qualified specialists. Is there a particular service you're interested in today?"
     
     return None
 
-def is_booking_inquiry(text):
+def is_booking_inquiry(text, intents=None):
     """Check if the user is asking about booking an appointment"""
-    text_lower = text.lower()
-    booking_terms = ["book", "schedule", "appointment", "reserve", "see a doctor", "visit", "come in"]
+    if intents is None:
+        intents = intent_router.scan(text)
     
-    return any(term in text_lower for term in booking_terms)
+    return intents.has("booking")
 
-def detect_emotion(text):
-    """Detect emotional state from text"""
-    text_lower = text.lower()
+def wants_attention(text, intents=None):
+    """Check for "hear me out" or similar phrases indicating user wants attention"""
+    if intents is None:
+        intents = intent_router.scan(text)
     
-    # Pain indicators
-    pain_words = ["pain", "hurt", "ache", "sore", "discomfort", "suffering", "agony", "ouch"]
-    if any(word in text_lower for word in pain_words):
-        return "pain"
-    
-    # Anxiety indicators
-    anxiety_words = ["anxious", "nervous", "worried", "scared", "afraid", "fear", "stress", "concern", "panic"]
-    if any(word in text_lower for word in anxiety_words):
-        return "anxiety"
-    
-    # Urgency indicators
-    urgency_words = ["urgent", "emergency", "asap", "right away", "immediately", "soon", "hurry", "quick"]
-    if any(word in text_lower for word in urgency_words):
-        return "urgency"
-    
-    # Confusion indicators
-    confusion_words = ["confused", "don't understand", "what do you mean", "unclear", "lost", "not following"]
-    if any(word in text_lower for word in confusion_words):
-        return "confusion"
+    return intents.has("listening")
+
+@metrics.timed('detect_emotion')
+def detect_emotion(text, intents=None):
+    """Detect emotional state from text"""
+    if intents is None:
+        intents = intent_router.scan(text)
     
-    # Frustration indicators
-    frustration_words = ["frustrated", "annoyed", "upset", "angry", "mad", "irritated", "fed up", "tired of"]
-    if any(word in text_lower for word in frustration_words):
-        return "frustration"
+    # Emotions are checked in priority order: pain, anxiety, urgency, confusion, frustration
+    for emotional_state in EMOTION_KEYWORDS:
+        if intents.has(f"emotion.{emotional_state}"):
+            return emotional_state
     
     return "neutral"
 
@@ -1241,6 +1596,7 @@ def add_filler():
         return random.choice(FILLERS)
     return ""
 
+@metrics.timed('add_human_touches')
 def add_human_touches(text):
     """Add human touches like fillers, pauses, and repetitions to text"""
     # Don't modify text that already has human touches
@@ -1322,48 +1678,8 @@ def extract_service(text):
     return None
 
 def extract_time(text):
-    """Extract time and date from user input"""
-    text = text.lower()
-    
-    # Check for common time patterns
-    day_patterns = [
-        r"(monday|tuesday|wednesday|thursday|friday|saturday|sunday)",
-        r"(tomorrow|today|next week)",
-        r"(january|february|march|april|may|june|july|august|september|october|november|december) (\d{1,2})(?:st|nd|rd|th)?",
-        r"(\d{1,2})(?:st|nd|rd|th)? of (january|february|march|april|may|june|july|august|september|october|november|december)"
-    ]
-    
-    time_patterns = [
-        r"(\d{1,2})(?::(\d{2}))? ?(am|pm)",
-        r"(\d{1,2}) o'?clock",
-        r"(morning|afternoon|evening)",
-        r"(noon|midnight)"
-    ]
-    
-    day_match = None
-    for pattern in day_patterns:
-        match = re.search(pattern, text)
-        if match:
-            day_match = match.group(0)
-            break
-    
-    time_match = None
-    for pattern in time_patterns:
-        match = re.search(pattern, text)
-        if match:
-            time_match = match.group(0)
-            break
-    
-    if day_match and time_match:
-        return f"{day_match} at {time_match}"
-    elif day_match:
-        # Default to morning if only day is specified
-        return f"{day_match} at 10:00 AM"
-    elif time_match:
-        # Default to tomorrow if only time is specified
-        return f"tomorrow at {time_match}"
-    
-    return None
+    """Extract time and date from user input (e.g. "tuesday at 2 pm")"""
+    return time_label(*scan_time_expressions(text))
 
 def extract_phone(text):
     """Extract phone number from user input"""
@@ -1408,27 +1724,19 @@ def format_uae_phone(phone):
         return f"{phone[:4]} {phone[4:6]} {phone[6:9]}-{phone[9:]}"
     return phone
 
-def is_affirmative(text):
+def is_affirmative(text, intents=None):
     """Check if text indicates affirmative response"""
-    text = text.lower()
-    affirmative_words = ["yes", "yeah", "yep", "sure", "okay", "ok", "fine", "good", "alright", "correct", "right", "yup", "absolutely", "definitely", "certainly", "indeed", "true", "affirmative", "agreed", "works", "that works"]
+    if intents is None:
+        intents = intent_router.scan(text)
     
-    for word in affirmative_words:
-        if word in text:
-            return True
-    
-    return False
+    return intents.has("affirmative")
 
-def is_negative(text):
+def is_negative(text, intents=None):
     """Check if text indicates negative response"""
-    text = text.lower()
-    negative_words = ["no", "nope", "nah", "not", "don't", "cannot", "can't", "won't", "wouldn't", "shouldn't", "never", "negative", "disagree", "incorrect", "wrong", "false", "impossible", "unavailable"]
+    if intents is None:
+        intents = intent_router.scan(text)
     
-    for word in negative_words:
-        if word in text:
-            return True
-    
-    return False
+    return intents.has("negative")
 
 def get_service_category(service):
     """Map service to a category for availability checking"""
@@ -1443,34 +1751,169 @@ def get_service_category(service):
     else:
         return "general"
 
-def check_availability(service_type, preferred_time):
-    """Check if the preferred time is available for the service"""
-    # For demo purposes, randomly determine availability
-    # In a real implementation, this would check a database or calendar
-    return random.choice([True, False])
+def check_availability(service_type, time_range, doctor=None):
+    """
+    Find a free slot for the service inside the requested time range
+    
+    Args:
+        service_type: Service category (see get_service_category)
+        time_range: TimeRange from parse_time_range
+        doctor: Preferred doctor (e.g. the one the caller asked about)
+        
+    Returns:
+        Tuple of (slot start, doctor name) for the earliest free slot, or None
+    """
+    return availability.find_slot(service_type, time_range.start, time_range.end, doctor=doctor)
+
+def suggest_alternative_time(service_type, after, exclude_previous=False, doctor=None):
+    """
+    Suggest the nearest free slot for the service from a given time
+    
+    Args:
+        service_type: Service category (see get_service_category)
+        after: Aware datetime to search from (never earlier than now)
+        exclude_previous: Skip a slot starting exactly at after (it was already declined)
+        doctor: Preferred doctor when several are free at the same time
+        
+    Returns:
+        Tuple of (slot start, doctor name), or None if the service is fully booked
+    """
+    if exclude_previous:
+        after += timedelta(minutes=1)
+    return availability.next_free(service_type, after, doctor=doctor)
+
+def appointment_id(session_id, patient_info):
+    """Stable ID of a booking (the same call, doctor and slot give the same ID)"""
+    start = patient_info.get('preferred_start')
+    name = f"{session_id}/{patient_info.get('doctor')}/{start.isoformat() if start else patient_info.get('preferred_time')}"
+    return uuid.uuid5(uuid.NAMESPACE_URL, name).hex
+
+def enqueue_booking_jobs(appointment):
+    """Queue the side effects of a confirmed booking, once per appointment"""
+    for kind in BOOKING_JOBS:
+        jobs.enqueue(kind, appointment, f"{appointment['id']}:{kind}")
+
+def create_calendar_event_job(appointment, key):
+    """Job: add the appointment to the clinic calendar"""
+    logger.info(f"Mock: Calendar event created: {json.dumps(appointment)}")
+
+def log_to_sheets_job(appointment, key):
+    """Job: log the appointment to Google Sheets"""
+    logger.info(f"Mock: Appointment logged to Google Sheets: {json.dumps(appointment)}")
+
+def send_confirmation_sms_job(appointment, key):
+    """Job: text the patient a confirmation"""
+    logger.info(f"Mock: SMS confirmation sent to {appointment['phone_number']}")
+
+BOOKING_JOBS = {
+    'calendar_event': create_calendar_event_job,
+    'sheets_row': log_to_sheets_job,
+    'sms_confirmation': send_confirmation_sms_job
+}
+for job_kind, job_handler in BOOKING_JOBS.items():
+    jobs.register(job_kind, job_handler)
+metrics.gauge('job_queue_depth', "Side-effect jobs waiting or running", jobs.depth)
+
+@app.before_request
+def start_job_workers():
+    """Start the job workers when the app serves its first request (not when the module is imported)"""
+    jobs.start()
+
+def voice_reply(text, next_state, emotion="neutral", template=None, prefix="", **fields):
+    """
+    Build a turn reply whose audio has not been synthesized yet
+    
+    Args:
+        text: Response text
+        next_state: Conversation state after this turn
+        emotion: Emotional tone for the voice
+        template: Optional (template_name, slots) if the text came from RESPONSE_TEMPLATES
+        prefix: Static phrase spoken before a templated response
+        **fields: Extra JSON fields (e.g. session_id)
+        
+    Returns:
+        Dict with the JSON fields plus a 'voice' spec for synthesize_reply_voice
+    """
+    return dict(
+        fields,
+        text=text,
+        next_state=next_state,
+        voice={'text': text, 'emotion': emotion, 'template': template, 'prefix': prefix}
+    )
+
+def synthesize_reply_voice(voice, session_id=None):
+    """Generate the audio for a reply's voice spec and return its URL (valid while the session lasts)"""
+    if voice['template']:
+        return generate_templated_voice(*voice['template'], emotion=voice['emotion'], prefix=voice['prefix'], session_id=session_id)
+    return generate_voice(voice['text'], emotion=voice['emotion'], session_id=session_id)
+
+def send_reply(reply, session_id=None):
+    """Synthesize a reply's audio and return it as the JSON the web client expects"""
+    voice = reply.pop('voice', None)
+    if voice:
+        reply['audio_url'] = synthesize_reply_voice(voice, session_id or reply.get('session_id'))
+    return jsonify(reply)
+
+def audio_url(artifact_id):
+    """URL the browser plays an audio artifact from"""
+    return f"/api/audio/{artifact_id}"
 
-def suggest_alternative_time(service_type, preferred_time, exclude_previous=False):
-    """Suggest an alternative time based on service type"""
-    # Get available slots for the service type
-    available_slots = AVAILABLE_SLOTS.get(service_type, AVAILABLE_SLOTS["general"])
+def finished_stream_audio(audio_stream):
+    """Whole audio of a finished stream (stitched WAV gets its real length in the header)"""
+    audio = audio_stream.getvalue()
+    if audio_stream.mimetype == 'audio/wav':
+        return finalize_wav(audio)
+    return audio
+
+def build_voice_request(text, emotion="neutral"):
+    """
+    Build the ElevenLabs request headers and body for a response
     
-    # Filter out the previous suggestion if needed
-    if exclude_previous and preferred_time in available_slots:
-        available_slots = [slot for slot in available_slots if slot != preferred_time]
+    Args:
+        text: Text to convert to speech
+        emotion: Emotional tone for the voice
+        
+    Returns:
+        Tuple of (headers, data)
+    """
+    # Add SSML tags for emotion and pauses
+    text_with_emotion = add_ssml_tags(text, emotion)
     
-    # Return a random available slot
-    return random.choice(available_slots)
+    headers = {
+        "Accept": "audio/mpeg",
+        "Content-Type": "application/json",
+        "xi-api-key": ELEVENLABS_API_KEY
+    }
+    
+    # Adjust voice settings based on emotion
+    stability, similarity_boost = get_voice_settings(emotion)
+    
+    data = {
+        "text": text_with_emotion,
+        "model_id": ELEVENLABS_MODEL_ID,
+        "voice_settings": {
+            "stability": stability,
+            "similarity_boost": similarity_boost
+        }
+    }
+    
+    return headers, data
 
-def generate_voice(text, emotion="neutral"):
+def generate_voice(text, emotion="neutral", stream=None, session_id=None):
     """
     Generate voice audio using ElevenLabs API with emotion
     
+    Clips are cached by text and voice settings, so fixed phrases are only
+    synthesized once across all workers.
+    
     Args:
         text: Text to convert to speech
         emotion: Emotional tone for the voice
+        stream: Use the streaming endpoint (defaults to ELEVENLABS_STREAMING)
+        session_id: Session the audio URL belongs to
         
     Returns:
-        URL to the generated audio file
+        URL to the generated audio
     """
     try:
         # Check if we have valid ElevenLabs credentials
@@ -1478,54 +1921,235 @@ def generate_voice(text, emotion="neutral"):
             logger.warning("Missing ElevenLabs credentials, using mock audio")
             return "/static/mock_audio.mp3"
         
-        # Add SSML tags for emotion and pauses
-        text_with_emotion = add_ssml_tags(text, emotion)
+        stability, similarity_boost = get_voice_settings(emotion)
+        cache_key = make_cache_key(text, emotion, stability, similarity_boost, ELEVENLABS_VOICE_ID, ELEVENLABS_MODEL_ID)
         
-        # Call ElevenLabs API
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+        if tts_cache.get(cache_key) is not None:
+            return audio_url(audio_store.register(session_id, cache_key=cache_key))
         
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": ELEVENLABS_API_KEY
-        }
+        if stream is None:
+            stream = ELEVENLABS_STREAMING
         
-        # Adjust voice settings based on emotion
-        stability, similarity_boost = get_voice_settings(emotion)
+        if stream:
+            try:
+                audio_stream = stream_voice(text, emotion, cache_key)
+                return audio_url(audio_store.register(session_id, cache_key=cache_key, stream_id=audio_stream.stream_id))
+            except Exception as e:
+                logger.warning(f"Streaming synthesis unavailable, falling back to full synthesis: {str(e)}")
         
-        data = {
-            "text": text_with_emotion,
-            "model_id": "eleven_monolingual_v1",
-            "voice_settings": {
-                "stability": stability,
-                "similarity_boost": similarity_boost
-            }
-        }
-        
-        response = requests.post(url, json=data, headers=headers)
+        # The lookup above already counted this request's miss
+        audio = tts_cache.get_or_synthesize(cache_key, lambda: synthesize_voice(text, emotion), count_miss=False)
         
-        if response.status_code == 200:
-            # Save the audio file
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            filename = f"response_{timestamp}.mp3"
-            filepath = os.path.join("static", "audio", filename)
-            
-            # Ensure directory exists
-            os.makedirs(os.path.join("static", "audio"), exist_ok=True)
-            
-            with open(filepath, "wb") as f:
-                f.write(response.content)
-            
-            # Return the URL to the audio file
-            return f"/static/audio/{filename}"
-        else:
-            logger.error(f"ElevenLabs API error: {response.status_code} - {response.text}")
-            return "/static/mock_audio.mp3"
+        if audio:
+            return audio_url(audio_store.register(session_id, cache_key=cache_key))
+        return "/static/mock_audio.mp3"
             
     except Exception as e:
         logger.error(f"Error generating voice: {str(e)}")
         return "/static/mock_audio.mp3"
 
+@metrics.timed('elevenlabs_tts')
+def synthesize_voice(text, emotion="neutral"):
+    """
+    Synthesize a complete clip with the (non-streaming) ElevenLabs endpoint
+    
+    Args:
+        text: Text to convert to speech
+        emotion: Emotional tone for the voice
+        
+    Returns:
+        MP3 audio bytes, or None on error
+    """
+    headers, data = build_voice_request(text, emotion)
+    
+    # Call ElevenLabs API
+    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+    
+    response = http_client.post(url, json=data, headers=headers)
+    
+    if response.status_code == 200:
+        return response.content
+    
+    logger.error(f"ElevenLabs API error: {response.status_code} - {response.text}")
+    return None
+
+def stream_voice(text, emotion="neutral", cache_key=None):
+    """
+    Start streaming synthesis that the browser can play immediately
+    
+    The ElevenLabs streaming request starts in the background right away, so
+    synthesis overlaps with the JSON response; /api/audio/<id> relays chunks
+    to the browser as they arrive. Identical requests in flight share one
+    stream, and the finished clip is stored in the TTS cache.
+    
+    Args:
+        text: Text to convert to speech
+        emotion: Emotional tone for the voice
+        cache_key: TTS cache key for the clip, also used as the stream ID
+        
+    Returns:
+        The AudioStream (readable while synthesis runs)
+    """
+    headers, data = build_voice_request(text, emotion)
+    url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}/stream"
+    
+    def synthesize():
+        start = time.perf_counter()
+        with http_client.post(url, json=data, headers=headers, stream=True) as response:
+            if response.status_code != 200:
+                raise RuntimeError(f"ElevenLabs API error: {response.status_code} - {response.text}")
+            
+            first_chunk = True
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if first_chunk:
+                    metrics.observe('elevenlabs_first_chunk', time.perf_counter() - start)
+                    first_chunk = False
+                yield chunk
+        metrics.observe('elevenlabs_stream', time.perf_counter() - start)
+    
+    def store(audio_stream):
+        if cache_key:
+            tts_cache.put(cache_key, audio_stream.getvalue())
+    
+    return audio_streams.start(synthesize, stream_id=cache_key, on_complete=store)
+
+def render_response_template(template_name, slots):
+    """Fill a response template, collapsing the gaps left by empty fillers"""
+    text = RESPONSE_TEMPLATES[template_name].format(**slots)
+    return re.sub(r'\s+', ' ', text).strip()
+
+def response_template_phrases():
+    """
+    Get every static phrase the phrase bank should pre-render, by emotion
+    
+    Templates are spoken with any emotion in RESPONSE_EMOTIONS, so their static
+    text and the fillers are rendered for each. Empathy lines only precede
+    responses for their own emotional state.
+    
+    Returns:
+        Dictionary mapping emotion to phrases, the most common emotion first
+    """
+    phrases = []
+    for template in RESPONSE_TEMPLATES.values():
+        phrases.extend(template_static_phrases(template))
+    phrases.extend(FILLERS)
+    
+    plan = {emotion: list(phrases) for emotion in dict.fromkeys(["friendly", *RESPONSE_EMOTIONS.values()])}
+    for emotional_state, lines in EMPATHY.items():
+        plan[RESPONSE_EMOTIONS.get(emotional_state, "friendly")].extend(lines)
+    return plan
+
+def synthesize_pcm(text, emotion="neutral"):
+    """
+    Synthesize a phrase as raw 16-bit mono PCM for the phrase bank
+    
+    Args:
+        text: Text to convert to speech
+        emotion: Emotional tone for the voice
+        
+    Returns:
+        PCM bytes at PHRASE_SAMPLE_RATE, or None on error
+    """
+    stability, similarity_boost = get_voice_settings(emotion)
+    output_format = f"pcm_{PHRASE_SAMPLE_RATE}"
+    cache_key = make_cache_key(text, emotion, stability, similarity_boost, ELEVENLABS_VOICE_ID, f"{ELEVENLABS_MODEL_ID}/{output_format}")
+    
+    def request_pcm():
+        headers, data = build_voice_request(text, emotion)
+        headers.pop("Accept")
+        url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVENLABS_VOICE_ID}"
+        
+        response = http_client.post(url, params={"output_format": output_format}, json=data, headers=headers)
+        
+        if response.status_code == 200:
+            return response.content
+        
+        logger.error(f"ElevenLabs API error: {response.status_code} - {response.text}")
+        return None
+    
+    return pcm_cache.get_or_synthesize(cache_key, request_pcm)
+
+def synthesize_telephony(text, emotion="neutral"):
+    """
+    Synthesize a reply as 8 kHz mu-law for a call's media stream
+    
+    Args:
+        text: Text to convert to speech
+        emotion: Emotional tone for the voice
+        
+    Returns:
+        mu-law bytes, or None without ElevenLabs credentials or on error
+    """
+    if not ELEVENLABS_API_KEY or not ELEVENLABS_VOICE_ID:
+        logger.warning("Missing ElevenLabs credentials, no audio for the media stream")
+        return None
+    
+    try:
+        pcm = synthesize_pcm(text, emotion)
+        if not pcm:
+            return None
+        return transcode(pcm, f"pcm_{PHRASE_SAMPLE_RATE}", 'ulaw')
+    except Exception as e:
+        logger.error(f"Error synthesizing telephony audio: {str(e)}")
+        return None
+
+def generate_templated_voice(template_name, slots, emotion="neutral", prefix="", session_id=None):
+    """
+    Generate voice audio for a templated response by stitching phrase bank audio
+    
+    Only the variable slots are sent to ElevenLabs; static text and fillers
+    come from the phrase bank. Falls back to generate_voice when the phrase
+    bank is disabled.
+    
+    Args:
+        template_name: Key in RESPONSE_TEMPLATES
+        slots: Values for the template fields
+        emotion: Emotional tone for the voice
+        prefix: Optional static phrase spoken first (e.g. an empathy line)
+        session_id: Session the audio URL belongs to
+        
+    Returns:
+        URL to the generated audio
+    """
+    text = render_response_template(template_name, slots)
+    if prefix:
+        text = f"{prefix} {text}"
+    
+    if not PHRASE_BANK_ENABLED or not ELEVENLABS_API_KEY or not ELEVENLABS_VOICE_ID:
+        return generate_voice(text, emotion=emotion, session_id=session_id)
+    
+    try:
+        segments = split_template(RESPONSE_TEMPLATES[template_name], slots)
+        if prefix:
+            segments.insert(0, (prefix, True))
+        
+        # Stitched clips are unique to the call, so the artifact keeps its own copy
+        stream_id = uuid.uuid4().hex
+        artifact_id = audio_store.register(session_id, mimetype='audio/wav', stream_id=stream_id)
+        
+        def render():
+            start = time.perf_counter()
+            with metrics.span('phrase_bank_render'):
+                for index, chunk in enumerate(phrase_bank.stream(segments, emotion)):
+                    # Chunk 0 is the WAV header; chunk 1 is the first audio
+                    if index == 1:
+                        metrics.observe('phrase_bank_first_audio', time.perf_counter() - start)
+                    yield chunk
+        
+        # The stream's WAV header has a placeholder length; the stored copy gets the real one
+        audio_streams.start(
+            render,
+            mimetype='audio/wav',
+            stream_id=stream_id,
+            on_complete=lambda audio_stream: audio_store.store(artifact_id, finished_stream_audio(audio_stream))
+        )
+        return audio_url(artifact_id)
+        
+    except Exception as e:
+        logger.error(f"Error stitching templated voice: {str(e)}")
+        return generate_voice(text, emotion=emotion, session_id=session_id)
+
+@metrics.timed('add_ssml_tags')
 def add_ssml_tags(text, emotion):
     """Add SSML tags for emotion and pauses"""
     # Replace fillers with SSML pauses
@@ -1560,23 +2184,13 @@ def get_voice_settings(emotion):
     
     return settings.get(emotion, (0.5, 0.5))
 
+# Pre-rendered phrases for templated responses
+phrase_bank = PhraseBank(synthesize_pcm)
+
+if PHRASE_BANK_ENABLED and ELEVENLABS_API_KEY and ELEVENLABS_VOICE_ID:
+    phrase_bank.warm_up(response_template_phrases())
+
 if __name__ == '__main__':
-    # Create audio directory if it doesn't exist
-    audio_dir = os.path.join("static", "audio")
-    try:
-        # First check if it's a file instead of a directory
-        if os.path.exists(audio_dir) and not os.path.isdir(audio_dir):
-            # It exists but is not a directory, rename it
-            os.rename(audio_dir, audio_dir + "_file")
-            logger.info(f"Renamed existing file '{audio_dir}' to '{audio_dir}_file'")
-        
-        # Now create the directory
-        if not os.path.exists(audio_dir):
-            os.makedirs(audio_dir)
-            logger.info(f"Created directory: {audio_dir}")
-    except Exception as e:
-        logger.error(f"Error creating audio directory: {str(e)}")
-    
     # Create a mock audio file if it doesn't exist
     mock_audio_path = os.path.join("static", "mock_audio.mp3")
     if not os.path.exists(mock_audio_path):